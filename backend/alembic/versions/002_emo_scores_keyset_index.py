@@ -0,0 +1,29 @@
+"""emo score history keyset index
+
+Revision ID: 002
+Revises: 001
+Create Date: 2026-10-19 19:00:00.000000
+
+Composite index on user_emo_scores (user_id, created_at, id) for the
+emo-score history list, which pages newest first with a (created_at, id) keyset.
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '002'
+down_revision = '001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_user_emo_scores_user_created_id',
+        'user_emo_scores',
+        ['user_id', 'created_at', 'id'],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_user_emo_scores_user_created_id', table_name='user_emo_scores')
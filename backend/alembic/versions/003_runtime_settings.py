@@ -0,0 +1,52 @@
+"""runtime settings store
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-19 21:00:00.000000
+
+runtime_settings holds admin overrides for hot-reloadable tunables;
+runtime_setting_audit records every change.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('runtime_settings',
+        sa.Column('key', sa.String(length=64), nullable=False),
+        sa.Column('value', sa.Text(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('updated_by_user_id', sa.Integer(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['updated_by_user_id'], ['users.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('key')
+    )
+
+    op.create_table('runtime_setting_audit',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('key', sa.String(length=64), nullable=False),
+        sa.Column('old_value', sa.Text(), nullable=True),
+        sa.Column('new_value', sa.Text(), nullable=True),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('changed_by_user_id', sa.Integer(), nullable=True),
+        sa.Column('changed_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['changed_by_user_id'], ['users.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_runtime_setting_audit_id'), 'runtime_setting_audit', ['id'], unique=False)
+    op.create_index(op.f('ix_runtime_setting_audit_key'), 'runtime_setting_audit', ['key'], unique=False)
+    op.create_index(op.f('ix_runtime_setting_audit_version'), 'runtime_setting_audit', ['version'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_runtime_setting_audit_version'), table_name='runtime_setting_audit')
+    op.drop_index(op.f('ix_runtime_setting_audit_key'), table_name='runtime_setting_audit')
+    op.drop_index(op.f('ix_runtime_setting_audit_id'), table_name='runtime_setting_audit')
+    op.drop_table('runtime_setting_audit')
+    op.drop_table('runtime_settings')
@@ -0,0 +1,40 @@
+"""versioned prompt store
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-19 22:00:00.000000
+
+prompt_versions keeps every published version of the admin-editable system
+prompts; the highest version per key is active.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('prompt_versions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('key', sa.String(length=64), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('content_hash', sa.String(length=64), nullable=False),
+        sa.Column('created_by_user_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['created_by_user_id'], ['users.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('key', 'version', name='uq_prompt_versions_key_version')
+    )
+    op.create_index(op.f('ix_prompt_versions_id'), 'prompt_versions', ['id'], unique=False)
+    op.create_index(op.f('ix_prompt_versions_key'), 'prompt_versions', ['key'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_prompt_versions_key'), table_name='prompt_versions')
+    op.drop_index(op.f('ix_prompt_versions_id'), table_name='prompt_versions')
+    op.drop_table('prompt_versions')
@@ -0,0 +1,42 @@
+"""prompt A/B experiments
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-19 23:00:00.000000
+
+prompt_experiments defines per-prompt A/B variants; users are bucketed
+deterministically while an experiment is active.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('prompt_experiments',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('key', sa.String(length=64), nullable=False),
+        sa.Column('variants', sa.Text(), nullable=False),
+        sa.Column('is_active', sa.Boolean(), nullable=False, server_default='true'),
+        sa.Column('created_by_user_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.Column('ended_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['created_by_user_id'], ['users.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_prompt_experiments_id'), 'prompt_experiments', ['id'], unique=False)
+    op.create_index(op.f('ix_prompt_experiments_key'), 'prompt_experiments', ['key'], unique=False)
+    op.create_index(op.f('ix_prompt_experiments_is_active'), 'prompt_experiments', ['is_active'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_prompt_experiments_is_active'), table_name='prompt_experiments')
+    op.drop_index(op.f('ix_prompt_experiments_key'), table_name='prompt_experiments')
+    op.drop_index(op.f('ix_prompt_experiments_id'), table_name='prompt_experiments')
+    op.drop_table('prompt_experiments')
@@ -0,0 +1,28 @@
+"""session opening message pending flag
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-20 09:00:00.000000
+
+start_session returns before the therapist's opening message is generated;
+sessions.opening_pending is true while the background task is still running.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'sessions',
+        sa.Column('opening_pending', sa.Boolean(), server_default='false', nullable=False)
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('sessions', 'opening_pending')
@@ -0,0 +1,56 @@
+"""
+Agent Runs
+
+各 agent 服务共用的 run 调用：
+- 不在 CancelScope 中且不需要流式输出时，直接非流式调用
+- 在 CancelScope 中（客户端可能断开，见 app/core/cancellation.py）时以 scope.run_id 流式调用，
+  Agno 在每个 chunk 之间检查取消标记；run 被取消时抛出 RunCancelled
+"""
+
+import logging
+from typing import Callable, Optional
+
+from agno.agent import Agent
+from agno.run.agent import RunEvent
+
+from app.core.cancellation import RunCancelled, current_cancel_scope
+
+logger = logging.getLogger(__name__)
+
+
+def run_agent(agent: Agent, on_token: Optional[Callable[[str], None]] = None, **run_kwargs) -> str:
+    """
+    执行一次 agent run，返回回复文本
+
+    Args:
+        agent: Agno Agent
+        on_token: 每收到一段回复文本回调一次（WebSocket 推送）
+        **run_kwargs: 传给 Agent.run 的参数（input / user_id / session_id / session_state ...）
+
+    Raises:
+        RunCancelled: run 被取消（Agno 已把它以 CANCELLED 状态写入会话）
+    """
+    scope = current_cancel_scope()
+    if scope is None and on_token is None:
+        return agent.run(**run_kwargs, stream=False).content
+
+    if scope is not None:
+        scope.raise_if_cancelled()
+        run_kwargs["run_id"] = scope.run_id
+
+    chunks = []
+    cancelled = False
+    for event in agent.run(**run_kwargs, stream=True):
+        kind = getattr(event, "event", None)
+        if kind == RunEvent.run_cancelled.value:
+            cancelled = True
+        elif kind == RunEvent.run_content.value and isinstance(event.content, str) and event.content:
+            chunks.append(event.content)
+            if on_token is not None:
+                on_token(event.content)
+
+    # 只有 Agno 确实停止了 run 才算取消；最后一个 chunk 之后才断开的，回复已完整写入会话
+    if cancelled:
+        logger.info(f"{agent.name} run {run_kwargs.get('run_id')} stopped after {len(chunks)} chunk(s)")
+        raise RunCancelled(run_kwargs.get("run_id"), scope.reason if scope else None)
+    return "".join(chunks)
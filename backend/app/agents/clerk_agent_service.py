@@ -8,12 +8,19 @@ from agno.agent import Agent
 from agno.models.openai import OpenAIChat
 from agno.run import RunContext
 from app.core.config import settings
+from app.core.openai_logger import get_logging_http_client, openai_logging_context
+from app.core.tracing import trace_span
 from app.models.user_context import UserContext
 from app.models.session_review import SessionReview
+from app.services.database import get_agno_db
+from app.services.prompt_store import get_prompt_store
+from app.services.prompt_templates import render_prompt
+from app.services.runtime_settings import get_runtime_settings
 from sqlalchemy.orm import Session
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Tuple
 from datetime import datetime
 import logging
+import threading
 
 logger = logging.getLogger(__name__)
 
@@ -23,28 +30,34 @@ class ClerkAgentService:
 
     _instance: Optional['ClerkAgentService'] = None
     _agent: Optional[Agent] = None
+    # 预热线程和第一批请求可能同时构造单例，只允许一个线程创建 Agent / 注册监听
+    _init_lock = threading.Lock()
 
     def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
+        with cls._init_lock:
+            if cls._instance is None:
+                cls._instance = super().__new__(cls)
         return cls._instance
 
     def __init__(self):
         if self._agent is not None:
             return
+        with self._init_lock:
+            if self._agent is None:
+                self._build()
 
-        # 使用与 Therapist 相同的数据库
-        from app.agents.therapist_agent_service import TherapistAgentService
-        therapist_service = TherapistAgentService()
-
+    def _build(self):
         # 创建 Clerk Agent
         self._agent = Agent(
             name="ClerkAgent",
             model=OpenAIChat(
-                id=settings.CLERK_MODEL,
-                api_key=settings.OPENAI_API_KEY
+                id=get_runtime_settings().get("CLERK_MODEL"),
+                temperature=get_runtime_settings().get("CLERK_TEMPERATURE"),
+                api_key=settings.OPENAI_API_KEY,
+                base_url=settings.OPENAI_BASE_URL,
+                http_client=get_logging_http_client()  # 记录用量（按 prompt 实验变体聚合）
             ),
-            db=therapist_service.agno_db,
+            db=get_agno_db(),  # 与 Therapist 共用同一个 Agno 数据库
 
             # ===== Clerk 不需要 Memory =====
             enable_user_memories=False,
@@ -60,13 +73,22 @@ class ClerkAgentService:
             ],
 
             # ===== Instructions =====
-            instructions=self._load_clerk_instructions(),
+            # 每次 run 通过 session_state 传入（提示词可能有新版本，或用户处于 A/B 实验中）
+            instructions="{instructions}",
 
             markdown=False,
         )
 
+        # 单例 Agent：运行参数修改后直接更新模型配置
+        get_runtime_settings().add_listener(self._apply_runtime_settings)
+
         logger.info("✓ ClerkAgent 初始化完成")
 
+    def _apply_runtime_settings(self, changed: set):
+        runtime = get_runtime_settings()
+        self._agent.model.id = runtime.get("CLERK_MODEL")
+        self._agent.model.temperature = runtime.get("CLERK_TEMPERATURE")
+
     @property
     def agent(self) -> Agent:
         return self._agent
@@ -111,55 +133,29 @@ class ClerkAgentService:
             if not questions:
                 raise ValueError("No onboarding questions found")
 
-            # 3. 构造问答对话历史
-            qa_text = "\n\n".join([
-                f"Q{q.question_number}: {q.question_text}\nA: {q.answer or '未回答'}"
-                for q in questions
-            ])
-
-            # 4. 使用 Agno Agent 分析
-            prompt = f"""
-请分析以下用户的 onboarding 问答记录，生成结构化的用户上下文（Markdown 格式）。
-
-用户昵称：{user_nickname}
-
-{qa_text}
-
-要求：
-1. 使用以下 Markdown 结构：
-   ## 基本信息
-   - 昵称：{user_nickname}
-
-   ## 咨询目标
-   [用户寻求咨询的主要目的]
-
-   ## 当前状态评估
-   - 压力状态：[评估]
-   - 情绪稳定性：[评估]
-   - 焦虑程度：[评估]
-   - 功能水平：[评估]
-
-   ## 关注重点
-   [咨询师需要关注的重点事项]
-
-2. 保持简洁专业，每部分 2-5 句话
-3. 使用第三人称描述
-4. 只输出 Markdown 文本，不要有其他解释
-5. **重要**：必须使用提供的昵称 "{user_nickname}"，不要修改
-
-请立即调用 save_user_context 工具保存生成的用户上下文。
-"""
-
-            response = self._agent.run(
-                input=prompt,
-                user_id=str(user_id),
-                session_id=f"onboarding_{user_id}",
-                session_state={
-                    "user_id": user_id
-                },
-                stream=False
+            # 3. 使用 Agno Agent 分析
+            rendered = render_prompt(
+                "clerk_onboarding_analysis",
+                user_nickname=user_nickname,
+                questions=[(q.question_number, q.question_text, q.answer) for q in questions],
             )
 
+            instructions, prompt_variants = self._resolve_instructions(user_id)
+            agno_session_id = f"onboarding_{user_id}"
+            with openai_logging_context(user_id=user_id, session_id=agno_session_id, is_admin=False,
+                                        prompt_variants=prompt_variants):
+                response = self._agent.run(
+                    input=rendered.text,
+                    user_id=str(user_id),
+                    session_id=agno_session_id,
+                    session_state={
+                        "user_id": user_id,
+                        "instructions": instructions,
+                    },
+                    metadata={"prompt_hash": rendered.prompt_hash, "prompt_variants": prompt_variants},
+                    stream=False
+                )
+
             # 4. 从数据库读取保存的结果
             context = db.query(UserContext).filter_by(user_id=user_id).first()
 
@@ -204,36 +200,26 @@ class ClerkAgentService:
             }
         """
         try:
-            prompt = """
-请完成以下任务：
-
-1. 分析本次咨询对话，生成会话总结：
-   - 主要讨论的话题
-   - 用户的情绪变化
-   - 关键事件（2-5个关键时刻）
-
-2. 判断是否需要更新用户上下文：
-   - 如果发现用户的咨询目标、困扰或偏好有变化
-   - 或者了解到新的重要信息
-   - 则调用 `update_user_context` 工具更新
-
-3. 调用 `save_session_review` 工具保存会话总结和关键事件
-
-请逐步执行。
-"""
+            rendered = render_prompt("clerk_session_end")
 
             logger.info(f"ClerkAgent processing session end for session {session_id}")
 
-            response = self._agent.run(
-                input=prompt,
-                user_id=str(user_id),
-                session_id=agno_session_id,  # 使用 Agno session ID
-                session_state={
-                    "user_id": user_id,
-                    "session_id": session_id  # 传入业务 session ID
-                },
-                stream=False
-            )
+            instructions, prompt_variants = self._resolve_instructions(user_id)
+            with openai_logging_context(user_id=user_id, session_id=agno_session_id, is_admin=False,
+                                        prompt_variants=prompt_variants), \
+                    trace_span("clerk.agent_run", model=self._agent.model.id, prompt_hash=rendered.prompt_hash):
+                response = self._agent.run(
+                    input=rendered.text,
+                    user_id=str(user_id),
+                    session_id=agno_session_id,  # 使用 Agno session ID
+                    session_state={
+                        "user_id": user_id,
+                        "session_id": session_id,  # 传入业务 session ID
+                        "instructions": instructions,
+                    },
+                    metadata={"prompt_hash": rendered.prompt_hash, "prompt_variants": prompt_variants},
+                    stream=False
+                )
 
             # 从数据库读取保存的结果
             review = db.query(SessionReview).filter_by(session_id=session_id).first()
@@ -398,11 +384,20 @@ class ClerkAgentService:
 
         return save_session_review
 
+    def _resolve_instructions(self, user_id: int) -> Tuple[str, Dict[str, str]]:
+        """本次 run 的 Clerk 指令（实验变体优先）和变体标记 {key: "实验id:变体id"}"""
+        try:
+            content, assignment = get_prompt_store().get_for_user("clerk", user_id)
+        except Exception as e:
+            logger.error(f"Failed to resolve clerk instructions: {e}")
+            return self._load_clerk_instructions(), {}
+        return content, ({assignment.key: assignment.tag} if assignment is not None else {})
+
     def _load_clerk_instructions(self) -> str:
         """加载 Clerk 指令"""
         try:
-            from app.services.prompt_loader import PromptLoader
-            loader = PromptLoader()
+            from app.services.prompt_loader import get_prompt_loader
+            loader = get_prompt_loader()  # 共用单例，YAML 只解析一次
             return loader.get_prompt("clerk_base_instructions.yaml")
         except Exception as e:
             logger.error(f"Failed to load clerk instructions: {e}")
@@ -10,15 +10,21 @@ Onboarding Agent Service
 from agno.agent import Agent
 from agno.models.openai import OpenAIChat
 from agno.run import RunContext
+from app.agents.agent_runs import run_agent
 from app.core.config import settings
+from app.core.openai_logger import get_logging_http_client
 from app.models.user import User
 from app.models.user_onboarding import UserOnboarding, QuestionType
 from app.models.user_context import UserContext
 from app.models.emo_score import EmoScore, EmoScoreSource
+from app.services.database import get_agno_db
+from app.services.prompt_store import get_prompt_store
+from app.services.runtime_settings import get_runtime_settings
 from sqlalchemy.orm import Session
 from typing import Optional, List
 from datetime import datetime
 import logging
+import threading
 
 logger = logging.getLogger(__name__)
 
@@ -28,28 +34,33 @@ class OnboardingAgentService:
 
     _instance: Optional['OnboardingAgentService'] = None
     _agent: Optional[Agent] = None
+    # 预热线程和第一批请求可能同时构造单例，只允许一个线程创建 Agent / 注册监听
+    _init_lock = threading.Lock()
 
     def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
+        with cls._init_lock:
+            if cls._instance is None:
+                cls._instance = super().__new__(cls)
         return cls._instance
 
     def __init__(self):
         if self._agent is not None:
             return
+        with self._init_lock:
+            if self._agent is None:
+                self._build()
 
-        # 使用与 Therapist 相同的数据库
-        from app.agents.therapist_agent_service import TherapistAgentService
-        therapist_service = TherapistAgentService()
-
+    def _build(self):
         # 创建 Onboarding Agent
         self._agent = Agent(
             name="onboarding_agent",
             model=OpenAIChat(
-                id=settings.ONBOARDING_MODEL,
-                api_key=settings.OPENAI_API_KEY
+                id=get_runtime_settings().get("ONBOARDING_MODEL"),
+                api_key=settings.OPENAI_API_KEY,
+                base_url=settings.OPENAI_BASE_URL,
+                http_client=get_logging_http_client()  # 客户端断开时可中止上游流式响应
             ),
-            db=therapist_service.agno_db,
+            db=get_agno_db(),  # 与 Therapist 共用同一个 Agno 数据库
 
             # ===== Memory 配置 =====
             enable_user_memories=False,  # 不需要长期记忆
@@ -71,12 +82,39 @@ class OnboardingAgentService:
             markdown=False,
         )
 
+        # 单例 Agent：运行参数 / 提示词发布新版本后直接更新模型配置和 instructions
+        get_runtime_settings().add_listener(self._apply_runtime_settings)
+        get_prompt_store().add_listener(self._apply_prompt_changes)
+
         logger.info("✓ onboarding_agent 初始化完成")
 
+    def _apply_runtime_settings(self, changed: set):
+        self._agent.model.id = get_runtime_settings().get("ONBOARDING_MODEL")
+
+    def _apply_prompt_changes(self, changed: set):
+        if "onboarding" in changed:
+            self._agent.instructions = self._load_onboarding_instructions()
+            logger.info("onboarding_agent instructions reloaded")
+
     @property
     def agent(self) -> Agent:
         return self._agent
 
+    def run(self, prompt: str, user_id: int, session_id: str) -> str:
+        """
+        执行一次 onboarding run（问题 / 评估由工具写入数据库）
+
+        Raises:
+            RunCancelled: 在 CancelScope 中运行且客户端已断开
+        """
+        return run_agent(
+            self._agent,
+            input=prompt,
+            user_id=str(user_id),
+            session_id=session_id,
+            session_state={"user_id": user_id},
+        )
+
     # ===== 工具定义 =====
 
     def _create_save_question_tool(self):
@@ -380,8 +418,8 @@ class OnboardingAgentService:
     def _load_onboarding_instructions(self) -> str:
         """加载 Onboarding 指令"""
         try:
-            from app.services.prompt_loader import PromptLoader
-            loader = PromptLoader()
+            from app.services.prompt_loader import get_prompt_loader
+            loader = get_prompt_loader()  # 共用单例，YAML 只解析一次
             return loader.get_prompt("onboarding_instructions.yaml")
         except Exception as e:
             logger.error(f"Failed to load onboarding instructions: {e}")
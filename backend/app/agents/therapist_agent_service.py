@@ -5,15 +5,20 @@ Therapist Agent Service
 """
 
 from agno.agent import Agent
-from agno.db.postgres import PostgresDb
-from agno.db.sqlite import SqliteDb
 from agno.models.openai import OpenAIChat
+from app.agents.agent_runs import run_agent
+from app.core.cancellation import RunCancelled
 from app.core.config import settings
-from app.core.openai_logger import create_logging_http_client, openai_logging_context
+from app.core.openai_logger import get_logging_http_client, openai_logging_context
+from app.core.tracing import trace_span
 from app.models.user_context import UserContext
+from app.services.database import get_agno_db
+from app.services.prompt_store import THERAPIST_EXPERIMENT_PREFIX, get_prompt_store
+from app.services.prompt_templates import render_prompt
+from app.services.runtime_settings import get_runtime_settings
 from app.services.session_timeout_service import SessionTimeoutService
 from sqlalchemy.orm import Session
-from typing import Optional, List, Dict
+from typing import Callable, Optional, List, Dict, Tuple
 import logging
 
 logger = logging.getLogger(__name__)
@@ -26,23 +31,23 @@ class TherapistAgentService:
     """
 
     def __init__(self):
-        # 初始化 Agno 数据库连接
-        if settings.agno_database_url.startswith("postgresql"):
-            self.agno_db = PostgresDb(db_url=settings.agno_database_url)
-        else:
-            # SQLite
-            db_file = settings.agno_database_url.replace("sqlite:///", "")
-            self.agno_db = SqliteDb(db_file=db_file)
+        # Agno 数据库连接（进程内共享一个连接池）
+        self.agno_db = get_agno_db()
 
-        # 创建带日志功能的 HTTP client（用于记录 admin 用户的 prompts）
-        logging_http_client = create_logging_http_client()
+        # 带日志功能的 HTTP client（用于记录 admin 用户的 prompts），进程内共享连接池
+        logging_http_client = get_logging_http_client()
+
+        # 模型 id / temperature / 历史轮数可热更新，每次创建服务时读取最新值
+        runtime = get_runtime_settings()
 
         # 创建 Therapist Agent
         self._agent = Agent(
             name="TherapistAgent",
             model=OpenAIChat(
-                id=settings.THERAPIST_MODEL,
+                id=runtime.get("THERAPIST_MODEL"),
+                temperature=runtime.get("THERAPIST_TEMPERATURE"),
                 api_key=settings.OPENAI_API_KEY,
+                base_url=settings.OPENAI_BASE_URL,
                 http_client=logging_http_client  # 使用自定义 HTTP client
             ),
             db=self.agno_db,
@@ -52,7 +57,7 @@ class TherapistAgentService:
 
             # ===== Chat History 配置 =====
             add_history_to_context=True,  # 自动添加历史到上下文
-            num_history_runs=settings.THERAPIST_HISTORY_RUNS,
+            num_history_runs=runtime.get("THERAPIST_HISTORY_RUNS"),
 
             # ===== Instructions =====
             instructions="{instructions}",  # 通过 session_state 传递
@@ -74,7 +79,8 @@ class TherapistAgentService:
         session_id: str,
         message: str,
         db: Session,
-        active_duration_seconds: Optional[int] = None
+        active_duration_seconds: Optional[int] = None,
+        on_token: Optional[Callable[[str], None]] = None
     ) -> str:
         """
         处理用户消息
@@ -85,53 +91,102 @@ class TherapistAgentService:
             message: 用户消息
             db: SQLAlchemy session
             active_duration_seconds: 累计活跃时长（秒）
+            on_token: 传入时以流式调用模型，每收到一段回复文本回调一次（WebSocket 推送）
 
         Returns:
-            AI 回复文本
+            AI 回复文本（完整）
+
+        Raises:
+            RunCancelled: 客户端断开，run 已停止（其他错误返回兜底回复）
         """
         try:
             # 1. 查询用户信息
             from app.models.user import User
-            user = db.query(User).filter_by(id=user_id).first()
-            is_admin = user.is_admin if user else False
-
-            # 2. 加载数据
-            user_context = self._load_user_context(user_id, db)
-            therapist_prompt = self._load_therapist_prompt(user_id, db)
-
-            # 3. 检查超时
-            from app.models.session import Session as SessionModel
-            session_obj = db.query(SessionModel).filter_by(agno_session_id=session_id).first()
-            timeout_info = SessionTimeoutService.check_and_update(session_obj, db)
+            with trace_span("therapist.load_user"):
+                user = db.query(User).filter_by(id=user_id).first()
+                is_admin = user.is_admin if user else False
 
-            # 4. 构建指令（两种模式：normal vs timeout）
-            if timeout_info["should_remind"]:
-                timeout_reminder = self._load_timeout_reminder()
-                instructions = f"{therapist_prompt}\n\n{timeout_reminder}\n\n## 当前用户情况\n\n{user_context}"
-            else:
-                instructions = f"{therapist_prompt}\n\n## 当前用户情况\n\n{user_context}"
+            # 2-4. 加载数据、检查超时、构建指令
+            instructions, timeout_info = self._build_instructions(user_id, session_id, db)
 
             # 5. 调用 Agent
             logger.info(
                 f"[THERAPIST] user={user_id}, session={session_id}, "
-                f"timeout={timeout_info['should_remind']}, admin={is_admin}"
+                f"timeout={timeout_info['should_remind']}, admin={is_admin}, "
+                f"prompt={timeout_info['prompt_hash']}, variants={timeout_info['prompt_variants']}"
             )
 
-            with openai_logging_context(user_id=user_id, session_id=session_id, is_admin=is_admin):
-                response = self._agent.run(
+            # Agno 写 ai.agno_sessions 以及记忆提取的模型调用都发生在 run 内部，
+            # 会分别计入该 span 的 agno_sql_count 和子 span openai.http
+            prompt_variants = timeout_info["prompt_variants"]
+            with openai_logging_context(user_id=user_id, session_id=session_id, is_admin=is_admin,
+                                        prompt_variants=prompt_variants), \
+                    trace_span("therapist.agent_run", model=get_runtime_settings().get("THERAPIST_MODEL"),
+                               prompt_hash=timeout_info["prompt_hash"]):
+                run_kwargs = dict(
                     input=message,
                     user_id=str(user_id),
                     session_id=session_id,
                     session_state={"instructions": instructions},
-                    stream=False
+                    metadata={"prompt_hash": timeout_info["prompt_hash"], "prompt_variants": prompt_variants},
                 )
+                return run_agent(self._agent, on_token=on_token, **run_kwargs)
 
-            return response.content
-
+        except RunCancelled as e:
+            if not settings.SESSION_KEEP_CANCELLED_MESSAGES:
+                self._discard_run(session_id, e.run_id)
+            raise
         except Exception as e:
             logger.error(f"TherapistAgent error: {e}", exc_info=True)
             return "抱歉，我现在遇到了一些问题，请稍后再试。"
 
+    def _discard_run(self, session_id: str, run_id: str):
+        """从 Agno 会话中删除被取消的 run（SESSION_KEEP_CANCELLED_MESSAGES=False）"""
+        try:
+            agno_session = self._agent.get_session(session_id=session_id)
+            if agno_session is not None and agno_session.runs:
+                runs = [run for run in agno_session.runs if run.run_id != run_id]
+                if len(runs) != len(agno_session.runs):
+                    agno_session.runs = runs
+                    self._agent.save_session(agno_session)
+            # 单独存放 run 的存储（agno_runs 表）需要另外删除
+            self.agno_db.delete_run(run_id)
+            logger.info(f"Discarded cancelled run {run_id} from session {session_id}")
+        except Exception as e:
+            logger.error(f"Failed to discard cancelled run {run_id}: {e}", exc_info=True)
+
+    def _build_instructions(self, user_id: int, session_id: str, db: Session) -> Tuple[str, Dict]:
+        """
+        组装本轮的 instructions（治疗师 prompt + 超时提示 + 用户上下文）
+
+        Returns:
+            (instructions, timeout_info)，timeout_info 中带有 instructions 的 prompt_hash
+            和本轮使用的实验变体 prompt_variants {key: "实验id:变体id"}
+        """
+        prompt_variants: Dict[str, str] = {}
+        with trace_span("therapist.load_context"):
+            user_context = self._load_user_context(user_id, db)
+            therapist_prompt = self._load_therapist_prompt(user_id, db, prompt_variants)
+
+        from app.models.session import Session as SessionModel
+        with trace_span("session.timeout_check"):
+            session_obj = db.query(SessionModel).filter_by(agno_session_id=session_id).first()
+            timeout_info = SessionTimeoutService.check_and_update(session_obj, db)
+
+        # 两种模式：normal vs timeout（超时时插入提示）
+        rendered = render_prompt(
+            "therapist_instructions",
+            therapist_prompt=therapist_prompt,
+            timeout_reminder=(
+                self._load_timeout_reminder(user_id, prompt_variants) if timeout_info["should_remind"] else None
+            ),
+            user_context=user_context,
+        )
+        timeout_info["prompt_hash"] = rendered.prompt_hash
+        timeout_info["prompt_variants"] = prompt_variants
+
+        return rendered.text, timeout_info
+
     def _load_user_context(self, user_id: int, db: Session) -> str:
         """从数据库加载用户上下文"""
         try:
@@ -141,25 +196,36 @@ class TherapistAgentService:
             logger.error(f"Failed to load user context for user {user_id}: {e}")
             return "（用户信息加载失败）"
 
-    def _load_therapist_prompt(self, user_id: int, db: Session) -> str:
-        """从数据库加载治疗师个性化 prompt"""
+    def _load_therapist_prompt(self, user_id: int, db: Session, prompt_variants: Dict[str, str]) -> str:
+        """
+        加载治疗师个性化 prompt（只查 user.therapist_id，prompt 来自进程内治疗师目录）
+
+        该治疗师的 prompt 有进行中的实验时使用用户分到的变体，并把变体标记写入 prompt_variants
+        """
         try:
             from app.models.user import User
-            from sqlalchemy.orm import joinedload
+            from app.services.therapist_catalog import get_therapist_catalog
 
-            user = db.query(User).options(joinedload(User.therapist)).filter_by(id=user_id).first()
+            row = db.query(User.therapist_id).filter(User.id == user_id).first()
 
-            if not user:
+            if not row:
                 logger.warning(f"User {user_id} not found")
                 return "（用户不存在）"
 
-            if not user.therapist_id or not user.therapist:
+            therapist = get_therapist_catalog().get(row.therapist_id) if row.therapist_id else None
+            if not therapist:
                 logger.warning(f"User {user_id} has no therapist assigned")
                 return "（未分配治疗师）"
 
-            prompt = user.therapist.prompt
+            prompt = therapist.prompt
+            assignment = get_prompt_store().assign(f"{THERAPIST_EXPERIMENT_PREFIX}{row.therapist_id}", user_id)
+            if assignment is not None:
+                prompt_variants[assignment.key] = assignment.tag
+                if assignment.content is not None:
+                    prompt = assignment.content
+
             if not prompt or prompt.strip() == "":
-                logger.info(f"Therapist {user.therapist_id} has no custom prompt")
+                logger.info(f"Therapist {row.therapist_id} has no custom prompt")
                 return "（该治疗师暂未设置个性化指令）"
 
             return prompt
@@ -168,12 +234,13 @@ class TherapistAgentService:
             logger.error(f"Failed to load therapist prompt for user {user_id}: {e}", exc_info=True)
             return "（治疗师指令加载失败）"
 
-    def _load_timeout_reminder(self) -> str:
-        """加载超时提示文本"""
+    def _load_timeout_reminder(self, user_id: int, prompt_variants: Dict[str, str]) -> str:
+        """加载超时提示文本（实验变体优先）"""
         try:
-            from app.services.prompt_loader import PromptLoader
-            loader = PromptLoader()
-            return loader.get_prompt("therapist_timeout.yaml")
+            content, assignment = get_prompt_store().get_for_user("therapist-timeout", user_id)
+            if assignment is not None:
+                prompt_variants[assignment.key] = assignment.tag
+            return content
         except Exception as e:
             logger.error(f"Failed to load timeout reminder: {e}")
             return "## ⚠️ 重要提示\n\n本次咨询时间已经比较长了。"
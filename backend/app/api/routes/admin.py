@@ -3,10 +3,12 @@ Admin API Routes
 
 管理后台相关的 API 路由
 """
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session as DBSession
+from datetime import datetime, timedelta
+from typing import List, Optional
 import logging
-import os
 
 from app.schemas.admin import (
     FilePromptItem,
@@ -15,12 +17,31 @@ from app.schemas.admin import (
     FilePromptUpdateResponse,
     SessionConfigResponse,
     SessionConfigUpdateRequest,
-    SessionConfigUpdateResponse
+    SessionConfigUpdateResponse,
+    ProfileItem,
+    ProfileListResponse,
+    CaptchaPoolStatsResponse,
+    SchedulerStatusResponse,
+    RuntimeSettingItem,
+    RuntimeSettingsResponse,
+    RuntimeSettingsUpdateRequest,
+    RuntimeSettingAuditResponse,
+    PromptVersionListResponse,
+    PromptRollbackRequest,
+    PromptExperimentCreateRequest,
+    PromptExperimentItem,
+    PromptExperimentListResponse,
+    PromptExperimentReportResponse
 )
-from app.services.prompt_manager import get_prompt_manager
+from app.services.prompt_manager import PromptManager, get_prompt_manager
+from app.services.prompt_store import experiment_report, get_prompt_store
 from app.core.config import settings
 from app.core.deps import get_current_admin
+from app.models.prompt_experiment import PromptExperiment
+from app.models.runtime_setting import RuntimeSettingAudit
 from app.models.user import User
+from app.services.database import get_db
+from app.services.runtime_settings import TUNABLES, get_runtime_settings
 
 logger = logging.getLogger(__name__)
 
@@ -28,34 +49,22 @@ router = APIRouter(prefix="/admin", tags=["admin"])
 
 
 @router.get("/prompts/files", response_model=FilePromptsResponse)
-async def get_file_prompts(admin: User = Depends(get_current_admin)):
+def get_file_prompts(admin: User = Depends(get_current_admin)):
     """
-    获取所有文件型提示词配置
+    获取所有文件型提示词当前生效的版本
 
     返回 4 个文件型 prompts：
     - onboarding: 用户引导问卷
     - clerk: Clerk 基础指令
     - clerk_over: Clerk 会话结束
-    - therapist-general: 治疗师通用指令
+    - therapist-timeout: 治疗师超时提示
 
     Returns:
         所有文件型提示词配置列表
     """
     try:
         manager = get_prompt_manager()
-        prompts_data = manager.get_file_prompts()
-
-        # 转换为 FilePromptItem 对象
-        prompts = []
-        for data in prompts_data:
-            prompt = FilePromptItem(
-                key=data["key"],
-                display_name=data["display_name"],
-                file_path=data["file_path"],
-                content=data["content"]
-            )
-            prompts.append(prompt)
-
+        prompts = [FilePromptItem(**data) for data in manager.get_file_prompts()]
         return FilePromptsResponse(prompts=prompts)
 
     except Exception as e:
@@ -66,20 +75,27 @@ async def get_file_prompts(admin: User = Depends(get_current_admin)):
         )
 
 
+def _validate_prompt_key(prompt_key: str):
+    valid_keys = [config["key"] for config in PromptManager.PROMPT_CONFIGS]
+    if prompt_key not in valid_keys:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid prompt key: {prompt_key}. Valid keys: {', '.join(valid_keys)}"
+        )
+
+
 @router.put("/prompts/files/{prompt_key}", response_model=FilePromptUpdateResponse)
-async def update_file_prompt(
+def update_file_prompt(
     prompt_key: str,
     request: FilePromptUpdateRequest,
-    admin: User = Depends(get_current_admin)
+    admin: User = Depends(get_current_admin),
+    db: DBSession = Depends(get_db)
 ):
     """
-    更新单个文件型提示词配置
+    发布文件型提示词的新版本
 
-    支持的 prompt_key：
-    - onboarding
-    - clerk
-    - clerk_over
-    - therapist-general
+    新版本写入 prompt_versions，所有 worker 通过版本通知切换，
+    长驻的 Clerk / Onboarding Agent 会更新 instructions，无需重启。
 
     Args:
         prompt_key: 提示词 key
@@ -87,96 +103,202 @@ async def update_file_prompt(
 
     Returns:
         更新结果
+
+    Raises:
+        HTTPException 400: 内容为空
     """
+    _validate_prompt_key(prompt_key)
+    manager = get_prompt_manager()
+
     try:
-        manager = get_prompt_manager()
+        updated = manager.update_prompt_by_key(db, prompt_key, request.content, user_id=admin.id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not updated:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to update prompt: {prompt_key}"
+        )
 
-        # 验证 key 是否存在
-        valid_keys = ["onboarding", "clerk", "clerk_over", "therapist-general"]
-        if prompt_key not in valid_keys:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Invalid prompt key: {prompt_key}. Valid keys: {', '.join(valid_keys)}"
-            )
+    updated_prompt_data = manager.get_prompt_by_key(prompt_key)
+    if not updated_prompt_data:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to retrieve updated prompt: {prompt_key}"
+        )
 
-        # 更新 prompt
-        success = manager.update_prompt_by_key(prompt_key, request.content)
+    logger.info(f"Updated file prompt: {prompt_key} v{updated_prompt_data['version']}")
 
-        if not success:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Failed to update prompt: {prompt_key}"
-            )
+    return FilePromptUpdateResponse(
+        success=True,
+        message=f"Successfully updated prompt: {prompt_key}",
+        prompt=FilePromptItem(**updated_prompt_data)
+    )
 
-        # 清除 PromptLoader 缓存，让新配置生效
-        from app.services.prompt_loader import get_prompt_loader
-        prompt_loader = get_prompt_loader()
-        prompt_loader.reload()
-
-        # 获取更新后的 prompt
-        updated_prompt_data = manager.get_prompt_by_key(prompt_key)
-        if not updated_prompt_data:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Failed to retrieve updated prompt: {prompt_key}"
-            )
 
-        updated_prompt = FilePromptItem(
-            key=updated_prompt_data["key"],
-            display_name=updated_prompt_data["display_name"],
-            file_path=updated_prompt_data["file_path"],
-            content=updated_prompt_data["content"]
-        )
+@router.get("/prompts/files/{prompt_key}/versions", response_model=PromptVersionListResponse)
+def get_file_prompt_versions(
+    prompt_key: str,
+    limit: int = Query(50, ge=1, le=200),
+    admin: User = Depends(get_current_admin),
+    db: DBSession = Depends(get_db)
+):
+    """
+    提示词的发布历史（新的在前，不含 version 0 的 YAML 默认值）
+    """
+    _validate_prompt_key(prompt_key)
+    store = get_prompt_store()
+    entry = store.get_entry(prompt_key)
+    return PromptVersionListResponse(
+        key=prompt_key,
+        active_version=entry.version if entry else 0,
+        versions=store.history(db, prompt_key, limit=limit)
+    )
+
+
+@router.post("/prompts/files/{prompt_key}/rollback", response_model=FilePromptUpdateResponse)
+def rollback_file_prompt(
+    prompt_key: str,
+    request: PromptRollbackRequest,
+    admin: User = Depends(get_current_admin),
+    db: DBSession = Depends(get_db)
+):
+    """
+    回滚到某个历史版本（把该版本内容发布为新版本；version=0 表示 YAML 默认值）
+
+    Raises:
+        HTTPException 404: 版本不存在
+    """
+    _validate_prompt_key(prompt_key)
+    try:
+        get_prompt_store().rollback(db, prompt_key, request.version, user_id=admin.id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
 
-        logger.info(f"Updated file prompt: {prompt_key}")
+    return FilePromptUpdateResponse(
+        success=True,
+        message=f"Rolled back prompt {prompt_key} to version {request.version}",
+        prompt=FilePromptItem(**get_prompt_manager().get_prompt_by_key(prompt_key))
+    )
 
-        return FilePromptUpdateResponse(
-            success=True,
-            message=f"Successfully updated prompt: {prompt_key}",
-            prompt=updated_prompt
-        )
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Failed to update file prompt {prompt_key}: {e}", exc_info=True)
-        raise HTTPException(
-            status_code=500,
-            detail=f"Failed to update prompt: {str(e)}"
+# ============ Prompt A/B 实验 ============
+
+@router.get("/prompt-experiments", response_model=PromptExperimentListResponse)
+def list_prompt_experiments(
+    limit: int = Query(50, ge=1, le=200),
+    admin: User = Depends(get_current_admin),
+    db: DBSession = Depends(get_db)
+):
+    """
+    全部 prompt 实验（新的在前）
+    """
+    return PromptExperimentListResponse(items=get_prompt_store().list_experiments(db, limit=limit))
+
+
+@router.post("/prompt-experiments", response_model=PromptExperimentItem)
+def create_prompt_experiment(
+    request: PromptExperimentCreateRequest,
+    admin: User = Depends(get_current_admin),
+    db: DBSession = Depends(get_db)
+):
+    """
+    创建 prompt 实验（立即生效，用户按 id 确定性分桶）
+
+    Raises:
+        HTTPException 400: key 不支持实验、变体不合法，或该 key 已有进行中的实验
+    """
+    try:
+        return get_prompt_store().create_experiment(
+            db, request.name, request.key, [v.model_dump() for v in request.variants], user_id=admin.id
         )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/prompt-experiments/{experiment_id}/stop", response_model=PromptExperimentItem)
+def stop_prompt_experiment(
+    experiment_id: int,
+    admin: User = Depends(get_current_admin),
+    db: DBSession = Depends(get_db)
+):
+    """
+    结束实验，所有用户回到当前版本
+
+    Raises:
+        HTTPException 404: 实验不存在
+    """
+    try:
+        return get_prompt_store().stop_experiment(db, experiment_id, user_id=admin.id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.get("/prompt-experiments/{experiment_id}/report", response_model=PromptExperimentReportResponse)
+def get_prompt_experiment_report(
+    experiment_id: int,
+    admin: User = Depends(get_current_admin),
+    db: DBSession = Depends(get_db)
+):
+    """
+    按变体聚合实验期间的模型调用：prompt / completion tokens、缓存命中率、延迟
+
+    数据来自本机的用量日志（OPENAI_USAGE_LOG_DIR），多机部署时需要汇总各机器的日志
+
+    Raises:
+        HTTPException 404: 实验不存在
+    """
+    experiment = db.query(PromptExperiment).filter(PromptExperiment.id == experiment_id).first()
+    if experiment is None:
+        raise HTTPException(status_code=404, detail=f"Prompt experiment {experiment_id} not found")
+
+    item = PromptExperimentItem.model_validate(experiment)
+    since = experiment.created_at
+    until = experiment.ended_at or datetime.utcnow()
+    # 用量日志按本地日期分文件，多读前后各一天避免时区差异漏掉记录
+    from app.core.openai_logger import get_usage_logger  # 依赖 httpx，不在启动时导入
+
+    records = get_usage_logger().iter_records(
+        since.date() - timedelta(days=1), until.date() + timedelta(days=1)
+    )
+    return PromptExperimentReportResponse(
+        experiment=item,
+        since=since,
+        until=until,
+        variants=experiment_report(experiment.id, [v.id for v in item.variants], records),
+    )
+
+
+def _session_config() -> SessionConfigResponse:
+    runtime = get_runtime_settings()
+    return SessionConfigResponse(
+        suggested_duration_minutes=runtime.get("SESSION_SUGGESTED_DURATION_MINUTES"),
+        suggested_turns=runtime.get("SESSION_SUGGESTED_TURNS"),
+        reminder_interval=runtime.get("SESSION_REMINDER_INTERVAL")
+    )
 
 
 @router.get("/session-config", response_model=SessionConfigResponse)
-async def get_session_config(admin: User = Depends(get_current_admin)):
+def get_session_config(admin: User = Depends(get_current_admin)):
     """
     获取 Session 时间和轮数控制配置
 
     Returns:
-        当前配置值
+        当前生效的配置值
     """
-    try:
-        return SessionConfigResponse(
-            suggested_duration_minutes=settings.SESSION_SUGGESTED_DURATION_MINUTES,
-            suggested_turns=settings.SESSION_SUGGESTED_TURNS,
-            reminder_interval=settings.SESSION_REMINDER_INTERVAL
-        )
-    except Exception as e:
-        logger.error(f"Failed to get session config: {e}", exc_info=True)
-        raise HTTPException(
-            status_code=500,
-            detail=f"Failed to get session config: {str(e)}"
-        )
+    return _session_config()
 
 
 @router.put("/session-config", response_model=SessionConfigUpdateResponse)
-async def update_session_config(
+def update_session_config(
     request: SessionConfigUpdateRequest,
-    admin: User = Depends(get_current_admin)
+    admin: User = Depends(get_current_admin),
+    db: DBSession = Depends(get_db)
 ):
     """
     更新 Session 时间和轮数控制配置
 
-    将配置写入 .env 文件，需要重启服务生效
+    写入运行参数表，所有 worker 立即生效，无需重启
 
     Args:
         request: 包含新的配置值
@@ -185,62 +307,150 @@ async def update_session_config(
         更新结果
     """
     try:
-        # .env 文件路径
-        env_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))), '.env')
-
-        # 读取现有 .env 内容
-        if os.path.exists(env_path):
-            with open(env_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-        else:
-            lines = []
-
-        # 更新或添加配置
-        config_keys = {
-            'SESSION_SUGGESTED_DURATION_MINUTES': str(request.suggested_duration_minutes),
-            'SESSION_SUGGESTED_TURNS': str(request.suggested_turns),
-            'SESSION_REMINDER_INTERVAL': str(request.reminder_interval)
-        }
-
-        updated_keys = set()
-        new_lines = []
-
-        for line in lines:
-            stripped = line.strip()
-            if stripped and not stripped.startswith('#'):
-                key = stripped.split('=')[0].strip()
-                if key in config_keys:
-                    new_lines.append(f"{key}={config_keys[key]}\n")
-                    updated_keys.add(key)
-                else:
-                    new_lines.append(line)
-            else:
-                new_lines.append(line)
-
-        # 添加未更新的配置（新增）
-        for key, value in config_keys.items():
-            if key not in updated_keys:
-                new_lines.append(f"\n# Session 时间和轮数控制\n{key}={value}\n")
-
-        # 写回 .env 文件
-        with open(env_path, 'w', encoding='utf-8') as f:
-            f.writelines(new_lines)
-
-        logger.info(f"Updated session config: {config_keys}")
-
-        return SessionConfigUpdateResponse(
-            success=True,
-            message="配置已更新，需要重启服务生效",
-            config=SessionConfigResponse(
-                suggested_duration_minutes=request.suggested_duration_minutes,
-                suggested_turns=request.suggested_turns,
-                reminder_interval=request.reminder_interval
+        get_runtime_settings().update(db, {
+            "SESSION_SUGGESTED_DURATION_MINUTES": request.suggested_duration_minutes,
+            "SESSION_SUGGESTED_TURNS": request.suggested_turns,
+            "SESSION_REMINDER_INTERVAL": request.reminder_interval,
+        }, user_id=admin.id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return SessionConfigUpdateResponse(
+        success=True,
+        message="配置已更新，立即生效",
+        config=_session_config()
+    )
+
+
+def _runtime_settings_response() -> RuntimeSettingsResponse:
+    runtime = get_runtime_settings()
+    values = runtime.values()
+    overrides = runtime.overrides()
+    return RuntimeSettingsResponse(
+        version=runtime.version,
+        settings=[
+            RuntimeSettingItem(
+                key=key,
+                value=values[key],
+                default=getattr(settings, key),
+                is_overridden=key in overrides,
+                type=spec.type.__name__,
+                min=spec.min,
+                max=spec.max,
+                description=spec.description,
             )
-        )
+            for key, spec in TUNABLES.items()
+        ]
+    )
 
-    except Exception as e:
-        logger.error(f"Failed to update session config: {e}", exc_info=True)
-        raise HTTPException(
-            status_code=500,
-            detail=f"Failed to update session config: {str(e)}"
-        )
+
+@router.get("/runtime-settings", response_model=RuntimeSettingsResponse)
+def get_runtime_settings_list(admin: User = Depends(get_current_admin)):
+    """
+    列出所有可热更新的运行参数（当前值、默认值、取值范围）
+    """
+    return _runtime_settings_response()
+
+
+@router.put("/runtime-settings", response_model=RuntimeSettingsResponse)
+def update_runtime_settings(
+    request: RuntimeSettingsUpdateRequest,
+    admin: User = Depends(get_current_admin),
+    db: DBSession = Depends(get_db)
+):
+    """
+    批量修改运行参数（值为 null 表示恢复默认）
+
+    一组修改在一个事务中写入并记录审计，通过 NOTIFY / 版本轮询传播到所有 worker。
+
+    Raises:
+        HTTPException 400: 未知参数或取值不合法
+    """
+    try:
+        get_runtime_settings().update(db, request.values, user_id=admin.id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _runtime_settings_response()
+
+
+@router.get("/runtime-settings/audit", response_model=RuntimeSettingAuditResponse)
+def get_runtime_settings_audit(
+    limit: int = Query(50, ge=1, le=500),
+    key: Optional[str] = Query(None, description="只看某个参数"),
+    admin: User = Depends(get_current_admin),
+    db: DBSession = Depends(get_db)
+):
+    """
+    运行参数修改记录（新的在前）
+    """
+    query = db.query(RuntimeSettingAudit)
+    if key:
+        query = query.filter(RuntimeSettingAudit.key == key)
+    items = query.order_by(RuntimeSettingAudit.id.desc()).limit(limit).all()
+    return RuntimeSettingAuditResponse(items=items)
+
+
+@router.get("/profiles", response_model=ProfileListResponse)
+def get_profiles(admin: User = Depends(get_current_admin)):
+    """
+    列出 logs/profiles/ 下的采样 profile 文件
+
+    Returns:
+        profile 文件列表（新的在前）
+    """
+    from app.core.profiler import list_profiles
+
+    return ProfileListResponse(
+        profiles=[ProfileItem(**item) for item in list_profiles()]
+    )
+
+
+@router.get("/profiles/{profile_name}")
+def download_profile(profile_name: str, admin: User = Depends(get_current_admin)):
+    """
+    下载单个 profile 文件（.collapsed 或 speedscope .json）
+
+    Args:
+        profile_name: 文件名
+
+    Returns:
+        文件内容
+    """
+    from app.core.profiler import resolve_profile_path
+
+    path = resolve_profile_path(profile_name)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"Profile not found: {profile_name}")
+
+    media_type = "application/json" if path.suffix == ".json" else "text/plain"
+    return FileResponse(path, media_type=media_type, filename=path.name)
+
+
+@router.get("/captcha-pool", response_model=CaptchaPoolStatsResponse)
+def get_captcha_pool_stats(admin: User = Depends(get_current_admin)):
+    """
+    查看验证码预渲染池的状态（命中率、补充耗时、渲染速度）
+
+    统计为当前 worker 进程内的数据。
+    """
+    from app.services.captcha_pool import get_captcha_pool
+
+    return CaptchaPoolStatsResponse(
+        enabled=settings.CAPTCHA_POOL_ENABLED,
+        **get_captcha_pool().stats()
+    )
+
+
+@router.get("/scheduler", response_model=SchedulerStatusResponse)
+def get_scheduler_status(admin: User = Depends(get_current_admin)):
+    """
+    查看后台维护调度器的状态（过期验证码清理、超时会话关闭）
+
+    多 worker 部署时只有一个 worker 是 leader；统计为当前 worker 进程内的数据。
+    """
+    from app.services.scheduler import get_scheduler
+
+    return SchedulerStatusResponse(
+        enabled=settings.SCHEDULER_ENABLED,
+        **get_scheduler().stats()
+    )
@@ -8,12 +8,16 @@ from app.schemas.auth import TokenResponse
 from app.services.user_service import UserService
 from app.services.captcha_service import CaptchaService
 from app.services.invitation_service import InvitationService
-from app.core.security import create_access_token
+from app.core.security import create_access_token, hash_password
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 logger = logging.getLogger(__name__)
 
 
+class _InvitationCodeUnavailable(Exception):
+    """Raised inside the registration savepoint to roll back the inserted user."""
+
+
 @router.post("/register", response_model=TokenResponse, status_code=status.HTTP_201_CREATED)
 def register(
     user_data: UserCreate,
@@ -22,14 +26,18 @@ def register(
     """
     Register a new user with captcha and invitation code verification.
 
-    This endpoint:
-    1. Verifies the captcha
-    2. Verifies the invitation code
-    3. Checks if the email is already registered
-    4. Creates a new user with hashed password
-    5. Marks the invitation code as used
-    6. Generates a JWT access token
-    7. Returns the token and user information
+    The password is hashed first, before any statement runs, so the slow hash never
+    holds the transaction (and the captcha row lock) open.
+
+    Everything else happens in one transaction with a single commit:
+    1. Consumes the captcha (DELETE ... RETURNING)
+    2. Inserts the user (a duplicate email fails on the unique index)
+    3. Claims the invitation code with a conditional UPDATE ... RETURNING
+       (a single-use code can only be redeemed once, even under concurrent requests)
+    4. Generates a JWT access token and returns it with the user information
+
+    Steps 2-3 run inside a savepoint: if either fails, only the captcha consumption is
+    committed, so a captcha can never be reused.
 
     Args:
         user_data: User registration data (email, password, invitation_code, captcha)
@@ -44,66 +52,56 @@ def register(
     """
     logger.info(f"Registration attempt for email: {user_data.email}")
 
-    # 1. Verify captcha
-    logger.info(f"Verifying captcha: session_id={user_data.captcha_session_id}, text={user_data.captcha_text}")
-    if not CaptchaService.verify_captcha(db, user_data.captcha_session_id, user_data.captcha_text):
-        logger.warning(f"Captcha verification failed for email: {user_data.email}")
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid or expired captcha"
-        )
-    logger.info("Captcha verified successfully")
-
-    # 2. Verify invitation code
-    logger.info(f"Verifying invitation code: {user_data.invitation_code}")
-    if not InvitationService.verify_invitation_code(db, user_data.invitation_code):
-        logger.warning(f"Invitation code verification failed: {user_data.invitation_code}")
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid or used invitation code"
-        )
-    logger.info("Invitation code verified successfully")
-
-    # 3. Check if user already exists
-    logger.info(f"Checking if user exists: {user_data.email}")
-    if UserService.user_exists(db, user_data.email):
-        logger.warning(f"Email already registered: {user_data.email}")
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already registered"
-        )
-    logger.info("Email is available")
+    # Hash before the transaction starts so the slow hash never holds it open
+    hashed_password = hash_password(user_data.password)
 
     try:
-        # 4. Create new user
-        logger.info(f"Creating user: {user_data.email}")
-        user = UserService.create_user(db, user_data)
-        logger.info(f"User created successfully with id: {user.id}")
-
-        # 5. Mark invitation code as used
-        logger.info(f"Marking invitation code as used: {user_data.invitation_code}")
-        InvitationService.use_invitation_code(db, user_data.invitation_code, user.id)
-
-        # 6. Generate access token
+        # 1. Consume captcha
+        if not CaptchaService.consume_captcha(db, user_data.captcha_session_id, user_data.captcha_text):
+            db.commit()
+            logger.warning(f"Captcha verification failed for email: {user_data.email}")
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid or expired captcha"
+            )
+
+        try:
+            with db.begin_nested():
+                # 2. Insert user
+                user = UserService.add_user(db, user_data, hashed_password=hashed_password)
+
+                # 3. Claim invitation code
+                if not InvitationService.claim_invitation_code(db, user_data.invitation_code, user.id):
+                    raise _InvitationCodeUnavailable()
+        except IntegrityError as e:
+            db.commit()
+            logger.warning(f"Email already registered: {user_data.email} ({e.orig})")
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Email already registered"
+            )
+        except _InvitationCodeUnavailable:
+            db.commit()
+            logger.warning(f"Invitation code verification failed: {user_data.invitation_code}")
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid or used invitation code"
+            )
+
+        # 4. Build the response from the flushed row, then commit once
         access_token = create_access_token(subject=user.email)
-
-        # 7. Convert user to public schema
         user_public = UserPublic.model_validate(user)
+        db.commit()
 
-        logger.info(f"Registration completed successfully for email: {user_data.email}")
+        logger.info(f"Registration completed successfully for email: {user_data.email} (id={user.id})")
         return TokenResponse(
             access_token=access_token,
             token_type="bearer",
             user=user_public
         )
 
-    except IntegrityError as e:
-        db.rollback()
-        logger.error(f"IntegrityError during registration: {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already registered"
-        )
+    except HTTPException:
+        raise
     except Exception as e:
         db.rollback()
         logger.error(f"Unexpected error during registration: {str(e)}", exc_info=True)
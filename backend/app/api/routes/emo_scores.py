@@ -1,7 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session as DBSession
-from typing import Optional
+from datetime import datetime
+from typing import List, Optional
 
+from app.core.config import settings
 from app.services.database import get_db
 from app.core.deps import get_current_user
 from app.models.user import User
@@ -9,8 +11,12 @@ from app.models.session import Session
 from app.models.emo_score import EmoScoreSource
 from app.schemas.emo_score import (
     EmoScoreCreate,
+    EmoScoreBulkRequest,
+    EmoScoreBulkResponse,
     EmoScoreResponse,
-    EmoScoreListResponse
+    EmoScoreListItem,
+    EmoScoreListResponse,
+    EmoTrendResponse
 )
 from app.services.emo_score_service import EmoScoreService
 
@@ -59,6 +65,51 @@ def create_emo_score(
     return score
 
 
+@router.post("/bulk", response_model=EmoScoreBulkResponse, status_code=201)
+def bulk_create_emo_scores(
+    data: EmoScoreBulkRequest,
+    db: DBSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    批量导入情绪评估记录（如历史评估、多个会话的总结分数）
+
+    - 所有记录在一个事务中写入，变化率由数据库按时间顺序用窗口函数计算
+    - 可为每条记录指定 created_at，用于导入历史数据
+    - source=session 的记录必须提供属于当前用户的 session_id
+    """
+    if len(data.items) > settings.EMO_BULK_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"单次最多导入 {settings.EMO_BULK_MAX_ITEMS} 条评估记录"
+        )
+
+    if any(item.source == EmoScoreSource.SESSION and not item.session_id for item in data.items):
+        raise HTTPException(
+            status_code=400,
+            detail="当评估来源为 session 时，必须提供 session_id"
+        )
+
+    # 一次查询验证所有 session_id 都属于当前用户
+    session_ids = {item.session_id for item in data.items if item.session_id}
+    if session_ids:
+        owned = {
+            session_id for (session_id,) in db.query(Session.id).filter(
+                Session.id.in_(session_ids),
+                Session.user_id == current_user.id
+            )
+        }
+        if owned != session_ids:
+            raise HTTPException(status_code=404, detail="会话不存在或不属于当前用户")
+
+    ids = EmoScoreService.bulk_create_scores(
+        db=db,
+        items=[{**item.model_dump(), "user_id": current_user.id} for item in data.items]
+    )
+
+    return EmoScoreBulkResponse(created=len(ids), ids=ids)
+
+
 @router.get("/latest", response_model=EmoScoreResponse)
 def get_latest_emo_score(
     source: Optional[EmoScoreSource] = Query(None, description="筛选评估来源"),
@@ -82,35 +133,88 @@ def get_latest_emo_score(
     return score
 
 
-@router.get("/list", response_model=EmoScoreListResponse)
+@router.get("/list", response_model=EmoScoreListResponse, response_model_exclude_unset=True)
 def get_emo_score_list(
     source: Optional[EmoScoreSource] = Query(None, description="筛选评估来源"),
+    limit: int = Query(50, ge=1, le=500, description="每页条数"),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor"),
+    created_from: Optional[datetime] = Query(None, alias="from", description="起始时间（含，UTC）"),
+    created_to: Optional[datetime] = Query(None, alias="to", description="结束时间（不含，UTC）"),
+    fields: Optional[str] = Query(None, description="逗号分隔的字段列表，如 stress_score,anxiety_score"),
+    include_total: bool = Query(False, description="是否返回总记录数（额外一次 COUNT）"),
     db: DBSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
-    获取当前用户的所有情绪评估历史记录
+    分页获取当前用户的情绪评估历史记录
 
-    - 可按来源筛选
-    - 按创建时间倒序排列
+    - 按创建时间倒序，keyset 分页：把 next_cursor 作为 cursor 传回获取下一页
+    - 可按来源和时间范围（from / to）筛选
+    - fields 只返回指定字段（id 和 created_at 总是返回）
     """
-    total = EmoScoreService.get_score_count(
-        db=db,
-        user_id=current_user.id,
-        source=source
+    field_list = [name.strip() for name in fields.split(",") if name.strip()] if fields else None
+
+    try:
+        items, next_cursor = EmoScoreService.list_scores(
+            db=db,
+            user_id=current_user.id,
+            limit=limit,
+            cursor=cursor,
+            source=source,
+            created_from=created_from,
+            created_to=created_to,
+            fields=field_list
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    response = EmoScoreListResponse(
+        items=[EmoScoreListItem(**item) for item in items],
+        next_cursor=next_cursor,
+        has_more=next_cursor is not None
     )
+    if include_total:
+        response.total = EmoScoreService.get_score_count(
+            db=db,
+            user_id=current_user.id,
+            source=source
+        )
+    return response
 
-    items = EmoScoreService.get_score_history(
+
+@router.get("/trends", response_model=EmoTrendResponse)
+def get_emo_score_trends(
+    source: Optional[EmoScoreSource] = Query(None, description="只使用某个来源的评估"),
+    window: int = Query(3, ge=1, le=50, description="移动平均窗口（评估次数）"),
+    ewma_alpha: float = Query(0.3, gt=0, lt=1, description="EWMA 平滑系数"),
+    slope_windows: List[int] = Query([3, 7], description="斜率窗口（最近 N 次评估），可重复指定"),
+    points: Optional[int] = Query(None, ge=2, le=1000, description="序列最多返回的点数（超过时降采样）"),
+    db: DBSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    获取当前用户的情绪分数趋势
+
+    - 移动平均、EWMA、斜率（分数/天）、波动率
+    - 首次 onboarding 与最近一次 session 评估之间的变化
+    - 结果按最新评估时间缓存，新增评估后自动失效
+    """
+    if any(w < 2 or w > 100 for w in slope_windows):
+        raise HTTPException(status_code=400, detail="slope_windows 必须在 2 到 100 之间")
+
+    # numpy 只有趋势计算需要，不在启动时导入
+    from app.services.emo_trend_service import EmoTrendService
+
+    return EmoTrendService.get_trends(
         db=db,
         user_id=current_user.id,
-        source=source
+        source=source,
+        window=window,
+        ewma_alpha=ewma_alpha,
+        slope_windows=slope_windows,
+        points=points
     )
 
-    return {
-        "total": total,
-        "items": items
-    }
-
 
 @router.get("/{score_id}", response_model=EmoScoreResponse)
 def get_emo_score_by_id(
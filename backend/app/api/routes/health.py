@@ -1,8 +1,18 @@
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from app.services.lifecycle import get_lifecycle_manager
+from app.services.warmup import get_warmup
 
 router = APIRouter()
 
 
 @router.get("/health")
 async def health_check():
+    # 正在退出时让负载均衡 / 编排系统停止转发新请求
+    if get_lifecycle_manager().draining:
+        return JSONResponse(status_code=503, content={"status": "draining"})
+    # 预热完成前还未就绪（首个请求不承担冷启动延迟）
+    if not get_warmup().ready:
+        return JSONResponse(status_code=503, content={"status": "warming"})
     return {"status": "ok"}
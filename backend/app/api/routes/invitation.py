@@ -4,14 +4,25 @@ Invitation Code Routes
 API endpoints for invitation code management (Admin only).
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import datetime
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
+from app.core.config import settings
+
 from app.services.database import get_db
 from app.core.deps import get_current_admin
 from app.models.user import User
 from app.models.invitation_code import InvitationCode
-from app.schemas.invitation import InvitationCodeResponse, InvitationCodeListResponse
+from app.schemas.invitation import (
+    InvitationCodeResponse,
+    InvitationCodeListResponse,
+    InvitationCodeBulkRequest,
+    InvitationCodeCountResponse
+)
 from app.services.invitation_service import InvitationService
 
 router = APIRouter(prefix="/admin/invitation-codes", tags=["admin", "invitation"])
@@ -47,44 +58,127 @@ def create_invitation_code(
         )
 
 
+@router.post("/bulk", status_code=status.HTTP_201_CREATED)
+def bulk_create_invitation_codes(
+    request: InvitationCodeBulkRequest,
+    db: Session = Depends(get_db),
+    admin: User = Depends(get_current_admin)
+):
+    """
+    Generate many invitation codes at once (Admin only).
+
+    All codes are inserted in a single transaction (batched INSERT ... ON CONFLICT DO NOTHING),
+    then streamed back as CSV or NDJSON.
+
+    Raises:
+        HTTPException 400: If count exceeds INVITATION_BULK_MAX_COUNT
+    """
+    if request.count > settings.INVITATION_BULK_MAX_COUNT:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"count must not exceed {settings.INVITATION_BULK_MAX_COUNT}"
+        )
+
+    try:
+        rows = InvitationService.bulk_create_codes(db, request.count)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to create invitation codes: {str(e)}"
+        )
+
+    if request.format == "csv":
+        media_type, extension = "text/csv", "csv"
+    else:
+        media_type, extension = "application/x-ndjson", "ndjson"
+    filename = f"invitation_codes_{datetime.utcnow():%Y%m%d_%H%M%S}.{extension}"
+
+    return StreamingResponse(
+        InvitationService.iter_export(rows, request.format),
+        status_code=status.HTTP_201_CREATED,
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "X-Codes-Created": str(len(rows)),
+        }
+    )
+
+
 @router.get("", response_model=InvitationCodeListResponse)
 def get_invitation_codes(
+    limit: int = Query(50, ge=1, le=500, description="Page size"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    code_status: Optional[Literal["used", "unused", "universal"]] = Query(None, alias="status"),
+    created_from: Optional[datetime] = Query(None, description="Created at or after (UTC)"),
+    created_to: Optional[datetime] = Query(None, description="Created before (UTC)"),
+    code_prefix: Optional[str] = Query(None, max_length=20, description="Code prefix"),
     db: Session = Depends(get_db),
     admin: User = Depends(get_current_admin)
 ):
     """
-    Get all invitation codes (Admin only).
+    List invitation codes, newest first (Admin only).
+
+    Keyset-paginated (newest first): pass `next_cursor` back as `cursor` to get the
+    next page. The redeeming user's email is resolved in the same query.
 
     Returns:
-        List of all invitation codes with usage information
+        One page of invitation codes with usage information
+
+    Raises:
+        HTTPException 400: If the cursor is invalid
     """
     try:
-        codes = InvitationService.get_all_codes(db)
-
-        code_responses = []
-        for code in codes:
-            used_by_email = None
-            if code.used_by_user_id:
-                user = db.query(User).filter(User.id == code.used_by_user_id).first()
-                used_by_email = user.email if user else None
-
-            code_responses.append(InvitationCodeResponse(
-                id=code.id,
-                code=code.code,
-                is_universal=code.is_universal,
-                is_used=code.is_used,
-                used_by_email=used_by_email,
-                used_at=code.used_at,
-                created_at=code.created_at
-            ))
-
-        return InvitationCodeListResponse(codes=code_responses)
+        rows, next_cursor = InvitationService.list_codes(
+            db,
+            limit=limit,
+            cursor=cursor,
+            status=code_status,
+            created_from=created_from,
+            created_to=created_to,
+            code_prefix=code_prefix
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to get invitation codes: {str(e)}"
         )
 
+    return InvitationCodeListResponse(
+        codes=[InvitationCodeResponse.model_validate(row) for row in rows],
+        next_cursor=next_cursor,
+        has_more=next_cursor is not None
+    )
+
+
+@router.get("/count", response_model=InvitationCodeCountResponse)
+def count_invitation_codes(
+    code_status: Optional[Literal["used", "unused", "universal"]] = Query(None, alias="status"),
+    created_from: Optional[datetime] = Query(None),
+    created_to: Optional[datetime] = Query(None),
+    code_prefix: Optional[str] = Query(None, max_length=20),
+    db: Session = Depends(get_db),
+    admin: User = Depends(get_current_admin)
+):
+    """
+    Count invitation codes matching the list filters (Admin only).
+
+    Large tables on Postgres return the planner's estimate (`estimated: true`)
+    instead of running COUNT(*).
+    """
+    count, estimated = InvitationService.count_codes(
+        db,
+        status=code_status,
+        created_from=created_from,
+        created_to=created_to,
+        code_prefix=code_prefix
+    )
+    return InvitationCodeCountResponse(count=count, estimated=estimated)
+
 
 @router.delete("/{code_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_invitation_code(
@@ -0,0 +1,333 @@
+"""
+Session WebSocket
+
+One socket per open session replaces the polling loops of the consult page
+(get_messages, get_session_detail for should_remind, waiting on end):
+
+Client -> server (JSON):
+    {"type": "auth", "token": "<JWT>"}            first frame after connecting
+    {"type": "message", "message": "...", "active_duration_seconds": 120}
+    {"type": "end"}
+    {"type": "ping"} / {"type": "pong"}
+
+Server -> client (JSON):
+    {"type": "ready", "session_id", "opening_pending", ...session_state fields}
+    {"type": "token", "delta": "..."}            streamed therapist reply
+    {"type": "reply", "reply": "..."}            full reply, turn finished
+    {"type": "session_state", ...}               after every turn (also turns sent over HTTP / other tabs)
+    {"type": "opening_ready", "session_id"}      background opening message is stored
+    {"type": "review", "session_review", "key_events"}  then the socket is closed
+    {"type": "error", "detail": "..."}
+    {"type": "ping"} / {"type": "pong"}
+
+Authentication uses the same JWT as the HTTP API. Browsers cannot set headers
+on WebSocket requests, and a ?token= query string would end up in access logs,
+so the token is sent in the first frame; the connection is closed with 1008
+when it is invalid or does not arrive within WS_AUTH_TIMEOUT_SECONDS. One turn
+runs at a time per connection. Outgoing messages go through a bounded queue: the model stream
+blocks while the client is behind, and the connection is dropped when it
+stays full (WS_SEND_TIMEOUT_SECONDS) or when pushed events overflow it.
+When the connection goes away mid-turn (closed, too slow, heartbeat timeout)
+the model run is cancelled (app/core/cancellation.py) instead of generating
+a reply nobody receives.
+
+When the server starts draining (app/services/lifecycle.py) every connection is
+closed with 1012 (Service Restart) and the client reconnects to another worker.
+A turn already in progress is not cancelled: it finishes before the process
+exits, and its session_state event reaches the new connection on commit.
+"""
+import asyncio
+import concurrent.futures
+import logging
+from typing import Dict, Optional
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, status
+from starlette.concurrency import run_in_threadpool
+
+from app.core.cancellation import CancelScope, RunCancelled, cancel_scope
+from app.core.config import settings
+from app.services.lifecycle import ServiceDraining, get_lifecycle_manager
+from app.services.session_events import get_session_event_hub
+
+router = APIRouter(prefix="/sessions", tags=["sessions"])
+logger = logging.getLogger(__name__)
+
+# Close code for clients that cannot keep up (RFC 6455 "Try Again Later")
+WS_1013_TRY_AGAIN_LATER = 1013
+
+
+def _authenticate(token: str, session_id: int) -> Dict:
+    """
+    Validate the JWT and session ownership, return the initial "ready" event.
+
+    Raises:
+        ValueError: Invalid token, unknown user, session not owned by the user or closed
+    """
+    from app.core.security import decode_access_token
+    from app.models.session import Session, SessionStatus
+    from app.services.database import SessionLocal
+    from app.services.session_orchestrator import is_opening_pending, session_state_event
+    from app.services.user_service import UserService
+
+    email = decode_access_token(token)
+    if email is None:
+        raise ValueError("Could not validate credentials")
+
+    db = SessionLocal()
+    try:
+        user = UserService.get_user_by_email(db, email)
+        if user is None:
+            raise ValueError("Could not validate credentials")
+        session = db.query(Session).filter(Session.id == session_id).first()
+        if session is None or session.user_id != user.id:
+            raise ValueError(f"Session {session_id} not found")
+        if session.status != SessionStatus.open:
+            raise ValueError("Session is closed")
+        return {
+            **session_state_event(session),
+            "type": "ready",
+            "user_id": user.id,
+            "opening_pending": is_opening_pending(session),
+        }
+    finally:
+        db.close()
+
+
+async def _receive_auth(websocket: WebSocket, session_id: int) -> Dict:
+    """
+    Wait for the {"type": "auth"} frame and authenticate it.
+
+    Raises:
+        ValueError: Missing / malformed auth frame, timeout, or invalid credentials
+    """
+    try:
+        frame = await asyncio.wait_for(websocket.receive_json(), timeout=settings.WS_AUTH_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        raise ValueError("Authentication timed out")
+    if not isinstance(frame, dict) or frame.get("type") != "auth" or not isinstance(frame.get("token"), str):
+        raise ValueError("Expected an auth message")
+    return await run_in_threadpool(_authenticate, frame["token"], session_id)
+
+
+def _load_review(session_id: int) -> Dict:
+    from app.models.session_review import SessionReview
+    from app.services.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        review = db.query(SessionReview).filter_by(session_id=session_id).first()
+        return {
+            "type": "review",
+            "session_id": session_id,
+            "session_review": review.message_review if review else None,
+            "key_events": (review.key_events or []) if review else [],
+        }
+    finally:
+        db.close()
+
+
+class SessionChannel:
+    """State of one WebSocket connection"""
+
+    def __init__(self, websocket: WebSocket, user_id: int, session_id: int):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.session_id = session_id
+        self.loop = asyncio.get_running_loop()
+        self.outbox: asyncio.Queue = asyncio.Queue(maxsize=settings.WS_SEND_QUEUE_SIZE)
+        self.last_seen = self.loop.time()
+        self.turn: Optional[asyncio.Task] = None
+        self.turn_scope: Optional[CancelScope] = None
+        self.closed = False
+        self.close_code = status.WS_1000_NORMAL_CLOSURE
+        self.close_reason = ""
+
+    async def run(self, ready: Dict):
+        hub = get_session_event_hub()
+        self.subscriber = hub.subscribe(self.session_id, self.outbox)
+        await self.outbox.put(ready)
+
+        self.sender_task = asyncio.create_task(self._sender())
+        lifecycle = get_lifecycle_manager()
+        lifecycle.add_drain_listener(self._on_drain)
+        if lifecycle.draining:
+            self._on_drain()
+        tasks = [
+            self.sender_task,
+            asyncio.create_task(self._receiver()),
+            asyncio.create_task(self._heartbeat()),
+        ]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            self.closed = True
+            lifecycle.remove_drain_listener(self._on_drain)
+            # While draining the turn runs to completion and is stored (the shutdown waits for it)
+            if self.turn_scope is not None and not lifecycle.draining:
+                self.turn_scope.cancel(f"connection closed ({self.close_reason or 'client disconnected'})")
+            hub.unsubscribe(self.subscriber)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            try:
+                await self.websocket.close(code=self.close_code, reason=self.close_reason)
+            except (RuntimeError, WebSocketDisconnect):
+                pass  # already closed by the client
+
+    def _close(self, code: int, reason: str):
+        self.close_code = code
+        self.close_reason = reason
+
+    def _abort(self, code: int, reason: str):
+        """Drop the connection even if the sender is stuck in a slow send."""
+        self._close(code, reason)
+        self.sender_task.cancel()
+
+    def _on_drain(self):
+        """Drain listener; may be called from the signal handler, so only schedules the close."""
+        self.loop.call_soon_threadsafe(self._abort, status.WS_1012_SERVICE_RESTART, "server restarting")
+
+    # ===== 发送 =====
+
+    async def _sender(self):
+        while True:
+            message = await self.outbox.get()
+            if self.subscriber.overflowed:
+                logger.warning(f"[WS] session={self.session_id} send queue overflowed, closing")
+                self._close(WS_1013_TRY_AGAIN_LATER, "send queue overflow")
+                return
+            if message.get("type") == "review_ready":
+                await self.websocket.send_json(await run_in_threadpool(_load_review, self.session_id))
+                self._close(status.WS_1000_NORMAL_CLOSURE, "session closed")
+                return
+            await self.websocket.send_json(message)
+
+    def _push_from_thread(self, scope: CancelScope, message: Dict):
+        """
+        Called from the agent thread; blocks while the send queue is full.
+
+        Never raises into the model stream: a gone or too slow client cancels the
+        run, which Agno stops (and records as cancelled) at the next chunk.
+        """
+        if self.closed or scope.cancelled:
+            return
+        future = asyncio.run_coroutine_threadsafe(self.outbox.put(message), self.loop)
+        try:
+            future.result(timeout=settings.WS_SEND_TIMEOUT_SECONDS)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            self.closed = True
+            scope.cancel("client too slow")
+            self.loop.call_soon_threadsafe(self._abort, WS_1013_TRY_AGAIN_LATER, "client too slow")
+
+    # ===== 接收 =====
+
+    async def _receiver(self):
+        while True:
+            try:
+                data = await self.websocket.receive_json()
+            except WebSocketDisconnect:
+                return
+            except ValueError:
+                await self.outbox.put({"type": "error", "detail": "Invalid JSON"})
+                continue
+            self.last_seen = self.loop.time()
+
+            kind = data.get("type") if isinstance(data, dict) else None
+            if kind == "ping":
+                await self.outbox.put({"type": "pong"})
+            elif kind == "pong":
+                continue
+            elif kind in ("message", "end"):
+                if self.turn is not None and not self.turn.done():
+                    await self.outbox.put({"type": "error", "detail": "A turn is already in progress"})
+                elif kind == "message":
+                    message = data.get("message")
+                    if not isinstance(message, str) or not message.strip():
+                        await self.outbox.put({"type": "error", "detail": "Message must not be empty"})
+                        continue
+                    self.turn = asyncio.create_task(self._run_turn(message, data.get("active_duration_seconds")))
+                else:
+                    self.turn = asyncio.create_task(self._end_session())
+            else:
+                await self.outbox.put({"type": "error", "detail": f"Unknown message type: {kind}"})
+
+    async def _run_turn(self, message: str, active_duration_seconds):
+        from app.services.session_orchestrator import run_session_turn
+
+        if not isinstance(active_duration_seconds, int) or isinstance(active_duration_seconds, bool):
+            active_duration_seconds = None
+        logger.info(
+            f"[WS_MESSAGE] session_id={self.session_id}, user_id={self.user_id}, "
+            f"active_duration={active_duration_seconds}s, message_length={len(message)}"
+        )
+        scope = self.turn_scope = CancelScope()
+
+        def turn():
+            with cancel_scope(scope):
+                return run_session_turn(
+                    self.user_id,
+                    self.session_id,
+                    message,
+                    active_duration_seconds,
+                    lambda delta: self._push_from_thread(scope, {"type": "token", "delta": delta}),
+                )
+
+        try:
+            reply = await run_in_threadpool(turn)
+            await self.outbox.put({"type": "reply", "reply": reply})
+        except RunCancelled as e:
+            logger.info(f"[WS] session={self.session_id} turn cancelled: {e.reason}")
+        except (ValueError, ServiceDraining) as e:
+            await self.outbox.put({"type": "error", "detail": str(e)})
+        except Exception as e:
+            logger.error(f"[WS] session={self.session_id} turn failed: {e}", exc_info=True)
+            await self.outbox.put({"type": "error", "detail": "Failed to generate response"})
+        finally:
+            self.turn_scope = None
+
+    async def _end_session(self):
+        from app.services.session_orchestrator import end_session_for_user
+
+        try:
+            # The review itself is delivered by the review_ready event published on commit
+            await run_in_threadpool(end_session_for_user, self.user_id, self.session_id)
+        except (ValueError, ServiceDraining) as e:
+            await self.outbox.put({"type": "error", "detail": str(e)})
+        except Exception as e:
+            logger.error(f"[WS] session={self.session_id} end failed: {e}", exc_info=True)
+            await self.outbox.put({"type": "error", "detail": "Failed to generate session review"})
+
+    # ===== 心跳 =====
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(settings.WS_HEARTBEAT_SECONDS)
+            if self.loop.time() - self.last_seen > settings.WS_IDLE_TIMEOUT_SECONDS:
+                logger.info(f"[WS] session={self.session_id} heartbeat timeout, closing")
+                self._close(status.WS_1001_GOING_AWAY, "heartbeat timeout")
+                return
+            try:
+                self.outbox.put_nowait({"type": "ping"})
+            except asyncio.QueueFull:
+                pass  # the sender is behind anyway; the next heartbeat tries again
+
+
+@router.websocket("/{session_id}/ws")
+async def session_socket(websocket: WebSocket, session_id: int):
+    """
+    Bidirectional channel for an open session (see module docstring for the protocol).
+    """
+    await websocket.accept()
+    try:
+        ready = await _receive_auth(websocket, session_id)
+    except WebSocketDisconnect:
+        return
+    except ValueError as e:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=str(e))
+        return
+
+    user_id = ready.pop("user_id")
+    logger.info(f"[WS] session={session_id} user={user_id} connected")
+    await SessionChannel(websocket, user_id, session_id).run(ready)
+    logger.info(f"[WS] session={session_id} disconnected")
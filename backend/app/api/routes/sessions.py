@@ -1,22 +1,91 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, status
 from sqlalchemy.orm import Session as DBSession
-from sqlalchemy import func, desc, text
-from typing import List
-from datetime import datetime, timedelta
+from sqlalchemy import bindparam, func, desc, text
+from typing import Dict, List
+import json
+from datetime import datetime
 from app.services.database import get_db
+from app.core.cancellation import CLIENT_CLOSED_REQUEST, RUN_STATUS_CANCELLED, RunCancelled, run_cancellable
 from app.core.deps import get_current_user
 from app.models.user import User
 from app.models.session import Session, SessionStatus
 from app.schemas.session_action import SessionStartResponse, SessionEndResponse, ActiveSessionResponse
 from app.schemas.session_message import SessionMessageRequest, SessionMessageResponse, SessionMessageListItem
 from app.schemas.session import SessionDetail, SessionHistoryItem
-from app.services.session_orchestrator import SessionOrchestrator
+from app.services.session_timeout_service import SessionTimeoutService
+from app.services.session_orchestrator import (
+    OPENING_TRIGGER_MESSAGE,
+    SessionOrchestrator,
+    generate_opening_message,
+    is_opening_pending,
+    session_state_event,
+)
+from app.services.session_events import publish_session_event
+from app.services.lifecycle import get_lifecycle_manager
 import logging
 
 router = APIRouter(prefix="/sessions", tags=["sessions"])
 logger = logging.getLogger(__name__)
 
 
+def count_runs(db: DBSession, agno_session_ids: List[str]) -> Dict[str, int]:
+    """
+    Count Agno runs for several sessions in one query (ai.agno_sessions.runs).
+
+    Postgres stores runs as JSONB, SQLite as JSON text. Sessions without a row are omitted.
+    """
+    if not agno_session_ids:
+        return {}
+    length = "jsonb_array_length" if db.get_bind().dialect.name == "postgresql" else "json_array_length"
+    query = text(f"""
+        SELECT session_id, {length}(runs) AS run_count
+        FROM ai.agno_sessions
+        WHERE session_id IN :session_ids
+    """).bindparams(bindparam("session_ids", expanding=True))
+    rows = db.execute(query, {"session_ids": list(agno_session_ids)})
+    return {row.session_id: row.run_count or 0 for row in rows}
+
+
+def runs_to_messages(runs) -> List[SessionMessageListItem]:
+    """
+    Convert Agno runs (ai.agno_sessions.runs) to a flat message list.
+
+    Each run contributes the user input and the assistant reply; the system
+    trigger message is filtered out and ids are assigned after filtering.
+    Cancelled runs (client disconnected) only contribute the user input.
+    SQLite stores runs as a JSON string, Postgres returns them already decoded.
+    """
+    if isinstance(runs, str):
+        runs = json.loads(runs)
+
+    messages = []
+    for run in runs or []:
+        created_at = run.get("created_at", 0)
+
+        # User message
+        run_input = run.get("input")
+        if run_input and "input_content" in run_input:
+            content = run_input["input_content"]
+            if content != OPENING_TRIGGER_MESSAGE:
+                messages.append(SessionMessageListItem(
+                    id=len(messages),
+                    sender="user",
+                    message=content,
+                    created_at=created_at
+                ))
+
+        # Assistant message
+        if "content" in run and run.get("status") != RUN_STATUS_CANCELLED:
+            messages.append(SessionMessageListItem(
+                id=len(messages),
+                sender="assistant",
+                message=run["content"],
+                created_at=created_at
+            ))
+
+    return messages
+
+
 @router.get("/active", response_model=ActiveSessionResponse)
 def get_active_session(
     current_user: User = Depends(get_current_user),
@@ -35,7 +104,8 @@ def get_active_session(
     if active_session:
         return ActiveSessionResponse(
             active=True,
-            session_id=active_session.id
+            session_id=active_session.id,
+            opening_pending=is_opening_pending(active_session)
         )
     else:
         return ActiveSessionResponse(
@@ -63,25 +133,17 @@ def get_history_sessions(
             Session.start_time.asc()
         ).all()
 
+        # 一次查询所有会话的 runs 数组长度（逐个查询是 N+1）
+        try:
+            run_counts = count_runs(db, [s.agno_session_id for s in sessions if s.agno_session_id])
+        except Exception as e:
+            logger.warning(f"Failed to count messages for user {current_user.id}: {e}")
+            run_counts = {}
+
         result = []
         for idx, session in enumerate(sessions, start=1):
-            # 从 Agno 表的 runs 字段计算消息数量
-            message_count = 0
-            if session.agno_session_id:
-                try:
-                    # 查询 runs 数组长度，每个 run 包含 1 对用户消息和助手回复
-                    count_query = text("""
-                        SELECT jsonb_array_length(runs) as run_count
-                        FROM ai.agno_sessions
-                        WHERE session_id = :session_id
-                    """)
-                    count_result = db.execute(count_query, {"session_id": session.agno_session_id})
-                    row = count_result.fetchone()
-                    # 每个 run 包含 1 个用户消息 + 1 个助手回复 = 2 条消息
-                    message_count = (row.run_count * 2) if row and row.run_count else 0
-                except Exception as e:
-                    logger.warning(f"Failed to count messages for session {session.id}: {e}")
-                    message_count = 0
+            # 每个 run 包含 1 个用户消息 + 1 个助手回复 = 2 条消息
+            message_count = run_counts.get(session.agno_session_id, 0) * 2
 
             result.append(SessionHistoryItem(
                 id=session.id,
@@ -125,26 +187,13 @@ def get_session_detail(
     message_count = 0
     if session.agno_session_id:
         try:
-            # 查询 runs 数组长度，每个 run 包含 1 对用户消息和助手回复
-            count_query = text("""
-                SELECT jsonb_array_length(runs) as run_count
-                FROM ai.agno_sessions
-                WHERE session_id = :session_id
-            """)
-            count_result = db.execute(count_query, {"session_id": session.agno_session_id})
-            row = count_result.fetchone()
             # 每个 run 包含 1 个用户消息 + 1 个助手回复 = 2 条消息
-            message_count = (row.run_count * 2) if row and row.run_count else 0
+            message_count = count_runs(db, [session.agno_session_id]).get(session.agno_session_id, 0) * 2
         except Exception as e:
             logger.warning(f"Failed to count messages for session {session_id}: {e}")
 
-    # Calculate should_remind for active sessions
-    from app.core.config import settings
-    should_remind = False
-    if session.status == SessionStatus.open:
-        # 简单判断：只检查时长是否超过建议值（只读，不修改状态）
-        suggested_duration = settings.SESSION_SUGGESTED_DURATION_MINUTES * 60
-        should_remind = session.active_duration_seconds > suggested_duration
+    # Calculate should_remind for active sessions (read-only)
+    should_remind = session.status == SessionStatus.open and SessionTimeoutService.is_overtime(session)
 
     return SessionDetail(
         id=session.id,
@@ -159,97 +208,81 @@ def get_session_detail(
         active_duration_seconds=session.active_duration_seconds,
         turn_count=session.turn_count,
         overtime_reminder_count=session.overtime_reminder_count,
-        should_remind=should_remind
+        should_remind=should_remind,
+        opening_pending=is_opening_pending(session)
     )
 
 
 @router.post("/start", response_model=SessionStartResponse, status_code=status.HTTP_201_CREATED)
 def start_session(
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
     db: DBSession = Depends(get_db)
 ):
     """
     Start a new therapy session.
 
-    Creates a new session with agno_session_id and generates therapist's opening message.
+    Creates a new session with agno_session_id and returns immediately; the therapist's
+    opening message is generated in the background. Clients poll GET /sessions/{id}
+    until opening_pending is false, then load the messages.
 
     Important: When starting a new session, all previous open sessions for this user
     will be automatically closed to ensure only one active session at a time.
-    """
-    try:
-        # Close all previous open sessions for this user that are older than 24 hours
-        # This prevents accidentally closing sessions in other tabs
-        timeout = timedelta(hours=24)
-        cutoff_time = datetime.utcnow() - timeout
 
-        previous_open_sessions = db.query(Session).filter(
-            Session.user_id == current_user.id,
-            Session.status == SessionStatus.open,
-            Session.start_time < cutoff_time
-        ).all()
-
-        if previous_open_sessions:
-            logger.info(f"Closing {len(previous_open_sessions)} previous open session(s) older than 24 hours for user {current_user.id}")
-            for session in previous_open_sessions:
-                session.status = SessionStatus.closed
-                session.end_time = datetime.utcnow()
-            db.flush()
+    Rejected with 503 while the server is draining; the opening message of a session
+    that was already started is still generated before shutdown.
+    """
+    with get_lifecycle_manager().track_run("start_session"):
+        try:
+            # 超过 SESSION_STALE_HOURS 的未结束会话由后台 scheduler 统一关闭，这里只需
+            # 保证同一用户只有一个进行中的会话：一条 UPDATE 关闭所有仍在进行的会话
+            closed_count = db.query(Session).filter(
+                Session.user_id == current_user.id,
+                Session.status == SessionStatus.open
+            ).update(
+                {Session.status: SessionStatus.closed, Session.end_time: datetime.utcnow()},
+                synchronize_session=False
+            )
+            if closed_count:
+                logger.warning(f"User {current_user.id} already had {closed_count} open session(s), force-closed them")
 
-        # Check if user already has an active session (within 24 hours)
-        active_session = db.query(Session).filter(
-            Session.user_id == current_user.id,
-            Session.status == SessionStatus.open
-        ).first()
-
-        if active_session:
-            logger.warning(f"User {current_user.id} already has an active session {active_session.id}, force-closing it")
-            active_session.status = SessionStatus.closed
-            active_session.end_time = datetime.utcnow()
-            db.flush()
-
-        # Create new session
-        new_session = Session(
-            user_id=current_user.id,
-            status=SessionStatus.open
-        )
-        db.add(new_session)
-        db.flush()  # Get session.id
+            # Create new session
+            new_session = Session(
+                user_id=current_user.id,
+                status=SessionStatus.open,
+                opening_pending=True
+            )
+            db.add(new_session)
+            db.flush()  # Get session.id
 
-        # Generate agno_session_id
-        timestamp = int(datetime.utcnow().timestamp())
-        new_session.agno_session_id = f"session_{new_session.id}_{timestamp}"
+            # Generate agno_session_id
+            timestamp = int(datetime.utcnow().timestamp())
+            new_session.agno_session_id = f"session_{new_session.id}_{timestamp}"
 
-        db.commit()
-        db.refresh(new_session)
+            db.commit()
+            db.refresh(new_session)
 
-        logger.info(f"Created session {new_session.id} with agno_session_id: {new_session.agno_session_id}")
+            logger.info(f"Created session {new_session.id} with agno_session_id: {new_session.agno_session_id}")
 
-        # Auto-generate therapist's opening message
-        try:
-            orchestrator = SessionOrchestrator(db=db)
-            opening_message = orchestrator.process_message(
+            # Opening message runs after the response is sent (own DB session, clears opening_pending).
+            # Its run is registered now so a drain starting before the task runs still waits for it.
+            background_tasks.add_task(
+                generate_opening_message,
                 user_id=current_user.id,
                 session_id=new_session.id,
                 agno_session_id=new_session.agno_session_id,
-                user_message="开始咨询"  # System trigger message
+                run_id=get_lifecycle_manager().begin_run("opening", admit_during_drain=True)
             )
-            logger.info(f"Generated opening message for session {new_session.id}")
-        except Exception as e:
-            # If opening message generation fails, log error but don't fail session creation
-            logger.error(f"Failed to generate opening message for session {new_session.id}: {e}", exc_info=True)
-
-        # Commit turn_count update from opening message
-        db.commit()
 
-        return SessionStartResponse(session_id=new_session.id)
+            return SessionStartResponse(session_id=new_session.id, opening_pending=True)
 
-    except Exception as e:
-        db.rollback()
-        logger.error(f"Failed to start session: {e}", exc_info=True)
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to start session: {str(e)}"
-        )
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to start session: {e}", exc_info=True)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Failed to start session: {str(e)}"
+            )
 
 
 @router.get("/{session_id}/get_messages", response_model=List[SessionMessageListItem])
@@ -296,41 +329,7 @@ def get_session_messages(
             # No messages yet
             return []
 
-        runs = row.runs
-
-        # Convert runs to message list
-        messages = []
-        msg_id = 0
-
-        for run in runs:
-            # Add user message
-            if "input" in run and "input_content" in run["input"]:
-                messages.append(SessionMessageListItem(
-                    id=msg_id,
-                    sender="user",
-                    message=run["input"]["input_content"],
-                    created_at=run.get("created_at", 0)
-                ))
-                msg_id += 1
-
-            # Add assistant message
-            if "content" in run:
-                messages.append(SessionMessageListItem(
-                    id=msg_id,
-                    sender="assistant",
-                    message=run["content"],
-                    created_at=run.get("created_at", 0)
-                ))
-                msg_id += 1
-
-        # Filter out system trigger message "开始咨询"
-        messages = [msg for msg in messages if not (msg.sender == "user" and msg.message == "开始咨询")]
-
-        # Re-index message IDs after filtering
-        for idx, msg in enumerate(messages):
-            msg.id = idx
-
-        return messages
+        return runs_to_messages(row.runs)
 
     except Exception as e:
         logger.error(f"Failed to fetch messages for session {session_id}: {e}", exc_info=True)
@@ -341,94 +340,124 @@ def get_session_messages(
 
 
 @router.post("/{session_id}/post_message", response_model=SessionMessageResponse)
-def send_message(
+async def send_message(
     session_id: int,
     message_request: SessionMessageRequest,
+    request: Request,
     current_user: User = Depends(get_current_user),
     db: DBSession = Depends(get_db)
 ):
     """
     Send a message in a therapy session and get therapist's response.
 
-    Messages are automatically stored by Agno framework.
+    Messages are automatically stored by Agno framework. If the client disconnects
+    while the reply is being generated, the model run is cancelled and nothing but
+    the cancelled run (see SESSION_KEEP_CANCELLED_MESSAGES) is stored.
     """
     try:
-        # Validate session
-        session = db.query(Session).filter(Session.id == session_id).first()
-        if not session:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Session {session_id} not found"
-            )
+        return await run_cancellable(request, _send_message, session_id, message_request, current_user, db)
+    except RunCancelled as e:
+        logger.info(f"[POST_MESSAGE_CANCELLED] session_id={session_id}, run_id={e.run_id}, reason={e.reason}")
+        raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail="Client disconnected")
 
-        if session.user_id != current_user.id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="You don't have permission to access this session"
-            )
 
-        if session.status != SessionStatus.open:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Session is closed"
+def _send_message(
+    session_id: int,
+    message_request: SessionMessageRequest,
+    current_user: User,
+    db: DBSession
+) -> SessionMessageResponse:
+    # 在执行轮次的线程中登记：客户端断开后 run 仍在收尾时，退出流程也会等它
+    with get_lifecycle_manager().track_run("post_message"):
+        try:
+            # Validate session
+            session = db.query(Session).filter(Session.id == session_id).first()
+            if not session:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"Session {session_id} not found"
+                )
+
+            if session.user_id != current_user.id:
+                raise HTTPException(
+                    status_code=status.HTTP_403_FORBIDDEN,
+                    detail="You don't have permission to access this session"
+                )
+
+            if session.status != SessionStatus.open:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Session is closed"
+                )
+
+            # Two concurrent runs on the same Agno session would overwrite each other's history
+            if is_opening_pending(session):
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Opening message is still being generated"
+                )
+
+            # Log incoming request
+            logger.info(
+                f"[POST_MESSAGE] session_id={session_id}, user_id={current_user.id}, "
+                f"active_duration={message_request.active_duration_seconds}s, "
+                f"message_length={len(message_request.message)}"
             )
 
-        # Log incoming request
-        logger.info(
-            f"[POST_MESSAGE] session_id={session_id}, user_id={current_user.id}, "
-            f"active_duration={message_request.active_duration_seconds}s, "
-            f"message_length={len(message_request.message)}"
-        )
-
-        # Update session active duration if provided by frontend
-        if message_request.active_duration_seconds is not None:
-            session.active_duration_seconds = message_request.active_duration_seconds
-            db.flush()
+            # Update session active duration if provided by frontend
+            if message_request.active_duration_seconds is not None:
+                session.active_duration_seconds = message_request.active_duration_seconds
+                db.flush()
 
-        # Process message with orchestrator
-        orchestrator = SessionOrchestrator(db=db)
+            # Process message with orchestrator
+            orchestrator = SessionOrchestrator(db=db)
 
-        try:
-            therapist_reply = orchestrator.process_message(
-                user_id=current_user.id,
-                session_id=session.id,
-                agno_session_id=session.agno_session_id,
-                user_message=message_request.message,
-                active_duration_seconds=message_request.active_duration_seconds
-            )
-        except ValueError as e:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=str(e)
+            try:
+                therapist_reply = orchestrator.process_message(
+                    user_id=current_user.id,
+                    session_id=session.id,
+                    agno_session_id=session.agno_session_id,
+                    user_message=message_request.message,
+                    active_duration_seconds=message_request.active_duration_seconds
+                )
+            except ValueError as e:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=str(e)
+                )
+            except RunCancelled:
+                raise
+            except Exception as e:
+                raise HTTPException(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    detail=f"Failed to generate response: {str(e)}"
+                )
+
+            # Log success with updated session state
+            logger.info(
+                f"[POST_MESSAGE_SUCCESS] session_id={session_id}, "
+                f"turn_count={session.turn_count}, "
+                f"overtime_reminder_count={session.overtime_reminder_count}"
             )
+
+            # Commit all changes (turn_count, active_duration_seconds, overtime_reminder_count)
+            # and push the new timing state to the session's WebSocket connections
+            publish_session_event(db, session.id, session_state_event(session))
+            db.commit()
+
+            return SessionMessageResponse(reply=therapist_reply)
+
+        except (HTTPException, RunCancelled):
+            # A cancelled turn is not counted (turn_count / active duration are rolled back)
+            db.rollback()
+            raise
         except Exception as e:
+            logger.error(f"Unexpected error in send_message: {e}", exc_info=True)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Failed to generate response: {str(e)}"
+                detail=f"Unexpected error: {str(e)}"
             )
 
-        # Log success with updated session state
-        logger.info(
-            f"[POST_MESSAGE_SUCCESS] session_id={session_id}, "
-            f"turn_count={session.turn_count}, "
-            f"overtime_reminder_count={session.overtime_reminder_count}"
-        )
-
-        # Commit all changes (turn_count, active_duration_seconds, overtime_reminder_count)
-        db.commit()
-
-        return SessionMessageResponse(reply=therapist_reply)
-
-    except HTTPException:
-        db.rollback()
-        raise
-    except Exception as e:
-        logger.error(f"Unexpected error in send_message: {e}", exc_info=True)
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Unexpected error: {str(e)}"
-        )
-
 
 @router.post("/{session_id}/end", response_model=SessionEndResponse)
 def end_session(
@@ -441,62 +470,64 @@ def end_session(
 
     Uses ClerkAgent to analyze the session and generate review.
     """
-    try:
-        # Validate session
-        session = db.query(Session).filter(Session.id == session_id).first()
-        if not session:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Session {session_id} not found"
-            )
-
-        if session.user_id != current_user.id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="You don't have permission to access this session"
-            )
-
-        if session.status == SessionStatus.closed:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Session is already closed"
-            )
-
-        # Process session with ClerkAgent
-        orchestrator = SessionOrchestrator(db=db)
-
+    with get_lifecycle_manager().track_run("end_session"):
         try:
-            result = orchestrator.end_session_with_review(
-                user_id=current_user.id,
+            # Validate session
+            session = db.query(Session).filter(Session.id == session_id).first()
+            if not session:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"Session {session_id} not found"
+                )
+
+            if session.user_id != current_user.id:
+                raise HTTPException(
+                    status_code=status.HTTP_403_FORBIDDEN,
+                    detail="You don't have permission to access this session"
+                )
+
+            if session.status == SessionStatus.closed:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Session is already closed"
+                )
+
+            # Process session with ClerkAgent
+            orchestrator = SessionOrchestrator(db=db)
+
+            try:
+                result = orchestrator.end_session_with_review(
+                    user_id=current_user.id,
+                    session_id=session.id,
+                    agno_session_id=session.agno_session_id
+                )
+            except Exception as e:
+                raise HTTPException(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    detail=f"Failed to generate session review: {str(e)}"
+                )
+
+            # Update session status
+            session.status = SessionStatus.closed
+            session.end_time = datetime.utcnow()
+            publish_session_event(db, session.id, {"type": "review_ready", "session_id": session.id})
+            db.commit()
+
+            logger.info(f"Session {session_id} ended successfully")
+
+            return SessionEndResponse(
                 session_id=session.id,
-                agno_session_id=session.agno_session_id
+                session_review=result["session_review"],
+                key_events=result.get("key_events", [])
             )
+
+        except HTTPException:
+            db.rollback()
+            raise
         except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to end session {session_id}: {e}", exc_info=True)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Failed to generate session review: {str(e)}"
+                detail=f"Failed to end session: {str(e)}"
             )
-
-        # Update session status
-        session.status = SessionStatus.closed
-        session.end_time = datetime.utcnow()
-        db.commit()
-
-        logger.info(f"Session {session_id} ended successfully")
-
-        return SessionEndResponse(
-            session_id=session.id,
-            session_review=result["session_review"],
-            key_events=result.get("key_events", [])
-        )
-
-    except HTTPException:
-        db.rollback()
-        raise
-    except Exception as e:
-        db.rollback()
-        logger.error(f"Failed to end session {session_id}: {e}", exc_info=True)
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to end session: {str(e)}"
-        )
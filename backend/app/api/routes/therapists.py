@@ -1,53 +1,82 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session as DBSession
 from typing import List
+from app.core.config import settings
 from app.services.database import get_db
 from app.core.deps import get_current_user
 from app.models.user import User
 from app.models.therapist import Therapist
 from app.schemas.therapist import TherapistRead, TherapistUpdate, TherapistListItem
+from app.services.pg_notify import notify
+from app.services.therapist_catalog import (
+    THERAPIST_CATALOG_CHANNEL, CachedBody, get_therapist_catalog,
+)
 
 router = APIRouter(prefix="/therapists", tags=["therapists"])
 
 
+def _cache_control() -> str:
+    max_age = settings.THERAPIST_CATALOG_MAX_AGE_SECONDS
+    # 需要登录，只允许浏览器私有缓存；max_age 为 0 时每次都带 If-None-Match 重新验证
+    return f"private, max-age={max_age}" if max_age > 0 else "private, no-cache"
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    # If-None-Match 使用弱比较，忽略 W/ 前缀
+    candidates = [value.strip().removeprefix("W/") for value in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def _cached_response(request: Request, cached: CachedBody) -> Response:
+    headers = {"ETag": cached.etag, "Cache-Control": _cache_control()}
+    if _etag_matches(request, cached.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
+
 @router.get("", response_model=List[TherapistListItem])
 def get_all_therapists(
-    current_user: User = Depends(get_current_user),
-    db: DBSession = Depends(get_db)
+    request: Request,
+    current_user: User = Depends(get_current_user)
 ):
     """
     Get all therapists list.
 
     This endpoint returns a simplified list of all therapists
-    for selection purposes (e.g., in a dropdown).
+    for selection purposes (e.g., in a dropdown). Served from the
+    in-process therapist catalog with a strong ETag; a matching
+    If-None-Match returns 304.
 
     Args:
+        request: Incoming request (for If-None-Match)
         current_user: Authenticated user
-        db: Database session
 
     Returns:
         List of TherapistListItem with id, name, age, info
     """
-    therapists = db.query(Therapist).all()
-    return therapists
+    return _cached_response(request, get_therapist_catalog().list_body())
 
 
 @router.get("/{therapist_id}", response_model=TherapistRead)
 def get_therapist(
     therapist_id: str,
-    current_user: User = Depends(get_current_user),
-    db: DBSession = Depends(get_db)
+    request: Request,
+    current_user: User = Depends(get_current_user)
 ):
     """
     Get therapist information by ID.
 
     This endpoint returns complete information about a specific therapist,
-    including their prompt template.
+    including their prompt template. Served from the in-process therapist
+    catalog with a strong ETag; a matching If-None-Match returns 304.
 
     Args:
         therapist_id: The therapist's ID
+        request: Incoming request (for If-None-Match)
         current_user: Authenticated user
-        db: Database session
 
     Returns:
         TherapistRead with all therapist information
@@ -55,12 +84,12 @@ def get_therapist(
     Raises:
         HTTPException 404: If therapist not found
     """
-    therapist = db.query(Therapist).filter(Therapist.id == therapist_id).first()
+    cached = get_therapist_catalog().detail_body(therapist_id)
 
-    if not therapist:
+    if cached is None:
         raise HTTPException(status_code=404, detail="Therapist not found")
 
-    return therapist
+    return _cached_response(request, cached)
 
 
 @router.patch("/{therapist_id}", response_model=TherapistRead)
@@ -75,6 +104,8 @@ def update_therapist(
 
     This endpoint allows updating any combination of therapist fields:
     name, age, info, and prompt. Only provided fields will be updated.
+    The therapist catalog is invalidated in this worker and, via
+    Postgres NOTIFY, in every other worker.
 
     Args:
         therapist_id: The therapist's ID
@@ -98,7 +129,10 @@ def update_therapist(
     for field, value in update_data.items():
         setattr(therapist, field, value)
 
+    # NOTIFY 随事务提交才投递，其他 worker 收到后失效各自的目录缓存
+    notify(db, THERAPIST_CATALOG_CHANNEL, therapist_id)
     db.commit()
     db.refresh(therapist)
+    get_therapist_catalog().invalidate(therapist_id)
 
     return therapist
@@ -11,7 +11,6 @@ from app.models.therapist import Therapist
 from app.schemas.user import UserOverview, UserRead, UserUpdate
 from app.schemas.user_context import UserContextResponse
 from app.schemas.user_memory import UserMemoryItem
-from app.agents.therapist_agent_service import TherapistAgentService
 
 router = APIRouter(prefix="/me", tags=["users"])
 
@@ -122,6 +121,8 @@ def get_user_memories(
     Raises:
         HTTPException 500: If fetching memories fails
     """
+    from app.agents.therapist_agent_service import TherapistAgentService  # agno / openai 不在启动时导入
+
     try:
         therapist_service = TherapistAgentService()
         memories = therapist_service.get_user_memories(user_id=current_user.id)
@@ -0,0 +1,168 @@
+"""
+Run Cancellation
+
+客户端断开后取消进行中的 agent run，不再为没人接收的回复继续生成 token：
+- HTTP 路由用 run_cancellable(request, func, ...) 在线程池中执行同步的处理函数，同时轮询
+  request.is_disconnected()，断开时取消；WebSocket 连接关闭 / 客户端太慢时由连接直接调用 scope.cancel()
+- CancelScope 通过 contextvar 传到 agent 调用处（app/agents/agent_runs.py），run 以 scope.run_id
+  作为 Agno run_id 流式执行，取消时调用 Agno 的 cancel_run：run 在下一个 chunk 处停止，
+  并以 CANCELLED 状态写入 Agno 会话（不会进入之后的模型上下文）
+- 日志 HTTP client 发出的流式响应登记在当前 scope 上，scope 退出时关闭仍未读完的响应，
+  断开与上游的连接（上游随之停止生成）
+"""
+
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, TypeVar
+
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+
+from app.core.config import settings
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 客户端在响应前断开（nginx 的约定，只出现在日志 / 访问记录中，客户端收不到）
+CLIENT_CLOSED_REQUEST = 499
+
+# Agno 中被取消的 run 的状态（agno.run.base.RunStatus.cancelled；读聊天记录的路由不必导入 agno）
+RUN_STATUS_CANCELLED = "CANCELLED"
+
+_current_scope: contextvars.ContextVar[Optional["CancelScope"]] = contextvars.ContextVar(
+    "cancel_scope", default=None
+)
+
+# 进程内统计（被取消的 run 数 / 被提前关闭的上游响应数）
+_stats = {"cancelled": 0, "aborted_responses": 0}
+_stats_lock = threading.Lock()
+
+
+class RunCancelled(Exception):
+    """进行中的 agent run 已被取消（客户端断开）"""
+
+    def __init__(self, run_id: str, reason: Optional[str] = None):
+        super().__init__(f"Run {run_id} cancelled: {reason or 'unknown reason'}")
+        self.run_id = run_id
+        self.reason = reason
+
+
+class CancelScope:
+    """一次可取消的处理（一个请求 / 一个 WebSocket 轮次）"""
+
+    def __init__(self):
+        self.run_id = str(uuid.uuid4())
+        self.reason: Optional[str] = None
+        self.started_at = time.monotonic()
+        self._event = threading.Event()
+        self._responses: List["httpx.Response"] = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str) -> bool:
+        """标记取消（任意线程可调用），已取消过则返回 False"""
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self.reason = reason
+            self._event.set()
+
+        from agno.run.cancel import cancel_run
+
+        # run 尚未开始时 Agno 会保存取消意图，run 一开始即停止
+        cancel_run(self.run_id)
+        with _stats_lock:
+            _stats["cancelled"] += 1
+        logger.info(
+            f"[RUN_CANCELLED] run_id={self.run_id}, reason={reason}, "
+            f"elapsed={time.monotonic() - self.started_at:.2f}s"
+        )
+        return True
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise RunCancelled(self.run_id, self.reason)
+
+    def track(self, response: "httpx.Response"):
+        """登记一个上游流式响应（由日志 HTTP client 的 response hook 调用）"""
+        with self._lock:
+            self._responses.append(response)
+
+    def close_responses(self) -> int:
+        """关闭仍未读完的上游响应，返回关闭的数量（在发起请求的线程中调用）"""
+        with self._lock:
+            responses, self._responses = self._responses, []
+        aborted = 0
+        for response in responses:
+            if response.is_closed:
+                continue
+            try:
+                response.close()
+                aborted += 1
+            except Exception as e:
+                logger.warning(f"Failed to close upstream response: {e}")
+        if aborted:
+            with _stats_lock:
+                _stats["aborted_responses"] += aborted
+            logger.info(f"[RUN_CANCELLED] run_id={self.run_id}, aborted {aborted} upstream response(s)")
+        return aborted
+
+
+def current_cancel_scope() -> Optional[CancelScope]:
+    """当前线程 / 协程所在的 CancelScope（不在可取消的处理中时为 None）"""
+    return _current_scope.get()
+
+
+@contextmanager
+def cancel_scope(scope: CancelScope):
+    """把 scope 设为当前 scope，退出时关闭登记的上游响应"""
+    token = _current_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _current_scope.reset(token)
+        scope.close_responses()
+
+
+async def run_cancellable(request: Request, func: Callable[..., T], *args, **kwargs) -> T:
+    """
+    在线程池中执行同步的 func，客户端断开时取消其中的 agent run
+
+    Raises:
+        RunCancelled: agent run 因客户端断开而停止
+    """
+    scope = CancelScope()
+
+    def call():
+        with cancel_scope(scope):
+            return func(*args, **kwargs)
+
+    task = asyncio.ensure_future(run_in_threadpool(call))
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=settings.CLIENT_DISCONNECT_POLL_SECONDS)
+            if done:
+                return task.result()
+            if not scope.cancelled and await request.is_disconnected():
+                scope.cancel("client disconnected")
+    except asyncio.CancelledError:
+        # 服务器关闭 / 请求被取消：让线程中的 run 尽快结束
+        scope.cancel("request cancelled")
+        raise
+
+
+def get_cancellation_stats() -> Dict:
+    with _stats_lock:
+        return dict(_stats)
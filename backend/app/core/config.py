@@ -17,6 +17,7 @@ class Settings(BaseSettings):
 
     # ===== AI & Agno Configuration =====
     OPENAI_API_KEY: str = ""
+    OPENAI_BASE_URL: Optional[str] = None  # 为空时使用官方 API；压测时指向本地 fake server
 
     # Agno Database (默认使用主数据库)
     AGNO_DB_URL: Optional[str] = None
@@ -44,6 +45,91 @@ class Settings(BaseSettings):
     SESSION_SUGGESTED_TURNS: int = 30  # 建议对话轮数
     SESSION_REMINDER_INTERVAL: int = 3  # 超时后每N轮提示一次
 
+    # 以上会话参数、模型 id、temperature、历史轮数可在管理后台热更新（app/services/runtime_settings.py），
+    # 这里的值是默认值
+    RUNTIME_SETTINGS_POLL_SECONDS: float = 30.0  # 轮询版本号的间隔（兜底 NOTIFY），0 表示不轮询
+    PROMPT_STORE_POLL_SECONDS: float = 30.0  # 提示词版本轮询间隔，0 表示不轮询
+    PROMPT_RENDER_CACHE_SIZE: int = 256  # 每个 worker 缓存的 prompt 渲染结果数
+
+    # 模型调用用量日志（token / 缓存 / 延迟，按 prompt 实验变体聚合）
+    OPENAI_USAGE_LOG_ENABLED: bool = True
+    OPENAI_USAGE_LOG_DIR: str = "logs/usage"
+
+    SESSION_STALE_HOURS: int = 24  # 超过 N 小时未结束的会话由后台任务关闭
+    SESSION_OPENING_TIMEOUT_SECONDS: int = 120  # 开场白后台生成超过该时长仍未完成，视为失败（不再阻塞发消息）
+
+    # ===== 会话 WebSocket =====
+    WS_AUTH_TIMEOUT_SECONDS: float = 10.0  # 连接后等待客户端发送 auth 消息（JWT）的时长
+    WS_HEARTBEAT_SECONDS: float = 20.0  # 服务端 ping 间隔
+    WS_IDLE_TIMEOUT_SECONDS: float = 60.0  # 超过该时长没有收到客户端任何帧则断开
+    WS_SEND_QUEUE_SIZE: int = 256  # 每个连接待发送消息的上限（流式 token + 推送事件）
+    WS_SEND_TIMEOUT_SECONDS: float = 10.0  # 队列满时模型流最多等待客户端消费的时长，超时断开
+
+    # ===== 客户端断开取消 =====
+    CLIENT_DISCONNECT_POLL_SECONDS: float = 0.5  # 模型生成期间检查 HTTP 客户端是否断开的间隔
+    # 被取消的轮次是否保留用户消息（聊天记录中可见，但不进入模型上下文）；False 时从 Agno 会话中删除该 run
+    SESSION_KEEP_CANCELLED_MESSAGES: bool = True
+
+    # ===== 优雅退出 =====
+    SHUTDOWN_DRAIN_TIMEOUT_SECONDS: float = 30.0  # 退出前等待进行中轮次的上限（uvicorn --timeout-graceful-shutdown 需更大）
+    SHUTDOWN_RETRY_AFTER_SECONDS: int = 5  # 退出期间拒绝新轮次（503）时返回的 Retry-After
+
+    # ===== Worker 预热 =====
+    WARMUP_ENABLED: bool = True  # 启动后在后台预热连接池 / 提示词 / agent，完成前 /health 返回 503
+
+    # ===== 后台维护任务 =====
+    SCHEDULER_ENABLED: bool = True
+    SCHEDULER_JITTER_SECONDS: int = 30  # 每次执行时间的随机偏移上限
+    SCHEDULER_CAPTCHA_PURGE_INTERVAL_SECONDS: int = 300
+    SCHEDULER_STALE_SESSION_INTERVAL_SECONDS: int = 600
+    SCHEDULER_REVIEW_ABANDONED_SESSIONS: bool = False  # 为被放弃的会话自动生成总结（会调用模型）
+
+    # ===== 治疗师目录缓存 =====
+    THERAPIST_CATALOG_MAX_AGE_SECONDS: int = 0  # 浏览器缓存时长；0 表示每次用 ETag 重新验证
+    PG_NOTIFY_POLL_SECONDS: float = 5.0  # LISTEN 线程检查停止信号的间隔
+
+    # ===== 情绪趋势分析 =====
+    EMO_TRENDS_CACHE_SIZE: int = 1024  # 每个 worker 缓存的趋势结果数
+    EMO_BULK_MAX_ITEMS: int = 1000  # 批量导入单次最多条数
+
+    # ===== Tracing 配置 =====
+    TRACING_ENABLED: bool = False
+    TRACING_EXPORTER: str = "jsonl"  # jsonl / otlp / both
+    TRACING_LOG_DIR: str = "logs/traces"
+    TRACING_OTLP_ENDPOINT: str = "http://localhost:4318/v1/traces"
+    TRACING_SERVICE_NAME: str = "unlimi-backend"
+
+    # ===== Profiling 配置 =====
+    PROFILING_ENABLED: bool = False
+    PROFILING_SAMPLE_RATE: float = 0.0  # 随机抽样比例（0 表示只响应 admin 的 X-Profile 头）
+    PROFILING_ROUTES: str = ""  # 逗号分隔的路由前缀白名单，空表示全部
+    PROFILING_INTERVAL_MS: float = 5.0  # 采样间隔（毫秒）
+    PROFILING_FORMAT: str = "collapsed"  # collapsed / speedscope
+    PROFILING_DIR: str = "logs/profiles"
+
+    # ===== SQL 语句统计（测试 / staging）=====
+    QUERY_COUNTER_ENABLED: bool = False
+    QUERY_COUNT_WARN_THRESHOLD: int = 20  # 单个请求超过 N 条语句时告警
+    QUERY_TIME_WARN_MS: float = 200.0  # 单个请求 DB 总耗时超过 N 毫秒时告警
+    QUERY_REPEAT_THRESHOLD: int = 3  # 同一形状语句执行 N 次以上视为疑似 N+1
+
+    # ===== 验证码 =====
+    CAPTCHA_MODE: str = "db"  # db: captcha_sessions 表 / token: 无状态签名 token，不访问数据库
+    CAPTCHA_TOKEN_SECRET: Optional[str] = None  # 为空时从 SECRET_KEY 派生
+    CAPTCHA_REPLAY_STORE: str = "memory"  # memory（单 worker）/ file（同机多 worker 共享）
+    CAPTCHA_REPLAY_DIR: str = "/tmp/unlimi_captcha_replay"
+
+    # ===== 验证码预渲染池 =====
+    CAPTCHA_POOL_ENABLED: bool = True
+    CAPTCHA_POOL_SIZE: int = 200  # 池容量
+    CAPTCHA_POOL_LOW_WATERMARK: int = 50  # 低于该数量时触发补充
+    CAPTCHA_POOL_BATCH_SIZE: int = 20  # 每个渲染任务生成的图片数
+    CAPTCHA_POOL_WORKERS: int = 2  # 渲染进程数（0 表示在补充线程内渲染）
+
+    # ===== 邀请码 =====
+    INVITATION_BULK_MAX_COUNT: int = 10000  # 单次批量生成的上限
+    INVITATION_COUNT_EXACT_THRESHOLD: int = 10000  # Postgres 估算行数低于该值时才执行精确 COUNT(*)
+
     @property
     def agno_database_url(self) -> str:
         """获取 Agno 数据库 URL"""
@@ -10,6 +10,7 @@ from app.services.database import get_db
 from app.models.user import User
 from app.core.security import decode_access_token
 from app.services.user_service import UserService
+from app.core.tracing import trace_span, mark_admin
 
 security = HTTPBearer()
 
@@ -44,23 +45,27 @@ def get_current_user(
     """
     token = credentials.credentials
 
-    # Decode token
-    email = decode_access_token(token)
-    if email is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-
-    # Get user from database
-    user = UserService.get_user_by_email(db, email)
-    if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+    with trace_span("auth.get_current_user"):
+        # Decode token
+        email = decode_access_token(token)
+        if email is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Could not validate credentials",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+
+        # Get user from database
+        user = UserService.get_user_by_email(db, email)
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="User not found",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+
+    if user.is_admin:
+        mark_admin()
 
     return user
 
@@ -0,0 +1,31 @@
+"""
+日志脱敏
+
+uvicorn 的访问日志和 WebSocket 连接日志会写出带查询字符串的完整路径。会话 WebSocket 已改为
+在第一条消息中发送 JWT（app/api/routes/session_ws.py），这里再隐去 ?token=，
+防止旧版前端（或手工拼接的 URL）把 token 写进日志。
+"""
+
+import logging
+import re
+
+_TOKEN_QUERY = re.compile(r"([?&]token=)[^&\s\"]+")
+
+
+class RedactQueryToken(logging.Filter):
+    """把日志参数中的 token 查询参数替换为 <redacted>"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if isinstance(record.args, tuple):
+            record.args = tuple(
+                _TOKEN_QUERY.sub(r"\1<redacted>", arg) if isinstance(arg, str) else arg for arg in record.args
+            )
+        return True
+
+
+def install_token_redaction():
+    """给 uvicorn 的访问日志和连接日志加上脱敏 filter（logger 上的 filter 在 uvicorn 配置日志后仍然保留）"""
+    for name in ("uvicorn.access", "uvicorn.error"):
+        logger = logging.getLogger(name)
+        if not any(isinstance(f, RedactQueryToken) for f in logger.filters):
+            logger.addFilter(RedactQueryToken())
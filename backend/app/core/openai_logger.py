@@ -1,19 +1,26 @@
 """
 OpenAI API Logger
 
-记录发送到 OpenAI API 的完整 prompt（仅对 admin 用户）
+- 记录发送到 OpenAI API 的完整 prompt（仅对 admin 用户）
+- 记录每次 chat completions 调用的 token 用量和延迟（所有用户，不含 prompt 内容），
+  带上当前的 prompt 实验变体标记，供管理后台按变体聚合
 """
 
 import json
 import logging
-from datetime import datetime
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterator
 import contextvars
 from contextlib import contextmanager
 
 import httpx
 
+from app.core.tracing import record_span
+
 logger = logging.getLogger(__name__)
 
 # 上下文变量：存储当前请求的用户信息
@@ -28,6 +35,7 @@ class OpenAIPromptLogger:
         self.log_dir.mkdir(parents=True, exist_ok=True)
         self.auto_update_html = auto_update_html
         self._update_counter = 0  # 用于控制 HTML 更新频率
+        self._html_thread: Optional[threading.Thread] = None
         logger.info(f"OpenAI Prompt Logger initialized, log_dir: {self.log_dir}")
 
     def _get_log_file_path(self) -> Path:
@@ -145,11 +153,20 @@ class OpenAIPromptLogger:
             self._update_counter = 0
             try:
                 # 在后台线程更新 HTML，避免阻塞主线程
-                import threading
-                threading.Thread(target=self._update_html_file, daemon=True).start()
+                self._html_thread = threading.Thread(target=self._update_html_file, daemon=True)
+                self._html_thread.start()
             except Exception as e:
                 logger.debug(f"Failed to schedule HTML update: {e}")
 
+    def flush(self, timeout: float = 5.0):
+        """等待后台的 HTML 更新完成，并把还没写进 HTML 的记录补上（进程退出前调用）"""
+        thread = self._html_thread
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+        if self.auto_update_html and self._update_counter:
+            self._update_counter = 0
+            self._update_html_file()
+
     def _update_html_file(self):
         """生成/更新 HTML 文件"""
         try:
@@ -408,8 +425,107 @@ class OpenAIPromptLogger:
             f.write(html_content)
 
 
+class OpenAIUsageLogger:
+    """记录每次模型调用的 token 用量和延迟（JSONL，按天分文件）"""
+
+    def __init__(self, log_dir: str = "logs/usage"):
+        self.log_dir = Path(log_dir)
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _get_log_file_path(self, day: date) -> Path:
+        return self.log_dir / f"usage_{day.isoformat()}.jsonl"
+
+    def record(
+        self,
+        user_context: Dict[str, Any],
+        model: str,
+        usage: Dict[str, Any],
+        latency_ms: float,
+        status_code: int,
+    ):
+        details = usage.get("prompt_tokens_details") or {}
+        entry = {
+            "timestamp": datetime.now().isoformat(),
+            "user_id": user_context.get("user_id"),
+            "session_id": user_context.get("session_id"),
+            "prompt_variants": user_context.get("prompt_variants") or {},
+            "model": model,
+            "status_code": status_code,
+            "latency_ms": round(latency_ms, 1),
+            "prompt_tokens": usage.get("prompt_tokens", 0),
+            "completion_tokens": usage.get("completion_tokens", 0),
+            "cached_tokens": details.get("cached_tokens", 0),
+        }
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        try:
+            with self._lock, open(self._get_log_file_path(date.today()), "a", encoding="utf-8") as f:
+                f.write(line)
+        except OSError as e:
+            logger.error(f"Failed to record OpenAI usage: {e}")
+
+    def iter_records(self, since: date, until: Optional[date] = None) -> Iterator[Dict[str, Any]]:
+        """按天读取 [since, until] 范围内的用量记录"""
+        day, until = since, until or date.today()
+        while day <= until:
+            path = self._get_log_file_path(day)
+            if path.exists():
+                with open(path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        if not line.strip():
+                            continue
+                        try:
+                            yield json.loads(line)
+                        except json.JSONDecodeError:
+                            continue  # 写入中途被截断的行
+            day += timedelta(days=1)
+
+
+class _UsageTapStream(httpx.SyncByteStream):
+    """
+    流式 chat completions 的响应体：原样透传 SSE 字节，
+    遇到带 usage 的最后一个 chunk（请求带 stream_options.include_usage，Agno 默认开启）时回调一次。
+    被取消的 run 在 usage chunk 之前关闭了流，不会记录用量
+    """
+
+    def __init__(self, stream: httpx.SyncByteStream, on_usage):
+        self._stream = stream
+        self._on_usage = on_usage
+        self._pending = b""
+        self._done = False
+
+    def __iter__(self) -> Iterator[bytes]:
+        for chunk in self._stream:
+            if not self._done:
+                self._scan(chunk)
+            yield chunk
+
+    def _scan(self, chunk: bytes):
+        self._pending += chunk
+        *lines, self._pending = self._pending.split(b"\n")
+        for line in lines:
+            line = line.strip()
+            if not line.startswith(b"data:") or b'"usage"' not in line:
+                continue
+            try:
+                data = json.loads(line[len(b"data:"):])
+            except ValueError:
+                continue
+            if data.get("usage"):
+                self._done = True
+                self._pending = b""
+                self._on_usage(data)
+                return
+
+    def close(self):
+        self._stream.close()
+
+
 # 全局单例
 _prompt_logger: Optional[OpenAIPromptLogger] = None
+_usage_logger: Optional[OpenAIUsageLogger] = None
+_http_client: Optional[httpx.Client] = None
+_http_client_lock = threading.Lock()
 
 
 def get_prompt_logger() -> OpenAIPromptLogger:
@@ -420,11 +536,27 @@ def get_prompt_logger() -> OpenAIPromptLogger:
     return _prompt_logger
 
 
+def get_usage_logger() -> OpenAIUsageLogger:
+    """获取全局用量 logger 单例"""
+    global _usage_logger
+    if _usage_logger is None:
+        from app.core.config import settings
+        _usage_logger = OpenAIUsageLogger(settings.OPENAI_USAGE_LOG_DIR)
+    return _usage_logger
+
+
 @contextmanager
-def openai_logging_context(user_id: int, session_id: str, is_admin: bool):
+def openai_logging_context(
+    user_id: int,
+    session_id: str,
+    is_admin: bool,
+    prompt_variants: Optional[Dict[str, str]] = None,
+):
     """
     设置 OpenAI 日志上下文
 
+    prompt_variants: 本次调用使用的 prompt 实验变体 {key: "实验id:变体id"}，写入用量日志
+
     使用示例：
         with openai_logging_context(user_id=123, session_id="abc", is_admin=True):
             agent.run(...)
@@ -433,6 +565,7 @@ def openai_logging_context(user_id: int, session_id: str, is_admin: bool):
         "user_id": user_id,
         "session_id": session_id,
         "is_admin": is_admin,
+        "prompt_variants": prompt_variants or {},
     })
     try:
         yield
@@ -491,6 +624,46 @@ def create_logging_http_client() -> httpx.Client:
         except Exception as e:
             logger.error(f"Error in request logging hook: {e}", exc_info=True)
 
+    def record_usage(response: httpx.Response):
+        """
+        记录 chat completions 的 token 用量和延迟
+
+        非流式调用先读取响应体；流式调用（agent_runs.run_agent 在 CancelScope 中 / 推送 token 时）
+        包装响应流，在最后的 usage chunk 到达时记录，延迟为整个生成的耗时
+        """
+        from app.core.config import settings
+
+        if not settings.OPENAI_USAGE_LOG_ENABLED:
+            return
+        request = response.request
+        if "/chat/completions" not in request.url.path or response.status_code != 200:
+            return
+        user_context = get_current_user_context()
+        if not user_context:
+            return
+        try:
+            body = json.loads(request.content) if request.content else {}
+            start = request.extensions.get("trace_start")
+
+            def record(resp_data: Dict[str, Any]):
+                latency_ms = (time.perf_counter_ns() - start[1]) / 1e6 if start else 0.0
+                get_usage_logger().record(
+                    user_context,
+                    model=resp_data.get("model") or body.get("model", "unknown"),
+                    usage=resp_data.get("usage") or {},
+                    latency_ms=latency_ms,
+                    status_code=response.status_code,
+                )
+
+            if body.get("stream"):
+                response.stream = _UsageTapStream(response.stream, record)
+                return
+            # event hook 中访问响应体必须先 read()，之后 SDK 读取的是同一份缓存内容
+            response.read()
+            record(json.loads(response.content))
+        except Exception as e:
+            logger.error(f"Error in usage logging hook: {e}", exc_info=True)
+
     def log_response(response: httpx.Response):
         """响应后的钩子"""
         # 检查是否是 OpenAI API 响应
@@ -539,13 +712,76 @@ def create_logging_http_client() -> httpx.Client:
         except Exception as e:
             logger.error(f"Error in response logging hook: {e}", exc_info=True)
 
+    def trace_request(request: httpx.Request):
+        """记录请求开始时间（用于 tracing span）"""
+        request.extensions["trace_start"] = (time.time_ns(), time.perf_counter_ns())
+
+    def trace_response(response: httpx.Response):
+        """记录模型 HTTP 调用 span（包括 Agno 内部的记忆提取调用）"""
+        start = response.request.extensions.get("trace_start")
+        if not start:
+            return
+        start_unix_ns, start_perf_ns = start
+        record_span(
+            "openai.http",
+            start_unix_ns,
+            time.perf_counter_ns() - start_perf_ns,
+            url_path=response.request.url.path,
+            status_code=response.status_code,
+        )
+
+    def track_for_cancellation(response: httpx.Response):
+        """把响应登记到当前 CancelScope，run 结束时关闭仍未读完的流（客户端断开后中止上游生成）"""
+        from app.core.cancellation import current_cancel_scope
+
+        scope = current_cancel_scope()
+        if scope is not None:
+            scope.track(response)
+
     # 创建 HTTP client with event hooks
     client = httpx.Client(
         event_hooks={
-            "request": [log_request],
-            "response": [log_response],
+            "request": [trace_request, log_request],
+            "response": [trace_response, record_usage, log_response, track_for_cancellation],
         },
         timeout=60.0,
     )
 
     return client
+
+
+def get_logging_http_client() -> httpx.Client:
+    """
+    获取所有 agent 共用的日志 HTTP client（一个连接池，hooks 只依赖 contextvar，可以跨线程共享）
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        with _http_client_lock:
+            if _http_client is None or _http_client.is_closed:
+                _http_client = create_logging_http_client()
+    return _http_client
+
+
+def _discard_inherited_http_client():
+    """fork 出的子进程不能复用父进程 HTTP client 的连接（gunicorn preload_app）：丢弃而不关闭"""
+    global _http_client, _http_client_lock
+    _http_client = None
+    _http_client_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_discard_inherited_http_client)
+
+
+def flush_prompt_logger():
+    """把 prompt 日志补写进 HTML（进程退出前调用；没有记录过日志时什么都不做）"""
+    if _prompt_logger is not None:
+        _prompt_logger.flush()
+
+
+def close_logging_http_client():
+    """关闭共享的 HTTP client 和它的连接池（进程退出前调用）"""
+    global _http_client
+    with _http_client_lock:
+        client, _http_client = _http_client, None
+    if client is not None:
+        client.close()
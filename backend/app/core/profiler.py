@@ -0,0 +1,290 @@
+"""
+On-demand Sampling Profiler
+
+按需对单个请求做 wall-clock 采样：
+- admin 请求带 `X-Profile: 1` 头
+- 或按 PROFILING_SAMPLE_RATE 随机抽样
+- 只对 PROFILING_ROUTES 中的路由前缀生效（为空表示全部）
+
+采样线程定时读取 sys._current_frames()，只记录处理该请求的线程：运行中间件的事件循环线程，
+以及正在为该请求执行同步 endpoint / 依赖的线程池 worker（通过请求 context 中的标记识别），
+其他并发请求的 worker 和空闲线程不计入。结果写入 logs/profiles/，
+格式为 collapsed stack（flamegraph.pl / speedscope 均可直接导入）或 speedscope JSON。
+
+PROFILING_ENABLED=false 时不会注册中间件，没有任何额外开销。
+"""
+
+import json
+import logging
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import Context, ContextVar
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "x-profile"
+
+# 同一时间只允许一个采样任务，避免多个采样线程互相放大开销
+_profile_lock = threading.Lock()
+
+# 被采样请求的标记：中间件在请求的 context 中设置，run_in_threadpool 把复制的 context 带到 worker 线程
+_profiled_request: ContextVar[Optional[object]] = ContextVar("profiled_request", default=None)
+
+
+def _is_idle(frame) -> bool:
+    """判断线程是否处于空闲等待（事件循环 select、线程池 worker 等待任务）"""
+    code = frame.f_code
+    if code.co_filename.endswith("selectors.py"):
+        return True
+    if code.co_name == "wait" and code.co_filename.endswith("threading.py"):
+        caller = frame.f_back
+        return caller is not None and caller.f_code.co_filename.endswith("queue.py")
+    return False
+
+
+def _worker_context(frame) -> Optional[Context]:
+    """线程池 worker（anyio WorkerThread.run）正在执行的任务的 contextvars.Context"""
+    while frame is not None:
+        code = frame.f_code
+        if code.co_name == "run" and "anyio" in code.co_filename:
+            context = frame.f_locals.get("context")
+            return context if isinstance(context, Context) else None
+        frame = frame.f_back
+    return None
+
+
+class SamplingProfiler:
+    """
+    基于 sys._current_frames() 的 wall-clock 采样器
+
+    thread_ids / request_marker 都为空时采样所有线程；否则只采样 thread_ids 中的线程，
+    以及当前任务的 context 中 _profiled_request 为 request_marker 的线程池 worker。
+    """
+
+    def __init__(self, interval: float = 0.005, max_depth: int = 128,
+                 thread_ids: Iterable[int] = (), request_marker: Optional[object] = None):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.thread_ids = frozenset(thread_ids)
+        self.request_marker = request_marker
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.started_at: Optional[float] = None
+        self.duration: float = 0.0
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration = time.perf_counter() - (self.started_at or time.perf_counter())
+
+    def _wants(self, thread_id: int, frame) -> bool:
+        if not self.thread_ids and self.request_marker is None:
+            return True
+        if thread_id in self.thread_ids:
+            return True
+        if self.request_marker is None:
+            return False
+        context = _worker_context(frame)
+        return context is not None and context.get(_profiled_request) is self.request_marker
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.is_set():
+            thread_names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or _is_idle(frame) or not self._wants(thread_id, frame):
+                    continue
+                stack = self._collapse(frame)
+                stack.append(thread_names.get(thread_id, str(thread_id)))
+                self.samples[";".join(reversed(stack))] += 1
+            self.sample_count += 1
+            self._stop.wait(self.interval)
+
+    def _collapse(self, frame) -> List[str]:
+        stack = []
+        while frame is not None and len(stack) < self.max_depth:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return stack
+
+    def to_collapsed(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common()) + "\n"
+
+    def to_speedscope(self, name: str) -> str:
+        frames: List[Dict[str, str]] = []
+        frame_index: Dict[str, int] = {}
+        samples = []
+        weights = []
+        for stack, count in self.samples.items():
+            indices = []
+            for frame_name in stack.split(";"):
+                if frame_name not in frame_index:
+                    frame_index[frame_name] = len(frames)
+                    frames.append({"name": frame_name})
+                indices.append(frame_index[frame_name])
+            samples.append(indices)
+            weights.append(count * self.interval)
+
+        return json.dumps({
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": self.duration,
+                "samples": samples,
+                "weights": weights,
+            }],
+            "name": name,
+            "exporter": "unlimi-backend",
+        })
+
+
+def get_profile_dir() -> Path:
+    profile_dir = Path(settings.PROFILING_DIR)
+    profile_dir.mkdir(parents=True, exist_ok=True)
+    return profile_dir
+
+
+def list_profiles() -> List[Dict]:
+    """列出已保存的 profile 文件（新的在前）"""
+    profile_dir = get_profile_dir()
+    profiles = []
+    for path in profile_dir.iterdir():
+        if path.suffix not in (".collapsed", ".json") or not path.is_file():
+            continue
+        stat = path.stat()
+        profiles.append({
+            "name": path.name,
+            "size_bytes": stat.st_size,
+            "created_at": datetime.fromtimestamp(stat.st_mtime),
+        })
+    profiles.sort(key=lambda p: p["created_at"], reverse=True)
+    return profiles
+
+
+def resolve_profile_path(name: str) -> Optional[Path]:
+    """根据文件名找到 profile 路径（拒绝路径穿越）"""
+    profile_dir = get_profile_dir().resolve()
+    path = (profile_dir / name).resolve()
+    if path.parent != profile_dir or not path.is_file():
+        return None
+    return path
+
+
+def _save_profile(profiler: SamplingProfiler, method: str, path: str, status_code: int) -> Path:
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_") or "root"
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    stem = f"{timestamp}_{method}_{slug}_{status_code}"
+
+    profile_dir = get_profile_dir()
+    if settings.PROFILING_FORMAT == "speedscope":
+        file_path = profile_dir / f"{stem}.json"
+        file_path.write_text(profiler.to_speedscope(f"{method} {path}"), encoding="utf-8")
+    else:
+        file_path = profile_dir / f"{stem}.collapsed"
+        file_path.write_text(profiler.to_collapsed(), encoding="utf-8")
+    return file_path
+
+
+def _route_allowed(path: str) -> bool:
+    prefixes = [p.strip() for p in settings.PROFILING_ROUTES.split(",") if p.strip()]
+    if not prefixes:
+        return True
+    return any(path.startswith(prefix) for prefix in prefixes)
+
+
+def _is_admin_request(authorization: Optional[str]) -> bool:
+    """校验 X-Profile 请求来自 admin（仅在带了该头时才查库）"""
+    if not authorization or not authorization.lower().startswith("bearer "):
+        return False
+
+    from app.core.security import decode_access_token
+    from app.services.database import SessionLocal
+    from app.services.user_service import UserService
+
+    email = decode_access_token(authorization[7:])
+    if email is None:
+        return False
+
+    db = SessionLocal()
+    try:
+        user = UserService.get_user_by_email(db, email)
+        return bool(user and user.is_admin)
+    finally:
+        db.close()
+
+
+async def _should_profile(request) -> Tuple[bool, str]:
+    from starlette.concurrency import run_in_threadpool
+
+    if not _route_allowed(request.url.path):
+        return False, ""
+    if request.headers.get(PROFILE_HEADER) == "1":
+        # 查库校验 admin 是阻塞操作，放到线程池
+        if await run_in_threadpool(_is_admin_request, request.headers.get("authorization")):
+            return True, "header"
+        return False, ""
+    if settings.PROFILING_SAMPLE_RATE > 0 and random.random() < settings.PROFILING_SAMPLE_RATE:
+        return True, "sampled"
+    return False, ""
+
+
+async def profiling_middleware(request, call_next):
+    """
+    HTTP 中间件：满足条件的请求在处理期间运行采样器，结束后写入 profile 文件
+    """
+    should_profile, reason = await _should_profile(request)
+    if not should_profile or not _profile_lock.acquire(blocking=False):
+        return await call_next(request)
+
+    # 只采样本请求的线程：当前的事件循环线程 + 带有本请求标记的线程池 worker
+    marker = object()
+    token = _profiled_request.set(marker)
+    profiler = SamplingProfiler(
+        interval=settings.PROFILING_INTERVAL_MS / 1000,
+        thread_ids=[threading.get_ident()],
+        request_marker=marker,
+    )
+    profiler.start()
+    status_code = 500
+    file_path = None
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+    finally:
+        profiler.stop()
+        _profiled_request.reset(token)
+        _profile_lock.release()
+        try:
+            file_path = _save_profile(profiler, request.method, request.url.path, status_code)
+            logger.info(
+                f"[PROFILE] {request.method} {request.url.path} reason={reason}, "
+                f"samples={profiler.sample_count}, duration={profiler.duration:.3f}s -> {file_path.name}"
+            )
+        except Exception as e:
+            logger.error(f"Failed to save profile: {e}", exc_info=True)
+
+    if file_path is not None:
+        response.headers["X-Profile-File"] = file_path.name
+    return response
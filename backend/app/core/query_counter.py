@@ -0,0 +1,202 @@
+"""
+SQL Query Counter
+
+基于 SQLAlchemy 事件的 SQL 语句统计：
+- 每个请求的语句数和总 DB 耗时，超过阈值时记录 warning
+- 按语句"形状"（去掉字面量和 IN 列表后的 SQL）计数，同一形状重复执行视为疑似 N+1
+- assert_max_queries(n)：测试中断言一段代码最多执行 n 条语句
+
+使用示例：
+    with assert_max_queries(3):
+        client.get("/api/sessions/history", headers=headers)
+
+    with count_queries() as stats:
+        ...
+    print(stats.count, stats.total_time_ms, stats.repeated())
+"""
+
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+import contextvars
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 上下文变量：当前请求的统计
+_current_stats = contextvars.ContextVar('query_stats', default=None)
+
+# 全局收集器：不依赖上下文传播（测试中 TestClient 在另一个线程里执行请求）
+_global_collectors: List["QueryStats"] = []
+_global_lock = threading.Lock()
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\((?:[^()]*)\)", re.IGNORECASE)
+_PARAM_PLACEHOLDER = re.compile(r"%\(\w+\)s|:\w+|\?|\$\d+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_statement(statement: str) -> str:
+    """把 SQL 归一化为"形状"：去掉字面量、参数占位符和 IN 列表内容"""
+    shape = _STRING_LITERAL.sub("?", statement)
+    shape = _IN_LIST.sub("IN (...)", shape)
+    shape = _PARAM_PLACEHOLDER.sub("?", shape)
+    shape = _NUMBER_LITERAL.sub("?", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+
+class QueryStats:
+    """一段代码执行的 SQL 统计"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_time_ns = 0
+        self.statements: List[str] = []
+        self.shapes: Counter = Counter()
+
+    @property
+    def total_time_ms(self) -> float:
+        return self.total_time_ns / 1_000_000
+
+    def record(self, statement: str, elapsed_ns: int):
+        self.count += 1
+        self.total_time_ns += elapsed_ns
+        self.statements.append(statement)
+        self.shapes[normalize_statement(statement)] += 1
+
+    def repeated(self, threshold: Optional[int] = None) -> List[Tuple[str, int]]:
+        """返回执行次数 >= threshold 的语句形状（疑似 N+1）"""
+        threshold = threshold or settings.QUERY_REPEAT_THRESHOLD
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+
+_hooks_installed = False
+
+# 其他模块的语句回调 callback(statement, elapsed_ns)，如 tracing 把语句计入当前 span；
+# 与语句统计共用同一对 Engine 事件，每条语句只计时一次
+_statement_listeners: List[Callable[[str, int], None]] = []
+
+
+def install_query_hooks():
+    """在所有 SQLAlchemy Engine 上注册语句统计事件（幂等）"""
+    global _hooks_installed
+    if _hooks_installed:
+        return
+
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    @event.listens_for(Engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _statement_listeners or _current_stats.get() is not None or _global_collectors:
+            conn.info.setdefault("query_counter_start", []).append(time.perf_counter_ns())
+
+    @event.listens_for(Engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("query_counter_start")
+        if not starts:
+            return
+        elapsed = time.perf_counter_ns() - starts.pop()
+
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.record(statement, elapsed)
+        if _global_collectors:
+            with _global_lock:
+                for collector in _global_collectors:
+                    if collector is not stats:
+                        collector.record(statement, elapsed)
+        for callback in _statement_listeners:
+            callback(statement, elapsed)
+
+    _hooks_installed = True
+    logger.info("Query counter hooks installed")
+
+
+def add_statement_listener(callback: Callable[[str, int], None]):
+    """注册语句回调：每条语句执行后以 (statement, elapsed_ns) 调用（幂等）"""
+    install_query_hooks()
+    if callback not in _statement_listeners:
+        _statement_listeners.append(callback)
+
+
+@contextmanager
+def count_queries():
+    """统计代码块内（所有线程）执行的 SQL 语句"""
+    install_query_hooks()
+    stats = QueryStats()
+    with _global_lock:
+        _global_collectors.append(stats)
+    try:
+        yield stats
+    finally:
+        with _global_lock:
+            _global_collectors.remove(stats)
+
+
+@contextmanager
+def assert_max_queries(max_queries: int):
+    """
+    断言代码块最多执行 max_queries 条 SQL 语句
+
+    Raises:
+        AssertionError: 超出时列出所有语句和重复的形状，方便定位 N+1
+    """
+    with count_queries() as stats:
+        yield stats
+
+    if stats.count > max_queries:
+        lines = [f"Expected at most {max_queries} queries, got {stats.count}:"]
+        lines += [f"  {i}. {_WHITESPACE.sub(' ', s).strip()}" for i, s in enumerate(stats.statements, 1)]
+        repeated = stats.repeated(threshold=2)
+        if repeated:
+            lines.append("Repeated statement shapes:")
+            lines += [f"  x{n}: {shape}" for shape, n in repeated]
+        raise AssertionError("\n".join(lines))
+
+
+def _log_request_stats(method: str, path: str, stats: QueryStats):
+    if stats.count > settings.QUERY_COUNT_WARN_THRESHOLD or stats.total_time_ms > settings.QUERY_TIME_WARN_MS:
+        logger.warning(
+            f"[QUERY_COUNT] {method} {path}: {stats.count} statements, "
+            f"{stats.total_time_ms:.1f}ms in DB"
+        )
+    for shape, n in stats.repeated():
+        logger.warning(f"[N+1] {method} {path}: statement executed {n} times: {shape[:300]}")
+
+
+async def query_counter_middleware(request, call_next):
+    """
+    HTTP 中间件：统计每个请求的 SQL 语句数和 DB 耗时，并附加到响应头
+    """
+    stats = QueryStats()
+    token = _current_stats.set(stats)
+    try:
+        response = await call_next(request)
+    finally:
+        _current_stats.reset(token)
+
+    _log_request_stats(request.method, request.url.path, stats)
+    response.headers["X-DB-Query-Count"] = str(stats.count)
+    response.headers["X-DB-Time-Ms"] = f"{stats.total_time_ms:.1f}"
+    return response
+
+
+def get_current_stats() -> Optional[QueryStats]:
+    """获取当前请求的 SQL 统计（未启用时为 None）"""
+    return _current_stats.get()
+
+
+def summarize(stats: QueryStats) -> Dict:
+    """把统计结果转为 dict（便于写日志 / benchmark 结果）"""
+    return {
+        "count": stats.count,
+        "total_time_ms": round(stats.total_time_ms, 3),
+        "repeated": [{"shape": shape, "count": n} for shape, n in stats.repeated(threshold=2)],
+    }
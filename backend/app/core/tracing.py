@@ -0,0 +1,352 @@
+"""
+Request Tracing
+
+请求级 tracing：按阶段（鉴权、DB 查询、超时检查、模型调用等）记录 span，
+并统计每个 span 内执行的 SQL 语句数。
+
+上下文传播沿用 openai_logger 的 contextvars 模式：
+- 中间件为每个请求创建 Trace 并写入 ContextVar
+- 同步路由/依赖在线程池中执行时，anyio 会复制上下文，因此 span 能挂到同一个 Trace 上
+
+导出方式：
+- jsonl: 写入 logs/traces/spans_YYYY-MM-DD.jsonl（每行一个 span）
+- otlp: 以 OTLP/HTTP JSON 格式发送到本地 collector
+- admin 用户的响应会附带 Server-Timing 头
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+import contextvars
+
+from app.core.config import settings
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+# 上下文变量：当前请求的 Trace 和当前活跃的 Span
+_current_trace = contextvars.ContextVar('request_trace', default=None)
+_current_span = contextvars.ContextVar('request_span', default=None)
+
+
+def _new_id(num_bytes: int) -> str:
+    return os.urandom(num_bytes).hex()
+
+
+class Span:
+    """单个阶段的耗时记录"""
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[str] = None,
+                 attributes: Optional[Dict[str, Any]] = None):
+        self.trace = trace
+        self.name = name
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.start_unix_ns = time.time_ns()
+        self._start_perf_ns = time.perf_counter_ns()
+        self.duration_ns: Optional[int] = None
+        self.sql_count = 0
+        self.sql_time_ns = 0
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def finish(self, duration_ns: Optional[int] = None):
+        if self.duration_ns is None:
+            self.duration_ns = duration_ns if duration_ns is not None else (
+                time.perf_counter_ns() - self._start_perf_ns
+            )
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.duration_ns or 0) / 1_000_000
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": datetime.fromtimestamp(self.start_unix_ns / 1e9).isoformat(),
+            "duration_ms": round(self.duration_ms, 3),
+            "sql_count": self.sql_count,
+            "sql_time_ms": round(self.sql_time_ns / 1_000_000, 3),
+            "attributes": self.attributes,
+        }
+
+
+class Trace:
+    """一次 HTTP 请求的所有 span"""
+
+    def __init__(self, name: str):
+        self.trace_id = _new_id(16)
+        self.name = name
+        self.spans: List[Span] = []
+        self.is_admin = False
+        self.sql_count = 0
+
+    def server_timing(self) -> str:
+        """生成 Server-Timing 头：每个 span 一项，附带 SQL 语句数"""
+        entries = []
+        for span in self.spans:
+            if span.duration_ns is None:
+                continue
+            entries.append(
+                f'{span.name};dur={span.duration_ms:.1f};desc="sql={span.sql_count}"'
+            )
+        return ", ".join(entries)
+
+
+def get_current_trace() -> Optional[Trace]:
+    """获取当前请求的 Trace（未启用 tracing 时为 None）"""
+    return _current_trace.get()
+
+
+def mark_admin():
+    """标记当前请求来自 admin 用户（决定是否返回 Server-Timing）"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.is_admin = True
+
+
+@contextmanager
+def trace_span(name: str, **attributes):
+    """
+    记录一个阶段的 span
+
+    未处于请求 Trace 中时不做任何事，因此可以放心地放在服务层代码里。
+
+    使用示例：
+        with trace_span("therapist.load_context", user_id=user_id):
+            ...
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+
+    parent = _current_span.get()
+    span = Span(trace, name, parent.span_id if parent else None, attributes)
+    trace.spans.append(span)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except Exception as e:
+        span.set_attribute("error", type(e).__name__)
+        raise
+    finally:
+        span.finish()
+        _current_span.reset(token)
+
+
+def record_span(name: str, start_unix_ns: int, duration_ns: int, **attributes):
+    """记录一个已经结束的 span（用于 httpx event hooks 这类无法包裹代码块的场景）"""
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    parent = _current_span.get()
+    span = Span(trace, name, parent.span_id if parent else None, attributes)
+    span.start_unix_ns = start_unix_ns
+    span.finish(duration_ns)
+    trace.spans.append(span)
+
+
+# ===== SQL 语句统计 =====
+
+def _record_sql(statement: str, elapsed_ns: int):
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    trace.sql_count += 1
+    span = _current_span.get()
+    if span is None:
+        return
+    span.sql_count += 1
+    span.sql_time_ns += elapsed_ns
+    if "agno_sessions" in statement:
+        span.attributes["agno_sql_count"] = span.attributes.get("agno_sql_count", 0) + 1
+
+
+def install_sql_hooks():
+    """
+    统计当前 span 内的 SQL 语句数和耗时
+
+    复用 query_counter 在 Engine 类上注册的事件（同时开启两者时每条语句只计时一次）；
+    监听 Engine 类而不是单个实例，这样 Agno 自己创建的 engine（写 ai.agno_sessions）
+    也会被统计到。
+    """
+    from app.core.query_counter import add_statement_listener
+
+    add_statement_listener(_record_sql)
+
+
+# ===== 导出 =====
+
+class SpanExporter:
+    """
+    后台线程批量导出 span
+
+    请求线程只负责把 Trace 放进队列，文件写入和 OTLP 发送都在后台完成。
+    """
+
+    def __init__(self, exporter: str = "jsonl", log_dir: str = "logs/traces",
+                 otlp_endpoint: Optional[str] = None, service_name: str = "unlimi-backend"):
+        self.exporters = {e.strip() for e in exporter.split(",") if e.strip()}
+        if "both" in self.exporters:
+            self.exporters = {"jsonl", "otlp"}
+        self.log_dir = Path(log_dir)
+        self.otlp_endpoint = otlp_endpoint
+        self.service_name = service_name
+        self._queue: "queue.Queue[Optional[Trace]]" = queue.Queue(maxsize=10000)
+        self._http_client: Optional["httpx.Client"] = None
+
+        if "jsonl" in self.exporters:
+            self.log_dir.mkdir(parents=True, exist_ok=True)
+
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+        logger.info(f"Span exporter initialized: exporters={sorted(self.exporters)}")
+
+    def export(self, trace: Trace):
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            logger.warning("Span export queue full, dropping trace")
+
+    def flush(self, timeout: float = 5.0):
+        """等待队列中的 span 全部导出"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    def _run(self):
+        while True:
+            trace = self._queue.get()
+            batch = [trace]
+            # 顺便取走队列里已有的其他 trace，合并成一批写出
+            while len(batch) < 100:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._export_batch(batch)
+            except Exception as e:
+                logger.error(f"Failed to export spans: {e}", exc_info=True)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _export_batch(self, batch: List[Trace]):
+        if "jsonl" in self.exporters:
+            self._write_jsonl(batch)
+        if "otlp" in self.exporters and self.otlp_endpoint:
+            self._send_otlp(batch)
+
+    def _write_jsonl(self, batch: List[Trace]):
+        today = datetime.now().strftime("%Y-%m-%d")
+        log_file = self.log_dir / f"spans_{today}.jsonl"
+        with open(log_file, "a", encoding="utf-8") as f:
+            for trace in batch:
+                for span in trace.spans:
+                    entry = span.to_dict()
+                    entry["trace_name"] = trace.name
+                    f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+
+    def _send_otlp(self, batch: List[Trace]):
+        if self._http_client is None:
+            import httpx  # 只有 OTLP 导出需要，不在启动时导入
+            self._http_client = httpx.Client(timeout=5.0)
+
+        otlp_spans = []
+        for trace in batch:
+            for span in trace.spans:
+                attributes = dict(span.attributes)
+                attributes["db.statement_count"] = span.sql_count
+                attributes["db.time_ms"] = round(span.sql_time_ns / 1_000_000, 3)
+                otlp_span = {
+                    "traceId": trace.trace_id,
+                    "spanId": span.span_id,
+                    "name": span.name,
+                    "kind": 2 if span.parent_id is None else 1,
+                    "startTimeUnixNano": str(span.start_unix_ns),
+                    "endTimeUnixNano": str(span.start_unix_ns + (span.duration_ns or 0)),
+                    "attributes": [_otlp_attribute(k, v) for k, v in attributes.items()],
+                }
+                if span.parent_id:
+                    otlp_span["parentSpanId"] = span.parent_id
+                otlp_spans.append(otlp_span)
+
+        payload = {
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attribute("service.name", self.service_name)]},
+                "scopeSpans": [{"scope": {"name": __name__}, "spans": otlp_spans}],
+            }]
+        }
+        response = self._http_client.post(self.otlp_endpoint, json=payload)
+        if response.status_code >= 400:
+            logger.warning(f"OTLP collector returned {response.status_code}: {response.text[:200]}")
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+# 全局单例
+_span_exporter: Optional[SpanExporter] = None
+
+
+def get_span_exporter() -> SpanExporter:
+    """获取全局 span exporter 单例"""
+    global _span_exporter
+    if _span_exporter is None:
+        _span_exporter = SpanExporter(
+            exporter=settings.TRACING_EXPORTER,
+            log_dir=settings.TRACING_LOG_DIR,
+            otlp_endpoint=settings.TRACING_OTLP_ENDPOINT,
+            service_name=settings.TRACING_SERVICE_NAME,
+        )
+    return _span_exporter
+
+
+async def tracing_middleware(request, call_next):
+    """
+    HTTP 中间件：为每个请求创建 Trace，结束后导出，并为 admin 附加 Server-Timing 头
+    """
+    trace = Trace(f"{request.method} {request.url.path}")
+    trace_token = _current_trace.set(trace)
+    try:
+        with trace_span("http.request", method=request.method, path=request.url.path) as root:
+            response = await call_next(request)
+            root.set_attribute("status_code", response.status_code)
+    finally:
+        _current_trace.reset(trace_token)
+
+    # 用路由模板命名（/api/sessions/{session_id}/post_message），便于聚合
+    route = request.scope.get("route")
+    if route is not None and getattr(route, "path", None):
+        trace.name = f"{request.method} {route.path}"
+        root.set_attribute("route", route.path)
+    root.set_attribute("sql_count_total", trace.sql_count)
+
+    if trace.is_admin:
+        response.headers["Server-Timing"] = trace.server_timing()
+
+    get_span_exporter().export(trace)
+    return response
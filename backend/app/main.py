@@ -1,6 +1,11 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.routes import health, auth, onboarding, sessions, users, admin, emo_scores, therapists, captcha, invitation
+from fastapi.responses import JSONResponse
+from app.api.routes import health, auth, onboarding, sessions, session_ws, users, admin, emo_scores, therapists, captcha, invitation
+from app.core.config import settings
+from app.core.log_redaction import install_token_redaction
+from app.services.lifecycle import ServiceDraining, get_lifecycle_manager
 # from app.api.routes import protected_example  # Uncomment to enable example protected routes
 import logging
 logging.basicConfig(
@@ -8,10 +13,79 @@ logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
 )
 
+install_token_redaction()
+
 print(">>> FastAPI app loaded")   # 控制台一定显示
 logging.info(">>> Logging system initialized")
 
-app = FastAPI(title="AI Therapy Backend")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用启动 / 关闭时的后台任务"""
+    from app.services.pg_notify import get_notify_listener
+    from app.services.prompt_store import get_prompt_store, subscribe_prompt_store_changes
+    from app.services.prompt_templates import get_prompt_templates
+    from app.services.runtime_settings import get_runtime_settings, subscribe_runtime_settings_changes
+    from app.services.session_events import subscribe_session_events
+    from app.services.therapist_catalog import get_therapist_catalog, subscribe_catalog_invalidation
+    try:
+        get_therapist_catalog().load()
+    except Exception as e:
+        # 加载失败时在第一次访问时重试
+        logging.warning(f"Therapist catalog warmup failed: {e}")
+    try:
+        get_runtime_settings().reload()
+    except Exception as e:
+        logging.warning(f"Runtime settings load failed, using defaults: {e}")
+    get_prompt_templates().compile_all()
+    try:
+        get_prompt_store().reload()
+    except Exception as e:
+        logging.warning(f"Prompt store load failed, using prompt files: {e}")
+    subscribe_catalog_invalidation()
+    subscribe_runtime_settings_changes()
+    subscribe_prompt_store_changes()
+    subscribe_session_events()
+    get_notify_listener().start()
+    get_runtime_settings().start()
+    get_prompt_store().start()
+    if settings.CAPTCHA_POOL_ENABLED:
+        from app.services.captcha_pool import get_captcha_pool
+        get_captcha_pool().start()
+    if settings.SCHEDULER_ENABLED:
+        from app.services.scheduler import get_scheduler
+        get_scheduler().start()
+    # SIGTERM 时先停止接受新的轮次，再交给 uvicorn 停止监听、等待连接结束
+    get_lifecycle_manager().install_signal_handlers()
+    # 连接池 / 提示词 / agent 在后台预热，完成前 /health 返回 503
+    from app.services.warmup import get_warmup
+    get_warmup().start()
+
+    yield
+
+    if settings.SCHEDULER_ENABLED:
+        get_scheduler().stop()
+    if settings.CAPTCHA_POOL_ENABLED:
+        get_captcha_pool().stop()
+    get_runtime_settings().stop()
+    get_prompt_store().stop()
+    get_notify_listener().stop()
+    # 等待仍在线程中运行的轮次，flush 日志，关闭 HTTP client 和数据库连接池
+    get_lifecycle_manager().shutdown()
+
+
+app = FastAPI(title="AI Therapy Backend", lifespan=lifespan)
+
+
+@app.exception_handler(ServiceDraining)
+async def service_draining_handler(request: Request, exc: ServiceDraining):
+    """进程正在退出：新的轮次由客户端 / 负载均衡重试到其他 worker"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server is restarting, please retry"},
+        headers={"Retry-After": str(settings.SHUTDOWN_RETRY_AFTER_SECONDS)},
+    )
+
 
 app.add_middleware(
     CORSMiddleware,
@@ -19,8 +93,23 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-DB-Query-Count", "X-DB-Time-Ms", "Retry-After"],
 )
 
+if settings.TRACING_ENABLED:
+    from app.core.tracing import install_sql_hooks, tracing_middleware
+    install_sql_hooks()
+    app.middleware("http")(tracing_middleware)
+
+if settings.QUERY_COUNTER_ENABLED:
+    from app.core.query_counter import install_query_hooks, query_counter_middleware
+    install_query_hooks()
+    app.middleware("http")(query_counter_middleware)
+
+if settings.PROFILING_ENABLED:
+    from app.core.profiler import profiling_middleware
+    app.middleware("http")(profiling_middleware)
+
 app.include_router(health.router)
 app.include_router(auth.router, prefix="/api")
 app.include_router(captcha.router, prefix="/api")
@@ -29,6 +118,7 @@ app.include_router(onboarding.router, prefix="/api/onboarding", tags=["onboardin
 app.include_router(users.router, prefix="/api", tags=["users"])
 app.include_router(therapists.router, prefix="/api", tags=["therapists"])
 app.include_router(sessions.router, prefix="/api", tags=["sessions"])
+app.include_router(session_ws.router, prefix="/api", tags=["sessions"])
 app.include_router(admin.router, prefix="/api", tags=["admin"])
 app.include_router(emo_scores.router, prefix="/api", tags=["emo-score"])
 # app.include_router(protected_example.router, prefix="/api")  # Uncomment to enable example
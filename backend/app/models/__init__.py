@@ -7,6 +7,9 @@ from app.models.user_onboarding import UserOnboarding
 from app.models.session_review import SessionReview
 from app.models.user_context import UserContext
 from app.models.emo_score import EmoScore, EmoScoreSource
+from app.models.runtime_setting import RuntimeSetting, RuntimeSettingAudit
+from app.models.prompt_version import PromptVersion
+from app.models.prompt_experiment import PromptExperiment
 
 __all__ = [
     # Core models
@@ -28,4 +31,10 @@ __all__ = [
     # Emotion score models
     "EmoScore",
     "EmoScoreSource",
+
+    # Runtime configuration models
+    "RuntimeSetting",
+    "RuntimeSettingAudit",
+    "PromptVersion",
+    "PromptExperiment",
 ]
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey, Enum
+from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey, Enum, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.services.database import Base
@@ -19,6 +19,10 @@ class EmoScore(Base):
     每次评估创建一条新记录，不支持修改/删除（append-only）。
     """
     __tablename__ = "user_emo_scores"
+    __table_args__ = (
+        # 历史列表按 user_id 过滤、(created_at, id) 倒序做 keyset 分页
+        Index("ix_user_emo_scores_user_created_id", "user_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(
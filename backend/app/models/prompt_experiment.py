@@ -0,0 +1,36 @@
+"""
+PromptExperiment Model
+
+A/B experiments on prompts (see app/services/prompt_store.py).
+Users are deterministically bucketed into one of the variants while the experiment is active.
+"""
+
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from app.services.database import Base
+
+
+class PromptExperiment(Base):
+    """
+    Prompt A/B experiment.
+
+    Attributes:
+        id: Primary key (part of every variant tag, e.g. "3:B")
+        name: Human readable name
+        key: Prompt key under test (clerk, therapist-timeout, therapist:<therapist_id>)
+        variants: JSON list of {"id", "weight", "content"}; content null means the current prompt (control)
+        is_active: Whether users are currently being bucketed into this experiment
+        created_by_user_id: Admin who created the experiment
+        created_at: Timestamp when the experiment was created
+        ended_at: Timestamp when the experiment was stopped
+    """
+    __tablename__ = "prompt_experiments"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(100), nullable=False)
+    key = Column(String(64), nullable=False, index=True)
+    variants = Column(Text, nullable=False)
+    is_active = Column(Boolean, default=True, nullable=False, index=True)
+    created_by_user_id = Column(Integer, ForeignKey('users.id', ondelete='SET NULL'), nullable=True)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    ended_at = Column(DateTime, nullable=True)
@@ -0,0 +1,37 @@
+"""
+PromptVersion Model
+
+Versioned system prompts managed from the admin console (see app/services/prompt_store.py).
+Rows are append-only: the active prompt for a key is the row with the highest version.
+"""
+
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy.sql import func
+from app.services.database import Base
+
+
+class PromptVersion(Base):
+    """
+    One published version of a system prompt.
+
+    Attributes:
+        id: Primary key (monotonic across all keys; used as the store-wide version stamp)
+        key: Prompt key (onboarding, clerk, clerk_over, therapist-timeout)
+        version: Per-key version number, starting at 1
+        content: Prompt text
+        content_hash: sha256 of content
+        created_by_user_id: Admin who published this version
+        created_at: Timestamp when the version was published
+    """
+    __tablename__ = "prompt_versions"
+    __table_args__ = (
+        UniqueConstraint('key', 'version', name='uq_prompt_versions_key_version'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    key = Column(String(64), nullable=False, index=True)
+    version = Column(Integer, nullable=False)
+    content = Column(Text, nullable=False)
+    content_hash = Column(String(64), nullable=False)
+    created_by_user_id = Column(Integer, ForeignKey('users.id', ondelete='SET NULL'), nullable=True)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
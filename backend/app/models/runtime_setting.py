@@ -0,0 +1,54 @@
+"""
+RuntimeSetting Model
+
+Stores admin overrides for hot-reloadable tunables (see app/services/runtime_settings.py).
+Every change is recorded in runtime_setting_audit.
+"""
+
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from app.services.database import Base
+
+
+class RuntimeSetting(Base):
+    """
+    Runtime setting override.
+
+    Attributes:
+        key: Setting name (same as the field in app.core.config.Settings)
+        value: JSON-encoded value
+        version: Global change-set version that last wrote this key
+        updated_by_user_id: Admin who made the change
+        updated_at: Timestamp of the last change
+    """
+    __tablename__ = "runtime_settings"
+
+    key = Column(String(64), primary_key=True)
+    value = Column(Text, nullable=False)
+    version = Column(Integer, nullable=False)
+    updated_by_user_id = Column(Integer, ForeignKey('users.id', ondelete='SET NULL'), nullable=True)
+    updated_at = Column(DateTime, server_default=func.now(), nullable=False)
+
+
+class RuntimeSettingAudit(Base):
+    """
+    Audit trail of runtime setting changes.
+
+    Attributes:
+        id: Primary key
+        key: Setting name
+        old_value: JSON-encoded value before the change (NULL if it was the default)
+        new_value: JSON-encoded value after the change (NULL if reset to default)
+        version: Change-set version (all keys changed together share one version)
+        changed_by_user_id: Admin who made the change
+        changed_at: Timestamp of the change
+    """
+    __tablename__ = "runtime_setting_audit"
+
+    id = Column(Integer, primary_key=True, index=True)
+    key = Column(String(64), nullable=False, index=True)
+    old_value = Column(Text, nullable=True)
+    new_value = Column(Text, nullable=True)
+    version = Column(Integer, nullable=False, index=True)
+    changed_by_user_id = Column(Integer, ForeignKey('users.id', ondelete='SET NULL'), nullable=True)
+    changed_at = Column(DateTime, server_default=func.now(), nullable=False)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum as SQLEnum, Text, JSON
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum as SQLEnum, Text, JSON, Boolean
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 import enum
@@ -25,6 +25,9 @@ class Session(Base):
     turn_count = Column(Integer, default=0, nullable=False)  # 对话往返轮数
     overtime_reminder_count = Column(Integer, default=0, nullable=False)  # 超时提示次数
 
+    # 开场白在后台生成，生成完成（或失败）前为 True
+    opening_pending = Column(Boolean, default=False, nullable=False)
+
     # Relationships
     user = relationship("User", back_populates="sessions")
     review = relationship("SessionReview", back_populates="session", uselist=False, cascade="all, delete-orphan")
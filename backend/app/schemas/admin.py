@@ -3,8 +3,9 @@ Admin API Schemas
 
 管理后台相关的数据模型
 """
-from pydantic import BaseModel, Field
-from typing import List, Dict, Optional
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from datetime import datetime
+from typing import Any, List, Dict, Optional
 
 
 # ============ 提示词配置相关 ============
@@ -58,7 +59,9 @@ class FilePromptItem(BaseModel):
     key: str = Field(..., description="Prompt key (onboarding, clerk, clerk_over, therapist-general)")
     display_name: str = Field(..., description="显示名称")
     content: str = Field(..., description="Prompt 内容")
-    file_path: str = Field(..., description="YAML 文件路径")
+    file_path: str = Field(..., description="YAML 文件路径（默认值来源）")
+    version: int = Field(0, description="当前生效的版本（0 表示 YAML 默认值）")
+    updated_at: Optional[datetime] = Field(None, description="当前版本的发布时间")
 
 
 class FilePromptsResponse(BaseModel):
@@ -78,6 +81,97 @@ class FilePromptUpdateResponse(BaseModel):
     prompt: FilePromptItem = Field(..., description="更新后的 prompt 信息")
 
 
+class PromptVersionItem(BaseModel):
+    """提示词的一个已发布版本"""
+    model_config = ConfigDict(from_attributes=True)
+
+    version: int
+    content: str
+    content_hash: str
+    created_by_user_id: Optional[int] = None
+    created_at: datetime
+
+
+class PromptVersionListResponse(BaseModel):
+    """提示词发布历史（新的在前）"""
+    key: str
+    active_version: int = Field(..., description="当前生效的版本（0 表示 YAML 默认值）")
+    versions: List[PromptVersionItem]
+
+
+class PromptRollbackRequest(BaseModel):
+    """回滚到历史版本"""
+    version: int = Field(..., ge=0, description="要恢复的版本（0 表示 YAML 默认值）")
+
+
+# ============ Prompt A/B 实验 ============
+
+class PromptExperimentVariant(BaseModel):
+    """实验的一个变体"""
+    id: str = Field(..., description="变体 id（字母 / 数字 / _ / -）")
+    weight: int = Field(1, description="分桶权重（1-1000）")
+    content: Optional[str] = Field(None, description="提示词内容，null 表示对照组（使用当前版本）")
+
+
+class PromptExperimentCreateRequest(BaseModel):
+    """创建实验"""
+    name: str = Field(..., max_length=100, description="实验名称")
+    key: str = Field(..., description="提示词 key：clerk / therapist-timeout / therapist:<therapist_id>")
+    variants: List[PromptExperimentVariant] = Field(..., min_length=2, description="变体列表")
+
+
+class PromptExperimentItem(BaseModel):
+    """一个实验"""
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    name: str
+    key: str
+    variants: List[PromptExperimentVariant]
+    is_active: bool
+    created_by_user_id: Optional[int] = None
+    created_at: datetime
+    ended_at: Optional[datetime] = None
+
+    @field_validator("variants", mode="before")
+    @classmethod
+    def _parse_variants(cls, value):
+        # 数据库中以 JSON 文本保存
+        if isinstance(value, str):
+            import json
+            return json.loads(value)
+        return value
+
+
+class PromptExperimentListResponse(BaseModel):
+    """实验列表（新的在前）"""
+    items: List[PromptExperimentItem]
+
+
+class PromptExperimentVariantStats(BaseModel):
+    """某个变体的用量统计（按模型调用计）"""
+    variant_id: str
+    calls: int
+    users: int
+    prompt_tokens: int
+    completion_tokens: int
+    cached_tokens: int
+    avg_prompt_tokens: Optional[float] = None
+    avg_completion_tokens: Optional[float] = None
+    cache_hit_rate: Optional[float] = Field(None, description="cached_tokens / prompt_tokens")
+    avg_latency_ms: Optional[float] = None
+    p50_latency_ms: Optional[float] = None
+    p95_latency_ms: Optional[float] = None
+
+
+class PromptExperimentReportResponse(BaseModel):
+    """实验报告"""
+    experiment: PromptExperimentItem
+    since: datetime
+    until: datetime
+    variants: List[PromptExperimentVariantStats]
+
+
 # ============ Session 配置相关 ============
 
 class SessionConfigResponse(BaseModel):
@@ -99,3 +193,98 @@ class SessionConfigUpdateResponse(BaseModel):
     success: bool = Field(..., description="是否成功")
     message: str = Field(..., description="消息")
     config: SessionConfigResponse = Field(..., description="更新后的配置")
+
+
+# ============ Profiling 相关 ============
+
+class ProfileItem(BaseModel):
+    """单个 profile 文件"""
+    name: str = Field(..., description="文件名")
+    size_bytes: int = Field(..., description="文件大小（字节）")
+    created_at: datetime = Field(..., description="生成时间")
+
+
+class ProfileListResponse(BaseModel):
+    """profile 文件列表响应"""
+    profiles: List[ProfileItem] = Field(..., description="profile 文件列表（新的在前）")
+
+
+class CaptchaPoolStatsResponse(BaseModel):
+    """验证码预渲染池统计"""
+    enabled: bool = Field(..., description="是否启用预渲染池")
+    running: bool = Field(..., description="补充线程是否在运行")
+    size: int = Field(..., description="当前池中图片数")
+    capacity: int = Field(..., description="池容量")
+    low_watermark: int = Field(..., description="低于该数量时触发补充")
+    workers: int = Field(..., description="渲染进程数（0 表示在补充线程内渲染）")
+    hits: int = Field(..., description="从池中取到图片的次数")
+    misses: int = Field(..., description="池为空、在请求线程内渲染的次数")
+    hit_rate: Optional[float] = Field(None, description="命中率")
+    refills: int = Field(..., description="补充次数")
+    images_rendered: int = Field(..., description="累计渲染图片数")
+    last_refill_ms: Optional[float] = Field(None, description="最近一次补充耗时（毫秒）")
+    avg_refill_ms: Optional[float] = Field(None, description="平均补充耗时（毫秒）")
+    images_per_second: Optional[float] = Field(None, description="渲染速度（张/秒）")
+
+
+class SchedulerTaskItem(BaseModel):
+    """维护任务执行统计"""
+    name: str = Field(..., description="任务名称")
+    interval_seconds: float = Field(..., description="执行间隔（秒，另加随机 jitter）")
+    runs: int = Field(..., description="执行次数")
+    failures: int = Field(..., description="失败次数")
+    last_run_at: Optional[datetime] = Field(None, description="最近一次执行时间（UTC）")
+    last_duration_ms: Optional[float] = Field(None, description="最近一次执行耗时（毫秒）")
+    last_result: Optional[str] = Field(None, description="最近一次执行结果摘要")
+    last_error: Optional[str] = Field(None, description="最近一次失败的错误信息")
+
+
+class SchedulerStatusResponse(BaseModel):
+    """后台维护调度器状态"""
+    enabled: bool = Field(..., description="是否启用调度器")
+    running: bool = Field(..., description="调度线程是否在运行")
+    is_leader: bool = Field(..., description="当前 worker 是否持有 advisory lock（负责执行任务）")
+    tasks: List[SchedulerTaskItem] = Field(..., description="任务列表")
+
+
+# ============ 运行参数（热更新）============
+
+class RuntimeSettingItem(BaseModel):
+    """一个可热更新的运行参数"""
+    key: str = Field(..., description="参数名（与 .env 中的名称相同）")
+    value: Any = Field(..., description="当前生效的值")
+    default: Any = Field(..., description="默认值（来自 .env / 代码）")
+    is_overridden: bool = Field(..., description="是否被管理员覆盖")
+    type: str = Field(..., description="取值类型：int / float / str")
+    min: Optional[float] = Field(None, description="最小值")
+    max: Optional[float] = Field(None, description="最大值")
+    description: str = Field(..., description="说明")
+
+
+class RuntimeSettingsResponse(BaseModel):
+    """运行参数列表"""
+    version: int = Field(..., description="当前 worker 加载的配置版本")
+    settings: List[RuntimeSettingItem] = Field(..., description="参数列表")
+
+
+class RuntimeSettingsUpdateRequest(BaseModel):
+    """批量修改运行参数（值为 null 表示恢复默认）"""
+    values: Dict[str, Any] = Field(..., min_length=1, description="参数名 -> 新值")
+
+
+class RuntimeSettingAuditItem(BaseModel):
+    """一条运行参数修改记录"""
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    key: str
+    old_value: Optional[str] = Field(None, description="修改前的值（JSON，null 表示默认值）")
+    new_value: Optional[str] = Field(None, description="修改后的值（JSON，null 表示恢复默认）")
+    version: int
+    changed_by_user_id: Optional[int] = None
+    changed_at: datetime
+
+
+class RuntimeSettingAuditResponse(BaseModel):
+    """运行参数修改记录（新的在前）"""
+    items: List[RuntimeSettingAuditItem]
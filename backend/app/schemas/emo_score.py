@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field, field_validator
-from datetime import datetime
-from typing import Optional
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
 from app.models.emo_score import EmoScoreSource
 
 
@@ -14,6 +14,31 @@ class EmoScoreCreate(BaseModel):
     session_id: Optional[int] = Field(None, description="会话 ID（source=session 时必填）")
 
 
+class EmoScoreBulkItem(EmoScoreCreate):
+    """批量导入的单条评估（可指定历史时间）"""
+    created_at: Optional[datetime] = Field(None, description="评估时间（UTC），默认为导入时间")
+
+    @field_validator("created_at")
+    @classmethod
+    def _to_naive_utc(cls, value: Optional[datetime]) -> Optional[datetime]:
+        # 库中的 created_at 是不带时区的 UTC 时间；带时区的输入（如 ...Z）统一转换，
+        # 否则与默认的 utcnow() 混在一批里无法比较
+        if value is not None and value.tzinfo is not None:
+            return value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+
+class EmoScoreBulkRequest(BaseModel):
+    """批量导入评估的请求 schema"""
+    items: list[EmoScoreBulkItem] = Field(..., min_length=1, description="评估记录")
+
+
+class EmoScoreBulkResponse(BaseModel):
+    """批量导入评估的响应 schema"""
+    created: int
+    ids: list[int]
+
+
 class EmoScoreResponse(BaseModel):
     """情绪评估的响应 schema"""
     id: int
@@ -37,7 +62,67 @@ class EmoScoreResponse(BaseModel):
         from_attributes = True
 
 
+class EmoScoreListItem(BaseModel):
+    """
+    评估历史列表项
+
+    除 id 和 created_at 外都是可选的：请求 fields= 时只返回请求的字段。
+    """
+    id: int
+    created_at: datetime
+    user_id: Optional[int] = None
+
+    stress_score: Optional[int] = None
+    stable_score: Optional[int] = None
+    anxiety_score: Optional[int] = None
+    functional_score: Optional[int] = None
+
+    stress_score_change: Optional[float] = None
+    stable_score_change: Optional[float] = None
+    anxiety_score_change: Optional[float] = None
+    functional_score_change: Optional[float] = None
+
+    source: Optional[EmoScoreSource] = None
+    session_id: Optional[int] = None
+
+
 class EmoScoreListResponse(BaseModel):
-    """评估历史列表响应"""
-    total: int
-    items: list[EmoScoreResponse]
+    """评估历史列表响应（按 created_at 倒序分页）"""
+    total: Optional[int] = Field(None, description="总记录数，仅在 include_total=true 时返回")
+    items: list[EmoScoreListItem]
+    next_cursor: Optional[str] = Field(None, description="下一页游标，最后一页为 null")
+    has_more: bool = False
+
+
+class EmoTrendDimension(BaseModel):
+    """单个维度的趋势统计"""
+    name: str = Field(..., description="分数字段名，如 stress_score")
+    latest: Optional[float] = Field(None, description="最近一次有效分数")
+    moving_average: Optional[float] = Field(None, description="最新的移动平均")
+    ewma: Optional[float] = Field(None, description="最新的指数加权移动平均")
+    slopes: Dict[str, Optional[float]] = Field(default_factory=dict, description="最近 N 次评估的斜率（分数/天），key 为 N")
+    volatility: Optional[float] = Field(None, description="相邻两次评估变化量的标准差")
+    onboarding: Optional[float] = Field(None, description="首次 onboarding 评估分数")
+    latest_session: Optional[float] = Field(None, description="最近一次 session 评估分数")
+    delta: Optional[float] = Field(None, description="latest_session - onboarding")
+    delta_rate: Optional[float] = Field(None, description="delta / onboarding")
+
+
+class EmoTrendSeries(BaseModel):
+    """画图用的序列（可能已降采样），values 中缺失值为 null"""
+    timestamps: List[datetime]
+    values: Dict[str, List[Optional[float]]]
+    moving_average: Dict[str, List[Optional[float]]]
+    ewma: Dict[str, List[Optional[float]]]
+
+
+class EmoTrendResponse(BaseModel):
+    """情绪分数趋势分析响应"""
+    total: int = Field(..., description="参与计算的评估记录数")
+    latest_created_at: Optional[datetime] = None
+    window: int
+    ewma_alpha: float
+    slope_windows: List[int]
+    downsampled: bool = Field(False, description="series 是否经过降采样")
+    dimensions: List[EmoTrendDimension]
+    series: EmoTrendSeries
@@ -4,9 +4,9 @@ Invitation Code Schemas
 Pydantic models for invitation code management.
 """
 
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 from datetime import datetime
-from typing import Optional
+from typing import Literal, Optional
 
 
 class InvitationCodeResponse(BaseModel):
@@ -23,5 +23,19 @@ class InvitationCodeResponse(BaseModel):
 
 
 class InvitationCodeListResponse(BaseModel):
-    """Response model for list of invitation codes."""
+    """Response model for one page of invitation codes."""
     codes: list[InvitationCodeResponse]
+    next_cursor: Optional[str] = Field(None, description="Cursor for the next page, None on the last page")
+    has_more: bool = False
+
+
+class InvitationCodeCountResponse(BaseModel):
+    """Response model for invitation code count."""
+    count: int
+    estimated: bool = Field(False, description="True if the count is a planner estimate")
+
+
+class InvitationCodeBulkRequest(BaseModel):
+    """Request model for bulk invitation code generation."""
+    count: int = Field(..., ge=1, description="Number of codes to generate")
+    format: Literal["csv", "ndjson"] = Field("csv", description="Response format")
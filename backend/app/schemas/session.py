@@ -34,6 +34,7 @@ class SessionDetail(BaseModel):
     turn_count: int
     overtime_reminder_count: int
     should_remind: bool = False  # Whether timeout reminder should be shown
+    opening_pending: bool = False  # Opening message is still being generated
 
 
 class SessionHistoryItem(BaseModel):
@@ -5,6 +5,7 @@ from typing import List, Optional
 class SessionStartResponse(BaseModel):
     """Response schema for starting a new session"""
     session_id: int
+    opening_pending: bool = False  # Opening message is generated in the background; poll until false
 
 
 class SessionEndResponse(BaseModel):
@@ -18,3 +19,4 @@ class ActiveSessionResponse(BaseModel):
     """Response schema for checking active session"""
     active: bool
     session_id: Optional[int] = None
+    opening_pending: bool = False
@@ -0,0 +1,210 @@
+"""
+Captcha Pool
+
+预渲染验证码池：
+- 有界队列保存 (text, image_base64)，/api/captcha/generate 直接取出一个
+- 后台线程在池低于 CAPTCHA_POOL_LOW_WATERMARK 时补充到 CAPTCHA_POOL_SIZE
+- 渲染（画噪点、SMOOTH、PNG 编码、base64）在进程池中完成，不占用请求线程和 GIL
+- 统计命中率、补充耗时和渲染速度，通过 GET /api/admin/captcha-pool 查看
+
+每张图片只会被取出一次；池为空或未启动时由调用方在请求线程内渲染（计为 miss）。
+"""
+
+import logging
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Deque, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _render_batch(count: int) -> List[Tuple[str, str]]:
+    """在渲染进程中执行：生成 count 个 (text, image_base64)"""
+    from app.services.captcha_service import CaptchaService
+    return [CaptchaService.render_captcha() for _ in range(count)]
+
+
+class CaptchaPool:
+    """后台补充的预渲染验证码池"""
+
+    def __init__(self, capacity: int = 200, low_watermark: int = 50,
+                 batch_size: int = 20, workers: int = 2):
+        self.capacity = capacity
+        self.low_watermark = min(low_watermark, capacity)
+        self.batch_size = max(1, batch_size)
+        self.workers = max(0, workers)  # 0 表示在补充线程内渲染
+
+        self._items: Deque[Tuple[str, str]] = deque()
+        self._lock = threading.Lock()
+        self._need_refill = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+        # 统计
+        self.hits = 0
+        self.misses = 0
+        self.refills = 0
+        self.images_rendered = 0
+        self.render_time = 0.0
+        self.last_refill_ms: Optional[float] = None
+        self._refill_total_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """启动补充线程（幂等）"""
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="captcha-pool-refill", daemon=True)
+        self._thread.start()
+        self._need_refill.set()
+        logger.info(
+            f"Captcha pool started: capacity={self.capacity}, low_watermark={self.low_watermark}, "
+            f"workers={self.workers}"
+        )
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self._need_refill.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        logger.info("Captcha pool stopped")
+
+    def pop(self) -> Optional[Tuple[str, str]]:
+        """取出一个预渲染验证码；池未运行时返回 None 且不计入统计"""
+        if not self.running:
+            return None
+        with self._lock:
+            item = self._items.popleft() if self._items else None
+            size = len(self._items)
+            if item is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if size < self.low_watermark:
+            self._need_refill.set()
+        return item
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    # ===== 补充 =====
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._need_refill.wait(timeout=1.0)
+            self._need_refill.clear()
+            while not self._stop.is_set() and len(self._items) < self.capacity:
+                try:
+                    self._refill_once(self.capacity - len(self._items))
+                except Exception as e:
+                    logger.error(f"Captcha pool refill failed: {e}", exc_info=True)
+                    self._stop.wait(1.0)
+                    break
+
+    def _refill_once(self, missing: int):
+        # 拆成多个任务，让所有渲染进程并行工作
+        chunks = []
+        while missing > 0:
+            count = min(self.batch_size, missing)
+            chunks.append(count)
+            missing -= count
+
+        start = time.perf_counter()
+        rendered: List[Tuple[str, str]] = []
+        executor = self._get_executor()
+        if executor is not None:
+            try:
+                for future in [executor.submit(_render_batch, count) for count in chunks]:
+                    rendered.extend(future.result())
+            except (RuntimeError, BrokenProcessPool) as e:
+                # 例如主模块缺少 `if __name__ == "__main__"` 保护，spawn 无法启动子进程
+                logger.warning(f"Captcha render processes failed, rendering in thread from now on: {e}")
+                self._disable_executor()
+                rendered = []
+                executor = None
+        if executor is None:
+            for count in chunks:
+                rendered.extend(_render_batch(count))
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            space = self.capacity - len(self._items)
+            self._items.extend(rendered[:space])
+            self.refills += 1
+            self.images_rendered += len(rendered)
+            self.render_time += elapsed
+            self.last_refill_ms = elapsed * 1000
+            self._refill_total_ms += elapsed * 1000
+
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        """创建渲染进程池；失败时退回到在补充线程内渲染"""
+        if self._executor is None and self.workers:
+            try:
+                # spawn：服务进程里已经有多个线程，fork 不安全
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            except (OSError, NotImplementedError) as e:
+                logger.warning(f"Process pool unavailable, rendering captchas in thread: {e}")
+                self._disable_executor()
+        return self._executor if self.workers else None
+
+    def _disable_executor(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self.workers = 0
+
+    # ===== 统计 =====
+
+    def stats(self) -> Dict:
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "running": self.running,
+                "size": len(self._items),
+                "capacity": self.capacity,
+                "low_watermark": self.low_watermark,
+                "workers": self.workers,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / requests, 4) if requests else None,
+                "refills": self.refills,
+                "images_rendered": self.images_rendered,
+                "last_refill_ms": round(self.last_refill_ms, 1) if self.last_refill_ms is not None else None,
+                "avg_refill_ms": round(self._refill_total_ms / self.refills, 1) if self.refills else None,
+                "images_per_second": round(self.images_rendered / self.render_time, 1) if self.render_time else None,
+            }
+
+
+# 全局单例
+_captcha_pool: Optional[CaptchaPool] = None
+
+
+def get_captcha_pool() -> CaptchaPool:
+    """获取全局验证码池单例"""
+    global _captcha_pool
+    if _captcha_pool is None:
+        _captcha_pool = CaptchaPool(
+            capacity=settings.CAPTCHA_POOL_SIZE,
+            low_watermark=settings.CAPTCHA_POOL_LOW_WATERMARK,
+            batch_size=settings.CAPTCHA_POOL_BATCH_SIZE,
+            workers=settings.CAPTCHA_POOL_WORKERS,
+        )
+    return _captcha_pool
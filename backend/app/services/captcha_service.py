@@ -10,12 +10,33 @@ import uuid
 from datetime import datetime, timedelta
 from io import BytesIO
 import base64
-from PIL import Image, ImageDraw, ImageFont, ImageFilter
+from functools import lru_cache
+from sqlalchemy import delete
 from sqlalchemy.orm import Session
 from typing import Tuple
 
+from app.core.config import settings
 from app.models.captcha_session import CaptchaSession
 
+FONT_PATHS = [
+    '/System/Library/Fonts/Supplemental/Arial.ttf',  # macOS
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf',  # Linux
+    '/Library/Fonts/Arial.ttf',  # macOS alternative
+]
+
+
+@lru_cache(maxsize=1)
+def _load_font():
+    """Load the captcha font once per process, fallback to default if not available."""
+    from PIL import ImageFont
+
+    for font_path in FONT_PATHS:
+        try:
+            return ImageFont.truetype(font_path, 36)
+        except OSError:
+            continue
+    return ImageFont.load_default()
+
 
 class CaptchaService:
     """Service for generating and verifying captchas."""
@@ -41,27 +62,14 @@ class CaptchaService:
         Returns:
             Base64-encoded PNG image
         """
+        # PIL 只在渲染时导入（通常在验证码池的渲染进程中），不拖慢 app 启动
+        from PIL import Image, ImageDraw, ImageFilter
+
         # Create image with white background
         image = Image.new('RGB', (CaptchaService.IMAGE_WIDTH, CaptchaService.IMAGE_HEIGHT), 'white')
         draw = ImageDraw.Draw(image)
 
-        # Try to load a font, fallback to default if not available
-        try:
-            # Try common font paths for macOS and Linux
-            for font_path in [
-                '/System/Library/Fonts/Supplemental/Arial.ttf',  # macOS
-                '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf',  # Linux
-                '/Library/Fonts/Arial.ttf',  # macOS alternative
-            ]:
-                try:
-                    font = ImageFont.truetype(font_path, 36)
-                    break
-                except:
-                    continue
-            else:
-                font = ImageFont.load_default()
-        except:
-            font = ImageFont.load_default()
+        font = _load_font()
 
         # Draw noise lines
         for _ in range(5):
@@ -102,6 +110,26 @@ class CaptchaService:
 
         return image_base64
 
+    @staticmethod
+    def render_captcha() -> Tuple[str, str]:
+        """Generate a random captcha text and its rendered image."""
+        text = CaptchaService.generate_captcha_text()
+        return text, CaptchaService.generate_captcha_image(text)
+
+    @staticmethod
+    def next_captcha() -> Tuple[str, str]:
+        """
+        Get a (text, image_base64) pair, taken from the pre-rendered pool when enabled.
+
+        Falls back to rendering in the request thread when the pool is empty or not running.
+        """
+        if settings.CAPTCHA_POOL_ENABLED:
+            from app.services.captcha_pool import get_captcha_pool
+            pooled = get_captcha_pool().pop()
+            if pooled is not None:
+                return pooled
+        return CaptchaService.render_captcha()
+
     @staticmethod
     def create_captcha_session(db: Session) -> Tuple[str, str, int]:
         """
@@ -110,16 +138,23 @@ class CaptchaService:
         Args:
             db: Database session
 
+        In token mode (CAPTCHA_MODE=token) the session_id is a signed token
+        and nothing is written to the database.
+
         Returns:
             Tuple of (session_id, image_base64, expires_in_seconds)
         """
-        # Clean up expired sessions
-        CaptchaService.cleanup_expired_sessions(db)
+        expires_in = CaptchaService.CAPTCHA_EXPIRY_MINUTES * 60
+
+        if settings.CAPTCHA_MODE == "token":
+            from app.services.captcha_token import issue_token
+            captcha_text, image_base64 = CaptchaService.next_captcha()
+            return issue_token(captcha_text, expires_in), image_base64, expires_in
 
-        # Generate captcha
+        # Expired sessions are purged by the maintenance scheduler (app/services/scheduler.py)
+        # Generate captcha (pre-rendered pool first, render inline on miss)
         session_id = str(uuid.uuid4())
-        captcha_text = CaptchaService.generate_captcha_text()
-        image_base64 = CaptchaService.generate_captcha_image(captcha_text)
+        captcha_text, image_base64 = CaptchaService.next_captcha()
 
         # Save to database
         expires_at = datetime.utcnow() + timedelta(minutes=CaptchaService.CAPTCHA_EXPIRY_MINUTES)
@@ -131,7 +166,6 @@ class CaptchaService:
         db.add(captcha_session)
         db.commit()
 
-        expires_in = CaptchaService.CAPTCHA_EXPIRY_MINUTES * 60
         return session_id, image_base64, expires_in
 
     @staticmethod
@@ -147,9 +181,36 @@ class CaptchaService:
         Returns:
             True if captcha is valid, False otherwise
         """
-        # Find session
-        captcha_session = db.query(CaptchaSession).filter(
-            CaptchaSession.session_id == session_id
+        is_valid = CaptchaService.consume_captcha(db, session_id, user_input)
+        db.commit()
+        return is_valid
+
+    @staticmethod
+    def consume_captcha(db: Session, session_id: str, user_input: str) -> bool:
+        """
+        Verify captcha input and consume the captcha without committing.
+
+        DELETE ... RETURNING removes the session and reads the answer in one statement,
+        so a captcha can only be used once even under concurrent requests
+        (one-time use applies whether the answer is right or wrong).
+
+        Args:
+            db: Database session
+            session_id: Captcha session ID
+            user_input: User's captcha input
+
+        Returns:
+            True if captcha is valid, False otherwise
+        """
+        if settings.CAPTCHA_MODE == "token":
+            from app.services.captcha_token import verify_token
+            return verify_token(session_id, user_input)
+
+        captcha_session = db.execute(
+            delete(CaptchaSession)
+            .where(CaptchaSession.session_id == session_id)
+            .returning(CaptchaSession.captcha_text, CaptchaSession.expires_at)
+            .execution_options(synchronize_session=False)
         ).first()
 
         if not captcha_session:
@@ -157,23 +218,16 @@ class CaptchaService:
 
         # Check expiry
         if datetime.utcnow() > captcha_session.expires_at:
-            db.delete(captcha_session)
-            db.commit()
             return False
 
         # Verify text (case-insensitive)
-        is_valid = captcha_session.captcha_text.lower() == user_input.lower()
-
-        # Delete session after verification (one-time use)
-        db.delete(captcha_session)
-        db.commit()
-
-        return is_valid
+        return captcha_session.captcha_text.lower() == user_input.lower()
 
     @staticmethod
-    def cleanup_expired_sessions(db: Session) -> None:
-        """Clean up expired captcha sessions."""
-        db.query(CaptchaSession).filter(
+    def cleanup_expired_sessions(db: Session) -> int:
+        """Clean up expired captcha sessions, returns the number of deleted rows."""
+        deleted = db.query(CaptchaSession).filter(
             CaptchaSession.expires_at < datetime.utcnow()
-        ).delete()
+        ).delete(synchronize_session=False)
         db.commit()
+        return deleted
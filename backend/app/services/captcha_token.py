@@ -0,0 +1,185 @@
+"""
+Captcha Token
+
+无状态验证码（CAPTCHA_MODE=token）：
+- 生成时不写库，返回签名 token 作为 session_id：
+      v1.<expires_at>.<nonce>.<answer_hash>.<signature>
+  answer_hash = HMAC(key, nonce | answer)，以 nonce 为盐，token 中不含明文答案
+  signature   = HMAC(key, v1.<expires_at>.<nonce>.<answer_hash>)
+- 校验时重新计算签名和 answer_hash，同样不访问数据库
+- 一次性使用：nonce 在校验时写入重放集合（无论答案对错），过期后自动淘汰
+  - memory: 进程内 dict（单 worker）
+  - file: CAPTCHA_REPLAY_DIR 下用 O_CREAT | O_EXCL 创建文件（同一台机器上的多个 worker 共享）
+"""
+
+import base64
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+TOKEN_VERSION = "v1"
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _signing_key() -> bytes:
+    """验证码专用密钥；未单独配置时从 SECRET_KEY 派生，避免与 JWT 共用同一个 key"""
+    secret = settings.CAPTCHA_TOKEN_SECRET or settings.SECRET_KEY
+    return hmac.new(secret.encode("utf-8"), b"captcha-token", hashlib.sha256).digest()
+
+
+def answer_hash(nonce: str, answer: str, key: Optional[bytes] = None) -> str:
+    """以 nonce 为盐计算答案的 HMAC（忽略大小写）"""
+    key = key or _signing_key()
+    message = f"answer|{nonce}|{answer.strip().lower()}".encode("utf-8")
+    return _b64(hmac.new(key, message, hashlib.sha256).digest()[:16])
+
+
+def _sign(payload: str, key: bytes) -> str:
+    return _b64(hmac.new(key, f"token|{payload}".encode("utf-8"), hashlib.sha256).digest())
+
+
+def issue_token(answer: str, ttl_seconds: int) -> str:
+    """签发验证码 token"""
+    key = _signing_key()
+    expires_at = int(time.time()) + ttl_seconds
+    nonce = _b64(secrets.token_bytes(12))
+    payload = f"{TOKEN_VERSION}.{expires_at}.{nonce}.{answer_hash(nonce, answer, key)}"
+    return f"{payload}.{_sign(payload, key)}"
+
+
+def parse_token(token: str) -> Optional[Dict]:
+    """校验签名和有效期，返回 {expires_at, nonce, answer_hash}；无效时返回 None"""
+    parts = token.split(".")
+    if len(parts) != 5 or parts[0] != TOKEN_VERSION:
+        return None
+
+    payload, signature = token.rsplit(".", 1)
+    if not hmac.compare_digest(signature, _sign(payload, _signing_key())):
+        return None
+
+    try:
+        expires_at = int(parts[1])
+    except ValueError:
+        return None
+    if time.time() > expires_at:
+        return None
+
+    return {"expires_at": expires_at, "nonce": parts[2], "answer_hash": parts[3]}
+
+
+def verify_token(token: str, user_input: str) -> bool:
+    """校验 token 和答案，并消耗 nonce（一次性使用）"""
+    claims = parse_token(token)
+    if claims is None:
+        return False
+
+    # 先占用 nonce：同一个 token 只能校验一次，答错也不能重试
+    if not get_replay_store().claim(claims["nonce"], claims["expires_at"]):
+        logger.warning("Captcha token replay rejected")
+        return False
+
+    return hmac.compare_digest(claims["answer_hash"], answer_hash(claims["nonce"], user_input))
+
+
+# ===== 重放集合 =====
+
+class MemoryReplayStore:
+    """进程内重放集合"""
+
+    def __init__(self, sweep_interval: float = 60.0):
+        self._seen: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._sweep_interval = sweep_interval
+        self._next_sweep = time.time() + sweep_interval
+
+    def claim(self, nonce: str, expires_at: int) -> bool:
+        """记录 nonce；已存在时返回 False"""
+        now = time.time()
+        with self._lock:
+            if now >= self._next_sweep:
+                self._evict(now)
+            if nonce in self._seen:
+                return False
+            self._seen[nonce] = expires_at
+            return True
+
+    def _evict(self, now: float):
+        expired = [nonce for nonce, expires_at in self._seen.items() if expires_at < now]
+        for nonce in expired:
+            del self._seen[nonce]
+        self._next_sweep = now + self._sweep_interval
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+
+class FileReplayStore:
+    """
+    基于本地目录的重放集合（多个 worker 进程共享）
+
+    每个 nonce 一个空文件，O_CREAT | O_EXCL 保证只有一个进程能创建成功；
+    文件 mtime 设为 token 过期时间，过期后被淘汰。
+    """
+
+    def __init__(self, directory: str, sweep_interval: float = 60.0):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._sweep_interval = sweep_interval
+        self._next_sweep = 0.0
+        self._sweep_lock = threading.Lock()
+
+    def claim(self, nonce: str, expires_at: int) -> bool:
+        now = time.time()
+        if now >= self._next_sweep:
+            self._evict(now)
+
+        path = self.directory / nonce
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600)
+        except FileExistsError:
+            return False
+        os.close(fd)
+        os.utime(path, (expires_at, expires_at))
+        return True
+
+    def _evict(self, now: float):
+        if not self._sweep_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_sweep = now + self._sweep_interval
+            for entry in os.scandir(self.directory):
+                try:
+                    if entry.is_file() and entry.stat().st_mtime < now:
+                        os.unlink(entry.path)
+                except FileNotFoundError:
+                    # 另一个 worker 已经删除
+                    continue
+        finally:
+            self._sweep_lock.release()
+
+
+_replay_store = None
+
+
+def get_replay_store():
+    """获取全局重放集合单例"""
+    global _replay_store
+    if _replay_store is None:
+        if settings.CAPTCHA_REPLAY_STORE == "file":
+            _replay_store = FileReplayStore(settings.CAPTCHA_REPLAY_DIR)
+        else:
+            _replay_store = MemoryReplayStore()
+    return _replay_store
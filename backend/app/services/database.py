@@ -1,3 +1,5 @@
+import os
+import threading
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
@@ -16,3 +18,46 @@ def get_db() -> Generator:
         yield db
     finally:
         db.close()
+
+
+# Agno 会话存储（所有 agent 共用一个实例和连接池）
+_agno_db = None
+_agno_db_lock = threading.Lock()
+
+
+def get_agno_db():
+    """获取 Agno 数据库（PostgresDb / SqliteDb）单例"""
+    global _agno_db
+    if _agno_db is None:
+        with _agno_db_lock:
+            if _agno_db is None:
+                if settings.agno_database_url.startswith("postgresql"):
+                    from agno.db.postgres import PostgresDb
+                    _agno_db = PostgresDb(db_url=settings.agno_database_url)
+                else:
+                    # SQLite
+                    from agno.db.sqlite import SqliteDb
+                    _agno_db = SqliteDb(db_file=settings.agno_database_url.replace("sqlite:///", ""))
+    return _agno_db
+
+
+def _discard_inherited_connections():
+    """
+    fork 出的子进程不能使用父进程的连接（gunicorn preload_app）：丢弃连接池但不关闭，
+    父进程的连接不受影响，子进程按需重新建立
+    """
+    global _agno_db_lock
+    _agno_db_lock = threading.Lock()
+    engine.dispose(close=False)
+    if _agno_db is not None:
+        _agno_db.db_engine.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=_discard_inherited_connections)
+
+
+def dispose_engines():
+    """关闭连接池（进程退出前调用）"""
+    engine.dispose()
+    if _agno_db is not None:
+        _agno_db.close()
@@ -1,12 +1,24 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from datetime import datetime
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import Float, and_, case, cast, desc, func, insert, or_, select, tuple_, update
+from app.core.pagination import decode_cursor, encode_cursor
 from app.models.emo_score import EmoScore, EmoScoreSource
-from typing import Optional
+from typing import Dict, List, Optional, Sequence, Tuple
 
 
 class EmoScoreService:
     """情绪分数评估服务"""
 
+    # 列表接口 fields= 可选的字段（id 和 created_at 总是返回）
+    SCORE_FIELDS = ("stress_score", "stable_score", "anxiety_score", "functional_score")
+
+    LIST_FIELDS = (
+        "user_id",
+        "stress_score", "stable_score", "anxiety_score", "functional_score",
+        "stress_score_change", "stable_score_change", "anxiety_score_change", "functional_score_change",
+        "source", "session_id",
+    )
+
     @staticmethod
     def create_score(
         db: Session,
@@ -143,3 +155,170 @@ class EmoScoreService:
             EmoScore.id == score_id,
             EmoScore.user_id == user_id
         ).first()
+
+    @staticmethod
+    def list_scores(
+        db: Session,
+        user_id: int,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        source: Optional[EmoScoreSource] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+        fields: Optional[Sequence[str]] = None
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """
+        按 (created_at, id) 倒序分页获取评估记录
+
+        - keyset 分页：下一页条件为 (created_at, id) < 上一页最后一行，
+          由 (user_id, created_at, id) 复合索引直接定位，与历史长度无关
+        - 只查询需要的列，返回轻量 dict 而不是 ORM 对象
+        - 游标只携带最后一行的 id，比较时用子查询取出该行的 (created_at, id)，
+          避免时间戳在绑定参数里的格式与库中存储格式不一致（如 SQLite）
+
+        Args:
+            db: 数据库会话
+            user_id: 用户 ID
+            limit: 每页条数
+            cursor: 上一页返回的 next_cursor
+            source: 筛选评估来源
+            created_from: 只返回该时间（含）之后的记录
+            created_to: 只返回该时间之前的记录
+            fields: 需要返回的字段（默认全部 LIST_FIELDS）
+
+        Returns:
+            (items, next_cursor)，最后一页 next_cursor 为 None
+
+        Raises:
+            ValueError: 游标或字段名无效
+        """
+        fields = list(EmoScoreService.LIST_FIELDS if not fields else fields)
+        unknown = [name for name in fields if name not in EmoScoreService.LIST_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+
+        columns = [EmoScore.id, EmoScore.created_at] + [getattr(EmoScore, name) for name in fields]
+        query = select(*columns).where(EmoScore.user_id == user_id)
+
+        if source:
+            query = query.where(EmoScore.source == source)
+        if created_from is not None:
+            query = query.where(EmoScore.created_at >= created_from)
+        if created_to is not None:
+            query = query.where(EmoScore.created_at < created_to)
+        if cursor:
+            (last_id,) = decode_cursor(cursor, int)
+            last = aliased(EmoScore)
+            last_created_at = (
+                select(last.created_at)
+                .where(last.id == last_id, last.user_id == user_id)
+                .scalar_subquery()
+            )
+            query = query.where(tuple_(EmoScore.created_at, EmoScore.id) < tuple_(last_created_at, last_id))
+
+        rows = db.execute(
+            query.order_by(desc(EmoScore.created_at), desc(EmoScore.id)).limit(limit + 1)
+        ).all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1].id)
+        return [row._asdict() for row in rows], next_cursor
+
+    @staticmethod
+    def bulk_create_scores(db: Session, items: List[Dict]) -> List[int]:
+        """
+        批量写入评估记录，在数据库中用窗口函数计算变化率
+
+        一个事务内两条语句：
+        1. 批量 INSERT 所有记录（变化率留空），RETURNING id
+        2. 一条 UPDATE ... FROM，用 LAG() OVER (PARTITION BY user_id ORDER BY created_at, id)
+           取每条记录的上一条，计算四个变化率
+
+        支持导入历史数据：新记录插在已有记录中间时，排在其后的已有记录的变化率也会重新计算。
+        变化率公式与 create_score 相同: (本次 - 上次) / 上次，任一为空或上次为 0 时为 None。
+
+        Args:
+            db: 数据库会话
+            items: 每项包含 user_id、source，以及可选的四个分数、session_id、created_at（默认当前时间）
+
+        Returns:
+            新记录的 id（与 items 顺序一致）
+        """
+        if not items:
+            return []
+
+        now = datetime.utcnow()
+        rows = []
+        for item in items:
+            row = {
+                "user_id": item["user_id"],
+                "source": item["source"],
+                "session_id": item.get("session_id"),
+                "created_at": item.get("created_at") or now,
+            }
+            for name in EmoScoreService.SCORE_FIELDS:
+                row[name] = item.get(name)
+            rows.append(row)
+
+        # 每个用户新数据的最早时间，以及在此之前的最后一条已有记录的时间（窗口从这里开始就够了）
+        earliest: Dict[int, datetime] = {}
+        for row in rows:
+            if row["user_id"] not in earliest or row["created_at"] < earliest[row["user_id"]]:
+                earliest[row["user_id"]] = row["created_at"]
+        previous = dict(db.execute(
+            select(EmoScore.user_id, func.max(EmoScore.created_at))
+            .where(or_(*[
+                and_(EmoScore.user_id == user_id, EmoScore.created_at < start)
+                for user_id, start in earliest.items()
+            ]))
+            .group_by(EmoScore.user_id)
+        ).all())
+
+        try:
+            ids = list(db.scalars(
+                insert(EmoScore).returning(EmoScore.id, sort_by_parameter_order=True),
+                rows
+            ))
+
+            window_rows = or_(*[
+                and_(EmoScore.user_id == user_id, EmoScore.created_at >= previous.get(user_id, start))
+                for user_id, start in earliest.items()
+            ])
+            ordering = {"partition_by": EmoScore.user_id, "order_by": (EmoScore.created_at, EmoScore.id)}
+            computed = (
+                select(
+                    EmoScore.id,
+                    *[func.lag(getattr(EmoScore, name)).over(**ordering).label(f"prev_{name}")
+                      for name in EmoScoreService.SCORE_FIELDS]
+                )
+                .where(window_rows)
+                .subquery()
+            )
+
+            def change_rate(name: str):
+                current = getattr(EmoScore, name)
+                prev = getattr(computed.c, f"prev_{name}")
+                return case(
+                    (and_(current.is_not(None), prev.is_not(None), prev != 0),
+                     cast(current - prev, Float) / prev),
+                    else_=None
+                )
+
+            targets = or_(*[
+                and_(EmoScore.user_id == user_id, EmoScore.created_at >= start)
+                for user_id, start in earliest.items()
+            ])
+            db.execute(
+                update(EmoScore)
+                .where(EmoScore.id == computed.c.id, targets)
+                .values({f"{name}_change": change_rate(name) for name in EmoScoreService.SCORE_FIELDS})
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        return ids
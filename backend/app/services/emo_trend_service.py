@@ -0,0 +1,318 @@
+"""
+Emo Trend Service
+
+情绪分数趋势分析（GET /api/emo-score/trends）：
+- 一次查询加载用户的整条时间序列（只取需要的列），转成 (n, 4) 的 NumPy 数组
+- 向量化计算：移动平均、EWMA、最近 N 次评估的斜率（每天）、波动率、
+  首次 onboarding 评估与最近一次 session 评估之间的差值
+- 可选按等长分桶降采样到 N 个点，方便画图
+- 结果按 (用户, 参数, 最新 created_at, 记录数) 缓存在进程内 LRU 中；
+  新增评估后最新 created_at 变化，缓存自然失效
+
+缺失的分数记为 NaN，所有统计量都跳过缺失值。
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.emo_score import EmoScore, EmoScoreSource
+
+logger = logging.getLogger(__name__)
+
+DIMENSIONS = ("stress_score", "stable_score", "anxiety_score", "functional_score")
+SECONDS_PER_DAY = 86400.0
+
+
+# ===== 向量化计算 =====
+
+def moving_average(values: np.ndarray, window: int) -> np.ndarray:
+    """按列计算尾随移动平均（窗口内跳过 NaN；窗口内全为 NaN 时结果为 NaN）"""
+    valid = ~np.isnan(values)
+    filled = np.where(valid, values, 0.0)
+    zeros = np.zeros((1, values.shape[1]))
+    sums = np.cumsum(np.vstack([zeros, filled]), axis=0)
+    counts = np.cumsum(np.vstack([zeros, valid.astype(float)]), axis=0)
+
+    upper = np.arange(1, len(values) + 1)
+    lower = np.maximum(upper - window, 0)
+    window_sums = sums[upper] - sums[lower]
+    window_counts = counts[upper] - counts[lower]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(window_counts > 0, window_sums / window_counts, np.nan)
+
+
+def ewma(values: np.ndarray, alpha: float) -> np.ndarray:
+    """
+    按列计算指数加权移动平均 y_t = alpha * x_t + (1 - alpha) * y_{t-1}，缺失值处保持上一个值
+
+    记 d = 1 - alpha，k_t 为截至 t 的有效点数，则闭式解为
+        y_t = d^k_t * (y_0 + alpha * Σ_{有效 i<=t} x_i / d^k_i)
+    可以用 cumsum 向量化。d^-k 会指数增长，所以按块计算，每块以上一块的末值为初值。
+    """
+    n, columns = values.shape
+    result = np.full((n, columns), np.nan)
+    if n == 0:
+        return result
+
+    decay = 1.0 - alpha
+    # 保证 d^-chunk 不超过 1e200
+    chunk = max(1, min(n, int(200 / max(-np.log10(decay), 1e-12))))
+
+    previous = np.full(columns, np.nan)
+    for start in range(0, n, chunk):
+        block = values[start:start + chunk]
+        valid = ~np.isnan(block)
+        # 初值：上一块的末值；序列开头（或之前全是缺失值）用本块第一个有效值，
+        # 这样第一个有效点的结果正好等于它本身
+        first_valid = block[np.argmax(valid, axis=0), np.arange(columns)]
+        seed = np.where(np.isnan(previous), first_valid, previous)
+
+        k = np.cumsum(valid, axis=0).astype(float)
+        accumulated = np.cumsum(np.where(valid, alpha * block * decay ** -k, 0.0), axis=0)
+        block_result = decay ** k * (seed + accumulated)
+        # 还没有出现过有效值的位置为 NaN
+        block_result[np.isnan(previous) & (k == 0)] = np.nan
+
+        result[start:start + len(block)] = block_result
+        previous = block_result[-1]
+    return result
+
+
+def slopes(days: np.ndarray, values: np.ndarray, window: int) -> np.ndarray:
+    """
+    最近 window 次评估的最小二乘斜率（分数/天），按列计算
+
+    有效点少于 2 个或时间跨度为 0 时为 NaN。
+    """
+    x = days[-window:, None]
+    y = values[-window:]
+    valid = ~np.isnan(y)
+    count = valid.sum(axis=0)
+
+    x_mean = np.where(valid, x, 0.0).sum(axis=0) / np.maximum(count, 1)
+    y_mean = np.where(valid, y, 0.0).sum(axis=0) / np.maximum(count, 1)
+    dx = np.where(valid, x - x_mean, 0.0)
+    dy = np.where(valid, y - y_mean, 0.0)
+    denominator = (dx * dx).sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        slope = (dx * dy).sum(axis=0) / denominator
+    return np.where((count >= 2) & (denominator > 0), slope, np.nan)
+
+
+def volatility(values: np.ndarray) -> np.ndarray:
+    """相邻两次有效评估之间变化量的标准差，按列计算"""
+    result = np.full(values.shape[1], np.nan)
+    for column in range(values.shape[1]):
+        series = values[:, column]
+        changes = np.diff(series[~np.isnan(series)])
+        if len(changes) >= 2:
+            result[column] = changes.std(ddof=1)
+    return result
+
+
+def downsample(timestamps: np.ndarray, matrices: Sequence[np.ndarray], points: int):
+    """
+    按等长分桶降采样：每个桶取时间戳和各值的均值（跳过 NaN）
+
+    Returns:
+        (timestamps, [matrix, ...])
+    """
+    n = len(timestamps)
+    if points >= n:
+        return timestamps, list(matrices)
+
+    starts = np.linspace(0, n, points, endpoint=False).astype(int)
+    sizes = np.diff(np.append(starts, n))
+    bucket_timestamps = np.add.reduceat(timestamps, starts) / sizes
+
+    bucketed = []
+    for matrix in matrices:
+        valid = ~np.isnan(matrix)
+        sums = np.add.reduceat(np.where(valid, matrix, 0.0), starts, axis=0)
+        counts = np.add.reduceat(valid.astype(float), starts, axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            bucketed.append(np.where(counts > 0, sums / counts, np.nan))
+    return bucket_timestamps, bucketed
+
+
+def _to_list(array: np.ndarray) -> List[Optional[float]]:
+    """NaN 转 None，保留 2 位小数"""
+    return [None if np.isnan(value) else round(float(value), 2) for value in array]
+
+
+def _to_float(value) -> Optional[float]:
+    return None if value is None or np.isnan(value) else round(float(value), 4)
+
+
+# ===== 进程内缓存 =====
+
+class _TrendCache:
+    """线程安全的 LRU 缓存"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items: "OrderedDict[Hashable, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Dict]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item
+
+    def put(self, key: Hashable, value: Dict):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+_trend_cache = _TrendCache(settings.EMO_TRENDS_CACHE_SIZE)
+
+
+class EmoTrendService:
+    """情绪分数趋势分析服务"""
+
+    @staticmethod
+    def _series_version(db: Session, user_id: int, source: Optional[EmoScoreSource]) -> Tuple:
+        """(最新 created_at, 记录数)，用作缓存版本"""
+        query = db.query(func.max(EmoScore.created_at), func.count(EmoScore.id)).filter(
+            EmoScore.user_id == user_id
+        )
+        if source:
+            query = query.filter(EmoScore.source == source)
+        return tuple(query.one())
+
+    @staticmethod
+    def _load_series(db: Session, user_id: int, source: Optional[EmoScoreSource]):
+        """一次查询加载整条序列（按时间正序）"""
+        columns = [getattr(EmoScore, name) for name in DIMENSIONS]
+        query = db.query(EmoScore.created_at, EmoScore.source, *columns).filter(EmoScore.user_id == user_id)
+        if source:
+            query = query.filter(EmoScore.source == source)
+        rows = query.order_by(EmoScore.created_at, EmoScore.id).all()
+
+        # created_at 是不带时区的 UTC 时间
+        timestamps = np.array([row[0].replace(tzinfo=timezone.utc).timestamp() for row in rows], dtype=float)
+        sources = np.array([row[1].value if hasattr(row[1], "value") else row[1] for row in rows], dtype=object)
+        values = np.array(
+            [[np.nan if value is None else value for value in row[2:]] for row in rows], dtype=float
+        ).reshape(len(rows), len(DIMENSIONS))
+        return timestamps, sources, values
+
+    @staticmethod
+    def get_trends(
+        db: Session,
+        user_id: int,
+        source: Optional[EmoScoreSource] = None,
+        window: int = 3,
+        ewma_alpha: float = 0.3,
+        slope_windows: Sequence[int] = (3, 7),
+        points: Optional[int] = None
+    ) -> Dict:
+        """
+        计算用户的情绪分数趋势
+
+        Args:
+            db: 数据库会话
+            user_id: 用户 ID
+            source: 只使用某个来源的评估（默认全部）
+            window: 移动平均窗口（评估次数）
+            ewma_alpha: EWMA 平滑系数，越大越贴近最新值
+            slope_windows: 计算斜率的窗口（最近 N 次评估），斜率单位为 分数/天
+            points: 返回的序列最多 N 个点（超过时分桶降采样）
+
+        Returns:
+            与 EmoTrendResponse 对应的 dict
+        """
+        slope_windows = tuple(sorted(set(slope_windows)))
+        latest_created_at, total = EmoTrendService._series_version(db, user_id, source)
+        key = (user_id, source, window, ewma_alpha, slope_windows, points, latest_created_at, total)
+        cached = _trend_cache.get(key)
+        if cached is not None:
+            return cached
+
+        timestamps, sources, values = EmoTrendService._load_series(db, user_id, source)
+        result = EmoTrendService._compute(
+            timestamps, sources, values, window, ewma_alpha, slope_windows, points
+        )
+        result["latest_created_at"] = latest_created_at
+        _trend_cache.put(key, result)
+        return result
+
+    @staticmethod
+    def _compute(timestamps: np.ndarray, sources: np.ndarray, values: np.ndarray, window: int,
+                 ewma_alpha: float, slope_windows: Tuple[int, ...], points: Optional[int]) -> Dict:
+        total = len(timestamps)
+        moving = moving_average(values, window)
+        smoothed = ewma(values, ewma_alpha)
+        days = (timestamps - timestamps[0]) / SECONDS_PER_DAY if total else timestamps
+        slope_by_window = {w: slopes(days, values, w) for w in slope_windows} if total else {}
+        spread = volatility(values)
+
+        # onboarding 基线（第一次 onboarding 评估）与最近一次 session 评估
+        onboarding_rows = np.flatnonzero(sources == EmoScoreSource.ONBOARDING.value)
+        session_rows = np.flatnonzero(sources == EmoScoreSource.SESSION.value)
+        baseline = values[onboarding_rows[0]] if len(onboarding_rows) else np.full(len(DIMENSIONS), np.nan)
+        latest_session = values[session_rows[-1]] if len(session_rows) else np.full(len(DIMENSIONS), np.nan)
+        delta = latest_session - baseline
+        with np.errstate(invalid="ignore", divide="ignore"):
+            delta_rate = np.where(baseline > 0, delta / baseline, np.nan)
+
+        dimensions = []
+        for column, name in enumerate(DIMENSIONS):
+            series = values[:, column]
+            valid = series[~np.isnan(series)]
+            dimensions.append({
+                "name": name,
+                "latest": _to_float(valid[-1]) if len(valid) else None,
+                "moving_average": _to_float(moving[-1, column]) if total else None,
+                "ewma": _to_float(smoothed[-1, column]) if total else None,
+                "slopes": {str(w): _to_float(slope_by_window[w][column]) for w in slope_windows} if total else {},
+                "volatility": _to_float(spread[column]),
+                "onboarding": _to_float(baseline[column]),
+                "latest_session": _to_float(latest_session[column]),
+                "delta": _to_float(delta[column]),
+                "delta_rate": _to_float(delta_rate[column]),
+            })
+
+        series_timestamps, (series_values, series_moving, series_ewma) = (
+            downsample(timestamps, [values, moving, smoothed], points)
+            if points and total else (timestamps, [values, moving, smoothed])
+        )
+
+        return {
+            "total": total,
+            "window": window,
+            "ewma_alpha": ewma_alpha,
+            "slope_windows": list(slope_windows),
+            "downsampled": bool(points and total > points),
+            "dimensions": dimensions,
+            "series": {
+                "timestamps": [
+                    datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None) for ts in series_timestamps
+                ],
+                "values": {name: _to_list(series_values[:, i]) for i, name in enumerate(DIMENSIONS)},
+                "moving_average": {name: _to_list(series_moving[:, i]) for i, name in enumerate(DIMENSIONS)},
+                "ewma": {name: _to_list(series_ewma[:, i]) for i, name in enumerate(DIMENSIONS)},
+            },
+        }
@@ -4,13 +4,23 @@ Invitation Service
 Handles invitation code generation, verification, and management.
 """
 
-import random
+import csv
+import io
+import json
+import logging
+import secrets
 import string
 from datetime import datetime
+from sqlalchemy import case, func, or_, select, text, update
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Iterable, Iterator, List, Optional, Tuple
 
+from app.core.config import settings
+from app.core.pagination import decode_cursor, encode_cursor
 from app.models.invitation_code import InvitationCode
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
 
 
 class InvitationService:
@@ -18,12 +28,87 @@ class InvitationService:
 
     CODE_LENGTH = 8
     UNIVERSAL_CODE = "WuSY_940315"
+    CODE_CHARS = string.ascii_uppercase + string.digits
+
+    BULK_BATCH_SIZE = 1000
+    # 36^8 ≈ 2.8e12，正常情况下第一轮就能全部插入；补齐轮数只是防止死循环
+    BULK_MAX_ROUNDS = 10
+    EXPORT_FIELDS = ("id", "code", "created_at")
 
     @staticmethod
     def generate_code() -> str:
-        """Generate a random 8-character invitation code (digits + uppercase letters)."""
-        chars = string.ascii_uppercase + string.digits
-        return ''.join(random.choices(chars, k=InvitationService.CODE_LENGTH))
+        """Generate a random 8-character invitation code (digits + uppercase letters) with a CSPRNG."""
+        return ''.join(secrets.choice(InvitationService.CODE_CHARS) for _ in range(InvitationService.CODE_LENGTH))
+
+    @staticmethod
+    def _insert_ignore_conflicts(db: Session, codes: List[str]) -> list:
+        """
+        INSERT ... ON CONFLICT (code) DO NOTHING RETURNING id, code, created_at
+
+        Returns only the rows that were actually inserted.
+        """
+        if db.get_bind().dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+
+        stmt = (
+            insert(InvitationCode)
+            .values([{"code": code, "is_universal": False, "is_used": False} for code in codes])
+            .on_conflict_do_nothing(index_elements=["code"])
+            .returning(InvitationCode.id, InvitationCode.code, InvitationCode.created_at)
+        )
+        return db.execute(stmt).all()
+
+    @staticmethod
+    def bulk_create_codes(db: Session, count: int, batch_size: int = BULK_BATCH_SIZE) -> list:
+        """
+        Create `count` new single-use invitation codes in one transaction.
+
+        Codes are inserted in batches with ON CONFLICT DO NOTHING; codes that collide
+        with existing ones are simply not returned, and the shortfall is topped up with
+        freshly generated codes in the next round.
+
+        Args:
+            db: Database session
+            count: Number of codes to create
+            batch_size: Rows per INSERT statement
+
+        Returns:
+            List of rows (id, code, created_at), in insertion order
+
+        Raises:
+            RuntimeError: If the codes could not be topped up within BULK_MAX_ROUNDS
+        """
+        created = []
+        try:
+            for _ in range(InvitationService.BULK_MAX_ROUNDS):
+                missing = count - len(created)
+                if missing <= 0:
+                    break
+                # 批内先用 set 去重，冲突只可能来自库里已有的码
+                candidates = set()
+                while len(candidates) < missing:
+                    candidates.add(InvitationService.generate_code())
+                candidates = list(candidates)
+
+                inserted = 0
+                for start in range(0, missing, batch_size):
+                    rows = InvitationService._insert_ignore_conflicts(db, candidates[start:start + batch_size])
+                    created.extend(rows)
+                    inserted += len(rows)
+                if inserted < missing:
+                    logger.info(f"Invitation code collisions: {missing - inserted}, topping up")
+
+            if len(created) < count:
+                raise RuntimeError(f"Only {len(created)}/{count} unique invitation codes could be generated")
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        logger.info(f"Created {len(created)} invitation codes")
+        return created
 
     @staticmethod
     def create_invitation_code(db: Session) -> InvitationCode:
@@ -36,23 +121,34 @@ class InvitationService:
         Returns:
             Created InvitationCode object
         """
-        # Generate unique code
-        while True:
-            code = InvitationService.generate_code()
-            existing = db.query(InvitationCode).filter(InvitationCode.code == code).first()
-            if not existing:
-                break
-
-        invitation = InvitationCode(
-            code=code,
-            is_universal=False,
-            is_used=False
-        )
-        db.add(invitation)
-        db.commit()
-        db.refresh(invitation)
+        row = InvitationService.bulk_create_codes(db, 1)[0]
+        return db.get(InvitationCode, row.id)
 
-        return invitation
+    @staticmethod
+    def iter_export(rows: Iterable, fmt: str = "csv", chunk_size: int = 500) -> Iterator[str]:
+        """
+        Serialize (id, code, created_at) rows as CSV (with header) or NDJSON, in chunks.
+
+        Used by the bulk endpoint (StreamingResponse) and scripts/generate_invitation_codes.py.
+        """
+        buffer = io.StringIO()
+        writer = csv.writer(buffer) if fmt == "csv" else None
+        if writer is not None:
+            writer.writerow(InvitationService.EXPORT_FIELDS)
+
+        for index, row in enumerate(rows, start=1):
+            created_at = row.created_at.isoformat() if row.created_at else None
+            if writer is not None:
+                writer.writerow((row.id, row.code, created_at))
+            else:
+                buffer.write(json.dumps({"id": row.id, "code": row.code, "created_at": created_at}) + "\n")
+            if index % chunk_size == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+
+        if buffer.tell():
+            yield buffer.getvalue()
 
     @staticmethod
     def verify_invitation_code(db: Session, code: str) -> bool:
@@ -78,6 +174,41 @@ class InvitationService:
         # Regular code must be unused
         return not invitation.is_used
 
+    @staticmethod
+    def claim_invitation_code(db: Session, code: str, user_id: int) -> bool:
+        """
+        Atomically redeem an invitation code without committing.
+
+        A single conditional UPDATE ... WHERE (is_universal OR NOT is_used) RETURNING:
+        the row lock taken by the UPDATE guarantees that concurrent registrations
+        redeem a single-use code exactly once. Universal codes match but keep their
+        columns unchanged.
+
+        Args:
+            db: Database session
+            code: Invitation code
+            user_id: ID of user who uses the code
+
+        Returns:
+            True if the code was valid and is now claimed, False otherwise
+        """
+        single_use = InvitationCode.is_universal.is_(False)
+        claimed = db.execute(
+            update(InvitationCode)
+            .where(
+                InvitationCode.code == code,
+                or_(InvitationCode.is_universal.is_(True), InvitationCode.is_used.is_(False))
+            )
+            .values(
+                is_used=case((single_use, True), else_=InvitationCode.is_used),
+                used_by_user_id=case((single_use, user_id), else_=InvitationCode.used_by_user_id),
+                used_at=case((single_use, datetime.utcnow()), else_=InvitationCode.used_at),
+            )
+            .returning(InvitationCode.id)
+            .execution_options(synchronize_session=False)
+        ).first()
+        return claimed is not None
+
     @staticmethod
     def use_invitation_code(db: Session, code: str, user_id: int) -> bool:
         """
@@ -91,31 +222,135 @@ class InvitationService:
         Returns:
             True if successful, False otherwise
         """
-        invitation = db.query(InvitationCode).filter(InvitationCode.code == code).first()
-
-        if not invitation:
+        if not InvitationService.claim_invitation_code(db, code, user_id):
             return False
+        db.commit()
+        return True
 
-        # Don't modify universal codes
-        if invitation.is_universal:
-            return True
+    @staticmethod
+    def _apply_filters(query, status: Optional[str] = None, created_from: Optional[datetime] = None,
+                       created_to: Optional[datetime] = None, code_prefix: Optional[str] = None):
+        """Apply the admin list filters (status: used / unused / universal)."""
+        if status == "used":
+            query = query.where(InvitationCode.is_universal.is_(False), InvitationCode.is_used.is_(True))
+        elif status == "unused":
+            query = query.where(InvitationCode.is_universal.is_(False), InvitationCode.is_used.is_(False))
+        elif status == "universal":
+            query = query.where(InvitationCode.is_universal.is_(True))
+        if created_from is not None:
+            query = query.where(InvitationCode.created_at >= created_from)
+        if created_to is not None:
+            query = query.where(InvitationCode.created_at < created_to)
+        if code_prefix:
+            query = query.where(InvitationCode.code.startswith(code_prefix, autoescape=True))
+        return query
 
-        # Don't allow already-used codes
-        if invitation.is_used:
-            return False
+    @staticmethod
+    def list_codes(
+        db: Session,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        status: Optional[str] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+        code_prefix: Optional[str] = None
+    ) -> Tuple[list, Optional[str]]:
+        """
+        List invitation codes newest first with keyset pagination.
 
-        # Mark as used
-        invitation.is_used = True
-        invitation.used_by_user_id = user_id
-        invitation.used_at = datetime.utcnow()
-        db.commit()
+        Pages on the primary key (id DESC): ids are assigned in insertion order, so this is
+        the created_at order without needing another index. The redeeming user's email is
+        resolved in the same query (LEFT JOIN users).
 
-        return True
+        Args:
+            db: Database session
+            limit: Page size
+            cursor: Opaque cursor from the previous page (None for the first page)
+            status: used / unused / universal
+            created_from: Only codes created at or after this time
+            created_to: Only codes created before this time
+            code_prefix: Only codes starting with this prefix
+
+        Returns:
+            (rows, next_cursor): rows have id, code, is_universal, is_used, used_by_email,
+            used_at, created_at; next_cursor is None on the last page
+
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        query = (
+            select(
+                InvitationCode.id,
+                InvitationCode.code,
+                InvitationCode.is_universal,
+                InvitationCode.is_used,
+                User.email.label("used_by_email"),
+                InvitationCode.used_at,
+                InvitationCode.created_at,
+            )
+            .outerjoin(User, User.id == InvitationCode.used_by_user_id)
+        )
+        query = InvitationService._apply_filters(query, status, created_from, created_to, code_prefix)
+        if cursor:
+            (last_id,) = decode_cursor(cursor, int)
+            query = query.where(InvitationCode.id < last_id)
+
+        rows = db.execute(query.order_by(InvitationCode.id.desc()).limit(limit + 1)).all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1].id)
+        return rows, next_cursor
+
+    @staticmethod
+    def count_codes(
+        db: Session,
+        status: Optional[str] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+        code_prefix: Optional[str] = None
+    ) -> Tuple[int, bool]:
+        """
+        Count invitation codes matching the list filters.
+
+        On Postgres the planner's estimate is used first (pg_class.reltuples without
+        filters, the EXPLAIN row estimate with filters); only when the estimate is below
+        INVITATION_COUNT_EXACT_THRESHOLD an exact COUNT(*) is run.
+
+        Returns:
+            (count, estimated)
+        """
+        query = InvitationService._apply_filters(
+            select(InvitationCode.id), status, created_from, created_to, code_prefix
+        )
+
+        if db.get_bind().dialect.name == "postgresql":
+            filtered = any(value for value in (status, created_from, created_to, code_prefix))
+            estimate = InvitationService._estimate_rows(db, query if filtered else None)
+            if estimate is not None and estimate >= settings.INVITATION_COUNT_EXACT_THRESHOLD:
+                return estimate, True
+
+        exact = db.execute(select(func.count()).select_from(query.subquery())).scalar_one()
+        return exact, False
 
     @staticmethod
-    def get_all_codes(db: Session) -> List[InvitationCode]:
-        """Get all invitation codes with user information."""
-        return db.query(InvitationCode).order_by(InvitationCode.created_at.desc()).all()
+    def _estimate_rows(db: Session, query=None) -> Optional[int]:
+        """Postgres row estimate: pg_class.reltuples for the whole table, EXPLAIN for a filtered query."""
+        if query is None:
+            reltuples = db.execute(
+                text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table)"),
+                {"table": InvitationCode.__tablename__}
+            ).scalar()
+            # -1 表示从未 ANALYZE 过
+            return int(reltuples) if reltuples is not None and reltuples >= 0 else None
+
+        # 用驱动的参数风格直接执行，过滤值仍然作为绑定参数传递
+        compiled = query.compile(dialect=db.get_bind().dialect)
+        plan = db.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
 
     @staticmethod
     def delete_code(db: Session, code_id: int) -> bool:
@@ -0,0 +1,228 @@
+"""
+Lifecycle Manager
+
+进程的优雅退出（滚动重启 / docker stop 时不丢失进行中的对话轮次和会话总结）：
+- 收到 SIGTERM / SIGINT 后进入 draining：新的轮次（发消息、开始 / 结束会话、onboarding 生成）
+  直接返回 503 + Retry-After，由客户端 / 负载均衡重试到其他 worker；/health 返回 503
+- 进行中的轮次用 track_run() 登记，退出前最多等待 SHUTDOWN_DRAIN_TIMEOUT_SECONDS
+- WebSocket 连接在当前轮次结束后以 1012 (Service Restart) 关闭，客户端重连到其他 worker
+- 等待结束后 flush 日志 / span 队列，关闭共享的 HTTP client 和数据库连接池
+
+uvicorn 自己的 SIGTERM 处理（停止监听、等待连接结束）保持不变，这里只是在它之前先标记 draining，
+所以 uvicorn 的 --timeout-graceful-shutdown 需要大于 SHUTDOWN_DRAIN_TIMEOUT_SECONDS。
+"""
+
+import itertools
+import logging
+import signal
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceDraining(Exception):
+    """进程正在退出，不再接受新的轮次（由 main.py 转换为 503 + Retry-After）"""
+
+    def __init__(self, kind: str):
+        super().__init__(f"Server is shutting down, not accepting {kind}")
+        self.kind = kind
+
+
+class LifecycleManager:
+    """draining 状态 + 进行中的轮次登记"""
+
+    def __init__(self):
+        self._draining = threading.Event()
+        self._idle = threading.Condition()
+        self._in_flight: Dict[int, Dict] = {}
+        self._ids = itertools.count(1)
+        self._drain_listeners: List[Callable[[], None]] = []
+        # 信号处理函数会在主线程任意位置执行，锁必须可重入（Condition 默认就是 RLock）
+        self._listeners_lock = threading.RLock()
+        self._signals_installed = False
+
+        self.drain_reason: Optional[str] = None
+        self.rejected = 0
+
+    @property
+    def draining(self) -> bool:
+        return self._draining.is_set()
+
+    # ===== 进行中的轮次 =====
+
+    @contextmanager
+    def track_run(self, kind: str, admit_during_drain: bool = False):
+        """
+        登记一个进行中的轮次（在执行轮次的线程中使用，线程被请求取消后仍会继续计数）
+
+        Args:
+            kind: 轮次类型（日志和统计用）
+            admit_during_drain: draining 时仍然执行（已经开始的工作的后续部分，例如开场白）
+
+        Raises:
+            ServiceDraining: 正在退出且 admit_during_drain=False
+        """
+        run_id = self.begin_run(kind, admit_during_drain)
+        try:
+            yield
+        finally:
+            self.end_run(run_id)
+
+    def begin_run(self, kind: str, admit_during_drain: bool = False) -> int:
+        """
+        登记一个进行中的轮次并返回 run_id，由 end_run(run_id) 结束
+
+        用于登记和执行不在同一处的工作：例如 start_session 在返回前登记开场白，
+        由响应之后的后台任务结束，中间进入 draining 时也会等待它。
+
+        Raises:
+            ServiceDraining: 正在退出且 admit_during_drain=False
+        """
+        with self._idle:
+            if self.draining and not admit_during_drain:
+                self.rejected += 1
+                raise ServiceDraining(kind)
+            run_id = next(self._ids)
+            self._in_flight[run_id] = {"kind": kind, "started_at": time.monotonic()}
+            return run_id
+
+    def end_run(self, run_id: int):
+        """结束 begin_run 登记的轮次（重复调用无影响）"""
+        with self._idle:
+            if self._in_flight.pop(run_id, None) is not None:
+                self._idle.notify_all()
+
+    def in_flight(self) -> int:
+        with self._idle:
+            return len(self._in_flight)
+
+    def wait_idle(self, timeout: float) -> bool:
+        """等待所有进行中的轮次结束，超时返回 False"""
+        deadline = time.monotonic() + timeout
+        with self._idle:
+            while self._in_flight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    # ===== draining =====
+
+    def add_drain_listener(self, listener: Callable[[], None]):
+        """注册进入 draining 时的回调（在信号处理 / 关闭流程中调用，需要线程安全且不阻塞）"""
+        with self._listeners_lock:
+            self._drain_listeners.append(listener)
+
+    def remove_drain_listener(self, listener: Callable[[], None]):
+        with self._listeners_lock:
+            if listener in self._drain_listeners:
+                self._drain_listeners.remove(listener)
+
+    def begin_drain(self, reason: str) -> bool:
+        """进入 draining（可重复调用，只有第一次生效）"""
+        with self._idle:
+            if self.draining:
+                return False
+            self.drain_reason = reason
+            self._draining.set()
+        logger.info(f"[LIFECYCLE] draining ({reason}), in-flight runs: {self.in_flight()}")
+
+        with self._listeners_lock:
+            listeners = list(self._drain_listeners)
+        for listener in listeners:
+            try:
+                listener()
+            except Exception as e:
+                logger.error(f"Drain listener failed: {e}", exc_info=True)
+        return True
+
+    def install_signal_handlers(self):
+        """
+        在 uvicorn 的 SIGTERM / SIGINT 处理之前先进入 draining
+
+        uvicorn 在启动 lifespan 前已用 signal.signal 注册了自己的处理函数，这里包一层并继续调用它。
+        只能在主线程调用（TestClient 等在其他线程运行 lifespan 时跳过）。
+        """
+        if self._signals_installed or threading.current_thread() is not threading.main_thread():
+            return
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            previous = signal.getsignal(sig)
+
+            def handler(signum, frame, previous=previous):
+                self.begin_drain(f"signal {signal.Signals(signum).name}")
+                if callable(previous):
+                    previous(signum, frame)
+                elif previous == signal.SIG_DFL:
+                    signal.signal(signum, signal.SIG_DFL)
+                    signal.raise_signal(signum)
+
+            signal.signal(sig, handler)
+        self._signals_installed = True
+
+    def shutdown(self):
+        """
+        关闭流程（lifespan 退出时调用）：等待进行中的轮次，然后释放共享资源
+        """
+        self.begin_drain("shutdown")
+        started = time.monotonic()
+        if self.wait_idle(settings.SHUTDOWN_DRAIN_TIMEOUT_SECONDS):
+            logger.info(f"[LIFECYCLE] drained in {time.monotonic() - started:.1f}s")
+        else:
+            with self._idle:
+                pending = [run["kind"] for run in self._in_flight.values()]
+            logger.warning(
+                f"[LIFECYCLE] drain timeout after {settings.SHUTDOWN_DRAIN_TIMEOUT_SECONDS}s, "
+                f"abandoning {len(pending)} run(s): {pending}"
+            )
+
+        for name, close in _release_steps():
+            try:
+                close()
+            except Exception as e:
+                logger.error(f"[LIFECYCLE] {name} failed: {e}", exc_info=True)
+        logger.info("[LIFECYCLE] shutdown complete")
+
+    def stats(self) -> Dict:
+        with self._idle:
+            kinds = [run["kind"] for run in self._in_flight.values()]
+        return {
+            "draining": self.draining,
+            "drain_reason": self.drain_reason,
+            "in_flight": len(kinds),
+            "in_flight_kinds": kinds,
+            "rejected": self.rejected,
+        }
+
+
+def _release_steps():
+    """退出前依次执行的清理（先 flush 日志，再关闭连接）"""
+    from app.core.openai_logger import close_logging_http_client, flush_prompt_logger
+    from app.services.database import dispose_engines
+
+    steps = [("flush prompt log", flush_prompt_logger)]
+    if settings.TRACING_ENABLED:
+        from app.core.tracing import get_span_exporter
+        steps.append(("flush spans", get_span_exporter().flush))
+    steps += [
+        ("close HTTP client", close_logging_http_client),
+        ("dispose database pools", dispose_engines),
+    ]
+    return steps
+
+
+# 全局单例
+_manager: Optional[LifecycleManager] = None
+
+
+def get_lifecycle_manager() -> LifecycleManager:
+    """获取全局生命周期管理单例"""
+    global _manager
+    if _manager is None:
+        _manager = LifecycleManager()
+    return _manager
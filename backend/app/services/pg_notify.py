@@ -0,0 +1,162 @@
+"""
+Postgres LISTEN/NOTIFY
+
+多 worker 部署时，各进程内的缓存通过 Postgres 的 NOTIFY 互相失效：
+- 写入方在同一个事务里调用 notify(db, channel, payload)，事务提交后才会投递，
+  回滚则不会发出通知
+- 每个 worker 一个后台线程持有专用连接 LISTEN 所有订阅的 channel，收到通知后调用 handler
+
+连接断开重连期间可能漏掉通知，因此重连成功后会以 payload=None 调用所有 handler，
+由订阅方自行全量失效。非 Postgres 数据库（本地 SQLite 单进程）下不启动监听，notify 为 no-op。
+"""
+
+import logging
+import select
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import text
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# channel -> handler(payload)，payload 为 None 表示可能漏掉了通知
+NotifyHandler = Callable[[Optional[str]], None]
+
+
+def notify(db, channel: str, payload: str = "") -> None:
+    """在当前事务中发出通知（提交后投递；非 Postgres 时忽略）"""
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": channel, "payload": payload})
+
+
+class PgNotifyListener:
+    """后台 LISTEN 线程，把通知分发给订阅的 handler"""
+
+    def __init__(self, poll_timeout: float = 5.0, reconnect_delay: float = 5.0):
+        self.poll_timeout = poll_timeout
+        self.reconnect_delay = reconnect_delay
+        self._handlers: Dict[str, List[NotifyHandler]] = defaultdict(list)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._conn = None
+
+        self.received = 0
+        self.reconnects = 0
+
+    def subscribe(self, channel: str, handler: NotifyHandler):
+        """注册 handler；需要在 start() 之前调用"""
+        self._handlers[channel].append(handler)
+
+    def start(self):
+        from app.services.database import engine
+
+        if engine.dialect.name != "postgresql" or not self._handlers:
+            return
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="pg-notify-listener", daemon=True)
+        self._thread.start()
+        logger.info(f"pg_notify listener started: channels={sorted(self._handlers)}")
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self._close()
+
+    def stats(self) -> Dict:
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "channels": sorted(self._handlers),
+            "received": self.received,
+            "reconnects": self.reconnects,
+        }
+
+    # ===== 监听循环 =====
+
+    def _run(self):
+        first_connect = True
+        while not self._stop.is_set():
+            try:
+                self._connect()
+                if not first_connect:
+                    # 断线期间的通知已经丢失，让订阅方全量失效
+                    self.reconnects += 1
+                    self._dispatch_all(None)
+                first_connect = False
+                while not self._stop.is_set():
+                    for channel, payload in self._wait():
+                        self.received += 1
+                        self._dispatch(channel, payload)
+            except Exception as e:
+                if self._stop.is_set():
+                    break
+                logger.warning(f"[PG_NOTIFY] listener connection lost: {e}")
+                self._close()
+                self._stop.wait(self.reconnect_delay)
+
+    def _connect(self):
+        """用专用的 DBAPI 连接 LISTEN（autocommit，不占用连接池）"""
+        from app.services.database import engine
+
+        raw = engine.raw_connection()
+        # 从池中分离，关闭时真正断开而不是归还
+        raw.detach()
+        conn = raw.driver_connection
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            for channel in self._handlers:
+                cursor.execute(f'LISTEN "{channel}"')
+        self._conn = conn
+
+    def _wait(self):
+        """等待最多 poll_timeout 秒，返回收到的 (channel, payload) 列表"""
+        conn = self._conn
+        if hasattr(conn, "poll"):
+            # psycopg2
+            if select.select([conn], [], [], self.poll_timeout) == ([], [], []):
+                return []
+            conn.poll()
+            notifies = [(n.channel, n.payload) for n in conn.notifies]
+            conn.notifies.clear()
+            return notifies
+        # psycopg 3
+        return [(n.channel, n.payload) for n in conn.notifies(timeout=self.poll_timeout)]
+
+    def _dispatch(self, channel: str, payload: Optional[str]):
+        for handler in self._handlers.get(channel, []):
+            try:
+                handler(payload)
+            except Exception as e:
+                logger.error(f"[PG_NOTIFY] handler for {channel} failed: {e}", exc_info=True)
+
+    def _dispatch_all(self, payload: Optional[str]):
+        for channel in list(self._handlers):
+            self._dispatch(channel, payload)
+
+    def _close(self):
+        if self._conn is None:
+            return
+        try:
+            self._conn.close()
+        except Exception:
+            pass
+        self._conn = None
+
+
+# 全局单例
+_listener: Optional[PgNotifyListener] = None
+
+
+def get_notify_listener() -> PgNotifyListener:
+    """获取全局 LISTEN 线程单例"""
+    global _listener
+    if _listener is None:
+        _listener = PgNotifyListener(poll_timeout=settings.PG_NOTIFY_POLL_SECONDS)
+    return _listener
@@ -9,7 +9,7 @@ logger = logging.getLogger(__name__)
 class PromptLoader:
     """
     系统提示词加载器
-    从 YAML 配置文件中加载 LLM 系统提示词
+    从 YAML 配置文件中加载 LLM 系统提示词；管理后台可编辑的提示词优先使用 PromptStore 中的当前版本
     """
 
     def __init__(self, prompts_dir: Optional[str] = None):
@@ -45,6 +45,15 @@ class PromptLoader:
             FileNotFoundError: 配置文件不存在
             ValueError: 配置文件格式错误或缺少 system_prompt 字段
         """
+        # 管理后台可编辑的提示词以 PromptStore 中当前生效的版本为准
+        from app.services.prompt_store import get_prompt_store
+        store = get_prompt_store()
+        key = store.key_for_file(prompt_file)
+        if key is not None:
+            entry = store.get_entry(key)
+            if entry is not None and entry.content:
+                return entry.content
+
         # 检查缓存
         if prompt_file in self._cache:
             logger.debug(f"Loading prompt from cache: {prompt_file}")
@@ -237,122 +237,78 @@ class PromptManager:
 
     def get_file_prompts(self) -> List[Dict]:
         """
-        获取所有文件型 prompts（4个文件）
+        获取所有文件型 prompts 当前生效的版本（来自 PromptStore 的进程内快照，不读文件）
 
         Returns:
-            提示词配置列表，每个包含 key, display_name, file_path, content
+            提示词配置列表，每个包含 key, display_name, file_path, content, version, updated_at
         """
         prompts = []
-
         for config in self.PROMPT_CONFIGS:
-            file_path = self.prompts_dir / config["file_path"]
-
-            if not file_path.exists():
-                logger.warning(f"Prompt file not found: {file_path}")
-                continue
-
-            try:
-                with open(file_path, "r", encoding="utf-8") as f:
-                    data = yaml.safe_load(f)
-
-                prompt_data = {
-                    "key": config["key"],
-                    "display_name": config["display_name"],
-                    "file_path": config["file_path"],
-                    "content": data.get("system_prompt", "")
-                }
-
+            prompt_data = self.get_prompt_by_key(config["key"])
+            if prompt_data is not None:
                 prompts.append(prompt_data)
-
-            except Exception as e:
-                logger.error(f"Failed to load prompt {config['key']}: {e}")
-                continue
-
         return prompts
 
     def get_prompt_by_key(self, key: str) -> Optional[Dict]:
         """
-        根据 key 获取单个文件型 prompt
+        根据 key 获取单个文件型 prompt 当前生效的版本
 
         Args:
-            key: 提示词 key (onboarding, clerk, clerk_over, therapist-general)
+            key: 提示词 key (onboarding, clerk, clerk_over, therapist-timeout)
 
         Returns:
             提示词配置字典，如果不存在则返回 None
         """
+        from app.services.prompt_store import get_prompt_store
+
         for config in self.PROMPT_CONFIGS:
             if config["key"] == key:
-                file_path = self.prompts_dir / config["file_path"]
-
-                if not file_path.exists():
-                    logger.error(f"Prompt file not found: {file_path}")
-                    return None
-
-                try:
-                    with open(file_path, "r", encoding="utf-8") as f:
-                        data = yaml.safe_load(f)
-
-                    return {
-                        "key": config["key"],
-                        "display_name": config["display_name"],
-                        "file_path": config["file_path"],
-                        "content": data.get("system_prompt", "")
-                    }
-
-                except Exception as e:
-                    logger.error(f"Failed to load prompt {key}: {e}")
+                entry = get_prompt_store().get_entry(key)
+                if entry is None:
+                    logger.error(f"Prompt not found: {key}")
                     return None
+                return {
+                    "key": config["key"],
+                    "display_name": config["display_name"],
+                    "file_path": config["file_path"],
+                    "content": entry.content,
+                    "version": entry.version,
+                    "updated_at": entry.created_at,
+                }
 
         logger.error(f"Prompt config not found for key: {key}")
         return None
 
-    def update_prompt_by_key(self, key: str, content: str) -> bool:
+    def update_prompt_by_key(self, db, key: str, content: str, user_id: Optional[int] = None) -> bool:
         """
-        根据 key 更新文件型 prompt
+        根据 key 发布文件型 prompt 的新版本
+
+        不再原地改写 YAML 文件：新版本追加到 prompt_versions，所有 worker 通过
+        PromptStore 的版本通知原子切换，Clerk / Onboarding Agent 随之更新 instructions。
 
         Args:
+            db: 数据库 session
             key: 提示词 key
             content: 新的提示词内容
+            user_id: 操作的管理员
 
         Returns:
             是否更新成功
-        """
-        # 查找配置
-        config = None
-        for cfg in self.PROMPT_CONFIGS:
-            if cfg["key"] == key:
-                config = cfg
-                break
 
-        if not config:
-            logger.error(f"Prompt config not found for key: {key}")
-            return False
-
-        file_path = self.prompts_dir / config["file_path"]
-
-        if not file_path.exists():
-            logger.error(f"Prompt file not found: {file_path}")
-            return False
+        Raises:
+            ValueError: 未知 key 或内容为空（调用方返回 400）
+        """
+        from app.services.prompt_store import get_prompt_store
 
         try:
-            # 读取现有配置
-            with open(file_path, "r", encoding="utf-8") as f:
-                data = yaml.safe_load(f)
-
-            # 备份原文件
-            self._backup_file(file_path)
-
-            # 更新内容（只更新 system_prompt，保持 metadata 不变）
-            data["system_prompt"] = content
-
-            # 写入文件
-            with open(file_path, "w", encoding="utf-8") as f:
-                yaml.dump(data, f, allow_unicode=True, default_flow_style=False, sort_keys=False)
-
+            get_prompt_store().publish(db, key, content, user_id=user_id)
             logger.info(f"Successfully updated prompt: {key}")
             return True
-
+        except ValueError:
+            db.rollback()
+            raise
         except Exception as e:
+            db.rollback()
             logger.error(f"Failed to update prompt {key}: {e}", exc_info=True)
             return False
 
@@ -0,0 +1,527 @@
+"""
+Prompt Store
+
+管理后台可编辑的系统提示词（onboarding / clerk / clerk_over / therapist-timeout）的版本化存储。
+
+- 每次发布在 prompt_versions 表中追加一行（key 内版本号 +1），从不原地修改；
+  当前生效的是每个 key 最高版本的一行，回滚 = 把旧版本内容再发布为新版本
+- app/config/prompts/*.yaml 只作为默认值（某个 key 还没有发布过版本时使用），
+  进程内只解析一次
+- 每个 worker 持有一份不可变快照，读路径只做一次 dict 查找；store 版本号 = prompt_versions.id 的最大值
+- 发布时在同一事务中 NOTIFY，其他 worker 收到后重新加载；另有版本轮询兜底漏掉的通知
+- 快照变化后回调 listener，长驻的 Onboarding 单例 Agent 借此替换 instructions
+
+A/B 实验（prompt_experiments 表）：
+- 每个 key 同时最多一个进行中的实验，实验包含若干带权重的变体；content 为空的变体是对照组（使用当前版本）
+- 用户按 sha256(实验 id + user_id) 确定性分桶，同一用户在实验期间总是拿到同一个变体
+- 变体标记 "实验id:变体id" 写入 openai_logging_context 和 Agno run metadata，
+  OpenAI 用量日志按标记聚合出每个变体的 token / 缓存命中率 / 延迟（experiment_report）
+- 支持的 key：clerk、therapist-timeout，以及单个治疗师的 prompt（therapist:<therapist_id>）
+"""
+
+import hashlib
+import json
+import logging
+import re
+import time
+import zlib
+from datetime import datetime
+from types import MappingProxyType
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional, Tuple
+
+import yaml
+from sqlalchemy import func
+
+from app.core.config import settings
+from app.services.versioned_store import VersionedStore
+
+logger = logging.getLogger(__name__)
+
+# LISTEN/NOTIFY channel，payload 为 "key:version"
+PROMPT_STORE_CHANNEL = "prompt_store"
+
+# 串行化发布的 advisory lock key
+PROMPT_STORE_LOCK_KEY = zlib.crc32(b"unlimi-prompt-store")
+
+
+class PromptEntry(NamedTuple):
+    """某个 key 当前生效的提示词"""
+    key: str
+    content: str
+    version: int  # 0 表示来自 YAML 默认文件
+    content_hash: str
+    created_at: Optional[datetime] = None
+    created_by_user_id: Optional[int] = None
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+# ===== A/B 实验 =====
+
+# 可以做实验的提示词（另外还有 therapist:<therapist_id>）
+EXPERIMENT_KEYS = ("clerk", "therapist-timeout")
+THERAPIST_EXPERIMENT_PREFIX = "therapist:"
+
+_VARIANT_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,32}$")
+
+
+class ExperimentVariant(NamedTuple):
+    id: str
+    weight: int
+    content: Optional[str]  # None 表示对照组，使用当前生效的提示词
+
+
+class Experiment(NamedTuple):
+    """进行中的实验（快照中的不可变副本）"""
+    id: int
+    name: str
+    key: str
+    variants: Tuple[ExperimentVariant, ...]
+
+
+class VariantAssignment(NamedTuple):
+    """某个用户在某个实验中分到的变体"""
+    key: str
+    experiment_id: int
+    variant_id: str
+    content: Optional[str]
+
+    @property
+    def tag(self) -> str:
+        return f"{self.experiment_id}:{self.variant_id}"
+
+
+def is_experiment_key(key: str) -> bool:
+    if key.startswith(THERAPIST_EXPERIMENT_PREFIX):
+        return len(key) > len(THERAPIST_EXPERIMENT_PREFIX)
+    return key in EXPERIMENT_KEYS
+
+
+def parse_variants(raw: Iterable[Dict]) -> Tuple[ExperimentVariant, ...]:
+    """
+    校验并转换变体定义
+
+    Raises:
+        ValueError: 变体少于 2 个、id 重复或不合法、权重不合法、content 为空字符串
+    """
+    variants = []
+    for item in raw:
+        variant_id = str(item.get("id", ""))
+        if not _VARIANT_ID_RE.match(variant_id):
+            raise ValueError(f"Invalid variant id: {variant_id!r}")
+        weight = item.get("weight", 1)
+        if isinstance(weight, bool) or not isinstance(weight, int) or not 1 <= weight <= 1000:
+            raise ValueError(f"Variant {variant_id}: weight must be an integer between 1 and 1000")
+        content = item.get("content")
+        if content is not None and not content.strip():
+            raise ValueError(f"Variant {variant_id}: content must not be empty (use null for control)")
+        variants.append(ExperimentVariant(variant_id, weight, content))
+    if len(variants) < 2:
+        raise ValueError("An experiment needs at least 2 variants")
+    if len({v.id for v in variants}) != len(variants):
+        raise ValueError("Variant ids must be unique")
+    return tuple(variants)
+
+
+def assign_variant(experiment: Experiment, user_id: int) -> ExperimentVariant:
+    """确定性分桶：同一实验中同一用户总是落在同一个变体"""
+    digest = hashlib.sha256(f"{experiment.id}:{user_id}".encode("utf-8")).hexdigest()
+    point = int(digest[:8], 16) % sum(v.weight for v in experiment.variants)
+    for variant in experiment.variants:
+        if point < variant.weight:
+            return variant
+        point -= variant.weight
+    return experiment.variants[-1]
+
+
+def _percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def experiment_report(experiment_id: int, variant_ids: Iterable[str], records: Iterable[Dict]) -> List[Dict]:
+    """
+    按变体聚合用量日志（app.core.openai_logger.OpenAIUsageLogger 的记录）
+
+    一次 Agent run 可能包含多次模型调用（工具调用、记忆提取），这里按调用计数
+    """
+    def new_group() -> Dict:
+        return {"calls": 0, "users": set(), "prompt": 0, "completion": 0, "cached": 0, "latencies": []}
+
+    prefix = f"{experiment_id}:"
+    groups: Dict[str, Dict] = {variant_id: new_group() for variant_id in variant_ids}
+    for record in records:
+        tag = next(
+            (t for t in (record.get("prompt_variants") or {}).values() if t.startswith(prefix)), None
+        )
+        if tag is None:
+            continue
+        group = groups.setdefault(tag[len(prefix):], new_group())
+        group["calls"] += 1
+        group["users"].add(record.get("user_id"))
+        group["prompt"] += record.get("prompt_tokens") or 0
+        group["completion"] += record.get("completion_tokens") or 0
+        group["cached"] += record.get("cached_tokens") or 0
+        group["latencies"].append(record.get("latency_ms") or 0.0)
+
+    report = []
+    for variant_id, group in groups.items():
+        calls = group["calls"]
+        latencies = sorted(group["latencies"])
+        report.append({
+            "variant_id": variant_id,
+            "calls": calls,
+            "users": len(group["users"]),
+            "prompt_tokens": group["prompt"],
+            "completion_tokens": group["completion"],
+            "cached_tokens": group["cached"],
+            "avg_prompt_tokens": round(group["prompt"] / calls, 1) if calls else None,
+            "avg_completion_tokens": round(group["completion"] / calls, 1) if calls else None,
+            "cache_hit_rate": round(group["cached"] / group["prompt"], 4) if group["prompt"] else None,
+            "avg_latency_ms": round(sum(latencies) / calls, 1) if calls else None,
+            "p50_latency_ms": _percentile(latencies, 50),
+            "p95_latency_ms": _percentile(latencies, 95),
+        })
+    return report
+
+
+class PromptStore(VersionedStore):
+    """进程内的提示词快照 + 版本轮询线程（见 app/services/versioned_store.py）"""
+
+    label = "Prompt store"
+    thread_name = "prompt-store-poller"
+    lock_key = PROMPT_STORE_LOCK_KEY
+
+    # 加载失败后的这段时间内读路径直接使用 YAML 默认值、不再访问数据库（轮询线程 / 通知照常重试）
+    load_retry_seconds = 30.0
+
+    def __init__(self, prompts_dir=None, poll_interval: float = 30.0):
+        from pathlib import Path
+        from app.services.prompt_manager import PromptManager
+
+        super().__init__(poll_interval)
+        self.prompts_dir = Path(prompts_dir) if prompts_dir else Path(__file__).parent.parent / "config" / "prompts"
+        self.prompt_files: Dict[str, str] = {cfg["key"]: cfg["file_path"] for cfg in PromptManager.PROMPT_CONFIGS}
+
+        self._file_defaults: Optional[Dict[str, PromptEntry]] = None
+        self._entries: Mapping[str, PromptEntry] = MappingProxyType({})
+        self._experiments: Mapping[str, Experiment] = MappingProxyType({})
+        self._retry_at = 0.0
+
+    # ===== 读取（热路径） =====
+
+    def get_entry(self, key: str) -> Optional[PromptEntry]:
+        if not self.loaded:
+            if time.monotonic() < self._retry_at:
+                return self._load_file_defaults().get(key)
+            try:
+                self.reload()
+            except Exception as e:
+                # 数据库不可用（如尚未迁移）时退回 YAML 默认值，load_retry_seconds 之后再重试
+                self._retry_at = time.monotonic() + self.load_retry_seconds
+                logger.warning(
+                    f"Prompt store load failed, using prompt files for {self.load_retry_seconds:.0f}s: {e}"
+                )
+                return self._load_file_defaults().get(key)
+        return self._entries.get(key)
+
+    def get(self, key: str) -> str:
+        """
+        获取 key 当前生效的提示词内容
+
+        Raises:
+            KeyError: 未知 key，或默认文件缺失且从未发布过
+        """
+        entry = self.get_entry(key)
+        if entry is None:
+            raise KeyError(f"Prompt not found: {key}")
+        return entry.content
+
+    def assign(self, key: str, user_id: Optional[int]) -> Optional[VariantAssignment]:
+        """key 上有进行中的实验时，返回该用户分到的变体"""
+        if user_id is None:
+            return None
+        if not self.loaded:
+            self.get_entry(key)
+        experiment = self._experiments.get(key)
+        if experiment is None:
+            return None
+        variant = assign_variant(experiment, user_id)
+        return VariantAssignment(key, experiment.id, variant.id, variant.content)
+
+    def get_for_user(self, key: str, user_id: Optional[int]) -> Tuple[str, Optional[VariantAssignment]]:
+        """
+        获取 key 对该用户生效的提示词（实验变体优先）
+
+        Raises:
+            KeyError: 同 get()
+        """
+        assignment = self.assign(key, user_id)
+        if assignment is not None and assignment.content is not None:
+            return assignment.content, assignment
+        return self.get(key), assignment
+
+    def key_for_file(self, prompt_file: str) -> Optional[str]:
+        for key, file_path in self.prompt_files.items():
+            if file_path == prompt_file:
+                return key
+        return None
+
+    # ===== 加载 =====
+
+    def _load_file_defaults(self) -> Dict[str, PromptEntry]:
+        if self._file_defaults is None:
+            defaults = {}
+            for key, file_path in self.prompt_files.items():
+                path = self.prompts_dir / file_path
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        data = yaml.safe_load(f) or {}
+                    content = data.get("system_prompt") or ""
+                except FileNotFoundError:
+                    logger.warning(f"Prompt file not found: {path}")
+                    continue
+                except yaml.YAMLError as e:
+                    logger.error(f"Failed to parse prompt file {path}: {e}")
+                    continue
+                defaults[key] = PromptEntry(key, content, 0, content_hash(content))
+            self._file_defaults = defaults
+        return self._file_defaults
+
+    def _read_stamp(self, db) -> Tuple[int, int, int]:
+        """(最新提示词版本 id, 最新实验 id, 进行中的实验数)，任一变化都需要重新加载"""
+        from app.models.prompt_experiment import PromptExperiment
+        from app.models.prompt_version import PromptVersion
+
+        return (
+            db.query(func.max(PromptVersion.id)).scalar() or 0,
+            db.query(func.max(PromptExperiment.id)).scalar() or 0,
+            db.query(func.count(PromptExperiment.id)).filter(PromptExperiment.is_active.is_(True)).scalar() or 0,
+        )
+
+    def _load(self, db) -> set:
+        from sqlalchemy.orm import aliased
+        from app.models.prompt_experiment import PromptExperiment
+        from app.models.prompt_version import PromptVersion
+
+        # 先读版本戳：期间有新的发布时快照可能比版本戳新，下一次 check_version 会再加载一次；
+        # 反过来（先读内容）则版本戳已包含新发布而内容没有，check_version 再也不会重新加载
+        stamp = self._read_stamp(db)
+        latest = aliased(PromptVersion)
+        max_version = (
+            db.query(func.max(latest.version))
+            .filter(latest.key == PromptVersion.key)
+            .scalar_subquery()
+        )
+        rows = db.query(PromptVersion).filter(PromptVersion.version == max_version).all()
+        experiment_rows = db.query(PromptExperiment).filter(PromptExperiment.is_active.is_(True)).all()
+
+        entries = dict(self._load_file_defaults())
+        for row in rows:
+            entries[row.key] = PromptEntry(
+                row.key, row.content, row.version, row.content_hash,
+                row.created_at, row.created_by_user_id,
+            )
+
+        old_entries = self._entries
+        changed = {
+            key for key, entry in entries.items()
+            if key not in old_entries or old_entries[key].content_hash != entry.content_hash
+        } if self.loaded else set()
+
+        experiments = {}
+        for row in experiment_rows:
+            try:
+                variants = parse_variants(json.loads(row.variants))
+            except ValueError as e:
+                logger.warning(f"Ignoring invalid prompt experiment {row.id}: {e}")
+                continue
+            experiments[row.key] = Experiment(row.id, row.name, row.key, variants)
+        old_experiments = self._experiments
+        changed |= {
+            key for key in set(experiments) | set(old_experiments)
+            if old_experiments.get(key) != experiments.get(key)
+        } if self.loaded else set()
+
+        self._entries = MappingProxyType(entries)
+        self._experiments = MappingProxyType(experiments)
+        self.version = stamp[0]
+        self._stamp = stamp
+        return changed
+
+    # ===== 发布 =====
+
+    def publish(self, db, key: str, content: str, user_id: Optional[int] = None) -> PromptEntry:
+        """
+        发布新版本（内容与当前版本相同时不产生新版本），提交后通知其他 worker
+
+        Raises:
+            ValueError: 未知 key 或内容为空
+        """
+        from app.models.prompt_version import PromptVersion
+        from app.services.pg_notify import notify
+
+        if key not in self.prompt_files:
+            raise ValueError(f"Invalid prompt key: {key}. Valid keys: {', '.join(self.prompt_files)}")
+        if not content or not content.strip():
+            raise ValueError("Prompt content must not be empty")
+
+        current = self.get_entry(key)
+        digest = content_hash(content)
+        if current is not None and current.content_hash == digest:
+            return current
+
+        self.lock_for_write(db)
+        next_version = (
+            db.query(func.max(PromptVersion.version)).filter(PromptVersion.key == key).scalar() or 0
+        ) + 1
+        db.add(PromptVersion(
+            key=key, version=next_version, content=content, content_hash=digest, created_by_user_id=user_id
+        ))
+        notify(db, PROMPT_STORE_CHANNEL, f"{key}:{next_version}")
+        db.commit()
+        logger.info(f"Published prompt {key} v{next_version} by user {user_id}")
+
+        self.reload()
+        return self.get_entry(key)
+
+    def rollback(self, db, key: str, version: int, user_id: Optional[int] = None) -> PromptEntry:
+        """
+        把 key 的某个历史版本重新发布为新版本（version=0 表示 YAML 默认文件）
+
+        Raises:
+            ValueError: 未知 key 或版本不存在
+        """
+        from app.models.prompt_version import PromptVersion
+
+        if version == 0:
+            default = self._load_file_defaults().get(key)
+            if default is None:
+                raise ValueError(f"No default prompt file for {key}")
+            content = default.content
+        else:
+            row = db.query(PromptVersion).filter(
+                PromptVersion.key == key, PromptVersion.version == version
+            ).first()
+            if row is None:
+                raise ValueError(f"Prompt {key} has no version {version}")
+            content = row.content
+        return self.publish(db, key, content, user_id=user_id)
+
+    def history(self, db, key: str, limit: int = 50) -> List:
+        """key 的版本历史（新的在前）"""
+        from app.models.prompt_version import PromptVersion
+
+        return (
+            db.query(PromptVersion)
+            .filter(PromptVersion.key == key)
+            .order_by(PromptVersion.version.desc())
+            .limit(limit)
+            .all()
+        )
+
+    # ===== A/B 实验 =====
+
+    def experiments(self) -> Mapping[str, Experiment]:
+        """进行中的实验：key -> Experiment"""
+        return self._experiments
+
+    def create_experiment(self, db, name: str, key: str, variants: List[Dict], user_id: Optional[int] = None):
+        """
+        创建实验（立即生效），提交后通知其他 worker
+
+        Raises:
+            ValueError: key 不支持实验、变体不合法，或该 key 已有进行中的实验
+        """
+        from app.models.prompt_experiment import PromptExperiment
+        from app.services.pg_notify import notify
+
+        if not is_experiment_key(key):
+            raise ValueError(
+                f"Invalid experiment key: {key}. Valid keys: {', '.join(EXPERIMENT_KEYS)}, "
+                f"{THERAPIST_EXPERIMENT_PREFIX}<therapist_id>"
+            )
+        if not name or not name.strip():
+            raise ValueError("Experiment name must not be empty")
+        parsed = parse_variants(variants)
+
+        self.lock_for_write(db)
+        running = db.query(PromptExperiment.id).filter(
+            PromptExperiment.key == key, PromptExperiment.is_active.is_(True)
+        ).first()
+        if running is not None:
+            db.rollback()
+            raise ValueError(f"Prompt {key} already has a running experiment: {running.id}")
+
+        row = PromptExperiment(
+            name=name.strip(),
+            key=key,
+            variants=json.dumps([v._asdict() for v in parsed], ensure_ascii=False),
+            is_active=True,
+            created_by_user_id=user_id,
+        )
+        db.add(row)
+        db.flush()
+        notify(db, PROMPT_STORE_CHANNEL, f"experiment:{row.id}")
+        db.commit()
+        db.refresh(row)
+        logger.info(f"Started prompt experiment {row.id} on {key} by user {user_id}: {[v.id for v in parsed]}")
+
+        self.reload()
+        return row
+
+    def stop_experiment(self, db, experiment_id: int, user_id: Optional[int] = None):
+        """
+        结束实验，所有用户回到当前版本
+
+        Raises:
+            ValueError: 实验不存在
+        """
+        from app.models.prompt_experiment import PromptExperiment
+        from app.services.pg_notify import notify
+
+        row = db.query(PromptExperiment).filter(PromptExperiment.id == experiment_id).first()
+        if row is None:
+            raise ValueError(f"Prompt experiment {experiment_id} not found")
+        if not row.is_active:
+            return row
+
+        row.is_active = False
+        row.ended_at = datetime.utcnow()
+        notify(db, PROMPT_STORE_CHANNEL, f"experiment:{row.id}")
+        db.commit()
+        db.refresh(row)
+        logger.info(f"Stopped prompt experiment {row.id} on {row.key} by user {user_id}")
+
+        self.reload()
+        return row
+
+    def list_experiments(self, db, limit: int = 50) -> List:
+        """全部实验（新的在前）"""
+        from app.models.prompt_experiment import PromptExperiment
+
+        return db.query(PromptExperiment).order_by(PromptExperiment.id.desc()).limit(limit).all()
+
+
+# 全局单例
+_store: Optional[PromptStore] = None
+
+
+def get_prompt_store() -> PromptStore:
+    """获取全局提示词存储单例"""
+    global _store
+    if _store is None:
+        _store = PromptStore(poll_interval=settings.PROMPT_STORE_POLL_SECONDS)
+    return _store
+
+
+def subscribe_prompt_store_changes():
+    """注册其他 worker 的发布通知（payload 为 None 表示重连后需要全量检查）"""
+    from app.services.pg_notify import get_notify_listener
+    get_notify_listener().subscribe(
+        PROMPT_STORE_CHANNEL, lambda payload: get_prompt_store().check_version()
+    )
@@ -0,0 +1,150 @@
+"""
+Prompt Templates
+
+发给模型的 prompt 统一用 Jinja2 模板（app/config/prompts/*.j2）拼装：
+- 启动时一次性编译全部模板，请求路径上不再读文件或解析模板
+- 相同模板 + 相同参数的渲染结果放在 LRU 中复用（参数需可哈希，list / dict 会被转换成 tuple）
+- 每个模板有稳定的 template_hash（源文件内容），每次渲染结果有 prompt_hash（渲染后文本），
+  可以作为 prompt cache 命中分析和响应缓存的 key
+
+模板使用 StrictUndefined，缺少变量时直接报错，避免把空字符串悄悄发给模型。
+"""
+
+import hashlib
+import logging
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, NamedTuple, Optional
+
+from jinja2 import Environment, FileSystemLoader, StrictUndefined, Template
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_SUFFIX = ".j2"
+
+
+class RenderedPrompt(NamedTuple):
+    """一次渲染的结果"""
+    text: str
+    template: str
+    template_hash: str
+    prompt_hash: str
+
+
+def _hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def _freeze(value: Any) -> Any:
+    """把渲染参数转换成可哈希的形式，作为 LRU 的 key"""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+class PromptTemplates:
+    """编译好的 prompt 模板集合 + 渲染缓存"""
+
+    def __init__(self, templates_dir: Optional[str] = None, cache_size: int = 256):
+        if templates_dir is None:
+            templates_dir = Path(__file__).parent.parent / "config" / "prompts"
+        self.templates_dir = Path(templates_dir)
+
+        self.env = Environment(
+            loader=FileSystemLoader(str(self.templates_dir)),
+            undefined=StrictUndefined,
+            autoescape=False,
+            trim_blocks=True,
+            lstrip_blocks=True,
+            keep_trailing_newline=False,
+            auto_reload=False,
+        )
+        self._templates: Dict[str, Template] = {}
+        self._hashes: Dict[str, str] = {}
+        self._compile_lock = threading.Lock()
+        self._render_cached = lru_cache(maxsize=cache_size)(self._render_frozen)
+
+        self.uncacheable_renders = 0
+
+    def compile_all(self) -> int:
+        """编译目录下全部模板，返回模板数量"""
+        with self._compile_lock:
+            templates, hashes = {}, {}
+            for path in sorted(self.templates_dir.glob(f"*{TEMPLATE_SUFFIX}")):
+                name = path.stem
+                templates[name] = self.env.get_template(path.name)
+                hashes[name] = _hash(path.read_text(encoding="utf-8"))
+            self._templates = templates
+            self._hashes = hashes
+            self._render_cached.cache_clear()
+        logger.info(f"Compiled {len(templates)} prompt templates: {sorted(templates)}")
+        return len(templates)
+
+    def _get_template(self, name: str) -> Template:
+        if not self._templates:
+            self.compile_all()
+        template = self._templates.get(name)
+        if template is None:
+            raise KeyError(f"Prompt template not found: {name}{TEMPLATE_SUFFIX}")
+        return template
+
+    def template_hash(self, name: str) -> str:
+        self._get_template(name)
+        return self._hashes[name]
+
+    def _render_frozen(self, name: str, frozen: tuple) -> RenderedPrompt:
+        text = self._get_template(name).render(dict(frozen)).strip()
+        return RenderedPrompt(text, name, self._hashes[name], _hash(text))
+
+    def render(self, name: str, **context) -> RenderedPrompt:
+        """
+        渲染模板（相同参数命中 LRU）
+
+        Raises:
+            KeyError: 模板不存在
+            jinja2.UndefinedError: 模板引用了未提供的变量
+        """
+        if not self._templates:
+            # 编译会清空渲染缓存，必须在查缓存之前完成
+            self.compile_all()
+        frozen = tuple(sorted((key, _freeze(value)) for key, value in context.items()))
+        try:
+            hash(frozen)
+        except TypeError:
+            # 参数里有不可哈希的对象：直接渲染，不进缓存
+            self.uncacheable_renders += 1
+            return self._render_frozen(name, frozen)
+        return self._render_cached(name, frozen)
+
+    def stats(self) -> Dict:
+        info = self._render_cached.cache_info()
+        return {
+            "templates": {name: self._hashes[name] for name in sorted(self._templates)},
+            "hits": info.hits,
+            "misses": info.misses,
+            "size": info.currsize,
+            "max_size": info.maxsize,
+            "uncacheable_renders": self.uncacheable_renders,
+        }
+
+
+# 全局单例
+_templates: Optional[PromptTemplates] = None
+
+
+def get_prompt_templates() -> PromptTemplates:
+    """获取全局 prompt 模板单例"""
+    global _templates
+    if _templates is None:
+        _templates = PromptTemplates(cache_size=settings.PROMPT_RENDER_CACHE_SIZE)
+    return _templates
+
+
+def render_prompt(name: str, **context) -> RenderedPrompt:
+    """渲染 app/config/prompts/{name}.j2"""
+    return get_prompt_templates().render(name, **context)
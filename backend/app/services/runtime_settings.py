@@ -0,0 +1,221 @@
+"""
+Runtime Settings
+
+可热更新的运行参数（会话时长 / 轮数、历史轮数、temperature、模型 id 等）。
+默认值来自 app.core.config.settings（.env），管理员的修改保存在 runtime_settings 表中，
+每次修改都写入 runtime_setting_audit，无需重启服务、也不会中断正在进行的模型调用。
+
+- 读路径：get(key) 只读取进程内的不可变快照（整体替换引用），不加锁、不访问数据库
+- 版本号：每次修改是一个 change set，版本号 = 审计表中的最大版本 + 1（Postgres 下用
+  advisory xact lock 串行化），只增不减，删除覆盖（恢复默认）也会产生新版本
+- 传播：修改在同一个事务中发出 NOTIFY，其他 worker 收到后重新加载；另有轮询线程每
+  RUNTIME_SETTINGS_POLL_SECONDS 秒比较一次版本号，兜底漏掉的通知和非 Postgres 部署
+"""
+
+import json
+import logging
+import zlib
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, NamedTuple, Optional
+
+from sqlalchemy import func
+
+from app.core.config import settings
+from app.services.versioned_store import VersionedStore
+
+logger = logging.getLogger(__name__)
+
+# LISTEN/NOTIFY channel，payload 为新的版本号
+RUNTIME_SETTINGS_CHANNEL = "runtime_settings"
+
+# 串行化修改的 advisory lock key
+RUNTIME_SETTINGS_LOCK_KEY = zlib.crc32(b"unlimi-runtime-settings")
+
+
+class Tunable(NamedTuple):
+    """一个可热更新参数的类型和取值范围"""
+    type: type
+    description: str
+    min: Optional[float] = None
+    max: Optional[float] = None
+
+
+TUNABLES: Dict[str, Tunable] = {
+    "SESSION_SUGGESTED_DURATION_MINUTES": Tunable(int, "建议咨询时长（分钟）", 1, 120),
+    "SESSION_SUGGESTED_TURNS": Tunable(int, "建议对话轮数", 1, 200),
+    "SESSION_REMINDER_INTERVAL": Tunable(int, "超时后每N轮提示一次", 1, 10),
+    "THERAPIST_HISTORY_RUNS": Tunable(int, "Therapist 带入上下文的历史轮数", 1, 100),
+    "THERAPIST_TEMPERATURE": Tunable(float, "Therapist temperature", 0.0, 2.0),
+    "CLERK_TEMPERATURE": Tunable(float, "Clerk temperature", 0.0, 2.0),
+    "THERAPIST_MODEL": Tunable(str, "Therapist 模型 id"),
+    "CLERK_MODEL": Tunable(str, "Clerk 模型 id"),
+    "ONBOARDING_MODEL": Tunable(str, "Onboarding 模型 id"),
+}
+
+
+def validate_value(key: str, value: Any) -> Any:
+    """
+    按 TUNABLES 校验并转换取值
+
+    Raises:
+        ValueError: 未知的 key，或取值类型 / 范围不合法
+    """
+    spec = TUNABLES.get(key)
+    if spec is None:
+        raise ValueError(f"Unknown runtime setting: {key}")
+    if isinstance(value, bool) or value is None:
+        raise ValueError(f"{key}: expected {spec.type.__name__}")
+    if spec.type is int and isinstance(value, float) and not value.is_integer():
+        raise ValueError(f"{key}: expected int")
+    try:
+        converted = spec.type(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{key}: expected {spec.type.__name__}")
+    if spec.type is str:
+        converted = converted.strip()
+        if not converted:
+            raise ValueError(f"{key}: must not be empty")
+    if spec.min is not None and converted < spec.min:
+        raise ValueError(f"{key}: must be >= {spec.min}")
+    if spec.max is not None and converted > spec.max:
+        raise ValueError(f"{key}: must be <= {spec.max}")
+    return converted
+
+
+def _defaults() -> Dict[str, Any]:
+    return {key: getattr(settings, key) for key in TUNABLES}
+
+
+class RuntimeSettingsStore(VersionedStore):
+    """进程内的运行参数快照 + 版本轮询线程（见 app/services/versioned_store.py）"""
+
+    label = "Runtime settings"
+    thread_name = "runtime-settings-poller"
+    lock_key = RUNTIME_SETTINGS_LOCK_KEY
+
+    def __init__(self, poll_interval: float = 30.0):
+        super().__init__(poll_interval)
+        self._values: Mapping[str, Any] = MappingProxyType(_defaults())
+        self._overrides: Mapping[str, Any] = MappingProxyType({})
+
+    # ===== 读取（热路径） =====
+
+    def get(self, key: str) -> Any:
+        return self._values[key]
+
+    def values(self) -> Mapping[str, Any]:
+        return self._values
+
+    def overrides(self) -> Mapping[str, Any]:
+        return self._overrides
+
+    # ===== 加载 =====
+
+    def _read_stamp(self, db) -> int:
+        from app.models.runtime_setting import RuntimeSettingAudit
+
+        return db.query(func.max(RuntimeSettingAudit.version)).scalar() or 0
+
+    def _load(self, db) -> set:
+        from app.models.runtime_setting import RuntimeSetting
+
+        version = self._read_stamp(db)
+        rows = db.query(RuntimeSetting.key, RuntimeSetting.value).all()
+
+        overrides = {}
+        for key, raw in rows:
+            try:
+                overrides[key] = validate_value(key, json.loads(raw))
+            except ValueError as e:
+                # 代码里删除了某个参数，或取值范围收紧后旧值不再合法：忽略该覆盖
+                logger.warning(f"Ignoring runtime setting override {key}={raw}: {e}")
+        values = {**_defaults(), **overrides}
+
+        old_values = self._values
+        changed = {key for key in values if old_values.get(key) != values[key]}
+        self._overrides = MappingProxyType(overrides)
+        self._values = MappingProxyType(values)
+        self.version = self._stamp = version
+        return changed
+
+    # ===== 修改 =====
+
+    def update(self, db, changes: Dict[str, Any], user_id: Optional[int] = None) -> int:
+        """
+        在一个事务中写入一组修改（值为 None 表示恢复默认），记录审计并通知其他 worker
+
+        Returns:
+            新的版本号（没有实际变化时返回当前版本）
+
+        Raises:
+            ValueError: 参数校验失败
+        """
+        from app.models.runtime_setting import RuntimeSetting, RuntimeSettingAudit
+        from app.services.pg_notify import notify
+
+        unknown = sorted(set(changes) - set(TUNABLES))
+        if unknown:
+            raise ValueError(f"Unknown runtime setting: {', '.join(unknown)}")
+        validated = {
+            key: None if value is None else validate_value(key, value)
+            for key, value in changes.items()
+        }
+
+        self.lock_for_write(db)
+        version = self._read_stamp(db) + 1
+        existing = {
+            row.key: row for row in
+            db.query(RuntimeSetting).filter(RuntimeSetting.key.in_(list(validated))).with_for_update()
+        }
+
+        changed = 0
+        for key, value in validated.items():
+            row = existing.get(key)
+            old_raw = row.value if row is not None else None
+            new_raw = None if value is None else json.dumps(value)
+            if old_raw == new_raw:
+                continue
+            if new_raw is None:
+                db.delete(row)
+            elif row is None:
+                db.add(RuntimeSetting(key=key, value=new_raw, version=version, updated_by_user_id=user_id))
+            else:
+                row.value = new_raw
+                row.version = version
+                row.updated_by_user_id = user_id
+                row.updated_at = func.now()
+            db.add(RuntimeSettingAudit(
+                key=key, old_value=old_raw, new_value=new_raw, version=version, changed_by_user_id=user_id
+            ))
+            changed += 1
+
+        if not changed:
+            db.rollback()
+            return self.version
+
+        notify(db, RUNTIME_SETTINGS_CHANNEL, str(version))
+        db.commit()
+        logger.info(f"Runtime settings updated by user {user_id}: version={version}, {validated}")
+
+        self.reload()
+        return version
+
+
+# 全局单例
+_store: Optional[RuntimeSettingsStore] = None
+
+
+def get_runtime_settings() -> RuntimeSettingsStore:
+    """获取全局运行参数单例"""
+    global _store
+    if _store is None:
+        _store = RuntimeSettingsStore(poll_interval=settings.RUNTIME_SETTINGS_POLL_SECONDS)
+    return _store
+
+
+def subscribe_runtime_settings_changes():
+    """注册其他 worker 的修改通知（payload 为新版本号；None 表示重连后需要全量检查）"""
+    from app.services.pg_notify import get_notify_listener
+    get_notify_listener().subscribe(
+        RUNTIME_SETTINGS_CHANNEL, lambda payload: get_runtime_settings().check_version()
+    )
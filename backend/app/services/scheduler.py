@@ -0,0 +1,316 @@
+"""
+Maintenance Scheduler
+
+在后台线程中周期性执行维护任务（不在请求路径上）：
+- captcha.purge_expired: 删除过期的 captcha_sessions
+- sessions.close_stale: 用一条 UPDATE 关闭超过 SESSION_STALE_HOURS 的未结束会话
+- 可选：为被放弃（有对话但没有总结）的会话排队生成 Clerk 总结
+
+多 worker 部署时通过 Postgres advisory lock 选主，只有持有锁的 worker 执行任务；
+SQLite（本地开发）下当前进程总是 leader。每个任务的执行时间带随机 jitter，
+避免多个实例在同一时刻打到数据库。
+"""
+
+import logging
+import random
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# advisory lock 的 key（所有 worker 相同）
+SCHEDULER_LOCK_KEY = zlib.crc32(b"unlimi-maintenance-scheduler")
+
+
+class ScheduledTask:
+    """一个周期任务及其执行统计"""
+
+    def __init__(self, name: str, func: Callable[[Any], Any], interval: float, jitter: float):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter
+        # 首次执行也加 jitter，分散多个实例的启动时刻
+        self.next_run = time.monotonic() + random.uniform(0, jitter)
+
+        self.runs = 0
+        self.failures = 0
+        self.last_run_at: Optional[datetime] = None
+        self.last_duration_ms: Optional[float] = None
+        self.last_result: Optional[str] = None
+        self.last_error: Optional[str] = None
+
+    def schedule_next(self):
+        self.next_run = time.monotonic() + self.interval + random.uniform(0, self.jitter)
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "interval_seconds": self.interval,
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_run_at": self.last_run_at,
+            "last_duration_ms": round(self.last_duration_ms, 1) if self.last_duration_ms is not None else None,
+            "last_result": self.last_result,
+            "last_error": self.last_error,
+        }
+
+
+class MaintenanceScheduler:
+    """单线程周期任务调度器（advisory lock 选主）"""
+
+    def __init__(self, tick: float = 1.0):
+        self.tick = tick
+        self.tasks: List[ScheduledTask] = []
+        self.is_leader = False
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock_conn = None
+        # 耗时的后台任务（如生成会话总结）单独排队，不阻塞维护任务
+        self._job_executor: Optional[ThreadPoolExecutor] = None
+
+    def add_task(self, name: str, func: Callable[[Any], Any], interval: float,
+                 jitter: Optional[float] = None):
+        """注册任务：func(db) 在独立的 DB session 中执行，返回值会记录为 last_result"""
+        jitter = settings.SCHEDULER_JITTER_SECONDS if jitter is None else jitter
+        self.tasks.append(ScheduledTask(name, func, interval, jitter))
+
+    def enqueue(self, func: Callable, *args):
+        """排队执行一个后台作业（单线程顺序执行）"""
+        if self._job_executor is None:
+            self._job_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="scheduler-job")
+        self._job_executor.submit(self._run_job, func, *args)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="maintenance-scheduler", daemon=True)
+        self._thread.start()
+        logger.info(f"Maintenance scheduler started: tasks={[t.name for t in self.tasks]}")
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._job_executor is not None:
+            self._job_executor.shutdown(wait=False, cancel_futures=True)
+            self._job_executor = None
+        self._release_leadership()
+        logger.info("Maintenance scheduler stopped")
+
+    def stats(self) -> Dict:
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "is_leader": self.is_leader,
+            "tasks": [task.to_dict() for task in self.tasks],
+        }
+
+    # ===== 主循环 =====
+
+    def _run(self):
+        while not self._stop.is_set():
+            now = time.monotonic()
+            due = [task for task in self.tasks if task.next_run <= now]
+            if due and self._ensure_leadership():
+                for task in due:
+                    if self._stop.is_set():
+                        break
+                    self._run_task(task)
+            for task in due:
+                if task.next_run <= now:
+                    task.schedule_next()
+            self._stop.wait(self.tick)
+
+    def _run_task(self, task: ScheduledTask):
+        from app.services.database import SessionLocal
+
+        db = SessionLocal()
+        start = time.perf_counter()
+        try:
+            result = task.func(db)
+            db.commit()
+            task.last_result = None if result is None else str(result)
+            task.last_error = None
+            if result:
+                logger.info(f"[SCHEDULER] {task.name}: {result}")
+        except Exception as e:
+            db.rollback()
+            task.failures += 1
+            task.last_error = f"{type(e).__name__}: {e}"
+            logger.error(f"[SCHEDULER] {task.name} failed: {e}", exc_info=True)
+        finally:
+            db.close()
+            task.runs += 1
+            task.last_run_at = datetime.utcnow()
+            task.last_duration_ms = (time.perf_counter() - start) * 1000
+            task.schedule_next()
+
+    def _run_job(self, func: Callable, *args):
+        try:
+            func(*args)
+        except Exception as e:
+            logger.error(f"[SCHEDULER] background job {getattr(func, '__name__', func)} failed: {e}", exc_info=True)
+
+    # ===== 选主 =====
+
+    def _ensure_leadership(self) -> bool:
+        """持有 advisory lock 的专用连接存活即为 leader；否则尝试获取"""
+        from app.services.database import engine
+        from sqlalchemy import text
+
+        if engine.dialect.name != "postgresql":
+            self.is_leader = True
+            return True
+
+        if self._lock_conn is not None:
+            try:
+                self._lock_conn.execute(text("SELECT 1"))
+                self._lock_conn.commit()  # 不要让专用连接停留在 idle in transaction
+                return True
+            except Exception as e:
+                logger.warning(f"[SCHEDULER] lost leader connection: {e}")
+                self._close_lock_conn()
+
+        conn = None
+        try:
+            conn = engine.connect()
+            acquired = conn.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": SCHEDULER_LOCK_KEY}
+            ).scalar()
+            # advisory lock 是会话级的，提交事务不会释放，但连接必须一直保持
+            conn.commit()
+        except Exception as e:
+            logger.error(f"[SCHEDULER] leader election failed: {e}")
+            if conn is not None:
+                conn.close()
+            self.is_leader = False
+            return False
+
+        if acquired:
+            self._lock_conn = conn
+            if not self.is_leader:
+                logger.info("[SCHEDULER] acquired leadership")
+            self.is_leader = True
+        else:
+            conn.close()
+            self.is_leader = False
+        return self.is_leader
+
+    def _release_leadership(self):
+        if self._lock_conn is None:
+            return
+        from sqlalchemy import text
+        try:
+            self._lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": SCHEDULER_LOCK_KEY})
+            self._lock_conn.commit()
+        except Exception as e:
+            logger.warning(f"[SCHEDULER] failed to release advisory lock: {e}")
+        self._close_lock_conn()
+
+    def _close_lock_conn(self):
+        try:
+            self._lock_conn.close()
+        except Exception:
+            pass
+        self._lock_conn = None
+        self.is_leader = False
+
+
+# ===== 维护任务 =====
+
+def purge_expired_captchas(db) -> Optional[str]:
+    from app.services.captcha_service import CaptchaService
+    deleted = CaptchaService.cleanup_expired_sessions(db)
+    return f"deleted={deleted}" if deleted else None
+
+
+def close_stale_sessions(db) -> Optional[str]:
+    """
+    一条 UPDATE ... RETURNING 关闭所有超时未结束的会话
+
+    开启 SCHEDULER_REVIEW_ABANDONED_SESSIONS 时，为有对话但还没有总结的会话排队生成总结。
+    先提交关闭再排队：作业线程使用自己的 session，提交失败时也不会为仍然打开的会话生成总结。
+    """
+    from sqlalchemy import exists, update
+
+    from app.models.session import Session, SessionStatus
+    from app.models.session_review import SessionReview
+
+    now = datetime.utcnow()
+    cutoff = now - timedelta(hours=settings.SESSION_STALE_HOURS)
+    closed = db.execute(
+        update(Session)
+        .where(Session.status == SessionStatus.open, Session.start_time < cutoff)
+        .values(status=SessionStatus.closed, end_time=now)
+        .returning(Session.id, Session.user_id, Session.agno_session_id, Session.turn_count)
+        .execution_options(synchronize_session=False)
+    ).all()
+    if not closed:
+        return None
+
+    pending = []
+    if settings.SCHEDULER_REVIEW_ABANDONED_SESSIONS:
+        # 开场白占一轮，用户至少说过一句话才值得总结
+        candidates = [row for row in closed if row.agno_session_id and row.turn_count > 1]
+        if candidates:
+            reviewed = {
+                session_id for (session_id,) in db.query(SessionReview.session_id).filter(
+                    SessionReview.session_id.in_([row.id for row in candidates])
+                )
+            }
+            pending = [row for row in candidates if row.id not in reviewed]
+
+    db.commit()
+    for row in pending:
+        get_scheduler().enqueue(review_abandoned_session, row.user_id, row.id, row.agno_session_id)
+
+    return f"closed={len(closed)}, reviews_queued={len(pending)}"
+
+
+def review_abandoned_session(user_id: int, session_id: int, agno_session_id: str):
+    """为被放弃的会话生成总结（在 scheduler 的作业线程中执行）"""
+    from app.services.database import SessionLocal
+    from app.services.session_orchestrator import SessionOrchestrator
+
+    db = SessionLocal()
+    try:
+        SessionOrchestrator(db=db).end_session_with_review(
+            user_id=user_id,
+            session_id=session_id,
+            agno_session_id=agno_session_id
+        )
+        db.commit()
+        logger.info(f"[SCHEDULER] generated review for abandoned session {session_id}")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+# 全局单例
+_scheduler: Optional[MaintenanceScheduler] = None
+
+
+def get_scheduler() -> MaintenanceScheduler:
+    """获取全局维护调度器单例（首次调用时注册内置任务）"""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = MaintenanceScheduler()
+        _scheduler.add_task(
+            "captcha.purge_expired", purge_expired_captchas,
+            interval=settings.SCHEDULER_CAPTCHA_PURGE_INTERVAL_SECONDS,
+        )
+        _scheduler.add_task(
+            "sessions.close_stale", close_stale_sessions,
+            interval=settings.SCHEDULER_STALE_SESSION_INTERVAL_SECONDS,
+        )
+    return _scheduler
@@ -0,0 +1,130 @@
+"""
+Session Events
+
+会话 WebSocket 的服务端推送事件（计时 / 超时提示状态、会话总结完成）：
+- 写入方在事务中调用 publish_session_event(db, session_id, event)，提交后才投递，回滚则丢弃
+- Postgres 下通过 NOTIFY 投递给所有 worker（包括自己），由各 worker 的 LISTEN 线程
+  分发给本进程内订阅了该会话的 WebSocket 连接；其他数据库（本地单进程）在提交后直接本地分发
+- 事件只携带少量字段（NOTIFY payload 上限 8000 字节），大内容（如会话总结）由连接自行读取数据库
+
+订阅方是 asyncio 的有界队列，分发在 LISTEN / 请求线程中进行，通过 call_soon_threadsafe
+放入队列；队列已满说明客户端消费太慢，订阅方会被标记为 overflowed，由连接自行断开。
+"""
+
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from typing import Dict, Optional, Set
+
+from sqlalchemy import event as sa_event
+
+from app.services.pg_notify import notify
+
+logger = logging.getLogger(__name__)
+
+# LISTEN/NOTIFY channel，payload 为 {"session_id": ..., "event": {...}}
+SESSION_EVENTS_CHANNEL = "session_events"
+
+
+class SessionSubscriber:
+    """一个 WebSocket 连接的事件队列"""
+
+    def __init__(self, session_id: int, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue):
+        self.session_id = session_id
+        self.loop = loop
+        self.queue = queue
+        self.overflowed = False
+
+    def offer(self, event: Dict):
+        """在事件循环线程中调用：放入队列，满了则标记 overflowed"""
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class SessionEventHub:
+    """进程内的 session_id -> 订阅者 注册表"""
+
+    def __init__(self):
+        self._subscribers: Dict[int, Set[SessionSubscriber]] = defaultdict(set)
+        self._lock = threading.Lock()
+
+        self.dispatched = 0
+
+    def subscribe(self, session_id: int, queue: asyncio.Queue) -> SessionSubscriber:
+        """在事件循环中调用"""
+        subscriber = SessionSubscriber(session_id, asyncio.get_running_loop(), queue)
+        with self._lock:
+            self._subscribers[session_id].add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: SessionSubscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(subscriber.session_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[subscriber.session_id]
+
+    def dispatch(self, session_id: int, event: Dict):
+        """把事件交给本进程内该会话的所有连接（任意线程可调用）"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(session_id, ()))
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.offer, event)
+            except RuntimeError:
+                # 事件循环已关闭（连接正在退出）
+                continue
+        self.dispatched += 1
+
+    def connections(self) -> int:
+        with self._lock:
+            return sum(len(s) for s in self._subscribers.values())
+
+    def stats(self) -> Dict:
+        return {"connections": self.connections(), "dispatched": self.dispatched}
+
+
+# 全局单例
+_hub: Optional[SessionEventHub] = None
+
+
+def get_session_event_hub() -> SessionEventHub:
+    """获取全局会话事件分发单例"""
+    global _hub
+    if _hub is None:
+        _hub = SessionEventHub()
+    return _hub
+
+
+def publish_session_event(db, session_id: int, event: Dict):
+    """在当前事务中发布事件（提交后投递给所有 worker 上该会话的连接）"""
+    if db.get_bind().dialect.name == "postgresql":
+        notify(db, SESSION_EVENTS_CHANNEL, json.dumps({"session_id": session_id, "event": event}))
+        return
+    sa_event.listen(
+        db, "after_commit",
+        lambda _session: get_session_event_hub().dispatch(session_id, event),
+        once=True,
+    )
+
+
+def _handle_notification(payload: Optional[str]):
+    if payload is None:
+        # 重连期间可能漏掉事件：客户端会在下一次交互时拿到最新状态，这里不做补发
+        return
+    try:
+        data = json.loads(payload)
+        get_session_event_hub().dispatch(int(data["session_id"]), data["event"])
+    except (ValueError, KeyError, TypeError) as e:
+        logger.warning(f"Invalid session event payload {payload!r}: {e}")
+
+
+def subscribe_session_events():
+    """注册其他 worker 发布的会话事件"""
+    from app.services.pg_notify import get_notify_listener
+    get_notify_listener().subscribe(SESSION_EVENTS_CHANNEL, _handle_notification)
@@ -1,13 +1,175 @@
 import logging
+from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
-from typing import Dict, Optional
-from app.agents.therapist_agent_service import TherapistAgentService
-from app.agents.clerk_agent_service import ClerkAgentService
-from app.agents.intent_classifier import IntentClassifier  # 保留但暂时不使用
-from app.models.session import Session as SessionModel
+from typing import Callable, Dict, Optional, Tuple
+from app.core.cancellation import RunCancelled
+from app.core.config import settings
+from app.models.session import Session as SessionModel, SessionStatus
+from app.services.session_events import publish_session_event
+from app.services.lifecycle import get_lifecycle_manager
+from app.services.session_timeout_service import SessionTimeoutService
 
 logger = logging.getLogger(__name__)
 
+# System trigger message for the therapist's opening turn, hidden from the transcript
+OPENING_TRIGGER_MESSAGE = "开始咨询"
+
+
+def is_opening_pending(session: SessionModel) -> bool:
+    """
+    Whether the opening message of this session is still being generated.
+
+    A flag older than SESSION_OPENING_TIMEOUT_SECONDS is treated as stale (the worker
+    running the background task died), so it never blocks the session forever.
+    """
+    if not session.opening_pending:
+        return False
+    deadline = timedelta(seconds=settings.SESSION_OPENING_TIMEOUT_SECONDS)
+    return session.start_time is None or datetime.utcnow() - session.start_time < deadline
+
+
+def generate_opening_message(user_id: int, session_id: int, agno_session_id: str, run_id: Optional[int] = None):
+    """
+    Generate the therapist's opening message in the background (FastAPI BackgroundTasks).
+
+    Runs after start_session has returned, with its own DB session; clears
+    sessions.opening_pending when done, whether generation succeeded or not.
+    The reply is stored in the Agno session and picked up by the client's next poll.
+
+    run_id is the lifecycle run start_session registered before returning, so a drain
+    that begins between the response and this task still waits for the opening; it is
+    ended here. Without it (direct calls) the run is registered on entry, admitted while
+    draining because the session was already started.
+    """
+    from app.services.database import SessionLocal
+
+    lifecycle = get_lifecycle_manager()
+    if run_id is None:
+        run_id = lifecycle.begin_run("opening", admit_during_drain=True)
+    db = SessionLocal()
+    try:
+        try:
+            SessionOrchestrator(db=db).process_message(
+                user_id=user_id,
+                session_id=session_id,
+                agno_session_id=agno_session_id,
+                user_message=OPENING_TRIGGER_MESSAGE
+            )
+            logger.info(f"Generated opening message for session {session_id}")
+        except Exception as e:
+            # 开场白失败不影响会话本身，用户可以直接发消息
+            db.rollback()
+            logger.error(f"Failed to generate opening message for session {session_id}: {e}", exc_info=True)
+
+        db.query(SessionModel).filter(SessionModel.id == session_id).update(
+            {SessionModel.opening_pending: False}, synchronize_session=False
+        )
+        publish_session_event(db, session_id, {"type": "opening_ready", "session_id": session_id})
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Failed to finish opening message for session {session_id}: {e}", exc_info=True)
+    finally:
+        db.close()
+        lifecycle.end_run(run_id)
+
+
+def session_state_event(session: SessionModel) -> Dict:
+    """Timing / overtime-reminder state pushed to the session's WebSocket connections."""
+    return {"type": "session_state", "session_id": session.id, **SessionTimeoutService.state(session)}
+
+
+def run_session_turn(
+    user_id: int,
+    session_id: int,
+    user_message: str,
+    active_duration_seconds: Optional[int] = None,
+    on_token: Optional[Callable[[str], None]] = None
+) -> str:
+    """
+    One therapist turn for the WebSocket channel, with its own DB session.
+
+    Mirrors POST /sessions/{id}/post_message and publishes the new session_state
+    event on commit.
+
+    Raises:
+        ValueError: Session not found / not owned by the user / closed / opening still pending
+        RunCancelled: The connection went away and the run was stopped
+        ServiceDraining: The server is shutting down
+    """
+    from app.services.database import SessionLocal
+
+    with get_lifecycle_manager().track_run("ws_message"):
+        db = SessionLocal()
+        try:
+            session = db.query(SessionModel).filter(SessionModel.id == session_id).first()
+            if session is None or session.user_id != user_id:
+                raise ValueError(f"Session {session_id} not found")
+            if session.status != SessionStatus.open:
+                raise ValueError("Session is closed")
+            if is_opening_pending(session):
+                raise ValueError("Opening message is still being generated")
+
+            if active_duration_seconds is not None:
+                session.active_duration_seconds = active_duration_seconds
+                db.flush()
+
+            reply = SessionOrchestrator(db=db).process_message(
+                user_id=user_id,
+                session_id=session.id,
+                agno_session_id=session.agno_session_id,
+                user_message=user_message,
+                active_duration_seconds=active_duration_seconds,
+                on_token=on_token
+            )
+            publish_session_event(db, session.id, session_state_event(session))
+            db.commit()
+            return reply
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+def end_session_for_user(user_id: int, session_id: int) -> Dict:
+    """
+    End a session with ClerkAgent review for the WebSocket channel, with its own DB session.
+
+    Mirrors POST /sessions/{id}/end; connections learn about the review through
+    the review_ready event published on commit.
+
+    Raises:
+        ValueError: Session not found / not owned by the user / already closed
+        ServiceDraining: The server is shutting down
+    """
+    from app.services.database import SessionLocal
+
+    with get_lifecycle_manager().track_run("ws_end_session"):
+        db = SessionLocal()
+        try:
+            session = db.query(SessionModel).filter(SessionModel.id == session_id).first()
+            if session is None or session.user_id != user_id:
+                raise ValueError(f"Session {session_id} not found")
+            if session.status == SessionStatus.closed:
+                raise ValueError("Session is already closed")
+
+            result = SessionOrchestrator(db=db).end_session_with_review(
+                user_id=user_id,
+                session_id=session.id,
+                agno_session_id=session.agno_session_id
+            )
+            session.status = SessionStatus.closed
+            session.end_time = datetime.utcnow()
+            publish_session_event(db, session.id, {"type": "review_ready", "session_id": session.id})
+            db.commit()
+            return result
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
 
 class SessionOrchestrator:
     """
@@ -22,6 +184,11 @@ class SessionOrchestrator:
         Args:
             db: Database session
         """
+        # agno / openai 导入较慢：路由模块导入本模块时不加载，第一次处理会话（或 worker 预热）时才导入
+        from app.agents.clerk_agent_service import ClerkAgentService
+        from app.agents.therapist_agent_service import TherapistAgentService
+        # from app.agents.intent_classifier import IntentClassifier  # 保留但暂时不使用
+
         self.db = db
         self.therapist_service = TherapistAgentService()
         self.clerk_service = ClerkAgentService()
@@ -33,7 +200,8 @@ class SessionOrchestrator:
         session_id: int,
         agno_session_id: str,
         user_message: str,
-        active_duration_seconds: Optional[int] = None
+        active_duration_seconds: Optional[int] = None,
+        on_token: Optional[Callable[[str], None]] = None
     ) -> str:
         """
         Process a user message and generate a therapeutic response.
@@ -44,12 +212,14 @@ class SessionOrchestrator:
             agno_session_id: Agno session ID (sessions.agno_session_id)
             user_message: User's message text
             active_duration_seconds: Accumulated active duration in seconds (from frontend)
+            on_token: Stream the reply, called with each text delta (WebSocket channel)
 
         Returns:
             Therapist's response
 
         Raises:
             ValueError: If user context not found
+            RunCancelled: The client went away and the run was stopped
             Exception: If processing fails
         """
         try:
@@ -62,11 +232,14 @@ class SessionOrchestrator:
                 session_id=agno_session_id,  # 使用 Agno session ID
                 message=user_message,
                 db=self.db,
-                active_duration_seconds=active_duration_seconds
+                active_duration_seconds=active_duration_seconds,
+                on_token=on_token
             )
 
             return response
 
+        except RunCancelled:
+            raise
         except Exception as e:
             logger.error(f"Error processing message: {str(e)}", exc_info=True)
             raise Exception(f"Error processing message: {str(e)}")
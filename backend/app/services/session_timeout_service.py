@@ -5,7 +5,7 @@ Session Timeout Service
 """
 
 from app.models.session import Session
-from app.core.config import settings
+from app.services.runtime_settings import get_runtime_settings
 from sqlalchemy.orm import Session as DBSession
 import logging
 
@@ -15,6 +15,22 @@ logger = logging.getLogger(__name__)
 class SessionTimeoutService:
     """会话超时管理服务（极简版）"""
 
+    @staticmethod
+    def is_overtime(session: Session) -> bool:
+        """是否已超过建议时长（只读，不修改状态）"""
+        suggested_duration = get_runtime_settings().get("SESSION_SUGGESTED_DURATION_MINUTES") * 60
+        return session.active_duration_seconds > suggested_duration
+
+    @staticmethod
+    def state(session: Session) -> dict:
+        """推送给客户端的会话计时状态"""
+        return {
+            "active_duration_seconds": session.active_duration_seconds,
+            "turn_count": session.turn_count,
+            "overtime_reminder_count": session.overtime_reminder_count,
+            "should_remind": SessionTimeoutService.is_overtime(session),
+        }
+
     @staticmethod
     def check_and_update(session: Session, db: DBSession) -> dict:
         """
@@ -34,8 +50,7 @@ class SessionTimeoutService:
         session.turn_count += 1
 
         # 检查是否超时（只判断时长）
-        suggested_duration = settings.SESSION_SUGGESTED_DURATION_MINUTES * 60
-        should_remind = session.active_duration_seconds > suggested_duration
+        should_remind = SessionTimeoutService.is_overtime(session)
 
         # 持久化
         db.flush()
@@ -0,0 +1,159 @@
+"""
+Therapist Catalog
+
+治疗师目录很少变化，但 GET /api/therapists 每次打开页面都会请求，聊天的每一轮也要读取治疗师 prompt。
+这里在进程内缓存一份不可变快照：
+- 启动时加载，之后读路径完全不访问数据库
+- 列表 / 详情的 JSON 在加载时序列化好，并以内容的 sha256 作为强 ETag
+- update_therapist 提交后调用 invalidate()，并通过 pg_notify 通知其他 worker 失效
+- 失效后在下一次访问时重新加载（generation 计数避免加载期间的失效被覆盖）；
+  同一时刻只有一个线程重新加载，其他线程继续使用上一份快照，失效不会引起一波并发加载
+"""
+
+import hashlib
+import logging
+import threading
+from typing import Dict, List, NamedTuple, Optional
+
+from pydantic import TypeAdapter
+
+from app.schemas.therapist import TherapistListItem, TherapistRead
+
+logger = logging.getLogger(__name__)
+
+# LISTEN/NOTIFY channel，payload 为变更的 therapist_id
+THERAPIST_CATALOG_CHANNEL = "therapist_catalog"
+
+_list_adapter = TypeAdapter(List[TherapistListItem])
+
+
+def make_etag(body: bytes) -> str:
+    """强 ETag：响应体内容的 sha256"""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+class CachedBody(NamedTuple):
+    """预先序列化好的响应体"""
+    body: bytes
+    etag: str
+
+
+class CatalogSnapshot(NamedTuple):
+    therapists: Dict[str, TherapistRead]
+    list_body: CachedBody
+    detail_bodies: Dict[str, CachedBody]
+
+
+class TherapistCatalog:
+    """进程内治疗师目录缓存"""
+
+    def __init__(self):
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._snapshot_generation = -1  # _snapshot 加载开始时的 generation，不等于 _generation 即已失效
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+
+        self.loads = 0
+        self.invalidations = 0
+
+    def load(self, db=None) -> CatalogSnapshot:
+        """从数据库加载快照（db 为空时使用独立 session）"""
+        from app.models.therapist import Therapist
+
+        generation = self._generation
+        own_session = db is None
+        if own_session:
+            from app.services.database import SessionLocal
+            db = SessionLocal()
+        try:
+            rows = db.query(Therapist).order_by(Therapist.id).all()
+            therapists = {row.id: TherapistRead.model_validate(row) for row in rows}
+        finally:
+            if own_session:
+                db.close()
+
+        list_body = _list_adapter.dump_json(
+            [TherapistListItem.model_validate(t, from_attributes=True) for t in therapists.values()]
+        )
+        detail_bodies = {}
+        for therapist_id, therapist in therapists.items():
+            body = therapist.model_dump_json().encode("utf-8")
+            detail_bodies[therapist_id] = CachedBody(body, make_etag(body))
+        snapshot = CatalogSnapshot(therapists, CachedBody(list_body, make_etag(list_body)), detail_bodies)
+
+        with self._lock:
+            self.loads += 1
+            # 按加载开始时的 generation 保存：加载期间发生了失效时，这份快照仍比之前的新，
+            # 可以在重新加载期间提供给其他线程，但依然视为已失效，下一次访问会再加载
+            if generation >= self._snapshot_generation:
+                self._snapshot = snapshot
+                self._snapshot_generation = generation
+        logger.info(f"Therapist catalog loaded: {len(therapists)} therapists")
+        return snapshot
+
+    def _is_current(self) -> bool:
+        return self._snapshot is not None and self._snapshot_generation == self._generation
+
+    def snapshot(self) -> CatalogSnapshot:
+        snapshot = self._snapshot
+        if self._is_current():
+            return snapshot
+        # 已失效：只有一个线程重新加载，其他线程直接返回上一份快照；还没有快照时只能等待
+        if not self._reload_lock.acquire(blocking=snapshot is None):
+            return snapshot
+        try:
+            # 等到锁时可能已经由别的线程加载完成
+            if self._is_current():
+                return self._snapshot
+            return self.load()
+        finally:
+            self._reload_lock.release()
+
+    def invalidate(self, therapist_id: Optional[str] = None):
+        """标记快照失效，下次访问时重新加载（重新加载期间其他线程仍使用旧快照）"""
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+        logger.info(f"Therapist catalog invalidated: therapist={therapist_id or '*'}")
+
+    # ===== 读取 =====
+
+    def get(self, therapist_id: str) -> Optional[TherapistRead]:
+        return self.snapshot().therapists.get(therapist_id)
+
+    def list_body(self) -> CachedBody:
+        return self.snapshot().list_body
+
+    def detail_body(self, therapist_id: str) -> Optional[CachedBody]:
+        return self.snapshot().detail_bodies.get(therapist_id)
+
+    def stats(self) -> Dict:
+        snapshot = self._snapshot
+        return {
+            "loaded": self._is_current(),
+            "therapists": len(snapshot.therapists) if snapshot else 0,
+            "etag": snapshot.list_body.etag if snapshot else None,
+            "loads": self.loads,
+            "invalidations": self.invalidations,
+        }
+
+
+# 全局单例
+_catalog: Optional[TherapistCatalog] = None
+
+
+def get_therapist_catalog() -> TherapistCatalog:
+    """获取全局治疗师目录单例"""
+    global _catalog
+    if _catalog is None:
+        _catalog = TherapistCatalog()
+    return _catalog
+
+
+def subscribe_catalog_invalidation():
+    """注册其他 worker 的失效通知（payload 为 None 表示重连后全量失效）"""
+    from app.services.pg_notify import get_notify_listener
+    get_notify_listener().subscribe(
+        THERAPIST_CATALOG_CHANNEL, lambda payload: get_therapist_catalog().invalidate(payload)
+    )
@@ -48,14 +48,34 @@ class UserService:
         Returns:
             Newly created User object
         """
-        hashed_password = hash_password(user_create.password)
+        db_user = UserService.add_user(db, user_create)
+        db.commit()
+        db.refresh(db_user)
+        return db_user
+
+    @staticmethod
+    def add_user(db: Session, user_create: UserCreate, hashed_password: Optional[str] = None) -> User:
+        """
+        Insert a new user without committing (caller owns the transaction).
+
+        The INSERT is flushed immediately so the id and server defaults are available
+        and a duplicate email raises IntegrityError here.
+
+        Args:
+            db: Database session
+            user_create: User creation data
+            hashed_password: Hash computed before the transaction started (hashing is slow
+                and would otherwise hold the transaction open); hashed here if omitted
+
+        Returns:
+            Newly inserted (uncommitted) User object
+        """
         db_user = User(
             email=user_create.email,
-            hashed_password=hashed_password
+            hashed_password=hashed_password or hash_password(user_create.password)
         )
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        db.flush()
         return db_user
 
     @staticmethod
@@ -0,0 +1,134 @@
+"""
+Versioned Store
+
+数据库中带版本号的配置在每个 worker 内的快照（运行参数 app/services/runtime_settings.py、
+提示词 app/services/prompt_store.py 共用）：
+
+- 快照整体替换引用，读路径不加锁、不访问数据库
+- reload 在锁内读取数据库并替换快照，之后（锁外）回调 listener(changed_keys)
+- 修改在同一个事务中 NOTIFY，其他 worker 收到后 check_version；另有轮询线程每 poll_interval 秒
+  比较一次版本戳，兜底漏掉的通知和非 Postgres 部署
+- 写入前用 lock_for_write 取 Postgres advisory xact lock，串行化版本号的分配
+
+子类实现 _read_stamp（版本戳，配置变化时必然变化）和 _load（读取数据库、替换快照、返回变化的 key）。
+"""
+
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+
+class VersionedStore:
+    """进程内的版本化快照 + 版本轮询线程"""
+
+    label = "Versioned store"  # 日志中的名称
+    thread_name = "versioned-store-poller"
+    lock_key: int = 0  # 串行化修改的 advisory lock key
+
+    def __init__(self, poll_interval: float = 30.0):
+        self.poll_interval = poll_interval
+        self.version = 0
+        self.loaded = False
+        self.loaded_at: Optional[datetime] = None
+        self._stamp: Any = None
+        self._reload_lock = threading.Lock()
+        self._listeners: List[Callable[[set], None]] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.reloads = 0
+
+    # ===== 子类实现 =====
+
+    def _read_stamp(self, db) -> Any:
+        """数据库中的当前版本戳"""
+        raise NotImplementedError
+
+    def _load(self, db) -> set:
+        """读取数据库、替换快照并设置 self.version / self._stamp，返回变化的 key（在 reload 锁内调用）"""
+        raise NotImplementedError
+
+    # ===== 加载 =====
+
+    def add_listener(self, callback: Callable[[set], None]):
+        """注册变更回调：callback(changed_keys)，在执行 reload 的线程中调用"""
+        self._listeners.append(callback)
+
+    def reload(self, db=None) -> bool:
+        """从数据库重新加载快照，返回是否有内容发生变化"""
+        own_session = db is None
+        if own_session:
+            from app.services.database import SessionLocal
+            db = SessionLocal()
+        try:
+            with self._reload_lock:
+                changed = self._load(db)
+                self.loaded = True
+                self.loaded_at = datetime.utcnow()
+                self.reloads += 1
+        finally:
+            if own_session:
+                db.close()
+
+        if changed:
+            logger.info(f"{self.label} reloaded: version={self.version}, changed={sorted(changed)}")
+            for callback in self._listeners:
+                try:
+                    callback(changed)
+                except Exception as e:
+                    logger.error(f"{self.label} listener failed: {e}", exc_info=True)
+        return bool(changed)
+
+    def check_version(self) -> bool:
+        """比较数据库中的版本戳，不一致时重新加载"""
+        from app.services.database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            if self.loaded and self._read_stamp(db) == self._stamp:
+                return False
+            return self.reload(db)
+        finally:
+            db.close()
+
+    def lock_for_write(self, db):
+        """在当前事务中取 advisory lock（Postgres），提交或回滚时释放"""
+        if db.get_bind().dialect.name == "postgresql":
+            db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": self.lock_key})
+
+    # ===== 轮询线程 =====
+
+    def start(self):
+        if self.poll_interval <= 0:
+            return
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.check_version()
+            except Exception as e:
+                logger.warning(f"{self.label} poll failed: {e}")
+
+    def stats(self) -> Dict:
+        return {
+            "version": self.version,
+            "loaded_at": self.loaded_at,
+            "reloads": self.reloads,
+            "polling": self._thread is not None and self._thread.is_alive(),
+        }
@@ -0,0 +1,154 @@
+"""
+Worker Warmup
+
+每个 worker 启动后（lifespan 中，已加载治疗师目录 / 运行参数 / 提示词版本之后）在后台线程中
+把第一次请求才会做的初始化提前做掉，避免重启 / 扩容后的第一批用户承担冷启动延迟：
+- 导入启动时懒加载的重模块（agno / openai / httpx / numpy / PIL / passlib，见 import_heavy_modules）
+- 打开数据库连接池（主库和 Agno 库各建立一个连接）
+- 创建共享的 HTTP client，并向模型接口发一次 models.list 建立 TLS 连接
+- 解析 app/config/prompts/*.yaml（PromptLoader 缓存）
+- 构造各 agent（Agno Agent、工具、模型配置）
+
+完成之前 /health 返回 503，负载均衡不会把流量导过来；某一步失败只记录日志，不影响就绪
+（对应的初始化会在第一次请求时重试）。
+
+fork 安全（gunicorn preload_app=True 时 master 导入 app 后 fork 出 worker）：
+- 导入阶段不创建连接、不启动线程；后台线程、LISTEN 连接、验证码渲染进程都在 worker 的 lifespan 中启动
+- 数据库连接池和共享 HTTP client 在子进程中通过 os.register_at_fork 丢弃继承的连接
+  （见 app/services/database.py、app/core/openai_logger.py）
+- agent 单例（ClerkAgentService / OnboardingAgentService）、PromptLoader 都在 worker 中懒加载，
+  这里的预热同样在 worker 中执行
+- import_heavy_modules 只导入模块、不创建连接或线程，gunicorn 在 fork 前于 master 中调用一次，
+  worker 共享这些模块的内存（见 gunicorn.conf.py）
+"""
+
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def import_heavy_modules():
+    """导入路由模块里改为懒加载的依赖（导入 app.main 时不加载，见 benchmarks/startup.py）"""
+    import app.agents.clerk_agent_service  # noqa: F401  agno / openai
+    import app.agents.onboarding_agent  # noqa: F401
+    import app.agents.therapist_agent_service  # noqa: F401
+    import app.core.openai_logger  # noqa: F401  httpx
+    import app.services.emo_trend_service  # noqa: F401  numpy
+    from app.core.security import get_pwd_context
+    from app.services.captcha_service import _load_font
+
+    get_pwd_context()  # passlib
+    _load_font()  # PIL
+
+
+def _open_db_pools():
+    from sqlalchemy import text
+    from app.services.database import engine, get_agno_db
+
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    with get_agno_db().db_engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+
+def _open_http_pool():
+    from openai import OpenAI
+    from app.core.openai_logger import get_logging_http_client
+
+    client = OpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        base_url=settings.OPENAI_BASE_URL,
+        http_client=get_logging_http_client(),
+        max_retries=0,
+    )
+    client.models.list()
+
+
+def _load_prompt_files():
+    from app.services.prompt_loader import get_prompt_loader
+
+    loader = get_prompt_loader()
+    for path in sorted(loader.prompts_dir.glob("*.yaml")):
+        loader.get_prompt(path.name)
+
+
+def _construct_agents():
+    from app.agents.clerk_agent_service import ClerkAgentService
+    from app.agents.onboarding_agent import OnboardingAgentService
+    from app.agents.therapist_agent_service import TherapistAgentService
+
+    TherapistAgentService()
+    ClerkAgentService()
+    OnboardingAgentService()
+
+
+WARMUP_STEPS = [
+    ("imports", import_heavy_modules),
+    ("database pools", _open_db_pools),
+    ("http pool", _open_http_pool),
+    ("prompt files", _load_prompt_files),
+    ("agents", _construct_agents),
+]
+
+
+class Warmup:
+    """后台预热 + 就绪状态"""
+
+    def __init__(self):
+        self._ready = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.timings: Dict[str, float] = {}
+        self.failed: List[str] = []
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def start(self):
+        """在后台线程中预热（WARMUP_ENABLED=False 时直接就绪）"""
+        if not settings.WARMUP_ENABLED:
+            self._ready.set()
+            return
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self.run, name="worker-warmup", daemon=True)
+        self._thread.start()
+
+    def run(self):
+        started = time.perf_counter()
+        for name, step in WARMUP_STEPS:
+            step_started = time.perf_counter()
+            try:
+                step()
+            except Exception as e:
+                self.failed.append(name)
+                logger.warning(f"[WARMUP] {name} failed: {e}")
+            self.timings[name] = round((time.perf_counter() - step_started) * 1000, 1)
+        self._ready.set()
+        logger.info(
+            f"[WARMUP] ready in {(time.perf_counter() - started) * 1000:.0f}ms, "
+            f"steps(ms)={self.timings}" + (f", failed={self.failed}" if self.failed else "")
+        )
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def stats(self) -> Dict:
+        return {"ready": self.ready, "timings_ms": dict(self.timings), "failed": list(self.failed)}
+
+
+# 全局单例
+_warmup: Optional[Warmup] = None
+
+
+def get_warmup() -> Warmup:
+    """获取当前 worker 的预热状态单例"""
+    global _warmup
+    if _warmup is None:
+        _warmup = Warmup()
+    return _warmup
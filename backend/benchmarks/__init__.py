@@ -0,0 +1,8 @@
+"""
+Backend benchmarks
+
+- micro: 单个热点函数（鉴权、指令组装、runs 转换、验证码、情绪评估、prompt 日志）
+- macro: 完整 HTTP round trip（Agent 被替换为 StubAgent）
+
+运行方式见 benchmarks/run.py
+"""
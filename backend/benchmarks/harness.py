@@ -0,0 +1,191 @@
+"""
+Benchmark Harness
+
+注册、计时和基线对比：
+- @benchmark 注册一个 benchmark：被装饰的函数接收 BenchEnv，返回要反复执行的无参函数
+- run_benchmark 先预热，再计时 N 次，同时统计每次执行的 SQL 语句数
+- compare_results 把本次结果和基线对比，p50 变慢超过阈值视为回归
+
+注意：app.core.config 在导入时读取环境变量，这里不在模块级导入 app，
+由 runner 先配置好数据库再导入。
+"""
+
+import gc
+import statistics
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+
+@dataclass
+class BenchmarkSpec:
+    name: str
+    group: str  # micro / macro
+    setup: Callable[[Any], Callable[[], Any]]
+    iterations: int = 200
+    warmup: int = 20
+    threshold: Optional[float] = None  # 覆盖全局回归阈值（如 0.5 表示允许慢 50%）
+
+
+_registry: Dict[str, BenchmarkSpec] = {}
+
+
+def benchmark(name: str, group: str, iterations: int = 200, warmup: int = 20,
+              threshold: Optional[float] = None):
+    """
+    注册 benchmark
+
+    使用示例：
+        @benchmark("sessions.runs_to_messages", group="micro")
+        def bench_runs_to_messages(env):
+            runs = env.make_runs(20)
+            return lambda: runs_to_messages(runs)
+    """
+    def decorator(setup: Callable[[Any], Callable[[], Any]]):
+        _registry[name] = BenchmarkSpec(name, group, setup, iterations, warmup, threshold)
+        return setup
+    return decorator
+
+
+def get_benchmarks(groups: Optional[List[str]] = None, pattern: Optional[str] = None) -> List[BenchmarkSpec]:
+    specs = list(_registry.values())
+    if groups:
+        specs = [s for s in specs if s.group in groups]
+    if pattern:
+        specs = [s for s in specs if pattern in s.name]
+    return specs
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    group: str
+    iterations: int
+    mean_us: float
+    p50_us: float
+    p95_us: float
+    min_us: float
+    max_us: float
+    stdev_us: float
+    ops_per_sec: float
+    queries_per_op: float
+    threshold: Optional[float] = None
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {
+            "name": self.name,
+            "group": self.group,
+            "iterations": self.iterations,
+            "mean_us": round(self.mean_us, 2),
+            "p50_us": round(self.p50_us, 2),
+            "p95_us": round(self.p95_us, 2),
+            "min_us": round(self.min_us, 2),
+            "max_us": round(self.max_us, 2),
+            "stdev_us": round(self.stdev_us, 2),
+            "ops_per_sec": round(self.ops_per_sec, 1),
+            "queries_per_op": round(self.queries_per_op, 2),
+        }
+        if self.threshold is not None:
+            data["threshold"] = self.threshold
+        if self.extra:
+            data["extra"] = self.extra
+        return data
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    k = (len(sorted_values) - 1) * pct / 100
+    lower = int(k)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (k - lower)
+
+
+def run_benchmark(spec: BenchmarkSpec, env, iterations: Optional[int] = None) -> BenchmarkResult:
+    """预热后计时执行，返回统计结果"""
+    from app.core.query_counter import count_queries
+
+    iterations = iterations or spec.iterations
+    op = spec.setup(env)
+
+    for _ in range(spec.warmup):
+        op()
+
+    timings_ns: List[int] = []
+    gc_was_enabled = gc.isenabled()
+    gc.collect()
+    gc.disable()
+    try:
+        with count_queries() as stats:
+            for _ in range(iterations):
+                start = time.perf_counter_ns()
+                op()
+                timings_ns.append(time.perf_counter_ns() - start)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    timings_us = sorted(t / 1000 for t in timings_ns)
+    mean_us = statistics.fmean(timings_us)
+    return BenchmarkResult(
+        name=spec.name,
+        group=spec.group,
+        iterations=iterations,
+        mean_us=mean_us,
+        p50_us=_percentile(timings_us, 50),
+        p95_us=_percentile(timings_us, 95),
+        min_us=timings_us[0],
+        max_us=timings_us[-1],
+        stdev_us=statistics.pstdev(timings_us),
+        ops_per_sec=1_000_000 / mean_us if mean_us > 0 else 0.0,
+        queries_per_op=stats.count / iterations,
+        threshold=spec.threshold,
+    )
+
+
+# ===== 基线对比 =====
+
+def compare_results(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """
+    对比本次结果和基线
+
+    以 p50 为准（比 mean 更不受偶发抖动影响）；SQL 语句数增加也视为回归，
+    因为它通常意味着引入了 N+1。
+
+    Returns:
+        每个 benchmark 一项：{name, baseline_p50_us, current_p50_us, change, status}
+    """
+    baseline_by_name = {r["name"]: r for r in baseline.get("results", [])}
+    rows = []
+    for result in current.get("results", []):
+        base = baseline_by_name.get(result["name"])
+        if base is None:
+            rows.append({"name": result["name"], "status": "new", "current_p50_us": result["p50_us"]})
+            continue
+
+        limit = result.get("threshold", threshold)
+        change = (result["p50_us"] - base["p50_us"]) / base["p50_us"] if base["p50_us"] > 0 else 0.0
+        query_delta = result["queries_per_op"] - base["queries_per_op"]
+
+        if change > limit or query_delta > 0.5:
+            status = "regression"
+        elif change < -limit:
+            status = "improved"
+        else:
+            status = "ok"
+
+        rows.append({
+            "name": result["name"],
+            "baseline_p50_us": base["p50_us"],
+            "current_p50_us": result["p50_us"],
+            "change": round(change, 4),
+            "threshold": limit,
+            "baseline_queries_per_op": base["queries_per_op"],
+            "current_queries_per_op": result["queries_per_op"],
+            "status": status,
+        })
+
+    current_names = {r["name"] for r in current.get("results", [])}
+    for name in baseline_by_name:
+        if name not in current_names:
+            rows.append({"name": name, "status": "missing"})
+    return rows
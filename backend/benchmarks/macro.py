@@ -0,0 +1,54 @@
+"""
+Macro Benchmarks
+
+完整 HTTP round trip（TestClient + StubAgent），覆盖依赖注入、鉴权、序列化和 DB 访问
+"""
+
+from benchmarks.harness import benchmark
+
+
+def _checked(response):
+    if response.status_code >= 400:
+        raise RuntimeError(f"{response.request.method} {response.request.url}: "
+                           f"HTTP {response.status_code} {response.text[:200]}")
+    return response
+
+
+@benchmark("http.me_overview", group="macro", iterations=100, warmup=10)
+def bench_me_overview(env):
+    client = env.client()
+    return lambda: _checked(client.get("/api/me/overview", headers=env.headers))
+
+
+@benchmark("http.get_messages", group="macro", iterations=100, warmup=10)
+def bench_get_messages(env):
+    client = env.client()
+    url = f"/api/sessions/{env.session_id}/get_messages"
+    return lambda: _checked(client.get(url, headers=env.headers))
+
+
+@benchmark("http.post_message", group="macro", iterations=100, warmup=10)
+def bench_post_message(env):
+    client = env.client()
+    url = f"/api/sessions/{env.session_id}/post_message"
+    payload = {"message": "最近工作压力很大，晚上总是睡不着。", "active_duration_seconds": 120}
+
+    def post():
+        reply = _checked(client.post(url, json=payload, headers=env.headers)).json()["reply"]
+        # chat() 出错时返回兜底回复而不是 5xx，必须确认测到的是 StubAgent 的正常路径
+        if reply != env.stub_agent.reply:
+            raise RuntimeError(f"post_message returned the fallback reply instead of the stub reply: {reply!r}")
+
+    return post
+
+
+@benchmark("http.emo_score_list", group="macro", iterations=100, warmup=10)
+def bench_emo_score_list(env):
+    client = env.client()
+    return lambda: _checked(client.get("/api/emo-score/list", headers=env.headers))
+
+
+@benchmark("http.captcha_generate", group="macro", iterations=50, warmup=5)
+def bench_captcha_generate(env):
+    client = env.client()
+    return lambda: _checked(client.get("/api/captcha/generate"))
@@ -0,0 +1,110 @@
+"""
+Micro Benchmarks
+
+单个热点函数的耗时（直接调用，不经过 HTTP）
+"""
+
+from benchmarks.harness import benchmark
+
+
+@benchmark("auth.get_current_user", group="micro")
+def bench_get_current_user(env):
+    from fastapi.security import HTTPAuthorizationCredentials
+
+    from app.core.deps import get_current_user
+
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=env.token)
+    db = env.db()
+
+    def op():
+        get_current_user(credentials, db)
+        db.expire_all()  # 与真实请求一致：每次都要查库
+
+    return op
+
+
+def _build_instructions_op(env, agno_session_id: str):
+    from app.agents.therapist_agent_service import TherapistAgentService
+
+    service = TherapistAgentService()
+    db = env.db()
+
+    def op():
+        service._build_instructions(env.user_id, agno_session_id, db)
+        db.rollback()  # 撤销 turn_count += 1，保证每次迭代的状态一致
+
+    return op
+
+
+@benchmark("therapist.build_instructions", group="micro")
+def bench_build_instructions(env):
+    return _build_instructions_op(env, env.agno_session_id)
+
+
+@benchmark("therapist.build_instructions_timeout", group="micro")
+def bench_build_instructions_timeout(env):
+    # 超时会话额外读取 therapist_timeout.yaml
+    return _build_instructions_op(env, env.overtime_agno_session_id)
+
+
+@benchmark("sessions.runs_to_messages", group="micro", iterations=1000, warmup=50)
+def bench_runs_to_messages(env):
+    from app.api.routes.sessions import runs_to_messages
+
+    runs = env.make_runs(20)
+    return lambda: runs_to_messages(runs)
+
+
+@benchmark("sessions.runs_to_messages_100", group="micro", iterations=300)
+def bench_runs_to_messages_large(env):
+    from app.api.routes.sessions import runs_to_messages
+
+    runs = env.make_runs(100)
+    return lambda: runs_to_messages(runs)
+
+
+@benchmark("captcha.generate_image", group="micro", iterations=100, warmup=5)
+def bench_captcha_image(env):
+    from app.services.captcha_service import CaptchaService
+
+    return lambda: CaptchaService.generate_captcha_image("4821")
+
+
+@benchmark("emo_score.create_score", group="micro", iterations=100)
+def bench_create_score(env):
+    from app.models.emo_score import EmoScoreSource
+    from app.services.emo_score_service import EmoScoreService
+
+    db = env.db()
+
+    def op():
+        EmoScoreService.create_score(
+            db=db,
+            user_id=env.user_id,
+            source=EmoScoreSource.SESSION,
+            stress_score=55,
+            stable_score=60,
+            anxiety_score=48,
+            functional_score=70,
+        )
+
+    return op
+
+
+@benchmark("openai_logger.log_request", group="micro", iterations=300)
+def bench_log_request(env):
+    from app.core.openai_logger import OpenAIPromptLogger
+
+    prompt_logger = OpenAIPromptLogger(log_dir=str(env.work_dir / "prompts"), auto_update_html=False)
+    messages = [{"role": "system", "content": "你是一位温和、专业的心理咨询师。" * 200}]
+    for run in env.make_runs(20):
+        messages.append({"role": "user", "content": run["input"]["input_content"]})
+        messages.append({"role": "assistant", "content": run["content"]})
+
+    return lambda: prompt_logger.log_request(
+        user_id=env.user_id,
+        session_id=env.agno_session_id,
+        model="gpt-4o-mini",
+        messages=messages,
+        request_params={"temperature": 0.7},
+    )
@@ -0,0 +1,93 @@
+"""
+Startup Benchmarks
+
+冷启动导入 app.main 的耗时（每次都在新的子进程中导入，不受当前进程已导入模块的影响），
+以及 `python -X importtime` 的导入耗时报告（runner 的 --importtime 选项）。
+
+路由模块不应在导入时加载 agno / openai / httpx / numpy / PIL / passlib：
+这些模块由用到它们的函数懒加载，gunicorn 在 fork 前于 master 中导入、worker 在预热时导入
+（见 app/services/warmup.py）。HEAVY_MODULES 也被 scripts/test_startup_time.py 用来做回归检查。
+"""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from benchmarks.harness import benchmark
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+HEAVY_MODULES = ["agno", "openai", "httpx", "numpy", "PIL", "passlib"]
+
+# 导入后打印已加载的重模块，供调用方检查
+_IMPORT_APP = (
+    "import sys, time\n"
+    "started = time.perf_counter()\n"
+    "import app.main\n"
+    "elapsed = (time.perf_counter() - started) * 1000\n"
+    f"loaded = [m for m in {HEAVY_MODULES!r} if m in sys.modules]\n"
+    "print(f'{elapsed:.1f}', ','.join(loaded))\n"
+)
+
+
+def _python(*args: str, env: Optional[Dict[str, str]] = None) -> subprocess.CompletedProcess:
+    env = dict(os.environ, **(env or {}), PYTHONPATH=str(BACKEND_DIR), PYTHONDONTWRITEBYTECODE="1")
+    result = subprocess.run([sys.executable, *args], cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"python {' '.join(args[:2])} failed:\n{result.stderr[-2000:]}")
+    return result
+
+
+def import_app(env: Optional[Dict[str, str]] = None) -> Dict:
+    """在新的子进程中导入 app.main，返回导入耗时（毫秒，不含解释器启动）和已加载的重模块"""
+    last_line = _python("-c", _IMPORT_APP, env=env).stdout.strip().splitlines()[-1]
+    elapsed, _, loaded = last_line.partition(" ")
+    return {"import_ms": float(elapsed), "heavy_modules": [m for m in loaded.split(",") if m]}
+
+
+def import_profile(top: int = 25, env: Optional[Dict[str, str]] = None) -> Dict:
+    """
+    用 -X importtime 导入 app.main，返回总耗时和按累计耗时排序的前 N 个模块
+
+    importtime 的每一行：`import time: self [us] | cumulative | <缩进>module`，
+    嵌套导入按缩进表示，顶层模块（缩进为 1 个空格）的累计耗时之和即总耗时。
+    """
+    stderr = _python("-X", "importtime", "-c", "import app.main", env=env).stderr
+    modules: List[Dict] = []
+    total_us = 0
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        row = {"module": name.strip(), "self_ms": int(self_us) / 1000,
+               "cumulative_ms": int(cumulative_us) / 1000, "depth": depth}
+        modules.append(row)
+        if depth == 0:
+            total_us += int(cumulative_us)
+
+    modules.sort(key=lambda r: r["cumulative_ms"], reverse=True)
+    loaded = {r["module"].split(".")[0] for r in modules}
+    return {
+        "total_ms": total_us / 1000,
+        "module_count": len(modules),
+        "heavy_modules": [m for m in HEAVY_MODULES if m in loaded],
+        "top": modules[:top],
+    }
+
+
+def print_import_profile(profile: Dict):
+    print(f"\nImport profile: app.main {profile['total_ms']:.1f}ms, {profile['module_count']} modules")
+    if profile["heavy_modules"]:
+        print(f"WARNING: heavy modules imported at startup: {profile['heavy_modules']}")
+    print(f"{'Module':<60}{'cumulative':>14}{'self':>12}")
+    for row in profile["top"]:
+        print(f"{row['module'][:59]:<60}{row['cumulative_ms']:>12.1f}ms{row['self_ms']:>10.1f}ms")
+
+
+@benchmark("startup.import_app", group="startup", iterations=5, warmup=1, threshold=0.5)
+def bench_import_app(env):
+    # 包含解释器启动；子进程计时波动较大，阈值放宽到 50%
+    return lambda: _python("-c", "import app.main")
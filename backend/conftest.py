@@ -0,0 +1,83 @@
+"""
+Shared pytest fixtures.
+
+assert_max_queries 用于给热点接口设置 SQL 语句数上限，查询数回归时让 CI 失败
+（见 scripts/test_query_budget.py）：
+
+    def test_history_query_budget(client, auth_headers, assert_max_queries):
+        with assert_max_queries(3):
+            client.get("/api/sessions/history", headers=auth_headers)
+
+client / auth_headers 使用临时 SQLite 数据库和 StubAgent，测试数据与 benchmark 相同
+（benchmarks/environment.py），不访问配置的数据库和 OpenAI。
+"""
+import os
+import sys
+
+import pytest
+
+from app.core import query_counter
+from app.core.config import settings
+
+# 应用的全局 engine 在导入时创建：未配置数据库（默认 Postgres URL）时换成不需要驱动的 SQLite，
+# 避免没有 Postgres 驱动的环境导入失败（client fixture 另外绑定到临时数据库）
+if "app.services.database" not in sys.modules and "DATABASE_URL" not in os.environ:
+    settings.DATABASE_URL = "sqlite://"
+
+
+@pytest.fixture
+def assert_max_queries():
+    """返回 query_counter.assert_max_queries 上下文管理器"""
+    return query_counter.assert_max_queries
+
+
+@pytest.fixture
+def count_queries():
+    """返回 query_counter.count_queries 上下文管理器"""
+    return query_counter.count_queries
+
+
+@pytest.fixture(scope="session")
+def api_env(tmp_path_factory):
+    """
+    绑定到临时 SQLite 数据库、写入测试数据、替换为 StubAgent 的 BenchEnv
+
+    测试结束后恢复应用的全局 engine 和 agent 服务
+    """
+    from sqlalchemy import create_engine
+
+    from app.agents.clerk_agent_service import ClerkAgentService
+    from app.agents.therapist_agent_service import TherapistAgentService
+    from app.services import database
+    from benchmarks.environment import BenchEnv
+
+    url = f"sqlite:///{tmp_path_factory.mktemp('api') / 'bench.db'}"
+    test_engine = create_engine(url, connect_args={"check_same_thread": False})
+    original_engine = database.engine
+    original_therapist_init = TherapistAgentService.__init__
+    original_clerk_agent = ClerkAgentService.__dict__.get("_agent")
+
+    database.engine = test_engine
+    database.SessionLocal.configure(bind=test_engine)
+    try:
+        env = BenchEnv(url)
+        env.setup()
+        yield env
+    finally:
+        database.engine = original_engine
+        database.SessionLocal.configure(bind=original_engine)
+        TherapistAgentService.__init__ = original_therapist_init
+        ClerkAgentService._agent = original_clerk_agent
+        test_engine.dispose()
+
+
+@pytest.fixture(scope="session")
+def client(api_env):
+    """访问完整 app 的 TestClient（不运行 lifespan：没有后台线程）"""
+    return api_env.client()
+
+
+@pytest.fixture(scope="session")
+def auth_headers(api_env):
+    """测试用户的 Authorization 头"""
+    return api_env.headers
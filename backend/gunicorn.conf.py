@@ -0,0 +1,67 @@
+"""
+生产环境 gunicorn 配置（uvicorn worker）
+
+    gunicorn -c gunicorn.conf.py app.main:app
+
+单个 uvicorn 进程里，验证码渲染、YAML 解析等 CPU 工作会阻塞所有请求；多个 worker 进程分摊。
+所有参数都可以用环境变量覆盖：
+
+- WEB_CONCURRENCY：worker 数，默认等于 CPU 核数。每个 worker 有自己的数据库连接池
+  （主库 + Agno 库）、LISTEN 连接和验证码渲染进程，增加 worker 前先确认 Postgres 的 max_connections
+- GUNICORN_MAX_REQUESTS / GUNICORN_MAX_REQUESTS_JITTER：处理这么多请求后重启 worker（抖动避免同时重启），
+  重启时走与 SIGTERM 相同的优雅退出（app/services/lifecycle.py）
+- GUNICORN_GRACEFUL_TIMEOUT：需大于 SHUTDOWN_DRAIN_TIMEOUT_SECONDS，docker 的 stop_grace_period 再留出余量
+
+preload_app：master 导入一次 app 后 fork 出 worker（共享只读内存、启动更快、导入错误在 master 就暴露）。
+导入阶段不能创建连接或线程，fork 安全的约定见 app/services/warmup.py。
+app 启动时不导入 agno / openai / numpy 等重模块（单进程 uvicorn 和测试启动更快），
+when_ready 在 fork 前于 master 中导入一次，worker 不用各自再导入。
+每个 worker 在 lifespan 中加载治疗师目录 / 运行参数 / 提示词版本，并在后台预热，完成前 /health 返回 503。
+
+多 worker 时：后台维护任务用 advisory lock 选主；会话事件、运行参数、提示词、治疗师目录的变更通过
+pg_notify 广播到所有 worker；CAPTCHA_MODE=token 时 CAPTCHA_REPLAY_STORE 需为 file（同机 worker 共享）。
+"""
+
+import multiprocessing
+import os
+import threading
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = True
+
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 2000))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", 200))
+
+# worker 心跳超时：模型调用在线程池中执行，不会阻塞事件循环的心跳
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 60))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 40))
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+
+def when_ready(server):
+    """master 导入完 app、即将 fork 第一个 worker：此时不应有后台线程（fork 后线程不会被复制，持有的锁会死锁）"""
+    if preload_app:
+        from app.services.warmup import import_heavy_modules
+
+        try:
+            import_heavy_modules()
+        except Exception as e:
+            server.log.warning(f"Preloading heavy modules failed: {e}")
+    threads = [t.name for t in threading.enumerate() if t is not threading.main_thread()]
+    if threads:
+        server.log.warning(f"Threads running in the master before fork: {threads}")
+    server.log.info(f"Starting {server.cfg.workers} worker(s), max_requests={server.cfg.max_requests}±{server.cfg.max_requests_jitter}")
+
+
+def post_fork(server, worker):
+    server.log.info(f"Worker spawned (pid: {worker.pid})")
+
+
+def worker_exit(server, worker):
+    server.log.info(f"Worker exited (pid: {worker.pid})")
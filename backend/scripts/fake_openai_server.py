@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Fake OpenAI Server
+
+本地模拟 OpenAI Chat Completions 接口，用于压测（不消耗真实额度）
+
+功能：
+- POST /v1/chat/completions（支持 stream=true 的 SSE 输出）
+- 延迟服从对数正态分布（--latency-median-ms / --latency-sigma）
+- 识别 Clerk / Onboarding 的工具，返回与工具签名匹配的 tool_calls
+- 按比例注入 429（--rate-limit-ratio）
+
+使用方式：
+    python scripts/fake_openai_server.py --port 9100 --latency-median-ms 800
+
+    # 后端指向 fake server
+    OPENAI_BASE_URL=http://127.0.0.1:9100/v1 OPENAI_API_KEY=sk-fake uvicorn app.main:app
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+from typing import Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+class FakeConfig:
+    latency_median_ms: float = 800.0
+    latency_sigma: float = 0.5
+    tokens_per_second: float = 60.0
+    rate_limit_ratio: float = 0.0
+    reply_chars: int = 200
+
+
+config = FakeConfig()
+app = FastAPI(title="Fake OpenAI")
+
+stats = {"requests": 0, "rate_limited": 0, "tool_calls": 0, "streamed": 0, "stream_aborted": 0}
+
+
+# ===== 工具调用参数（与 ClerkAgentService / OnboardingAgentService 的工具签名一致）=====
+
+def _onboarding_questions() -> Dict:
+    questions = [
+        {"question_text": "你希望我怎么称呼你？", "question_type": "text", "options": None},
+        {"question_text": "你这次来咨询，最希望解决什么问题？", "question_type": "text", "options": None},
+        {"question_text": "最近让你最困扰的事情是什么？", "question_type": "text", "options": None},
+        {"question_text": "你的压力主要来自哪里？", "question_type": "text", "options": None},
+    ]
+    for text in ["最近一周你的焦虑程度如何？", "你的整体压力水平如何？", "你的情绪是否稳定？",
+                 "你的睡眠质量如何？", "你能正常完成工作或学习吗？", "你身边有可以倾诉的人吗？"]:
+        questions.append({
+            "question_text": text,
+            "question_type": "choice",
+            "options": ["完全没有", "偶尔", "经常", "几乎总是"],
+        })
+    return {"questions": questions}
+
+
+def _user_context_markdown(nickname: str = "压测用户") -> str:
+    return (
+        f"## 基本信息\n- 昵称：{nickname}\n\n"
+        "## 咨询目标\n希望缓解工作压力。\n\n"
+        "## 当前状态评估\n- 压力状态：中等\n- 情绪稳定性：一般\n- 焦虑程度：中等\n- 功能水平：良好\n\n"
+        "## 关注重点\n关注睡眠和压力来源。"
+    )
+
+
+TOOL_ARGUMENTS = {
+    "save_multiple_questions": _onboarding_questions,
+    "complete_onboarding": lambda: {
+        "nickname": "压测用户",
+        "stress_score": random.randint(30, 80),
+        "stable_score": random.randint(30, 80),
+        "anxiety_score": random.randint(30, 80),
+        "functional_score": random.randint(30, 80),
+        "user_context_markdown": _user_context_markdown(),
+    },
+    "save_user_context": lambda: {"context_markdown": _user_context_markdown()},
+    "update_user_context": lambda: {"new_context_markdown": _user_context_markdown()},
+    "save_session_review": lambda: {
+        "session_review": "本次咨询主要讨论了工作压力，来访者情绪逐渐平稳。",
+        "key_events": ["提到加班导致失眠", "识别出完美主义倾向", "约定练习放松技巧"],
+    },
+}
+
+
+def _pick_tools(body: Dict) -> List[str]:
+    """
+    根据请求的 tools 和最后一条用户消息决定要调用的工具
+
+    提示词里点名的工具都会被调用（多个时并行返回），已经调用过的不再重复，
+    全部调用完后返回文本总结。
+    """
+    tools = [t.get("function", {}).get("name") for t in body.get("tools") or []]
+    messages = body.get("messages") or []
+    if not tools or not messages:
+        return []
+
+    last_user_index = max((i for i, m in enumerate(messages) if m.get("role") == "user"), default=None)
+    if last_user_index is None:
+        return []
+
+    content = messages[last_user_index].get("content") or ""
+    if isinstance(content, list):
+        content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+
+    already_called = set()
+    for message in messages[last_user_index + 1:]:
+        for call in message.get("tool_calls") or []:
+            already_called.add(call.get("function", {}).get("name"))
+
+    return [
+        name for name in tools
+        if name in TOOL_ARGUMENTS and name in content and name not in already_called
+    ]
+
+
+def _fake_reply(chars: int) -> str:
+    base = "我听到你说最近压力很大，这种感受很正常。我们可以一起慢慢梳理一下让你感到紧张的事情。"
+    return (base * (chars // len(base) + 1))[:chars]
+
+
+def _latency_seconds() -> float:
+    median = config.latency_median_ms / 1000
+    return random.lognormvariate(math.log(median), config.latency_sigma) if median > 0 else 0.0
+
+
+def _usage(messages: List[Dict], completion_text: str) -> Dict:
+    prompt_chars = sum(len(str(m.get("content") or "")) for m in messages)
+    prompt_tokens = max(1, prompt_chars // 2)
+    completion_tokens = max(1, len(completion_text) // 2)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens_details": {"cached_tokens": 0},
+    }
+
+
+@app.get("/v1/models")
+async def list_models():
+    return {"object": "list", "data": [{"id": "gpt-4o-mini", "object": "model", "owned_by": "fake"}]}
+
+
+@app.get("/stats")
+async def get_stats():
+    return stats
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    stats["requests"] += 1
+
+    if config.rate_limit_ratio > 0 and random.random() < config.rate_limit_ratio:
+        stats["rate_limited"] += 1
+        return JSONResponse(
+            status_code=429,
+            headers={"retry-after": "1"},
+            content={"error": {"message": "Rate limit reached (fake)", "type": "requests", "code": "rate_limit_exceeded"}},
+        )
+
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+    created = int(time.time())
+    model = body.get("model", "gpt-4o-mini")
+    messages = body.get("messages") or []
+
+    tool_names = _pick_tools(body)
+    tool_calls = None
+    content = None
+    if tool_names:
+        stats["tool_calls"] += len(tool_names)
+        tool_calls = [{
+            "id": f"call_{uuid.uuid4().hex[:24]}",
+            "type": "function",
+            "function": {"name": name, "arguments": json.dumps(TOOL_ARGUMENTS[name](), ensure_ascii=False)},
+        } for name in tool_names]
+    else:
+        content = _fake_reply(config.reply_chars)
+
+    usage = _usage(messages, content or "".join(c["function"]["arguments"] for c in tool_calls))
+    finish_reason = "tool_calls" if tool_calls else "stop"
+
+    if body.get("stream"):
+        stats["streamed"] += 1
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+        return StreamingResponse(
+            _stream(completion_id, created, model, content, tool_calls, finish_reason, usage, include_usage),
+            media_type="text/event-stream",
+        )
+
+    await asyncio.sleep(_latency_seconds())
+    message = {"role": "assistant", "content": content}
+    if tool_calls:
+        message["tool_calls"] = tool_calls
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": created,
+        "model": model,
+        "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+        "usage": usage,
+    }
+
+
+async def _stream(completion_id, created, model, content, tool_calls, finish_reason, usage, include_usage):
+    def chunk(delta: Dict, finish: Optional[str] = None, chunk_usage: Optional[Dict] = None) -> str:
+        data = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish}] if chunk_usage is None else [],
+        }
+        if chunk_usage is not None:
+            data["usage"] = chunk_usage
+        return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    try:
+        # 首 token 延迟
+        await asyncio.sleep(_latency_seconds())
+        yield chunk({"role": "assistant", "content": ""})
+
+        if tool_calls:
+            for index, call in enumerate(tool_calls):
+                arguments = call["function"]["arguments"]
+                # 第一个 delta 带 id/name，参数分两段下发，模拟真实的增量拼接
+                yield chunk({"tool_calls": [{
+                    "index": index,
+                    "id": call["id"],
+                    "type": "function",
+                    "function": {"name": call["function"]["name"], "arguments": arguments[:len(arguments) // 2]},
+                }]})
+                yield chunk({"tool_calls": [{"index": index, "function": {"arguments": arguments[len(arguments) // 2:]}}]})
+        else:
+            step = 4
+            delay = step / config.tokens_per_second if config.tokens_per_second > 0 else 0
+            for i in range(0, len(content), step):
+                yield chunk({"content": content[i:i + step]})
+                if delay:
+                    await asyncio.sleep(delay)
+
+        yield chunk({}, finish=finish_reason)
+        if include_usage:
+            yield chunk({}, chunk_usage=usage)
+        yield "data: [DONE]\n\n"
+    except (asyncio.CancelledError, GeneratorExit):
+        # 客户端（后端）在流结束前断开：取消生效，上游不再继续生成
+        stats["stream_aborted"] += 1
+        raise
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible server for load testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-median-ms", type=float, default=800.0, help="延迟中位数（毫秒）")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="对数正态分布的 sigma")
+    parser.add_argument("--tokens-per-second", type=float, default=60.0, help="流式输出速度")
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0, help="返回 429 的比例（0-1）")
+    parser.add_argument("--reply-chars", type=int, default=200, help="文本回复长度")
+    args = parser.parse_args()
+
+    config.latency_median_ms = args.latency_median_ms
+    config.latency_sigma = args.latency_sigma
+    config.tokens_per_second = args.tokens_per_second
+    config.rate_limit_ratio = args.rate_limit_ratio
+    config.reply_chars = args.reply_chars
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+批量生成邀请码
+
+在一个事务中生成 N 个一次性邀请码（分批 INSERT ... ON CONFLICT DO NOTHING，冲突自动补齐），
+并以 CSV / NDJSON 输出。
+
+使用方式（在 backend/ 目录下）：
+    python scripts/generate_invitation_codes.py 500 > codes.csv
+    python scripts/generate_invitation_codes.py 2000 --format ndjson --output cohort_2026.ndjson
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+# 添加项目根目录到 path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.services.database import SessionLocal
+from app.services.invitation_service import InvitationService
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量生成邀请码")
+    parser.add_argument("count", type=int, help="生成数量")
+    parser.add_argument("--format", choices=["csv", "ndjson"], default="csv")
+    parser.add_argument("--output", default=None, help="输出文件（默认标准输出）")
+    parser.add_argument("--batch-size", type=int, default=InvitationService.BULK_BATCH_SIZE,
+                        help="每条 INSERT 的行数")
+    args = parser.parse_args()
+
+    if args.count < 1:
+        parser.error("count must be positive")
+
+    db = SessionLocal()
+    try:
+        rows = InvitationService.bulk_create_codes(db, args.count, batch_size=args.batch_size)
+    except Exception as e:
+        print(f"❌ Failed to create invitation codes: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        db.close()
+
+    out = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+    try:
+        for chunk in InvitationService.iter_export(rows, args.format):
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+
+    print(f"✅ Created {len(rows)} invitation codes", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
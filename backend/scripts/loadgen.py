@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Load Test
+
+模拟真实用户完整流程的并发压测：
+注册（验证码 + 通用邀请码）→ onboarding 答题 → 开始咨询 → N 轮对话 → 结束咨询
+
+配合 scripts/fake_openai_server.py 使用，不消耗真实 OpenAI 额度：
+
+    python scripts/fake_openai_server.py --port 9100 --latency-median-ms 800
+    OPENAI_BASE_URL=http://127.0.0.1:9100/v1 OPENAI_API_KEY=sk-fake uvicorn app.main:app --port 8000
+    python scripts/loadgen.py --base-url http://127.0.0.1:8000 --users 20 --concurrency 10 --turns 5
+
+验证码答案：
+- CAPTCHA_MODE=db: 直接从 captcha_sessions 表读取（使用与后端相同的 DATABASE_URL）
+- CAPTCHA_MODE=token: 用与后端相同的密钥枚举 4 位答案（需要相同的 SECRET_KEY / CAPTCHA_TOKEN_SECRET）
+
+输出每个接口的 p50/p95/p99 延迟、吞吐量和错误率；--json 可把结果写入文件。
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+from sqlalchemy import create_engine, text
+
+# 添加项目根目录到 path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.config import settings
+from app.services.captcha_service import CaptchaService
+from app.services.captcha_token import TOKEN_VERSION, answer_hash, parse_token
+from app.services.invitation_service import InvitationService
+
+
+class Metrics:
+    """按接口汇总延迟和错误"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.status_codes: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+
+    def record(self, endpoint: str, elapsed: float, status_code: int):
+        self.latencies[endpoint].append(elapsed)
+        self.status_codes[endpoint][status_code] += 1
+        if status_code >= 400:
+            self.errors[endpoint] += 1
+
+    def summary(self, wall_time: float) -> Dict:
+        result = {}
+        for endpoint, values in self.latencies.items():
+            values = sorted(values)
+            count = len(values)
+            result[endpoint] = {
+                "count": count,
+                "errors": self.errors[endpoint],
+                "error_rate": round(self.errors[endpoint] / count, 4) if count else 0.0,
+                "p50_ms": round(_percentile(values, 50) * 1000, 1),
+                "p95_ms": round(_percentile(values, 95) * 1000, 1),
+                "p99_ms": round(_percentile(values, 99) * 1000, 1),
+                "max_ms": round(values[-1] * 1000, 1) if values else 0.0,
+                "throughput_rps": round(count / wall_time, 2) if wall_time > 0 else 0.0,
+                "status_codes": dict(self.status_codes[endpoint]),
+            }
+        return result
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100
+    lower = int(k)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (k - lower)
+
+
+class LoadTestError(Exception):
+    """单个虚拟用户流程失败"""
+
+
+def _solve_captcha_token(token: str) -> str:
+    """CAPTCHA_MODE=token 时用同一个密钥枚举 4 位答案（需要与后端相同的 SECRET_KEY / CAPTCHA_TOKEN_SECRET）"""
+    claims = parse_token(token)
+    if claims is None:
+        raise LoadTestError("captcha token signature mismatch (check SECRET_KEY / CAPTCHA_TOKEN_SECRET)")
+    for candidate in range(10 ** CaptchaService.CAPTCHA_LENGTH):
+        answer = str(candidate).zfill(CaptchaService.CAPTCHA_LENGTH)
+        if answer_hash(claims["nonce"], answer) == claims["answer_hash"]:
+            return answer
+    raise LoadTestError("failed to solve captcha token")
+
+
+class VirtualUser:
+    """一个虚拟用户的完整流程"""
+
+    def __init__(self, client: httpx.AsyncClient, metrics: Metrics, engine, turns: int):
+        self.client = client
+        self.metrics = metrics
+        self.engine = engine
+        self.turns = turns
+        self.headers: Dict[str, str] = {}
+
+    async def request(self, endpoint: str, method: str, url: str, **kwargs) -> httpx.Response:
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, headers=self.headers, **kwargs)
+        except httpx.HTTPError as e:
+            self.metrics.record(endpoint, time.perf_counter() - start, 599)
+            raise LoadTestError(f"{endpoint}: {type(e).__name__}: {e}")
+        self.metrics.record(endpoint, time.perf_counter() - start, response.status_code)
+        if response.status_code >= 400:
+            raise LoadTestError(f"{endpoint}: HTTP {response.status_code} {response.text[:200]}")
+        return response
+
+    def _read_captcha_answer(self, session_id: str) -> str:
+        if session_id.startswith(f"{TOKEN_VERSION}."):
+            return _solve_captcha_token(session_id)
+
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                text("SELECT captcha_text FROM captcha_sessions WHERE session_id = :sid"),
+                {"sid": session_id},
+            ).first()
+        if row is None:
+            raise LoadTestError(f"captcha session {session_id} not found in database")
+        return row[0]
+
+    async def register(self):
+        response = await self.request("GET /api/captcha/generate", "GET", "/api/captcha/generate")
+        captcha = response.json()
+        answer = await asyncio.to_thread(self._read_captcha_answer, captcha["session_id"])
+
+        response = await self.request("POST /api/auth/register", "POST", "/api/auth/register", json={
+            "email": f"loadtest_{uuid.uuid4().hex[:12]}@example.com",
+            "password": "loadtest123",
+            "invitation_code": InvitationService.UNIVERSAL_CODE,
+            "captcha_session_id": captcha["session_id"],
+            "captcha_text": answer,
+        })
+        self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    async def onboarding(self):
+        response = await self.request("GET /api/onboarding", "GET", "/api/onboarding")
+        state = response.json()
+        question = state.get("question")
+        session_id = state.get("session_id")
+
+        while question and not state.get("is_complete"):
+            if question.get("options"):
+                answer = question["options"][0]
+            else:
+                answer = "最近工作压力比较大，睡眠也不太好"
+            response = await self.request("POST /api/onboarding/answer", "POST", "/api/onboarding/answer", json={
+                "session_id": session_id,
+                "question_number": question["question_number"],
+                "answer": answer,
+            })
+            state = response.json()
+            question = state.get("next_question")
+
+    async def consult(self):
+        response = await self.request("POST /api/sessions/start", "POST", "/api/sessions/start")
+        session_id = response.json()["session_id"]
+
+        # 开场白在后台生成，完成前发消息会返回 409
+        while response.json().get("opening_pending"):
+            await asyncio.sleep(0.5)
+            response = await self.request("GET /api/sessions/{id}", "GET", f"/api/sessions/{session_id}")
+
+        for turn in range(self.turns):
+            await self.request(
+                "POST /api/sessions/{id}/post_message", "POST", f"/api/sessions/{session_id}/post_message",
+                json={"message": f"这是第 {turn + 1} 轮，我想聊聊最近的压力。", "active_duration_seconds": 60 * (turn + 1)},
+            )
+
+        await self.request("GET /api/sessions/{id}/get_messages", "GET", f"/api/sessions/{session_id}/get_messages")
+        await self.request("POST /api/sessions/{id}/end", "POST", f"/api/sessions/{session_id}/end")
+
+    async def run(self):
+        await self.register()
+        await self.onboarding()
+        await self.consult()
+
+
+async def run_load_test(args) -> Dict:
+    metrics = Metrics()
+    engine = create_engine(args.database_url or settings.DATABASE_URL, pool_size=5, max_overflow=5)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    failures: List[str] = []
+    completed = 0
+
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+
+        async def one_user(index: int):
+            nonlocal completed
+            async with semaphore:
+                user = VirtualUser(client, metrics, engine, args.turns)
+                try:
+                    await user.run()
+                    completed += 1
+                except LoadTestError as e:
+                    failures.append(f"user {index}: {e}")
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one_user(i) for i in range(args.users)))
+        wall_time = time.perf_counter() - start
+
+    engine.dispose()
+    return {
+        "config": {
+            "base_url": args.base_url,
+            "users": args.users,
+            "concurrency": args.concurrency,
+            "turns": args.turns,
+        },
+        "wall_time_s": round(wall_time, 2),
+        "users_completed": completed,
+        "users_failed": len(failures),
+        "failures": failures[:50],
+        "endpoints": metrics.summary(wall_time),
+    }
+
+
+def print_report(result: Dict):
+    print("=" * 110)
+    print(
+        f"Users: {result['config']['users']}  Concurrency: {result['config']['concurrency']}  "
+        f"Turns: {result['config']['turns']}  Wall time: {result['wall_time_s']}s  "
+        f"Completed: {result['users_completed']}  Failed: {result['users_failed']}"
+    )
+    print("=" * 110)
+    print(f"{'Endpoint':<42}{'count':>7}{'err%':>7}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}{'rps':>9}")
+    for endpoint, s in result["endpoints"].items():
+        print(
+            f"{endpoint:<42}{s['count']:>7}{s['error_rate'] * 100:>6.1f}%"
+            f"{s['p50_ms']:>9.0f}ms{s['p95_ms']:>8.0f}ms{s['p99_ms']:>8.0f}ms{s['max_ms']:>8.0f}ms"
+            f"{s['throughput_rps']:>9.2f}"
+        )
+    if result["failures"]:
+        print("\nFailures (first 10):")
+        for failure in result["failures"][:10]:
+            print(f"  - {failure}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end load test for the therapy backend")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000", help="后端地址")
+    parser.add_argument("--users", type=int, default=10, help="虚拟用户总数")
+    parser.add_argument("--concurrency", type=int, default=5, help="同时运行的虚拟用户数")
+    parser.add_argument("--turns", type=int, default=5, help="每个用户的对话轮数")
+    parser.add_argument("--timeout", type=float, default=120.0, help="单个请求超时（秒）")
+    parser.add_argument("--database-url", default=None, help="读取验证码答案的数据库（默认使用 DATABASE_URL）")
+    parser.add_argument("--json", dest="json_path", default=None, help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    result = asyncio.run(run_load_test(args))
+    print_report(result)
+
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"\nResults written to {args.json_path}")
+
+    return 0 if result["users_failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
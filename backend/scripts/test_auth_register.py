@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+测试注册接口
+
+用 conftest.py 的 api_env / client（临时 SQLite）验证：
+- 密码在事务开始之前哈希（哈希时还没有执行任何 SQL），注册成功后可以用该密码登录校验
+- 邮箱已注册、邀请码已使用时返回 400，验证码仍然被消耗
+
+运行：python -m pytest scripts/test_auth_register.py
+"""
+
+import sys
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# 添加项目根目录到 path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.config import settings
+
+
+def _create_captcha(api_env, text: str = "1234") -> str:
+    from app.models.captcha_session import CaptchaSession
+
+    db = api_env.db()
+    try:
+        session_id = str(uuid.uuid4())
+        db.add(CaptchaSession(session_id=session_id, captcha_text=text,
+                              expires_at=datetime.utcnow() + timedelta(minutes=5)))
+        db.commit()
+        return session_id
+    finally:
+        db.close()
+
+
+def _create_invitation_code(api_env) -> str:
+    from app.models.invitation_code import InvitationCode
+
+    db = api_env.db()
+    try:
+        code = f"R{uuid.uuid4().hex[:10].upper()}"
+        db.add(InvitationCode(code=code, is_universal=False, is_used=False))
+        db.commit()
+        return code
+    finally:
+        db.close()
+
+
+def _captcha_exists(api_env, session_id: str) -> bool:
+    from app.models.captcha_session import CaptchaSession
+
+    db = api_env.db()
+    try:
+        return db.get(CaptchaSession, session_id) is not None
+    finally:
+        db.close()
+
+
+def _payload(api_env, email: str, code: str) -> dict:
+    return {
+        "email": email,
+        "password": "secret123",
+        "invitation_code": code,
+        "captcha_session_id": _create_captcha(api_env),
+        "captcha_text": "1234",
+    }
+
+
+def test_password_hashed_before_transaction(client, api_env, count_queries, monkeypatch):
+    """hash_password 执行时本次请求还没有执行任何 SQL；注册后的哈希能校验原密码"""
+    print("=" * 60)
+    print("测试 1: 事务开始前哈希密码")
+    print("=" * 60)
+
+    from app.api.routes import auth
+    from app.core.security import verify_password
+    from app.services.user_service import UserService
+
+    monkeypatch.setattr(settings, "CAPTCHA_MODE", "db")
+    email = f"register_{uuid.uuid4().hex[:10]}@example.com"
+    payload = _payload(api_env, email, _create_invitation_code(api_env))
+
+    statements_before_hash = []
+    hash_password = auth.hash_password
+
+    with count_queries() as stats:
+        def recording_hash(password):
+            statements_before_hash.append(stats.count)
+            return hash_password(password)
+
+        monkeypatch.setattr(auth, "hash_password", recording_hash)
+        response = client.post("/api/auth/register", json=payload)
+
+    assert response.status_code == 201, response.text
+    assert statements_before_hash == [0], statements_before_hash
+    assert not _captcha_exists(api_env, payload["captcha_session_id"])
+
+    db = api_env.db()
+    try:
+        user = UserService.get_user_by_email(db, email)
+        assert user is not None and verify_password("secret123", user.hashed_password)
+    finally:
+        db.close()
+    print(f"✓ 哈希前执行了 {statements_before_hash[0]} 条 SQL，注册共 {stats.count} 条")
+
+
+def test_rejected_registration_consumes_captcha(client, api_env, monkeypatch):
+    """邮箱已注册 / 邀请码已使用：400，验证码被消耗，不会创建用户"""
+    print("\n" + "=" * 60)
+    print("测试 2: 注册失败")
+    print("=" * 60)
+
+    monkeypatch.setattr(settings, "CAPTCHA_MODE", "db")
+    email = f"register_{uuid.uuid4().hex[:10]}@example.com"
+    code = _create_invitation_code(api_env)
+    assert client.post("/api/auth/register", json=_payload(api_env, email, code)).status_code == 201
+
+    duplicate = _payload(api_env, email, _create_invitation_code(api_env))
+    response = client.post("/api/auth/register", json=duplicate)
+    assert response.status_code == 400 and "Email" in response.json()["detail"]
+    assert not _captcha_exists(api_env, duplicate["captcha_session_id"])
+
+    used_code = _payload(api_env, f"other_{email}", code)
+    response = client.post("/api/auth/register", json=used_code)
+    assert response.status_code == 400 and "invitation" in response.json()["detail"]
+    assert not _captcha_exists(api_env, used_code["captcha_session_id"])
+    print("✓ 重复邮箱和已使用的邀请码返回 400，验证码都已消耗")
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+测试预渲染验证码池
+
+用容量很小的池验证：
+- 启动后补充到容量；pop 命中计入 hits，池空时返回 None 计入 misses，取出后重新补充到容量
+- 渲染任务交给执行器（这里用线程池代替进程池）时按 batch_size 拆分
+- 进程池无法创建（OSError）或子进程无法启动（BrokenProcessPool）时退回到补充线程内渲染
+- stop() 结束补充线程并关闭执行器，之后 pop 返回 None 且不计入统计
+"""
+
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from pathlib import Path
+
+# 添加项目根目录到 path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.config import settings
+
+# 渲染时导入的 CaptchaService 会创建全局 engine：未配置数据库（默认 Postgres URL）时换成不需要驱动的 SQLite
+if "app.services.database" not in sys.modules and "DATABASE_URL" not in os.environ:
+    settings.DATABASE_URL = "sqlite://"
+
+from app.services import captcha_pool
+from app.services.captcha_pool import CaptchaPool
+
+
+def _wait_for(condition, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("等待超时")
+        time.sleep(0.01)
+
+
+@contextmanager
+def _patched(name: str, value):
+    """临时替换 captcha_pool 模块中的对象"""
+    original = getattr(captcha_pool, name)
+    setattr(captcha_pool, name, value)
+    try:
+        yield
+    finally:
+        setattr(captcha_pool, name, original)
+
+
+@contextmanager
+def _gated_render():
+    """渲染在 gate 打开前阻塞，用来让池保持为空；返回 (gate, 每次渲染的数量)"""
+    gate = threading.Event()
+    batches = []
+    render = captcha_pool._render_batch
+
+    def gated(count):
+        gate.wait(10)
+        batches.append(count)
+        return render(count)
+
+    with _patched("_render_batch", gated):
+        try:
+            yield gate, batches
+        finally:
+            gate.set()
+
+
+def test_refill_and_pop_stats():
+    """补充到容量；取空后 miss；放行渲染后重新补满，hits / misses / hit_rate 正确"""
+    print("=" * 60)
+    print("测试 1: 补充与命中统计")
+    print("=" * 60)
+
+    pool = CaptchaPool(capacity=4, low_watermark=2, batch_size=3, workers=0)
+    assert pool.pop() is None and pool.stats()["misses"] == 0, "未启动时不计入统计"
+
+    pool.start()
+    try:
+        _wait_for(lambda: len(pool) == 4)
+        stats = pool.stats()
+        assert stats["refills"] == 1 and stats["images_rendered"] == 4
+
+        with _gated_render() as (gate, batches):
+            items = [pool.pop() for _ in range(4)]
+            assert all(text and image for text, image in items)
+            assert len({text + image for text, image in items}) == 4, "每张图片只取出一次"
+            assert pool.pop() is None
+
+            gate.set()
+            _wait_for(lambda: len(pool) == 4)
+            assert sum(batches) == 4 and max(batches) <= 3
+
+        stats = pool.stats()
+        assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (4, 1, 0.8)
+        assert stats["size"] == 4 and stats["refills"] >= 2
+    finally:
+        pool.stop()
+    print(f"✓ hits={stats['hits']} misses={stats['misses']}，取空后补充回 {stats['size']} 个")
+
+
+def test_executor_batches():
+    """有执行器时按 batch_size 拆成多个任务提交（用线程池代替进程池）"""
+    print("\n" + "=" * 60)
+    print("测试 2: 执行器渲染")
+    print("=" * 60)
+
+    executors = []
+
+    def thread_executor(max_workers, mp_context=None):
+        executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="captcha-render")
+        executors.append(executor)
+        return executor
+
+    with _patched("ProcessPoolExecutor", thread_executor), _gated_render() as (gate, batches):
+        pool = CaptchaPool(capacity=5, low_watermark=2, batch_size=2, workers=2)
+        pool.start()
+        try:
+            gate.set()
+            _wait_for(lambda: len(pool) == 5)
+            assert sorted(batches) == [1, 2, 2]
+            assert pool.stats()["workers"] == 2 and len(executors) == 1
+        finally:
+            pool.stop()
+    assert pool._executor is None and executors[0]._shutdown
+    print(f"✓ 5 个验证码拆成 {sorted(batches)} 在执行器中渲染，stop 后执行器关闭")
+
+
+def test_fallback_when_process_pool_unavailable():
+    """进程池创建失败 / 子进程无法启动：workers 置 0，在补充线程内渲染，池照常补满"""
+    print("\n" + "=" * 60)
+    print("测试 3: 进程池不可用时的回退")
+    print("=" * 60)
+
+    def unavailable(max_workers, mp_context=None):
+        raise OSError("no semaphores")
+
+    class BrokenExecutor:
+        def __init__(self, max_workers, mp_context=None):
+            self.shut_down = False
+
+        def submit(self, fn, *args):
+            raise BrokenProcessPool("child process could not start")
+
+        def shutdown(self, wait=True, cancel_futures=False):
+            self.shut_down = True
+
+    for factory in (unavailable, BrokenExecutor):
+        with _patched("ProcessPoolExecutor", factory):
+            pool = CaptchaPool(capacity=3, low_watermark=1, batch_size=2, workers=2)
+            pool.start()
+            try:
+                _wait_for(lambda: len(pool) == 3)
+                stats = pool.stats()
+                assert stats["workers"] == 0 and stats["images_rendered"] == 3, stats
+                assert pool._executor is None
+            finally:
+                pool.stop()
+    print("✓ 进程池创建失败和子进程无法启动两种情况都退回到线程内渲染")
+
+
+def test_stop():
+    """stop() 后补充线程退出，pop 返回 None 且不计入统计；可以重新 start"""
+    print("\n" + "=" * 60)
+    print("测试 4: 停止")
+    print("=" * 60)
+
+    pool = CaptchaPool(capacity=2, low_watermark=1, batch_size=2, workers=0)
+    pool.start()
+    _wait_for(lambda: len(pool) == 2)
+    thread = pool._thread
+    pool.stop()
+
+    assert not pool.running and not thread.is_alive()
+    assert pool.pop() is None
+    stats = pool.stats()
+    assert stats["running"] is False and (stats["hits"], stats["misses"]) == (0, 0)
+
+    pool.start()
+    try:
+        assert pool.running and pool.pop() is not None
+    finally:
+        pool.stop()
+    print("✓ 停止后不再补充和计数，重新启动后恢复")
+
+
+def main():
+    test_refill_and_pop_stats()
+    test_executor_batches()
+    test_fallback_when_process_pool_unavailable()
+    test_stop()
+    print("\n✓ 全部测试通过")
+
+
+if __name__ == "__main__":
+    main()
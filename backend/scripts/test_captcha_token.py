@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+测试无状态验证码 token
+
+验证签名、过期、答案校验和一次性使用（重放集合）
+"""
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# 添加项目根目录到 path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.services import captcha_token
+from app.services.captcha_token import (
+    FileReplayStore,
+    MemoryReplayStore,
+    issue_token,
+    parse_token,
+    verify_token,
+)
+
+
+def _use_memory_store():
+    captcha_token._replay_store = MemoryReplayStore()
+
+
+def test_issue_and_verify():
+    """正确答案通过，且 token 中不含明文答案"""
+    print("=" * 60)
+    print("测试 1: 签发与校验")
+    print("=" * 60)
+    _use_memory_store()
+
+    token = issue_token("4821", ttl_seconds=300)
+    assert "4821" not in token.split(".")[3], "token 不应包含明文答案"
+    assert verify_token(token, "4821") is True
+    print("✓ 正确答案校验通过")
+
+
+def test_single_use():
+    """同一个 token 只能校验一次（答错也会消耗）"""
+    print("\n" + "=" * 60)
+    print("测试 2: 一次性使用")
+    print("=" * 60)
+    _use_memory_store()
+
+    token = issue_token("1234", ttl_seconds=300)
+    assert verify_token(token, "1234") is True
+    assert verify_token(token, "1234") is False, "重放应该被拒绝"
+    print("✓ 重放被拒绝")
+
+    token = issue_token("5678", ttl_seconds=300)
+    assert verify_token(token, "0000") is False
+    assert verify_token(token, "5678") is False, "答错后不能再重试"
+    print("✓ 答错后 token 失效")
+
+
+def test_tampered_and_expired():
+    """篡改和过期的 token 无效"""
+    print("\n" + "=" * 60)
+    print("测试 3: 篡改与过期")
+    print("=" * 60)
+    _use_memory_store()
+
+    token = issue_token("2468", ttl_seconds=300)
+    version, expires_at, nonce, answer_hash, signature = token.split(".")
+    tampered = ".".join([version, str(int(expires_at) + 3600), nonce, answer_hash, signature])
+    assert parse_token(tampered) is None, "篡改过期时间后签名应失效"
+    assert parse_token("not-a-token") is None
+    print("✓ 篡改的 token 被拒绝")
+
+    expired = issue_token("2468", ttl_seconds=-1)
+    assert parse_token(expired) is None, "过期 token 应该无效"
+    print("✓ 过期的 token 被拒绝")
+
+
+def test_file_replay_store():
+    """文件重放集合：O_EXCL 去重，过期后淘汰"""
+    print("\n" + "=" * 60)
+    print("测试 4: 文件重放集合")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = FileReplayStore(directory)
+        now = int(time.time())
+        assert store.claim("nonce-a", now + 300) is True
+        assert store.claim("nonce-a", now + 300) is False, "同一个 nonce 只能占用一次"
+        print("✓ 重复 nonce 被拒绝")
+
+        assert store.claim("nonce-b", now - 10) is True
+        store._evict(time.time())
+        remaining = sorted(p.name for p in Path(directory).iterdir())
+        assert remaining == ["nonce-a"], f"过期 nonce 应被淘汰: {remaining}"
+        print("✓ 过期 nonce 被淘汰")
+
+
+def main():
+    test_issue_and_verify()
+    test_single_use()
+    test_tampered_and_expired()
+    test_file_replay_store()
+    print("\n✓ 全部测试通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+测试情绪评估的批量写入
+
+验证 bulk_create_scores 在数据库中计算的变化率：
+- 与逐条调用 create_score 的结果相同
+- 导入的历史记录插在已有记录中间时，排在其后的已有记录的变化率被重新计算，更早的记录不变
+- 上次分数为空或为 0 时变化率为 None；不同用户互不影响
+
+使用临时 SQLite 文件，不访问配置的数据库。
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# 添加项目根目录到 path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+
+# 测试使用自己的 engine；应用的全局 engine 只在导入时创建，这里换成不需要驱动的 SQLite，
+# 避免未配置数据库（默认 Postgres URL）的环境导入失败
+if "app.services.database" not in sys.modules and "DATABASE_URL" not in os.environ:
+    settings.DATABASE_URL = "sqlite://"
+
+from app.models.emo_score import EmoScore, EmoScoreSource
+from app.models.session import Session
+from app.models.therapist import Therapist
+from app.models.user import User
+from app.services.database import Base
+from app.services.emo_score_service import EmoScoreService
+
+BASE_TIME = datetime(2026, 1, 1, 9, 0, 0)
+CHANGE_FIELDS = [f"{name}_change" for name in EmoScoreService.SCORE_FIELDS]
+
+
+def _make_db(directory: str, name: str):
+    engine = create_engine(f"sqlite:///{directory}/{name}.db")
+    Base.metadata.create_all(engine, tables=[
+        Therapist.__table__, User.__table__, Session.__table__, EmoScore.__table__,
+    ])
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    db.add(Therapist(id="01", name="默认心理咨询师", age=35, info="test", prompt="test"))
+    for user_id in (1, 2):
+        db.add(User(id=user_id, email=f"emo{user_id}@example.com", hashed_password="x", therapist_id="01"))
+    db.commit()
+    return db
+
+
+def _item(user_id: int, day: int, stress=None, stable=None, anxiety=None, functional=None) -> dict:
+    return {
+        "user_id": user_id,
+        "source": EmoScoreSource.SESSION,
+        "created_at": BASE_TIME + timedelta(days=day),
+        "stress_score": stress,
+        "stable_score": stable,
+        "anxiety_score": anxiety,
+        "functional_score": functional,
+    }
+
+
+def _changes(db, user_id: int) -> list:
+    """按时间顺序返回 (day, 四个变化率)"""
+    rows = (
+        db.query(EmoScore)
+        .filter(EmoScore.user_id == user_id)
+        .order_by(EmoScore.created_at, EmoScore.id)
+        .all()
+    )
+    return [
+        ((row.created_at - BASE_TIME).days, tuple(
+            None if getattr(row, name) is None else round(getattr(row, name), 6) for name in CHANGE_FIELDS
+        ))
+        for row in rows
+    ]
+
+
+def test_matches_create_score():
+    """按时间顺序批量写入，结果与逐条 create_score 相同"""
+    print("=" * 60)
+    print("测试 1: 与 create_score 一致")
+    print("=" * 60)
+
+    items = [
+        _item(1, 0, 50, 60, 40, 70),
+        _item(1, 1, 40, 66, 0, 70),
+        _item(1, 2, 60, None, 10, 35),
+        _item(1, 3, 30, 33, 20, None),
+        _item(2, 0, 80, 80, 80, 80),
+        _item(2, 5, 20, 40, 60, 100),
+    ]
+
+    with tempfile.TemporaryDirectory() as directory:
+        bulk_db = _make_db(directory, "bulk")
+        sequential_db = _make_db(directory, "sequential")
+        try:
+            ids = EmoScoreService.bulk_create_scores(bulk_db, items)
+            assert len(ids) == len(items) and len(set(ids)) == len(items)
+
+            for item in items:
+                score = EmoScoreService.create_score(
+                    sequential_db, item["user_id"], item["source"],
+                    item["stress_score"], item["stable_score"], item["anxiety_score"], item["functional_score"],
+                )
+                score.created_at = item["created_at"]
+                sequential_db.commit()
+
+            for user_id in (1, 2):
+                assert _changes(bulk_db, user_id) == _changes(sequential_db, user_id), user_id
+            # 上次为 0 或为空时没有变化率
+            assert _changes(bulk_db, 1)[2][1] == (0.5, None, None, -0.5)
+        finally:
+            bulk_db.close()
+            sequential_db.close()
+    print(f"✓ {len(items)} 条记录的变化率与逐条写入相同")
+
+
+def test_backfill_recomputes_later_rows():
+    """导入的历史记录插在已有记录之间：之后的已有记录按新的上一条重新计算，之前的不变"""
+    print("\n" + "=" * 60)
+    print("测试 2: 导入历史数据后重新计算")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as directory:
+        db = _make_db(directory, "backfill")
+        try:
+            EmoScoreService.bulk_create_scores(db, [
+                _item(1, 0, 50, 50, 50, 50),
+                _item(1, 10, 80, 80, 80, 80),
+                _item(2, 0, 10, 10, 10, 10),
+                _item(2, 10, 20, 20, 20, 20),
+            ])
+            assert _changes(db, 1) == [(0, (None,) * 4), (10, (0.6,) * 4)]
+            user_2_before = _changes(db, 2)
+
+            # 乱序导入 day 5 和 day 2：day 2 的上一条是 day 0，day 5 的上一条是 day 2，day 10 改为对比 day 5
+            EmoScoreService.bulk_create_scores(db, [
+                _item(1, 5, 40, 40, 40, 40),
+                _item(1, 2, 25, 25, 25, 25),
+            ])
+            assert _changes(db, 1) == [
+                (0, (None,) * 4),
+                (2, (-0.5,) * 4),
+                (5, (0.6,) * 4),
+                (10, (1.0,) * 4),
+            ]
+            assert _changes(db, 2) == user_2_before, "其他用户的记录不应受影响"
+
+            # 导入比所有已有记录都早的记录：原来的第一条获得变化率
+            EmoScoreService.bulk_create_scores(db, [_item(2, -3, 40, 40, 40, 40)])
+            assert _changes(db, 2)[:2] == [(-3, (None,) * 4), (0, (-0.75,) * 4)]
+        finally:
+            db.close()
+    print("✓ 之后的已有记录被重新计算，之前的记录和其他用户不变")
+
+
+def main():
+    test_matches_create_score()
+    test_backfill_recomputes_later_rows()
+    print("\n✓ 全部测试通过")
+
+
+if __name__ == "__main__":
+    main()
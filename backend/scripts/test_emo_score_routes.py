@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+测试情绪评估接口
+
+用 conftest.py 的 api_env / client（临时 SQLite）验证：
+- POST /api/emo-score/bulk：带时区和不带时区的 created_at 可以混在一批里（统一为不带时区的 UTC）；
+  超过 EMO_BULK_MAX_ITEMS、source=session 缺少 session_id 返回 400，会话不属于当前用户返回 404
+- GET /api/emo-score/list：按 (created_at, id) 倒序的游标分页，created_at 相同时按 id 排序；
+  翻页过程中插入的新记录不影响后续页，最后一页 next_cursor 为 None；
+  fields / from / to / source / include_total 的组合；未知字段和格式错误的游标返回 400
+
+运行：python -m pytest scripts/test_emo_score_routes.py
+"""
+
+import sys
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# 添加项目根目录到 path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.config import settings
+
+
+def _create_user(api_env):
+    """新建一个没有评估记录的用户，返回 (user_id, headers)"""
+    from app.core.security import create_access_token
+    from app.models.user import User
+
+    email = f"emo_{uuid.uuid4().hex[:10]}@example.com"
+    db = api_env.db()
+    try:
+        user = User(email=email, hashed_password="x", therapist_id="01", has_finished_onboarding=True)
+        db.add(user)
+        db.commit()
+        return user.id, {"Authorization": f"Bearer {create_access_token(email)}"}
+    finally:
+        db.close()
+
+
+def _created_at(api_env, ids) -> list:
+    from app.models.emo_score import EmoScore
+
+    db = api_env.db()
+    try:
+        rows = dict(db.query(EmoScore.id, EmoScore.created_at).filter(EmoScore.id.in_(ids)))
+        return [rows[i] for i in ids]
+    finally:
+        db.close()
+
+
+def _seed_scores(api_env, user_id, created_ats, source: str = "onboarding") -> list:
+    """按顺序插入 created_at 给定的评估记录（stress_score 依次为 0, 1, 2...），返回 id"""
+    from app.models.emo_score import EmoScore, EmoScoreSource
+
+    db = api_env.db()
+    try:
+        rows = [
+            EmoScore(user_id=user_id, source=EmoScoreSource(source), stress_score=i, created_at=created_at)
+            for i, created_at in enumerate(created_ats)
+        ]
+        db.add_all(rows)
+        db.commit()
+        return [row.id for row in rows]
+    finally:
+        db.close()
+
+
+def _all_pages(client, headers, on_page=None, **params) -> list:
+    """沿 next_cursor 翻页直到最后一页，返回每一页的响应 JSON"""
+    pages, cursor = [], None
+    while True:
+        query = dict(params, **({"cursor": cursor} if cursor else {}))
+        response = client.get("/api/emo-score/list", params=query, headers=headers)
+        assert response.status_code == 200, response.text
+        pages.append(response.json())
+        if on_page is not None:
+            on_page(len(pages))
+        cursor = pages[-1]["next_cursor"]
+        assert pages[-1]["has_more"] is (cursor is not None)
+        if cursor is None:
+            return pages
+
+
+def test_bulk_mixed_timezones(client, api_env):
+    """同一批中带时区（Z / +08:00）、不带时区和缺省的 created_at：201，按 UTC 保存并计算变化率"""
+    print("=" * 60)
+    print("测试 1: 批量导入混合时区的时间")
+    print("=" * 60)
+
+    _, headers = _create_user(api_env)
+    items = [
+        {"source": "onboarding", "stress_score": 50, "created_at": "2024-01-01T00:00:00Z"},
+        {"source": "onboarding", "stress_score": 40, "created_at": "2024-01-02T08:00:00+08:00"},
+        {"source": "onboarding", "stress_score": 60, "created_at": "2024-01-03T00:00:00"},
+        {"source": "onboarding", "stress_score": 30},
+    ]
+    response = client.post("/api/emo-score/bulk", json={"items": items}, headers=headers)
+    assert response.status_code == 201, response.text
+    ids = response.json()["ids"]
+
+    stored = _created_at(api_env, ids)
+    assert stored[:3] == [datetime(2024, 1, 1), datetime(2024, 1, 2), datetime(2024, 1, 3)]
+    assert all(value.tzinfo is None for value in stored)
+
+    changes = [item["stress_score_change"] for item in reversed(
+        client.get("/api/emo-score/list", headers=headers).json()["items"]
+    )]
+    assert changes == [None, -0.2, 0.5, -0.5], changes
+    print(f"✓ {len(ids)} 条记录已导入，时间统一为 UTC")
+
+
+def test_bulk_rejections(client, api_env, monkeypatch):
+    """超过单次上限 / session 缺少 session_id 返回 400；别人的会话返回 404；都不写入数据"""
+    print("\n" + "=" * 60)
+    print("测试 2: 批量导入的校验")
+    print("=" * 60)
+
+    _, headers = _create_user(api_env)
+    url = "/api/emo-score/bulk"
+
+    monkeypatch.setattr(settings, "EMO_BULK_MAX_ITEMS", 2)
+    too_many = {"items": [{"source": "onboarding", "stress_score": 50}] * 3}
+    assert client.post(url, json=too_many, headers=headers).status_code == 400
+
+    missing_session = {"items": [{"source": "session", "stress_score": 50}]}
+    assert client.post(url, json=missing_session, headers=headers).status_code == 400
+
+    # api_env 默认用户的会话不属于新用户
+    others = {"items": [{"source": "session", "stress_score": 50, "session_id": api_env.session_id}]}
+    assert client.post(url, json=others, headers=headers).status_code == 404
+
+    assert client.get("/api/emo-score/list", headers=headers).json()["items"] == []
+    print("✓ 超过上限、缺少 session_id、别人的会话都被拒绝")
+
+
+def test_list_pages_are_stable(client, api_env):
+    """游标分页覆盖全部记录；created_at 相同时按 id 倒序；翻页时插入的新记录不挤进后续页"""
+    print("\n" + "=" * 60)
+    print("测试 3: 列表游标分页")
+    print("=" * 60)
+
+    user_id, headers = _create_user(api_env)
+    base = datetime(2024, 3, 1)
+    # 第 2~4 条的 created_at 相同，必须靠 id 排出确定的顺序
+    created_ats = [base, base + timedelta(hours=1), base + timedelta(hours=1), base + timedelta(hours=1),
+                   base + timedelta(hours=2), base + timedelta(hours=3), base + timedelta(hours=4)]
+    ids = _seed_scores(api_env, user_id, created_ats)
+    expected = [i for _, i in sorted(zip(created_ats, ids), reverse=True)]
+
+    pages = _all_pages(client, headers, limit=3)
+    assert [len(page["items"]) for page in pages] == [3, 3, 1]
+    assert [item["id"] for page in pages for item in page["items"]] == expected
+    assert expected[3:6] == [ids[3], ids[2], ids[1]], "created_at 相同的记录按 id 倒序"
+
+    # 翻到第 1 页后插入更新的记录：它们排在第一页之前，不影响后续页
+    def insert_while_paging(page_number):
+        if page_number == 1:
+            _seed_scores(api_env, user_id, [base + timedelta(hours=5), base + timedelta(hours=6)])
+
+    pages = _all_pages(client, headers, on_page=insert_while_paging, limit=3)
+    seen = [item["id"] for page in pages for item in page["items"]]
+    assert seen == expected, "翻页过程中插入的记录不应影响后续页"
+    assert pages[-1]["next_cursor"] is None and pages[-1]["has_more"] is False
+    print(f"✓ {len(ids)} 条记录分 3 页遍历，翻页时插入的记录不造成重复或遗漏")
+
+
+def test_list_fields_range_and_total(client, api_env):
+    """fields 只返回请求的字段；from（含）/ to（不含）和 source 过滤；include_total 时才返回 total"""
+    print("\n" + "=" * 60)
+    print("测试 4: 列表字段、时间范围和总数")
+    print("=" * 60)
+
+    user_id, headers = _create_user(api_env)
+    base = datetime(2024, 4, 1)
+    ids = _seed_scores(api_env, user_id, [base + timedelta(days=day) for day in range(5)])
+    url = "/api/emo-score/list"
+
+    body = client.get(url, params={"fields": "stress_score, source"}, headers=headers).json()
+    assert "total" not in body
+    assert all(set(item) == {"id", "created_at", "stress_score", "source"} for item in body["items"])
+    assert [item["stress_score"] for item in body["items"]] == [4, 3, 2, 1, 0]
+
+    params = {"from": "2024-04-02T00:00:00", "to": "2024-04-04T00:00:00", "fields": "stress_score"}
+    body = client.get(url, params=params, headers=headers).json()
+    assert [item["id"] for item in body["items"]] == [ids[2], ids[1]]
+
+    body = client.get(url, params={"include_total": "true", "limit": 2}, headers=headers).json()
+    assert body["total"] == 5 and len(body["items"]) == 2 and body["has_more"] is True
+
+    body = client.get(url, params={"source": "session", "include_total": "true"}, headers=headers).json()
+    assert body == {"total": 0, "items": [], "next_cursor": None, "has_more": False}
+    print("✓ fields / from / to / source / include_total 生效")
+
+
+def test_list_rejections(client, api_env):
+    """未知字段、格式错误的游标返回 400"""
+    print("\n" + "=" * 60)
+    print("测试 5: 列表参数校验")
+    print("=" * 60)
+
+    _, headers = _create_user(api_env)
+    url = "/api/emo-score/list"
+    assert client.get(url, params={"fields": "stress_score,password"}, headers=headers).status_code == 400
+    for cursor in ("not-a-cursor", "MXwy"):
+        assert client.get(url, params={"cursor": cursor}, headers=headers).status_code == 400, cursor
+    print("✓ 未知字段和格式错误的游标被拒绝")
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+测试情绪分数趋势分析
+
+验证：
+- EmoTrendService._compute 在带缺失值（NaN）、时间间隔不均匀的小序列上与手算结果一致：
+  移动平均、EWMA、斜率、波动率、onboarding 基线与最近一次 session 评估的差值、降采样
+- 全部缺失的维度所有统计量都为 None；空序列不报错
+- 新增评估（无论时间早晚）都会改变 _TrendCache 的 key，不会返回过期结果（conftest.py 的 api_env）
+
+运行：python -m pytest scripts/test_emo_trends.py
+"""
+
+import math
+import sys
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+# 添加项目根目录到 path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+
+from app.services.emo_trend_service import DIMENSIONS, EmoTrendService
+
+BASE = datetime(2024, 1, 1)
+NAN = math.nan
+
+# 第 0、1、2、4、5 天（第 3 天没有评估）；前两次 onboarding，之后 session
+DAYS = [0, 1, 2, 4, 5]
+SOURCES = ["onboarding", "onboarding", "session", "session", "session"]
+VALUES = [
+    # stress, stable, anxiety, functional
+    [10, NAN, 50, 0],
+    [NAN, NAN, 40, 5],
+    [20, NAN, NAN, 10],
+    [30, NAN, NAN, NAN],
+    [25, NAN, 20, 15],
+]
+
+
+def _compute(points=None):
+    timestamps = np.array(
+        [(BASE + timedelta(days=day)).replace(tzinfo=timezone.utc).timestamp() for day in DAYS], dtype=float
+    )
+    return EmoTrendService._compute(
+        timestamps, np.array(SOURCES, dtype=object), np.array(VALUES, dtype=float),
+        window=2, ewma_alpha=0.5, slope_windows=(3,), points=points,
+    )
+
+
+def test_compute_matches_hand_values():
+    """window=2、alpha=0.5、最近 3 次评估的斜率，与手算结果一致"""
+    print("=" * 60)
+    print("测试 1: 统计量")
+    print("=" * 60)
+
+    result = _compute()
+    dimensions = {item["name"]: item for item in result["dimensions"]}
+    assert result["total"] == 5 and result["downsampled"] is False
+
+    # stress: 有效值 10, 20, 30, 25（第 1 次缺失）
+    stress = dimensions["stress_score"]
+    assert stress["latest"] == 25 and stress["moving_average"] == 27.5 and stress["ewma"] == 23.75
+    # 第 2、4、5 天的 20, 30, 25：Σdxdy / Σdx² = 10 / (14/3)
+    assert stress["slopes"] == {"3": 2.1429}
+    # 相邻变化 10, 10, -5 的样本标准差 sqrt(75)
+    assert stress["volatility"] == 8.6603
+    assert (stress["onboarding"], stress["latest_session"], stress["delta"], stress["delta_rate"]) == (10, 25, 15, 1.5)
+
+    # anxiety: 最近 3 次只有 1 个有效点，斜率为 None；移动平均窗口内只有最后一个有效值
+    anxiety = dimensions["anxiety_score"]
+    assert anxiety["moving_average"] == 20 and anxiety["ewma"] == 32.5 and anxiety["slopes"] == {"3": None}
+    assert anxiety["volatility"] == 7.0711
+    assert (anxiety["delta"], anxiety["delta_rate"]) == (-30, -0.6)
+
+    # functional: 斜率只用第 2、5 天两个有效点；onboarding 基线为 0 时不计算变化率
+    functional = dimensions["functional_score"]
+    assert functional["slopes"] == {"3": 1.6667} and functional["volatility"] == 0.0
+    assert functional["ewma"] == 10.625
+    assert (functional["onboarding"], functional["delta"], functional["delta_rate"]) == (0, 15, None)
+
+    # stable: 全部缺失
+    stable = dimensions["stable_score"]
+    assert all(stable[name] is None for name in (
+        "latest", "moving_average", "ewma", "volatility", "onboarding", "latest_session", "delta", "delta_rate",
+    ))
+    assert stable["slopes"] == {"3": None}
+
+    series = result["series"]
+    assert series["timestamps"] == [BASE + timedelta(days=day) for day in DAYS]
+    assert series["values"]["stress_score"] == [10, None, 20, 30, 25]
+    assert series["moving_average"]["stress_score"] == [10, 10, 20, 25, 27.5]
+    assert series["ewma"]["stress_score"] == [10, 10, 15, 22.5, 23.75]
+    assert series["ewma"]["anxiety_score"] == [50, 45, 45, 45, 32.5]
+    assert series["ewma"]["stable_score"] == [None] * 5
+    print("✓ 移动平均、EWMA、斜率、波动率、onboarding 差值与手算一致")
+
+
+def test_downsample_and_empty_series():
+    """points=2：分成 2 个和 3 个点的两个桶，取均值并跳过 NaN；空序列返回空结果"""
+    print("\n" + "=" * 60)
+    print("测试 2: 降采样与空序列")
+    print("=" * 60)
+
+    result = _compute(points=2)
+    series = result["series"]
+    assert result["downsampled"] is True
+    # 桶 1：第 0、1 天；桶 2：第 2、4、5 天（平均 11/3 天）
+    assert series["timestamps"] == [BASE + timedelta(hours=12), BASE + timedelta(days=3, hours=16)]
+    assert series["values"]["stress_score"] == [10, 25]
+    assert series["values"]["anxiety_score"] == [45, 20]
+    assert series["values"]["functional_score"] == [2.5, 12.5]
+    assert series["values"]["stable_score"] == [None, None]
+    # 统计量不受降采样影响
+    assert result["dimensions"][0]["ewma"] == 23.75
+
+    empty = EmoTrendService._compute(
+        np.array([], dtype=float), np.array([], dtype=object), np.zeros((0, len(DIMENSIONS))),
+        window=2, ewma_alpha=0.5, slope_windows=(3,), points=2,
+    )
+    assert empty["total"] == 0 and empty["downsampled"] is False
+    assert all(item["latest"] is None and item["slopes"] == {} for item in empty["dimensions"])
+    assert empty["series"]["timestamps"] == []
+    print("✓ 降采样按桶求均值，空序列返回空结果")
+
+
+def test_new_score_changes_cache_key(api_env):
+    """缓存命中后新增评估：更新的记录改变最新 created_at，更早的记录改变记录数，都会重新计算"""
+    print("\n" + "=" * 60)
+    print("测试 3: 缓存失效")
+    print("=" * 60)
+
+    from app.models.emo_score import EmoScore, EmoScoreSource
+    from app.models.user import User
+    from app.services.emo_trend_service import _trend_cache
+
+    db = api_env.db()
+    try:
+        user = User(email=f"trend_{uuid.uuid4().hex[:10]}@example.com", hashed_password="x", therapist_id="01")
+        db.add(user)
+        db.flush()
+
+        def add_score(days: int, stress: int):
+            db.add(EmoScore(user_id=user.id, source=EmoScoreSource.SESSION, stress_score=stress,
+                            created_at=BASE + timedelta(days=days)))
+            db.commit()
+
+        add_score(0, 10)
+        add_score(2, 20)
+
+        first = EmoTrendService.get_trends(db, user.id)
+        hits = _trend_cache.hits
+        assert EmoTrendService.get_trends(db, user.id) is first and _trend_cache.hits == hits + 1
+
+        # 更新的记录：最新 created_at 变化
+        add_score(4, 40)
+        second = EmoTrendService.get_trends(db, user.id)
+        assert second is not first and second["total"] == 3
+        assert second["latest_created_at"] == BASE + timedelta(days=4)
+
+        # 更早的记录：最新 created_at 不变，记录数变化
+        add_score(1, 15)
+        third = EmoTrendService.get_trends(db, user.id)
+        assert third is not second and third["total"] == 4
+        assert third["series"]["values"]["stress_score"] == [10, 15, 20, 40]
+    finally:
+        db.close()
+    print("✓ 新增评估后缓存 key 变化，返回新的结果")
+
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+测试邀请码的批量生成和管理后台列表
+
+验证：
+- bulk_create_codes 跳过与库中已有邀请码冲突的码，并在下一轮补齐数量；
+  无法补齐时抛出 RuntimeError 并整体回滚
+- iter_export 按 CSV / NDJSON 分块输出
+- list_codes 的游标分页按 id 倒序遍历所有邀请码，不重复、不遗漏；
+  翻页过程中新插入的邀请码不影响后续页
+- 过滤条件和分页一起使用；兑换用户的 email 在同一个查询中取回
+- 格式错误的游标抛出 ValueError
+
+使用临时 SQLite 文件，不访问配置的数据库。
+"""
+
+import csv
+import io
+import json
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+# 添加项目根目录到 path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+
+# 测试使用自己的 engine；应用的全局 engine 只在导入时创建，这里换成不需要驱动的 SQLite，
+# 避免未配置数据库（默认 Postgres URL）的环境导入失败
+if "app.services.database" not in sys.modules and "DATABASE_URL" not in os.environ:
+    settings.DATABASE_URL = "sqlite://"
+
+from app.models.invitation_code import InvitationCode
+from app.models.therapist import Therapist
+from app.models.user import User
+from app.services.database import Base
+from app.services.invitation_service import InvitationService
+
+
+def _make_session_factory(directory: str):
+    engine = create_engine(f"sqlite:///{directory}/invitation_codes.db")
+    Base.metadata.create_all(engine, tables=[Therapist.__table__, User.__table__, InvitationCode.__table__])
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def _seed_codes(db, count: int, prefix: str = "C") -> list:
+    """插入 count 个一次性邀请码，每 3 个中第 1 个被新用户兑换，返回按插入顺序的 code"""
+    codes = []
+    for i in range(count):
+        code = f"{prefix}{i:05d}"
+        invitation = InvitationCode(code=code, is_universal=False, is_used=False)
+        if i % 3 == 0:
+            user = User(email=f"{code.lower()}@example.com", hashed_password="x", therapist_id="01")
+            db.add(user)
+            db.flush()
+            invitation.is_used = True
+            invitation.used_by_user_id = user.id
+            invitation.used_at = datetime.utcnow()
+        db.add(invitation)
+        codes.append(code)
+    db.commit()
+    return codes
+
+
+@contextmanager
+def _scripted_codes(sequence):
+    """让 generate_code 依次返回 sequence 中的码（用完后抛 StopIteration 防止死循环）"""
+    original = InvitationService.__dict__["generate_code"]
+    codes = iter(sequence)
+    InvitationService.generate_code = staticmethod(lambda: next(codes))
+    try:
+        yield
+    finally:
+        InvitationService.generate_code = original
+
+
+def _all_pages(db, limit: int, on_page=None, **filters) -> list:
+    """沿 next_cursor 翻页直到最后一页，返回每一页的 rows"""
+    pages, cursor = [], None
+    while True:
+        rows, cursor = InvitationService.list_codes(db, limit=limit, cursor=cursor, **filters)
+        pages.append(rows)
+        if on_page is not None:
+            on_page(len(pages))
+        if cursor is None:
+            return pages
+
+
+def test_bulk_create_tops_up_collisions():
+    """与已有邀请码冲突的候选不插入，差额在下一轮用新生成的码补齐；批内重复的候选先去重"""
+    print("=" * 60)
+    print("测试 1: 冲突与补齐")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as directory:
+        SessionFactory = _make_session_factory(directory)
+        db = SessionFactory()
+        try:
+            for code in ("OLD00001", "OLD00002"):
+                db.add(InvitationCode(code=code, is_universal=False, is_used=False))
+            db.commit()
+
+            # 第一轮 5 个候选（含批内重复的 NEW00001）中 2 个与库中冲突，第二轮补齐 2 个
+            sequence = ["NEW00001", "OLD00001", "NEW00001", "NEW00002", "OLD00002", "NEW00003",
+                        "NEW00004", "NEW00005"]
+            with _scripted_codes(sequence):
+                rows = InvitationService.bulk_create_codes(db, 5, batch_size=2)
+
+            codes = [row.code for row in rows]
+            assert sorted(codes) == ["NEW00001", "NEW00002", "NEW00003", "NEW00004", "NEW00005"], codes
+            assert len({row.id for row in rows}) == 5 and all(row.created_at for row in rows)
+            assert db.query(InvitationCode).count() == 7
+        finally:
+            db.close()
+    print(f"✓ 2 个冲突被跳过并补齐，共生成 {len(codes)} 个")
+
+
+def test_bulk_create_rolls_back_when_exhausted():
+    """BULK_MAX_ROUNDS 轮内无法补齐（候选全部冲突）：抛出 RuntimeError，已插入的码回滚"""
+    print("\n" + "=" * 60)
+    print("测试 2: 无法补齐时回滚")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as directory:
+        SessionFactory = _make_session_factory(directory)
+        db = SessionFactory()
+        try:
+            db.add(InvitationCode(code="TAKEN001", is_universal=False, is_used=False))
+            db.commit()
+
+            sequence = ["FRESH001"] + ["TAKEN001"] * InvitationService.BULK_MAX_ROUNDS
+            with _scripted_codes(sequence):
+                try:
+                    InvitationService.bulk_create_codes(db, 2)
+                except RuntimeError as e:
+                    assert "1/2" in str(e), e
+                else:
+                    raise AssertionError("应该抛出 RuntimeError")
+
+            assert [code for (code,) in db.query(InvitationCode.code)] == ["TAKEN001"], "已插入的码应该回滚"
+        finally:
+            db.close()
+    print(f"✓ {InvitationService.BULK_MAX_ROUNDS} 轮后放弃，事务回滚")
+
+
+def test_iter_export_formats():
+    """CSV 带表头、NDJSON 每行一个对象；按 chunk_size 分块"""
+    print("\n" + "=" * 60)
+    print("测试 3: 导出格式")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as directory:
+        SessionFactory = _make_session_factory(directory)
+        db = SessionFactory()
+        try:
+            rows = InvitationService.bulk_create_codes(db, 5)
+        finally:
+            db.close()
+
+    chunks = list(InvitationService.iter_export(rows, "csv", chunk_size=2))
+    assert len(chunks) == 3
+    parsed = list(csv.reader(io.StringIO("".join(chunks))))
+    assert parsed[0] == list(InvitationService.EXPORT_FIELDS)
+    assert [line[1] for line in parsed[1:]] == [row.code for row in rows]
+
+    lines = "".join(InvitationService.iter_export(rows, "ndjson")).splitlines()
+    records = [json.loads(line) for line in lines]
+    assert [record["code"] for record in records] == [row.code for row in rows]
+    assert set(records[0]) == set(InvitationService.EXPORT_FIELDS)
+    print(f"✓ CSV {len(chunks)} 块、NDJSON {len(records)} 行")
+
+
+def test_cursor_pages_are_stable():
+    """分页遍历覆盖全部邀请码；翻页时插入新邀请码，后续页既不重复也不遗漏"""
+    print("\n" + "=" * 60)
+    print("测试 4: 游标分页的稳定性")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as directory:
+        SessionFactory = _make_session_factory(directory)
+        db = SessionFactory()
+        try:
+            db.add(Therapist(id="01", name="默认心理咨询师", age=35, info="test", prompt="test"))
+            codes = _seed_codes(db, 23)
+
+            pages = _all_pages(db, limit=5)
+            seen = [row.code for page in pages for row in page]
+            assert [len(page) for page in pages] == [5, 5, 5, 5, 3]
+            assert seen == list(reversed(codes)), "应按 id 倒序、不重复不遗漏"
+
+            # 兑换用户的 email 与邀请码一起返回
+            used = {row.code: row.used_by_email for page in pages for row in page if row.is_used}
+            assert used and all(email == f"{code.lower()}@example.com" for code, email in used.items())
+
+            # 翻到第 2 页后插入新邀请码：它们排在第一页之前，不会挤进后续页
+            def insert_while_paging(page_number):
+                if page_number == 2:
+                    _seed_codes(db, 4, prefix="N")
+
+            pages = _all_pages(db, limit=5, on_page=insert_while_paging)
+            seen = [row.code for page in pages for row in page]
+            assert seen == list(reversed(codes)), "翻页过程中插入的新邀请码不应影响后续页"
+        finally:
+            db.close()
+    print("✓ 23 个邀请码分 5 页遍历，翻页时插入 4 个新邀请码不影响结果")
+
+
+def test_filters_with_pagination():
+    """过滤条件在每一页都生效，最后一页 next_cursor 为 None"""
+    print("\n" + "=" * 60)
+    print("测试 5: 过滤 + 分页")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as directory:
+        SessionFactory = _make_session_factory(directory)
+        db = SessionFactory()
+        try:
+            db.add(Therapist(id="01", name="默认心理咨询师", age=35, info="test", prompt="test"))
+            codes = _seed_codes(db, 12, prefix="A") + _seed_codes(db, 6, prefix="B")
+            db.add(InvitationCode(code=InvitationService.UNIVERSAL_CODE, is_universal=True, is_used=False))
+            db.commit()
+
+            used = [row.code for page in _all_pages(db, limit=2, status="used") for row in page]
+            assert used == [code for code in reversed(codes) if int(code[1:]) % 3 == 0]
+
+            unused_a = [row.code for page in _all_pages(db, limit=3, status="unused", code_prefix="A")
+                        for row in page]
+            assert unused_a == [code for code in reversed(codes) if code[0] == "A" and int(code[1:]) % 3]
+
+            universal = [row.code for page in _all_pages(db, limit=5, status="universal") for row in page]
+            assert universal == [InvitationService.UNIVERSAL_CODE]
+
+            assert InvitationService.count_codes(db, status="used") == (len(used), False)
+        finally:
+            db.close()
+    print(f"✓ used {len(used)} 个、A 开头未使用 {len(unused_a)} 个、通用码 1 个")
+
+
+def test_malformed_cursor():
+    """格式错误的游标抛出 ValueError（路由返回 400）"""
+    print("\n" + "=" * 60)
+    print("测试 6: 格式错误的游标")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as directory:
+        SessionFactory = _make_session_factory(directory)
+        db = SessionFactory()
+        try:
+            for cursor in ("not-a-cursor", "MXwy"):
+                try:
+                    InvitationService.list_codes(db, cursor=cursor)
+                except ValueError:
+                    continue
+                raise AssertionError(f"应该拒绝游标: {cursor}")
+        finally:
+            db.close()
+    print("✓ 格式错误的游标被拒绝")
+
+
+def main():
+    test_bulk_create_tops_up_collisions()
+    test_bulk_create_rolls_back_when_exhausted()
+    test_iter_export_formats()
+    test_cursor_pages_are_stable()
+    test_filters_with_pagination()
+    test_malformed_cursor()
+    print("\n✓ 全部测试通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+测试注册时邀请码的原子兑换
+
+多个线程同时用同一个一次性邀请码注册，验证：
+- 只有一个注册成功，其余返回 400
+- 邀请码的 used_by_user_id 指向成功注册的用户
+- 失败的注册不会留下用户，验证码也都被消耗
+
+默认使用临时 SQLite 文件；设置 RACE_DATABASE_URL 可以在 Postgres 上运行
+（会创建并清理 race_ 开头的测试数据）。
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# 添加项目根目录到 path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+
+# 测试使用自己的 engine；应用的全局 engine 只在导入时创建，这里换成不需要驱动的 SQLite，
+# 避免未配置数据库（默认 Postgres URL）的环境导入失败
+if "app.services.database" not in sys.modules and "DATABASE_URL" not in os.environ:
+    settings.DATABASE_URL = "sqlite://"
+
+from app.api.routes.auth import register
+from app.models.captcha_session import CaptchaSession
+from app.models.invitation_code import InvitationCode
+from app.models.therapist import Therapist
+from app.models.user import User
+from app.schemas.user import UserCreate
+from app.services.database import Base
+
+WORKERS = 8
+
+
+def _make_session_factory(directory: str):
+    url = os.environ.get("RACE_DATABASE_URL") or f"sqlite:///{directory}/race.db"
+    engine = create_engine(url, connect_args={"timeout": 30} if url.startswith("sqlite") else {})
+    Base.metadata.create_all(engine, tables=[
+        Therapist.__table__, User.__table__, InvitationCode.__table__, CaptchaSession.__table__,
+    ])
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def _seed(SessionFactory, code: str, universal: bool = False):
+    """插入邀请码和每个线程各自的验证码"""
+    prefix = uuid.uuid4().hex[:8]
+    db = SessionFactory()
+    try:
+        if db.get(Therapist, "01") is None:
+            db.add(Therapist(id="01", name="默认心理咨询师", age=35, info="test", prompt="test"))
+        db.add(InvitationCode(code=code, is_universal=universal, is_used=False))
+        captchas = []
+        for i in range(WORKERS):
+            captcha = CaptchaSession(
+                session_id=f"race_{prefix}_{i}",
+                captcha_text="1234",
+                expires_at=datetime.utcnow() + timedelta(minutes=5),
+            )
+            db.add(captcha)
+            captchas.append(captcha.session_id)
+        db.commit()
+        return prefix, captchas
+    finally:
+        db.close()
+
+
+def _register_concurrently(SessionFactory, code: str, prefix: str, captchas):
+    """所有线程在 barrier 处对齐后同时注册"""
+    barrier = threading.Barrier(WORKERS)
+    results = [None] * WORKERS
+
+    def worker(index: int):
+        user_data = UserCreate(
+            email=f"race_{prefix}_{index}@example.com",
+            password="password123",
+            invitation_code=code,
+            captcha_session_id=captchas[index],
+            captcha_text="1234",
+        )
+        db = SessionFactory()
+        try:
+            barrier.wait()
+            response = register(user_data, db)
+            results[index] = ("ok", response.user.id)
+        except HTTPException as e:
+            results[index] = (e.status_code, e.detail)
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(WORKERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def _cleanup(SessionFactory, code: str, prefix: str):
+    db = SessionFactory()
+    try:
+        db.query(InvitationCode).filter(InvitationCode.code == code).delete()
+        db.query(User).filter(User.email.like(f"race_{prefix}_%")).delete(synchronize_session=False)
+        db.query(CaptchaSession).filter(CaptchaSession.session_id.like(f"race_{prefix}_%")).delete(
+            synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_single_use_code_redeemed_once():
+    """一次性邀请码并发注册只能成功一次"""
+    print("=" * 60)
+    print(f"测试 1: {WORKERS} 个并发注册争抢同一个邀请码")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as directory:
+        SessionFactory = _make_session_factory(directory)
+        code = f"R{uuid.uuid4().hex[:7].upper()}"
+        prefix, captchas = _seed(SessionFactory, code)
+        try:
+            results = _register_concurrently(SessionFactory, code, prefix, captchas)
+            print(f"结果: {results}")
+
+            winners = [r[1] for r in results if r[0] == "ok"]
+            losers = [r for r in results if r[0] != "ok"]
+            assert len(winners) == 1, f"应该只有一个注册成功: {results}"
+            assert all(r == (400, "Invalid or used invitation code") for r in losers), results
+            print("✓ 只有一个注册成功")
+
+            db = SessionFactory()
+            try:
+                invitation = db.query(InvitationCode).filter(InvitationCode.code == code).one()
+                assert invitation.is_used and invitation.used_by_user_id == winners[0]
+                users = db.query(User).filter(User.email.like(f"race_{prefix}_%")).count()
+                assert users == 1, f"失败的注册不应留下用户: {users}"
+                remaining = db.query(CaptchaSession).filter(
+                    CaptchaSession.session_id.like(f"race_{prefix}_%")
+                ).count()
+                assert remaining == 0, f"所有验证码都应被消耗: {remaining}"
+            finally:
+                db.close()
+            print("✓ 邀请码归属正确，失败的注册没有留下用户，验证码全部被消耗")
+        finally:
+            _cleanup(SessionFactory, code, prefix)
+            SessionFactory.kw["bind"].dispose()
+
+
+def test_universal_code_redeemed_by_all():
+    """通用邀请码可以被并发的多个注册同时使用"""
+    print("\n" + "=" * 60)
+    print("测试 2: 通用邀请码并发注册")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as directory:
+        SessionFactory = _make_session_factory(directory)
+        code = f"U{uuid.uuid4().hex[:7].upper()}"
+        prefix, captchas = _seed(SessionFactory, code, universal=True)
+        try:
+            results = _register_concurrently(SessionFactory, code, prefix, captchas)
+            assert all(r[0] == "ok" for r in results), f"通用邀请码应全部成功: {results}"
+
+            db = SessionFactory()
+            try:
+                invitation = db.query(InvitationCode).filter(InvitationCode.code == code).one()
+                assert not invitation.is_used and invitation.used_by_user_id is None
+            finally:
+                db.close()
+            print(f"✓ {WORKERS} 个注册全部成功，通用邀请码保持未使用状态")
+        finally:
+            _cleanup(SessionFactory, code, prefix)
+            SessionFactory.kw["bind"].dispose()
+
+
+def main():
+    test_single_use_code_redeemed_once()
+    test_universal_code_redeemed_by_all()
+    print("\n✓ 全部测试通过")
+
+
+if __name__ == "__main__":
+    main()
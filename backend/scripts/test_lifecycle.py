@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+测试优雅退出的 draining
+
+验证：draining 后拒绝新的轮次（已开始的后续工作仍可进入）、wait_idle 等待进行中的轮次、
+drain 回调只触发一次、/health 在预热完成前和 draining 时返回 503
+"""
+
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+# 添加项目根目录到 path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.services.lifecycle import LifecycleManager, ServiceDraining
+
+
+def test_reject_new_runs_while_draining():
+    """draining 后新的轮次抛出 ServiceDraining，admit_during_drain 的仍然执行"""
+    print("=" * 60)
+    print("测试 1: draining 时拒绝新的轮次")
+    print("=" * 60)
+
+    manager = LifecycleManager()
+    with manager.track_run("post_message"):
+        assert manager.in_flight() == 1
+    assert manager.in_flight() == 0
+
+    calls = []
+    manager.add_drain_listener(lambda: calls.append(1))
+    assert manager.begin_drain("test") and not manager.begin_drain("again")
+    assert calls == [1] and manager.drain_reason == "test"
+
+    try:
+        with manager.track_run("post_message"):
+            raise AssertionError("draining 时不应进入")
+    except ServiceDraining as e:
+        assert e.kind == "post_message"
+    with manager.track_run("opening", admit_during_drain=True):
+        assert manager.in_flight() == 1
+    assert manager.stats()["rejected"] == 1
+    print("✓ 新轮次被拒绝，开场白仍可执行，drain 回调只触发一次")
+
+
+def test_wait_idle():
+    """wait_idle 等待进行中的轮次结束，超时返回 False"""
+    print("\n" + "=" * 60)
+    print("测试 2: 等待进行中的轮次")
+    print("=" * 60)
+
+    manager = LifecycleManager()
+    release = threading.Event()
+
+    def turn():
+        with manager.track_run("post_message"):
+            release.wait()
+
+    worker = threading.Thread(target=turn)
+    worker.start()
+    while manager.in_flight() == 0:
+        time.sleep(0.01)
+
+    manager.begin_drain("test")
+    assert not manager.wait_idle(0.1), "轮次未结束时应超时"
+
+    threading.Timer(0.1, release.set).start()
+    started = time.monotonic()
+    assert manager.wait_idle(5)
+    worker.join()
+    print(f"✓ 轮次结束后 {time.monotonic() - started:.2f}s 返回")
+
+
+def test_health_readiness():
+    """预热完成前和 draining 时 /health 返回 503"""
+    print("\n" + "=" * 60)
+    print("测试 3: /health 就绪状态")
+    print("=" * 60)
+
+    from app.api.routes import health
+    from app.services import lifecycle, warmup
+
+    original = lifecycle._manager, warmup._warmup, warmup.WARMUP_STEPS
+    try:
+        lifecycle._manager = LifecycleManager()
+        warmup._warmup = warmup.Warmup()
+        warmup.WARMUP_STEPS = [("ok", lambda: None), ("broken", lambda: 1 / 0)]
+        response = asyncio.run(health.health_check())
+        assert response.status_code == 503 and b"warming" in response.body
+
+        warmup._warmup.run()
+        assert warmup._warmup.stats()["failed"] == ["broken"], "失败的步骤不影响就绪"
+        assert asyncio.run(health.health_check()) == {"status": "ok"}
+
+        lifecycle._manager.begin_drain("test")
+        response = asyncio.run(health.health_check())
+        assert response.status_code == 503 and b"draining" in response.body
+    finally:
+        lifecycle._manager, warmup._warmup, warmup.WARMUP_STEPS = original
+    print("✓ warming / ok / draining")
+
+
+def main():
+    test_reject_new_runs_while_draining()
+    test_wait_idle()
+    test_health_readiness()
+    print("\n✓ 全部测试通过")
+
+
+if __name__ == "__main__":
+    main()
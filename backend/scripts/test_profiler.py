@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+测试按需采样 profiler
+
+验证：
+- 被采样请求的 profile 包含其同步 endpoint（线程池 worker）的调用栈
+- 同时在其他线程中运行的工作（其他请求、后台线程）不计入该请求的 profile
+- 输出的 collapsed stack / speedscope 格式可以被解析
+"""
+
+import json
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# 添加项目根目录到 path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.core.profiler import SamplingProfiler, profiling_middleware
+
+
+def _busy(seconds: float):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        sum(range(200))
+
+
+def profiled_endpoint_work(seconds: float):
+    _busy(seconds)
+
+
+def unrelated_background_work(stop: threading.Event):
+    while not stop.is_set():
+        _busy(0.01)
+
+
+def _run_with_background(func):
+    """在后台线程持续运行 unrelated_background_work 的同时执行 func"""
+    stop = threading.Event()
+    background = threading.Thread(target=unrelated_background_work, args=(stop,), name="unrelated")
+    background.start()
+    try:
+        return func()
+    finally:
+        stop.set()
+        background.join()
+
+
+def test_profiles_only_request_threads():
+    """profile 只包含本请求的线程：有 endpoint 的栈，没有同时运行的其他线程"""
+    print("=" * 60)
+    print("测试 1: 只采样处理请求的线程")
+    print("=" * 60)
+
+    app = FastAPI()
+    app.middleware("http")(profiling_middleware)
+
+    @app.get("/work")
+    def work():
+        profiled_endpoint_work(0.3)
+        return {"ok": True}
+
+    originals = (settings.PROFILING_SAMPLE_RATE, settings.PROFILING_DIR, settings.PROFILING_FORMAT)
+    with tempfile.TemporaryDirectory() as directory:
+        settings.PROFILING_SAMPLE_RATE = 1.0
+        settings.PROFILING_DIR = directory
+        settings.PROFILING_FORMAT = "collapsed"
+        try:
+            response = _run_with_background(lambda: TestClient(app).get("/work"))
+        finally:
+            settings.PROFILING_SAMPLE_RATE, settings.PROFILING_DIR, settings.PROFILING_FORMAT = originals
+
+        assert response.status_code == 200
+        profile = (Path(directory) / response.headers["X-Profile-File"]).read_text(encoding="utf-8")
+
+    stacks = {}
+    for line in profile.splitlines():
+        stack, count = line.rsplit(" ", 1)
+        stacks[stack] = int(count)
+    endpoint = sum(count for stack, count in stacks.items() if "profiled_endpoint_work" in stack)
+    assert endpoint > 10, f"应采到 endpoint 的调用栈：\n{profile}"
+    assert "unrelated_background_work" not in profile, f"不应采到其他线程：\n{profile}"
+    print(f"✓ endpoint 采样 {endpoint} 次，未包含同时运行的其他线程")
+
+
+def test_unrestricted_profiler_and_formats():
+    """不指定线程时采样所有非空闲线程；collapsed / speedscope 输出的权重一致"""
+    print("\n" + "=" * 60)
+    print("测试 2: 全线程采样与输出格式")
+    print("=" * 60)
+
+    profiler = SamplingProfiler(interval=0.002)
+
+    def run():
+        profiler.start()
+        try:
+            profiled_endpoint_work(0.2)
+        finally:
+            profiler.stop()
+
+    _run_with_background(run)
+
+    collapsed = profiler.to_collapsed()
+    assert "unrelated_background_work" in collapsed and "profiled_endpoint_work" in collapsed
+    total = sum(int(line.rsplit(" ", 1)[1]) for line in collapsed.splitlines())
+
+    speedscope = json.loads(profiler.to_speedscope("test"))
+    profile = speedscope["profiles"][0]
+    assert len(profile["samples"]) == len(profiler.samples)
+    assert abs(sum(profile["weights"]) - total * profiler.interval) < 1e-9
+    assert all(index < len(speedscope["shared"]["frames"]) for sample in profile["samples"] for index in sample)
+    print(f"✓ {profiler.sample_count} 轮采样，{len(profiler.samples)} 种调用栈")
+
+
+def main():
+    test_profiles_only_request_threads()
+    test_unrestricted_profiler_and_formats()
+    print("\n✓ 全部测试通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+测试 prompt A/B 实验
+
+验证变体校验、确定性分桶与权重分布、按变体聚合用量日志
+"""
+
+import sys
+from pathlib import Path
+
+# 添加项目根目录到 path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.services.prompt_store import Experiment, assign_variant, experiment_report, parse_variants
+
+
+def test_parse_variants():
+    """变体至少 2 个、id 唯一、权重为 1-1000 的整数、content 不能是空字符串"""
+    print("=" * 60)
+    print("测试 1: 变体校验")
+    print("=" * 60)
+
+    variants = parse_variants([{"id": "control"}, {"id": "short", "weight": 3, "content": "S"}])
+    assert variants[0].weight == 1 and variants[0].content is None
+    assert variants[1].weight == 3
+
+    invalid = [
+        [{"id": "only"}],
+        [{"id": "a"}, {"id": "a", "content": "x"}],
+        [{"id": "a"}, {"id": "b c"}],
+        [{"id": "a"}, {"id": "b", "weight": 0}],
+        [{"id": "a"}, {"id": "b", "weight": 1.5}],
+        [{"id": "a"}, {"id": "b", "content": "  "}],
+    ]
+    for raw in invalid:
+        try:
+            parse_variants(raw)
+        except ValueError:
+            continue
+        raise AssertionError(f"应该校验失败: {raw}")
+    print(f"✓ {len(invalid)} 种非法定义都被拒绝")
+
+
+def test_assignment_is_deterministic_and_weighted():
+    """同一用户总是同一个变体，分布接近权重，不同实验之间分桶独立"""
+    print("\n" + "=" * 60)
+    print("测试 2: 确定性分桶")
+    print("=" * 60)
+
+    variants = parse_variants([{"id": "control", "weight": 1}, {"id": "B", "weight": 3, "content": "B"}])
+    first = Experiment(1, "e1", "clerk", variants)
+    second = Experiment(2, "e2", "clerk", variants)
+
+    counts = {"control": 0, "B": 0}
+    differs = 0
+    for user_id in range(4000):
+        variant = assign_variant(first, user_id)
+        assert assign_variant(first, user_id) == variant
+        counts[variant.id] += 1
+        differs += assign_variant(second, user_id).id != variant.id
+    share = counts["B"] / 4000
+    assert 0.70 < share < 0.80, counts
+    assert differs > 0, "不同实验应该独立分桶"
+    print(f"✓ 分布 {counts}（B 占 {share:.1%}），换实验后 {differs} 个用户换了变体")
+
+
+def test_experiment_report():
+    """只统计本实验的记录，没有数据的变体也出现在报告中"""
+    print("\n" + "=" * 60)
+    print("测试 3: 按变体聚合")
+    print("=" * 60)
+
+    records = [
+        {"user_id": 1, "prompt_variants": {"clerk": "7:A"}, "prompt_tokens": 1000,
+         "completion_tokens": 100, "cached_tokens": 800, "latency_ms": 200.0},
+        {"user_id": 1, "prompt_variants": {"clerk": "7:A"}, "prompt_tokens": 1000,
+         "completion_tokens": 300, "cached_tokens": 0, "latency_ms": 400.0},
+        {"user_id": 2, "prompt_variants": {"clerk": "8:A"}, "prompt_tokens": 5000,
+         "completion_tokens": 1, "cached_tokens": 0, "latency_ms": 9000.0},
+        {"user_id": 3, "prompt_variants": {}, "prompt_tokens": 5000,
+         "completion_tokens": 1, "cached_tokens": 0, "latency_ms": 9000.0},
+    ]
+    report = {row["variant_id"]: row for row in experiment_report(7, ["A", "B"], records)}
+
+    a = report["A"]
+    assert a["calls"] == 2 and a["users"] == 1
+    assert a["avg_prompt_tokens"] == 1000 and a["avg_completion_tokens"] == 200
+    assert a["cache_hit_rate"] == 0.4
+    assert a["avg_latency_ms"] == 300 and a["p95_latency_ms"] == 400
+    assert report["B"]["calls"] == 0 and report["B"]["cache_hit_rate"] is None
+    print(f"✓ A: {a}")
+
+
+def main():
+    test_parse_variants()
+    test_assignment_is_deterministic_and_weighted()
+    test_experiment_report()
+    print("\n✓ 全部测试通过")
+
+
+if __name__ == "__main__":
+    main()
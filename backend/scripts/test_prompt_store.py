@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+测试版本化的提示词存储
+
+验证：publish 追加版本并递增 key 内版本号、内容未变时不产生新版本、rollback 把旧版本再发布为新版本、
+其他 worker 的 check_version 能发现发布、加载期间发生的发布不会让版本戳和内容不一致、
+数据库不可用时退回 YAML 默认值且在重试间隔内不再访问数据库、
+未知 key / 空内容抛出 ValueError，管理后台接口返回 400
+（使用临时 SQLite 数据库，不访问配置的数据库）
+"""
+
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+# 添加项目根目录到 path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine, event
+
+from app.core.config import settings
+
+# 导入模型会创建全局 engine：未配置数据库（默认 Postgres URL）时换成不需要驱动的 SQLite
+if "app.services.database" not in sys.modules and "DATABASE_URL" not in os.environ:
+    settings.DATABASE_URL = "sqlite://"
+
+from app.models.prompt_experiment import PromptExperiment
+from app.models.prompt_version import PromptVersion
+from app.models.user import User
+from app.services import database
+from app.services.prompt_store import PromptStore
+
+
+@contextmanager
+def _temp_database(create_tables: bool = True):
+    """把全局 SessionLocal 绑定到临时 SQLite 数据库（store.reload / check_version 使用它），结束后恢复"""
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{directory}/prompt_store.db")
+        if create_tables:
+            database.Base.metadata.create_all(engine, tables=[
+                User.__table__, PromptVersion.__table__, PromptExperiment.__table__,
+            ])
+        original = database.SessionLocal.kw["bind"]
+        database.SessionLocal.configure(bind=engine)
+        try:
+            yield database.SessionLocal
+        finally:
+            database.SessionLocal.configure(bind=original)
+            engine.dispose()
+
+
+def _publish(SessionFactory, store: PromptStore, key: str, content: str):
+    db = SessionFactory()
+    try:
+        return store.publish(db, key, content)
+    finally:
+        db.close()
+
+
+def _versions(SessionFactory, key: str) -> list:
+    db = SessionFactory()
+    try:
+        return [
+            (row.version, row.content)
+            for row in db.query(PromptVersion).filter(PromptVersion.key == key).order_by(PromptVersion.version)
+        ]
+    finally:
+        db.close()
+
+
+def _latest_id(SessionFactory) -> int:
+    """prompt_versions.id 的最大值（store 版本号）"""
+    db = SessionFactory()
+    try:
+        return max(row.id for row in db.query(PromptVersion))
+    finally:
+        db.close()
+
+
+def test_publish_and_rollback():
+    """publish 递增 key 内版本号；相同内容不产生新版本；rollback 到旧版本 / YAML 默认值都是新版本"""
+    print("=" * 60)
+    print("测试 1: 发布与回滚")
+    print("=" * 60)
+
+    with _temp_database() as SessionFactory:
+        store = PromptStore(poll_interval=0)
+        default = store.get_entry("clerk")
+        assert default.version == 0 and default.content
+
+        first = _publish(SessionFactory, store, "clerk", "clerk v1")
+        second = _publish(SessionFactory, store, "clerk", "clerk v2")
+        assert (first.version, second.version) == (1, 2)
+        assert store.get("clerk") == "clerk v2" and store.version == _latest_id(SessionFactory)
+
+        # 内容未变：返回当前版本，不写入新行
+        assert _publish(SessionFactory, store, "clerk", "clerk v2").version == 2
+
+        # 其他 key 的版本号独立
+        assert _publish(SessionFactory, store, "onboarding", "onboarding v1").version == 1
+
+        db = SessionFactory()
+        try:
+            assert store.rollback(db, "clerk", 1).version == 3
+            assert store.get("clerk") == "clerk v1"
+            assert store.rollback(db, "clerk", 0).content == default.content
+            try:
+                store.rollback(db, "clerk", 99)
+            except ValueError:
+                pass
+            else:
+                raise AssertionError("不存在的版本应该抛出 ValueError")
+            assert [row.version for row in store.history(db, "clerk")] == [4, 3, 2, 1]
+        finally:
+            db.close()
+
+        assert _versions(SessionFactory, "clerk") == [
+            (1, "clerk v1"), (2, "clerk v2"), (3, "clerk v1"), (4, default.content),
+        ]
+        assert store.get_entry("clerk").version == 4
+    print("✓ clerk 发布到 v4（含两次回滚），相同内容没有产生新版本")
+
+
+def test_check_version_picks_up_other_workers():
+    """另一个 worker 发布后，check_version 发现版本戳变化并重新加载，listener 收到变化的 key"""
+    print("\n" + "=" * 60)
+    print("测试 2: 跨 worker 同步")
+    print("=" * 60)
+
+    with _temp_database() as SessionFactory:
+        worker_a = PromptStore(poll_interval=0)
+        worker_b = PromptStore(poll_interval=0)
+        worker_a.reload()
+        worker_b.reload()
+        changed_keys = []
+        worker_b.add_listener(changed_keys.append)
+
+        _publish(SessionFactory, worker_a, "therapist-timeout", "timeout v1")
+        assert worker_b.get("therapist-timeout") != "timeout v1"
+
+        assert worker_b.check_version() is True
+        assert worker_b.get("therapist-timeout") == "timeout v1"
+        assert worker_b.version == worker_a.version
+        assert changed_keys == [{"therapist-timeout"}]
+        assert worker_b.check_version() is False
+    print(f"✓ worker B 重新加载到版本 {worker_b.version}")
+
+
+def test_publish_during_load_is_not_lost():
+    """加载过程中另一个 worker 发布：之后的 check_version 必须让版本戳和内容都是最新的"""
+    print("\n" + "=" * 60)
+    print("测试 3: 加载期间的发布")
+    print("=" * 60)
+
+    with _temp_database() as SessionFactory:
+        publisher = PromptStore(poll_interval=0)
+        store = PromptStore(poll_interval=0)
+        _publish(SessionFactory, publisher, "clerk", "clerk v1")
+
+        # 在加载的第一条查询执行完之后（第二条查询执行前）发布新版本
+        executed = []
+
+        def publish_mid_load(state):
+            executed.append(state.statement)
+            if len(executed) == 2:
+                _publish(SessionFactory, publisher, "clerk", "clerk v2")
+
+        db = SessionFactory()
+        try:
+            event.listen(db, "do_orm_execute", publish_mid_load)
+            store.reload(db)
+        finally:
+            db.close()
+
+        store.check_version()
+        assert store.get("clerk") == "clerk v2", "版本戳不能比快照内容新"
+        assert store.version == publisher.version
+        assert store.check_version() is False
+    print("✓ 加载期间的发布在下一次 check_version 时被加载")
+
+
+def test_database_unavailable_uses_file_defaults():
+    """数据库不可用：返回 YAML 默认值，重试间隔内不再访问数据库；间隔过后重试"""
+    print("\n" + "=" * 60)
+    print("测试 4: 数据库不可用")
+    print("=" * 60)
+
+    # 不建表：加载时查询失败
+    with _temp_database(create_tables=False):
+        store = PromptStore(poll_interval=0)
+        attempts = []
+        original_reload = store.reload
+
+        def counting_reload(db=None):
+            attempts.append(db)
+            return original_reload(db)
+
+        store.reload = counting_reload
+        defaults = store._load_file_defaults()
+
+        for _ in range(5):
+            assert store.get("clerk") == defaults["clerk"].content
+            assert store.get_entry("onboarding") == defaults["onboarding"]
+        assert len(attempts) == 1 and store.loaded is False
+
+        store._retry_at = 0.0
+        store.get("clerk")
+        assert len(attempts) == 2
+    print("✓ 5 轮读取只尝试加载 1 次，重试间隔过后再次尝试")
+
+
+def test_invalid_publish_maps_to_400():
+    """未知 key / 空内容：store 和 PromptManager 抛出 ValueError，管理后台接口返回 400"""
+    print("\n" + "=" * 60)
+    print("测试 5: 非法发布")
+    print("=" * 60)
+
+    from fastapi import HTTPException
+
+    from app.api.routes.admin import update_file_prompt
+    from app.schemas.admin import FilePromptUpdateRequest
+    from app.services.prompt_manager import get_prompt_manager
+
+    with _temp_database() as SessionFactory:
+        store = PromptStore(poll_interval=0)
+        db = SessionFactory()
+        try:
+            for key, content in (("unknown", "x"), ("clerk", ""), ("clerk", "   ")):
+                try:
+                    store.publish(db, key, content)
+                except ValueError:
+                    continue
+                raise AssertionError(f"应该拒绝发布: {key!r} {content!r}")
+
+            for key, content in (("unknown", "x"), ("clerk", "  \n ")):
+                try:
+                    get_prompt_manager().update_prompt_by_key(db, key, content)
+                except ValueError:
+                    continue
+                raise AssertionError(f"PromptManager 应该抛出 ValueError: {key!r}")
+
+            try:
+                update_file_prompt("clerk", FilePromptUpdateRequest(content="   "), admin=User(id=1), db=db)
+            except HTTPException as e:
+                assert e.status_code == 400, e.status_code
+            else:
+                raise AssertionError("空内容应该返回 400")
+        finally:
+            db.close()
+
+        assert _versions(SessionFactory, "clerk") == []
+    print("✓ 未知 key 和空内容都被拒绝，没有写入版本")
+
+
+def main():
+    test_publish_and_rollback()
+    test_check_version_picks_up_other_workers()
+    test_publish_during_load_is_not_lost()
+    test_database_unavailable_uses_file_defaults()
+    test_invalid_publish_maps_to_400()
+    print("\n✓ 全部测试通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+测试 prompt 模板
+
+验证全部模板可以编译、渲染结果与原先的拼接方式一致、相同参数命中渲染缓存、hash 稳定
+"""
+
+import sys
+from pathlib import Path
+
+# 添加项目根目录到 path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from jinja2 import UndefinedError
+
+from app.services.prompt_templates import PromptTemplates
+
+
+def test_compile_all():
+    """目录下的全部 .j2 模板都能编译"""
+    print("=" * 60)
+    print("测试 1: 编译全部模板")
+    print("=" * 60)
+
+    templates = PromptTemplates()
+    count = templates.compile_all()
+    assert count >= 5, f"模板数量不对: {count}"
+    for name in ["therapist_instructions", "clerk_onboarding_analysis", "clerk_session_end",
+                 "onboarding_generate_questions", "onboarding_complete"]:
+        assert len(templates.template_hash(name)) == 16
+    print(f"✓ 编译了 {count} 个模板")
+
+
+def test_therapist_instructions_layout():
+    """治疗师 instructions 与原先 f-string 拼接的结果一致"""
+    print("\n" + "=" * 60)
+    print("测试 2: 治疗师 instructions")
+    print("=" * 60)
+
+    templates = PromptTemplates()
+    normal = templates.render("therapist_instructions", therapist_prompt="P", timeout_reminder=None, user_context="U")
+    assert normal.text == "P\n\n## 当前用户情况\n\nU", repr(normal.text)
+
+    timeout = templates.render("therapist_instructions", therapist_prompt="P", timeout_reminder="T", user_context="U")
+    assert timeout.text == "P\n\nT\n\n## 当前用户情况\n\nU", repr(timeout.text)
+    assert normal.prompt_hash != timeout.prompt_hash
+    print("✓ 普通 / 超时两种模式的输出正确")
+
+
+def test_onboarding_qa_layout():
+    """问答记录的格式与原先的 join 一致"""
+    print("\n" + "=" * 60)
+    print("测试 3: onboarding 问答记录")
+    print("=" * 60)
+
+    questions = [(1, "怎么称呼你？", "小明"), (2, "咨询目标？", None)]
+    rendered = PromptTemplates().render("clerk_onboarding_analysis", user_nickname="小明", questions=questions)
+    expected = "\n\n".join(f"Q{n}: {text}\nA: {answer or '未回答'}" for n, text, answer in questions)
+    assert f"用户昵称：小明\n\n{expected}\n\n要求：" in rendered.text, rendered.text
+    print("✓ 问答记录格式正确")
+
+
+def test_render_cache_and_hash():
+    """相同参数命中缓存，list 参数会被转换成可哈希的形式，hash 在不同实例间稳定"""
+    print("\n" + "=" * 60)
+    print("测试 4: 渲染缓存与 hash")
+    print("=" * 60)
+
+    templates = PromptTemplates(cache_size=8)
+    first = templates.render("onboarding_complete", questions=[[1, "Q", "A"]])
+    second = templates.render("onboarding_complete", questions=[[1, "Q", "A"]])
+    assert first is second, "相同参数应该命中缓存"
+    stats = templates.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1, stats
+
+    other = PromptTemplates().render("onboarding_complete", questions=[(1, "Q", "A")])
+    assert other.prompt_hash == first.prompt_hash and other.template_hash == first.template_hash
+    print(f"✓ 缓存命中，prompt_hash={first.prompt_hash}")
+
+
+def test_missing_variable_raises():
+    """缺少变量时报错，而不是渲染出空字符串"""
+    print("\n" + "=" * 60)
+    print("测试 5: 缺少变量")
+    print("=" * 60)
+
+    try:
+        PromptTemplates().render("therapist_instructions", therapist_prompt="P", timeout_reminder=None)
+    except UndefinedError:
+        pass
+    else:
+        raise AssertionError("缺少变量应该报错")
+    print("✓ 缺少 user_context 时抛出 UndefinedError")
+
+
+def main():
+    test_compile_all()
+    test_therapist_instructions_layout()
+    test_onboarding_qa_layout()
+    test_render_cache_and_hash()
+    test_missing_variable_raises()
+    print("\n✓ 全部测试通过")
+
+
+if __name__ == "__main__":
+    main()
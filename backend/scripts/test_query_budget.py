@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+测试热点接口的 SQL 语句数上限
+
+用 conftest.py 的 client / auth_headers（临时 SQLite + StubAgent）调用接口，
+语句数超过上限（或随数据量增长，即 N+1）时失败，失败信息列出所有语句和重复的形状。
+
+运行：python -m pytest scripts/test_query_budget.py
+"""
+
+import json
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到 path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import text
+
+from benchmarks.environment import make_runs
+
+
+def _add_closed_sessions(api_env, count: int):
+    """给测试用户加 count 个已关闭、带 Agno runs 的会话"""
+    from app.models.session import Session, SessionStatus
+
+    db = api_env.db()
+    try:
+        for _ in range(count):
+            session = Session(user_id=api_env.user_id, status=SessionStatus.closed, active_duration_seconds=600)
+            db.add(session)
+            db.flush()
+            session.agno_session_id = f"session_{session.id}_budget"
+            db.execute(
+                text("""
+                    INSERT INTO ai.agno_sessions (session_id, session_type, runs, created_at, updated_at)
+                    VALUES (:session_id, 'agent', :runs, :now, :now)
+                """),
+                {"session_id": session.agno_session_id, "runs": json.dumps(make_runs(3)), "now": int(time.time())},
+            )
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_history_query_budget(client, auth_headers, api_env, assert_max_queries):
+    """历史会话列表：用户 + 会话 + 一次批量统计 runs，与会话数无关"""
+    print("=" * 60)
+    print("测试 1: /api/sessions/history")
+    print("=" * 60)
+
+    _add_closed_sessions(api_env, 2)
+    with assert_max_queries(3):
+        response = client.get("/api/sessions/history", headers=auth_headers)
+    assert response.status_code == 200
+
+    _add_closed_sessions(api_env, 5)
+    with assert_max_queries(3) as stats:
+        response = client.get("/api/sessions/history", headers=auth_headers)
+    assert response.status_code == 200
+    history = response.json()
+    assert len(history) == 7 and all(item["message_count"] == 6 for item in history), history
+    print(f"✓ 7 个会话 {stats.count} 条语句")
+
+
+def test_post_message_query_budget(client, auth_headers, api_env, assert_max_queries):
+    """发消息（StubAgent）：鉴权、会话校验、用户上下文、治疗师 prompt、超时检查、更新轮数"""
+    print("\n" + "=" * 60)
+    print("测试 2: /api/sessions/{id}/post_message")
+    print("=" * 60)
+
+    url = f"/api/sessions/{api_env.session_id}/post_message"
+    payload = {"message": "最近工作压力很大，晚上总是睡不着。", "active_duration_seconds": 120}
+    # 第一次调用会加载治疗师目录和提示词快照（进程内缓存），只统计稳定状态
+    client.post(url, json=payload, headers=auth_headers)
+    with assert_max_queries(7) as stats:
+        response = client.post(url, json=payload, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["reply"] == api_env.stub_agent.reply, "应走 StubAgent 的正常路径而不是兜底回复"
+    print(f"✓ {stats.count} 条语句")
+
+
+def test_emo_score_list_query_budget(client, auth_headers, assert_max_queries):
+    """情绪评估列表：鉴权 + 一次分页查询"""
+    print("\n" + "=" * 60)
+    print("测试 3: /api/emo-score/list")
+    print("=" * 60)
+
+    with assert_max_queries(2) as stats:
+        response = client.get("/api/emo-score/list", headers=auth_headers)
+    assert response.status_code == 200 and response.json()["items"]
+    print(f"✓ {stats.count} 条语句")
+
+
+def test_session_detail_query_budget(client, auth_headers, api_env, assert_max_queries):
+    """会话详情：鉴权、会话、总结、一次 count_runs；message_count 为 runs 数的两倍"""
+    print("\n" + "=" * 60)
+    print("测试 4: /api/sessions/{id}")
+    print("=" * 60)
+
+    db = api_env.db()
+    try:
+        runs = db.execute(
+            text("SELECT runs FROM ai.agno_sessions WHERE session_id = :session_id"),
+            {"session_id": api_env.agno_session_id},
+        ).scalar()
+    finally:
+        db.close()
+
+    with assert_max_queries(4) as stats:
+        response = client.get(f"/api/sessions/{api_env.session_id}", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["message_count"] == len(json.loads(runs)) * 2 > 0, response.json()
+    print(f"✓ {stats.count} 条语句，message_count={response.json()['message_count']}")
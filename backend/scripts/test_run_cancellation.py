@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+测试 agent run 的取消
+
+用进程内的 mock transport 模拟一个慢速流式的 OpenAI 接口，验证：
+取消后 run 在下一个 chunk 处停止并以 CANCELLED 状态写入 Agno 会话、上游响应被关闭、
+没有取消时回复完整返回、开始前已取消时不发起模型调用、流式 run 的 token 用量写入用量日志
+"""
+
+import json
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+from pathlib import Path
+
+# 添加项目根目录到 path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import httpx
+from agno.agent import Agent
+from agno.db.sqlite import SqliteDb
+from agno.models.openai import OpenAIChat
+from agno.run.base import RunStatus
+
+from app.agents.agent_runs import run_agent
+from app.core.cancellation import RUN_STATUS_CANCELLED, CancelScope, RunCancelled, cancel_scope
+from app.core import openai_logger
+from app.core.openai_logger import OpenAIUsageLogger, create_logging_http_client, openai_logging_context
+
+CHUNKS = 20
+CHUNK_DELAY = 0.05
+
+
+class SlowStream(httpx.SyncByteStream):
+    """逐个 chunk 输出的 SSE 响应，记录是否被提前关闭"""
+
+    def __init__(self):
+        self.sent = 0
+        self.closed_early = False
+
+    def __iter__(self):
+        for i in range(CHUNKS):
+            data = {
+                "id": "chatcmpl-test", "object": "chat.completion.chunk", "created": 0, "model": "fake",
+                "choices": [{"index": 0, "delta": {"content": f"{i},"}, "finish_reason": None}],
+            }
+            self.sent += 1
+            yield f"data: {json.dumps(data)}\n\n".encode()
+            time.sleep(CHUNK_DELAY)
+        # stream_options.include_usage：最后一个 chunk 只带 usage
+        usage = {"prompt_tokens": 12, "completion_tokens": CHUNKS, "total_tokens": 12 + CHUNKS,
+                 "prompt_tokens_details": {"cached_tokens": 8}}
+        yield f"data: {json.dumps({'id': 'chatcmpl-test', 'model': 'fake', 'choices': [], 'usage': usage})}\n\n".encode()
+        yield b"data: [DONE]\n\n"
+
+    def close(self):
+        self.closed_early = self.sent < CHUNKS
+
+
+def make_agent(db_file: str):
+    streams = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        stream = SlowStream()
+        streams.append(stream)
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, stream=stream)
+
+    http_client = create_logging_http_client()
+    http_client._transport = httpx.MockTransport(handler)
+    agent = Agent(
+        name="TestAgent",
+        model=OpenAIChat(id="fake", api_key="sk-test", http_client=http_client),
+        db=SqliteDb(db_file=db_file),
+    )
+    return agent, streams
+
+
+def test_cancel_stops_run():
+    """取消后 run 停止、上游流被关闭、Agno 记录 CANCELLED 状态"""
+    print("=" * 60)
+    print("测试 1: 取消进行中的 run")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        agent, streams = make_agent(str(Path(tmp) / "agno.db"))
+        scope = CancelScope()
+        tokens = []
+
+        def on_token(token):
+            # 收到第一个 chunk 后再计时，Agent 启动慢时也不会在流开始前就取消
+            if not tokens:
+                threading.Timer(CHUNK_DELAY * 3, scope.cancel, args=("test",)).start()
+            tokens.append(token)
+
+        try:
+            with cancel_scope(scope):
+                run_agent(agent, on_token=on_token, input="hi", session_id="s1", user_id="1")
+        except RunCancelled as e:
+            assert e.run_id == scope.run_id and e.reason == "test"
+        else:
+            raise AssertionError("run 应该被取消")
+
+        assert 0 < len(tokens) < CHUNKS, tokens
+        assert streams[0].closed_early, "上游流应该被提前关闭"
+        runs = agent.get_session(session_id="s1").runs
+        assert [r.status for r in runs] == [RunStatus.cancelled], runs
+        assert RunStatus.cancelled.value == RUN_STATUS_CANCELLED, "与 Agno 的状态值不一致"
+        assert runs[0].input.input_content == "hi"
+        print(f"✓ 收到 {len(tokens)}/{CHUNKS} 个 chunk 后停止，run 状态为 CANCELLED")
+
+
+def test_uncancelled_run_completes():
+    """在 CancelScope 中但没有取消：完整返回"""
+    print("\n" + "=" * 60)
+    print("测试 2: 未取消的 run")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        agent, streams = make_agent(str(Path(tmp) / "agno.db"))
+        with cancel_scope(CancelScope()):
+            reply = run_agent(agent, input="hi", session_id="s1", user_id="1")
+        assert reply == "".join(f"{i}," for i in range(CHUNKS)), reply
+        assert not streams[0].closed_early
+        assert agent.get_session(session_id="s1").runs[0].status == RunStatus.completed
+        print("✓ 回复完整，run 状态为 COMPLETED")
+
+
+def test_cancel_before_start():
+    """开始前已取消：不发起模型调用"""
+    print("\n" + "=" * 60)
+    print("测试 3: 开始前取消")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        agent, streams = make_agent(str(Path(tmp) / "agno.db"))
+        scope = CancelScope()
+        assert scope.cancel("gone") and not scope.cancel("again")
+        try:
+            with cancel_scope(scope):
+                run_agent(agent, input="hi", session_id="s1", user_id="1")
+        except RunCancelled:
+            pass
+        else:
+            raise AssertionError("run 应该被取消")
+        assert streams == []
+        print("✓ 没有发起模型调用")
+
+
+def test_streamed_run_records_usage():
+    """CancelScope 中的流式 run 记录用量（带 prompt 实验变体），被取消的 run 不记录"""
+    print("\n" + "=" * 60)
+    print("测试 4: 流式 run 的用量记录")
+    print("=" * 60)
+
+    original = openai_logger._usage_logger
+    with tempfile.TemporaryDirectory() as tmp:
+        openai_logger._usage_logger = usage_logger = OpenAIUsageLogger(str(Path(tmp) / "usage"))
+        try:
+            agent, _ = make_agent(str(Path(tmp) / "agno.db"))
+            with openai_logging_context(user_id=7, session_id="s1", is_admin=False,
+                                        prompt_variants={"therapist_01": "exp1:b"}):
+                with cancel_scope(CancelScope()):
+                    run_agent(agent, input="hi", session_id="s1", user_id="7")
+
+                scope = CancelScope()
+                threading.Timer(CHUNK_DELAY * 4, scope.cancel, args=("test",)).start()
+                try:
+                    with cancel_scope(scope):
+                        run_agent(agent, input="again", session_id="s1", user_id="7")
+                except RunCancelled:
+                    pass
+        finally:
+            openai_logger._usage_logger = original
+
+        records = list(usage_logger.iter_records(since=date.today()))
+        assert len(records) == 1, records
+        record = records[0]
+        assert record["user_id"] == 7 and record["prompt_variants"] == {"therapist_01": "exp1:b"}
+        assert (record["prompt_tokens"], record["completion_tokens"], record["cached_tokens"]) == (12, CHUNKS, 8)
+        assert record["latency_ms"] >= CHUNKS * CHUNK_DELAY * 1000 * 0.9, "延迟应覆盖整个生成过程"
+        print(f"✓ 记录 1 条用量（latency {record['latency_ms']:.0f}ms），被取消的 run 不记录")
+
+
+def main():
+    test_cancel_stops_run()
+    test_uncancelled_run_completes()
+    test_cancel_before_start()
+    test_streamed_run_records_usage()
+    print("\n✓ 全部测试通过")
+
+
+if __name__ == "__main__":
+    main()
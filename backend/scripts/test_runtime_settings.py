@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+测试可热更新的运行参数
+
+验证：validate_value 的类型和范围校验、update 写入审计并递增版本号、
+None 恢复默认值、没有实际变化的修改不产生新版本、其他 worker 的 check_version 能发现修改
+（使用临时 SQLite 数据库，不访问配置的数据库）
+"""
+
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+# 添加项目根目录到 path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine
+
+from app.core.config import settings
+
+# 导入模型会创建全局 engine：未配置数据库（默认 Postgres URL）时换成不需要驱动的 SQLite
+if "app.services.database" not in sys.modules and "DATABASE_URL" not in os.environ:
+    settings.DATABASE_URL = "sqlite://"
+
+from app.models.runtime_setting import RuntimeSetting, RuntimeSettingAudit
+from app.models.user import User
+from app.services import database
+from app.services.runtime_settings import RuntimeSettingsStore, validate_value
+
+
+@contextmanager
+def _temp_database():
+    """把全局 SessionLocal 绑定到临时 SQLite 数据库（store.reload / check_version 使用它），结束后恢复"""
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{directory}/runtime_settings.db")
+        database.Base.metadata.create_all(engine, tables=[
+            User.__table__, RuntimeSetting.__table__, RuntimeSettingAudit.__table__,
+        ])
+        original = database.SessionLocal.kw["bind"]
+        database.SessionLocal.configure(bind=engine)
+        try:
+            yield database.SessionLocal
+        finally:
+            database.SessionLocal.configure(bind=original)
+            engine.dispose()
+
+
+def _update(SessionFactory, store: RuntimeSettingsStore, changes, user_id=None) -> int:
+    db = SessionFactory()
+    try:
+        return store.update(db, changes, user_id=user_id)
+    finally:
+        db.close()
+
+
+def _audit_rows(SessionFactory):
+    db = SessionFactory()
+    try:
+        return [
+            (row.key, row.old_value, row.new_value, row.version)
+            for row in db.query(RuntimeSettingAudit).order_by(RuntimeSettingAudit.id)
+        ]
+    finally:
+        db.close()
+
+
+def test_validate_value():
+    """按 TUNABLES 转换类型，拒绝 bool / None / 非整数的 float / 越界 / 空字符串 / 未知 key"""
+    print("=" * 60)
+    print("测试 1: 取值校验")
+    print("=" * 60)
+
+    assert validate_value("SESSION_SUGGESTED_TURNS", 30) == 30
+    assert validate_value("SESSION_SUGGESTED_TURNS", 30.0) == 30
+    assert validate_value("SESSION_SUGGESTED_TURNS", "30") == 30
+    assert validate_value("THERAPIST_TEMPERATURE", 1) == 1.0
+    assert validate_value("THERAPIST_TEMPERATURE", 2.0) == 2.0
+    assert validate_value("THERAPIST_MODEL", "  gpt-4o-mini ") == "gpt-4o-mini"
+
+    invalid = [
+        ("SESSION_SUGGESTED_TURNS", True),
+        ("SESSION_SUGGESTED_TURNS", None),
+        ("SESSION_SUGGESTED_TURNS", 30.5),
+        ("SESSION_SUGGESTED_TURNS", "abc"),
+        ("SESSION_SUGGESTED_TURNS", 0),
+        ("SESSION_SUGGESTED_TURNS", 201),
+        ("THERAPIST_TEMPERATURE", -0.1),
+        ("THERAPIST_TEMPERATURE", 2.5),
+        ("THERAPIST_MODEL", "   "),
+        ("NOT_A_SETTING", 1),
+    ]
+    for key, value in invalid:
+        try:
+            validate_value(key, value)
+        except ValueError:
+            continue
+        raise AssertionError(f"应该校验失败: {key}={value!r}")
+    print(f"✓ {len(invalid)} 种非法取值都被拒绝")
+
+
+def test_update_writes_audit_and_bumps_version():
+    """一次修改是一个版本：所有 key 共用版本号、各写一条审计；读路径立即看到新值"""
+    print("\n" + "=" * 60)
+    print("测试 2: 审计与版本号")
+    print("=" * 60)
+
+    with _temp_database() as SessionFactory:
+        store = RuntimeSettingsStore(poll_interval=0)
+        store.reload()
+        assert store.version == 0
+        assert store.get("SESSION_SUGGESTED_TURNS") == settings.SESSION_SUGGESTED_TURNS
+
+        version = _update(SessionFactory, store, {"SESSION_SUGGESTED_TURNS": 42, "THERAPIST_TEMPERATURE": 0.3})
+        assert version == 1 and store.version == 1
+        assert store.get("SESSION_SUGGESTED_TURNS") == 42
+        assert store.get("THERAPIST_TEMPERATURE") == 0.3
+        assert dict(store.overrides()) == {"SESSION_SUGGESTED_TURNS": 42, "THERAPIST_TEMPERATURE": 0.3}
+
+        assert _update(SessionFactory, store, {"SESSION_SUGGESTED_TURNS": 50}) == 2
+        assert store.get("SESSION_SUGGESTED_TURNS") == 50
+
+        assert sorted(_audit_rows(SessionFactory), key=lambda row: (row[3], row[0])) == [
+            ("SESSION_SUGGESTED_TURNS", None, "42", 1),
+            ("THERAPIST_TEMPERATURE", None, "0.3", 1),
+            ("SESSION_SUGGESTED_TURNS", "42", "50", 2),
+        ]
+
+        # 非法取值整体拒绝，不写入任何内容
+        try:
+            _update(SessionFactory, store, {"SESSION_SUGGESTED_TURNS": 60, "THERAPIST_TEMPERATURE": 9})
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("应该校验失败")
+        assert store.get("SESSION_SUGGESTED_TURNS") == 50 and len(_audit_rows(SessionFactory)) == 3
+    print("✓ 版本 1 → 2，审计记录旧值和新值，非法修改整体拒绝")
+
+
+def test_none_resets_to_default():
+    """值为 None 删除覆盖、恢复 .env 默认值，也产生新版本和审计记录"""
+    print("\n" + "=" * 60)
+    print("测试 3: 恢复默认值")
+    print("=" * 60)
+
+    with _temp_database() as SessionFactory:
+        store = RuntimeSettingsStore(poll_interval=0)
+        store.reload()
+        _update(SessionFactory, store, {"THERAPIST_HISTORY_RUNS": 3})
+        assert store.get("THERAPIST_HISTORY_RUNS") == 3
+
+        assert _update(SessionFactory, store, {"THERAPIST_HISTORY_RUNS": None}) == 2
+        assert store.get("THERAPIST_HISTORY_RUNS") == settings.THERAPIST_HISTORY_RUNS
+        assert "THERAPIST_HISTORY_RUNS" not in store.overrides()
+        assert _audit_rows(SessionFactory)[-1] == ("THERAPIST_HISTORY_RUNS", "3", None, 2)
+
+        db = SessionFactory()
+        try:
+            assert db.query(RuntimeSetting).count() == 0
+        finally:
+            db.close()
+    print(f"✓ 恢复为默认值 {settings.THERAPIST_HISTORY_RUNS}，版本 2")
+
+
+def test_noop_update_creates_no_version():
+    """与当前取值相同、或对没有覆盖的 key 恢复默认：返回当前版本，不写审计"""
+    print("\n" + "=" * 60)
+    print("测试 4: 没有变化的修改")
+    print("=" * 60)
+
+    with _temp_database() as SessionFactory:
+        store = RuntimeSettingsStore(poll_interval=0)
+        store.reload()
+        _update(SessionFactory, store, {"CLERK_MODEL": "gpt-4o"})
+        reloads = store.reloads
+
+        assert _update(SessionFactory, store, {"CLERK_MODEL": " gpt-4o "}) == 1
+        assert _update(SessionFactory, store, {"THERAPIST_MODEL": None}) == 1
+        assert store.version == 1 and store.reloads == reloads
+        assert len(_audit_rows(SessionFactory)) == 1
+    print("✓ 版本仍为 1，只有一条审计记录")
+
+
+def test_check_version_picks_up_other_workers():
+    """另一个 worker（独立的 store）修改后，check_version 发现版本变化并重新加载，之后不再重复加载"""
+    print("\n" + "=" * 60)
+    print("测试 5: 跨 worker 同步")
+    print("=" * 60)
+
+    with _temp_database() as SessionFactory:
+        worker_a = RuntimeSettingsStore(poll_interval=0)
+        worker_b = RuntimeSettingsStore(poll_interval=0)
+        worker_a.reload()
+        worker_b.reload()
+        changed_keys = []
+        worker_b.add_listener(changed_keys.append)
+
+        _update(SessionFactory, worker_a, {"SESSION_REMINDER_INTERVAL": 5})
+        assert worker_b.get("SESSION_REMINDER_INTERVAL") == settings.SESSION_REMINDER_INTERVAL
+
+        assert worker_b.check_version() is True
+        assert worker_b.version == 1 and worker_b.get("SESSION_REMINDER_INTERVAL") == 5
+        assert changed_keys == [{"SESSION_REMINDER_INTERVAL"}]
+        assert worker_b.check_version() is False
+    print("✓ worker B 重新加载到版本 1，listener 收到变化的 key")
+
+
+def main():
+    test_validate_value()
+    test_update_writes_audit_and_bumps_version()
+    test_none_resets_to_default()
+    test_noop_update_creates_no_version()
+    test_check_version_picks_up_other_workers()
+    print("\n✓ 全部测试通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+测试维护调度器
+
+用 conftest.py 的 api_env（临时 SQLite）验证：
+- sessions.close_stale 只关闭超过 SESSION_STALE_HOURS 的未结束会话，并写入 end_time
+- 开启 SCHEDULER_REVIEW_ABANDONED_SESSIONS 时，只为有对话、还没有总结的会话排队生成总结，
+  且排队时关闭已经提交（作业线程用新的 session 能读到）
+- 调度循环执行到期任务、记录结果；任务失败时回滚并记录 last_error，下一次照常执行
+
+运行：python -m pytest scripts/test_scheduler.py
+"""
+
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# 添加项目根目录到 path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.config import settings
+
+
+def _create_sessions(api_env, specs) -> list:
+    """新建一个用户和若干会话：specs 为 (hours_ago, status, turn_count, reviewed)，返回会话 id"""
+    from app.models.session import Session
+    from app.models.session_review import SessionReview
+    from app.models.user import User
+
+    db = api_env.db()
+    try:
+        user = User(email=f"stale_{uuid.uuid4().hex[:10]}@example.com", hashed_password="x", therapist_id="01")
+        db.add(user)
+        db.flush()
+        ids = []
+        for hours_ago, status, turn_count, reviewed in specs:
+            session = Session(
+                user_id=user.id, status=status, turn_count=turn_count,
+                start_time=datetime.utcnow() - timedelta(hours=hours_ago),
+            )
+            db.add(session)
+            db.flush()
+            session.agno_session_id = f"session_{session.id}_stale"
+            if reviewed:
+                db.add(SessionReview(session_id=session.id, message_review="已有总结", key_events=[]))
+            ids.append(session.id)
+        db.commit()
+        return ids
+    finally:
+        db.close()
+
+
+def _session_states(api_env, ids) -> list:
+    from app.models.session import Session
+
+    db = api_env.db()
+    try:
+        sessions = {session.id: session for session in db.query(Session).filter(Session.id.in_(ids))}
+        return [(sessions[i].status.value, sessions[i].end_time is not None) for i in ids]
+    finally:
+        db.close()
+
+
+def test_close_stale_sessions(api_env, monkeypatch):
+    """只关闭超时的未结束会话；只为有对话且没有总结的会话排队生成总结"""
+    print("=" * 60)
+    print("测试 1: 关闭超时会话")
+    print("=" * 60)
+
+    from app.models.session import SessionStatus
+    from app.services import scheduler
+
+    stale = settings.SESSION_STALE_HOURS + 1
+    ids = _create_sessions(api_env, [
+        (stale, SessionStatus.open, 4, False),   # 有对话、没有总结：关闭并排队总结
+        (stale, SessionStatus.open, 1, False),   # 只有开场白：关闭，不总结
+        (stale, SessionStatus.open, 3, True),    # 已有总结：关闭，不重复总结
+        (1, SessionStatus.open, 5, False),       # 未超时：保持进行中
+        (stale, SessionStatus.closed, 5, False), # 已结束：不变
+    ])
+
+    queued = []
+
+    def enqueue(self, func, *args):
+        # 作业线程用自己的 session：排队时关闭必须已经提交
+        queued.append((args, _session_states(api_env, [args[1]])[0]))
+
+    monkeypatch.setattr(settings, "SCHEDULER_REVIEW_ABANDONED_SESSIONS", True)
+    monkeypatch.setattr(scheduler.MaintenanceScheduler, "enqueue", enqueue)
+
+    db = api_env.db()
+    try:
+        result = scheduler.close_stale_sessions(db)
+    finally:
+        db.close()
+
+    assert result == "closed=3, reviews_queued=1", result
+    assert _session_states(api_env, ids) == [
+        ("closed", True), ("closed", True), ("closed", True), ("open", False), ("closed", False),
+    ]
+    assert [(args[1], state) for args, state in queued] == [(ids[0], ("closed", True))]
+
+    # 再次执行：没有需要关闭的会话
+    db = api_env.db()
+    try:
+        assert scheduler.close_stale_sessions(db) is None
+    finally:
+        db.close()
+    print(f"✓ {result}")
+
+
+def test_scheduler_loop_records_results_and_failures(api_env):
+    """到期任务在调度线程中执行；失败的任务记录 last_error 并按间隔重试"""
+    print("\n" + "=" * 60)
+    print("测试 2: 调度循环")
+    print("=" * 60)
+
+    from app.services.scheduler import MaintenanceScheduler
+
+    def ok(db):
+        return "done"
+
+    def broken(db):
+        raise RuntimeError("boom")
+
+    runner = MaintenanceScheduler(tick=0.01)
+    runner.add_task("ok", ok, interval=0.02, jitter=0)
+    runner.add_task("broken", broken, interval=0.02, jitter=0)
+    runner.start()
+    try:
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline and min(task.runs for task in runner.tasks) < 2:
+            time.sleep(0.01)
+    finally:
+        runner.stop()
+
+    stats = runner.stats()
+    tasks = {task["name"]: task for task in stats["tasks"]}
+    assert not stats["running"]
+    assert tasks["ok"]["runs"] >= 2 and tasks["ok"]["failures"] == 0 and tasks["ok"]["last_result"] == "done"
+    assert tasks["broken"]["runs"] >= 2 and tasks["broken"]["failures"] == tasks["broken"]["runs"]
+    assert tasks["broken"]["last_error"] == "RuntimeError: boom"
+    print(f"✓ ok 执行 {tasks['ok']['runs']} 次，broken 失败 {tasks['broken']['failures']} 次后仍继续调度")
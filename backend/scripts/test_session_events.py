@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+测试会话事件分发
+
+验证事件只投递给订阅了该会话的连接、可以从其他线程分发、队列满时标记 overflowed
+"""
+
+import asyncio
+import sys
+import threading
+from pathlib import Path
+
+# 添加项目根目录到 path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.services.session_events import SessionEventHub
+
+
+def test_dispatch_by_session():
+    """事件只进入同一会话的队列，取消订阅后不再收到"""
+    print("=" * 60)
+    print("测试 1: 按会话分发")
+    print("=" * 60)
+
+    async def scenario():
+        hub = SessionEventHub()
+        first, second, other = asyncio.Queue(), asyncio.Queue(), asyncio.Queue()
+        sub_first = hub.subscribe(1, first)
+        hub.subscribe(1, second)
+        hub.subscribe(2, other)
+        assert hub.connections() == 3
+
+        # 从其他线程分发（LISTEN 线程 / 请求线程）
+        thread = threading.Thread(target=hub.dispatch, args=(1, {"type": "session_state"}))
+        thread.start()
+        thread.join()
+        await asyncio.sleep(0)
+
+        assert first.get_nowait() == {"type": "session_state"}
+        assert second.get_nowait() == {"type": "session_state"}
+        assert other.empty()
+
+        hub.unsubscribe(sub_first)
+        hub.dispatch(1, {"type": "review_ready"})
+        await asyncio.sleep(0)
+        assert first.empty() and second.qsize() == 1
+        assert hub.connections() == 2
+
+    asyncio.run(scenario())
+    print("✓ 只投递给同一会话的连接")
+
+
+def test_overflow_marks_subscriber():
+    """队列满时丢弃事件并标记 overflowed，由连接自行断开"""
+    print("\n" + "=" * 60)
+    print("测试 2: 队列溢出")
+    print("=" * 60)
+
+    async def scenario():
+        hub = SessionEventHub()
+        subscriber = hub.subscribe(1, asyncio.Queue(maxsize=2))
+        for i in range(3):
+            hub.dispatch(1, {"type": "session_state", "turn_count": i})
+        await asyncio.sleep(0)
+        assert subscriber.queue.qsize() == 2
+        assert subscriber.overflowed
+
+    asyncio.run(scenario())
+    print("✓ 溢出后 overflowed=True")
+
+
+def main():
+    test_dispatch_by_session()
+    test_overflow_marks_subscriber()
+    print("\n✓ 全部测试通过")
+
+
+if __name__ == "__main__":
+    main()
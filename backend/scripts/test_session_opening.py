@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+测试会话开场白的后台生成
+
+用 conftest.py 的 api_env / client（临时 SQLite + StubAgent）验证：
+- start_session 立即返回 opening_pending=True，开场白在响应之后生成，完成后 opening_pending 清除
+- 开场白生成失败时 opening_pending 同样被清除，并发布 opening_ready 事件
+- 生成期间 run_session_turn 拒绝发消息；超过 SESSION_OPENING_TIMEOUT_SECONDS 的标记视为过期
+- start_session 返回前登记开场白的轮次：响应之后、后台任务执行之前进入 draining 也会等待开场白
+
+运行：python -m pytest scripts/test_session_opening.py
+"""
+
+import asyncio
+import sys
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# 添加项目根目录到 path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.config import settings
+
+
+def _create_user(api_env):
+    """新建一个用户（不影响 api_env 默认用户的会话），返回 (user_id, headers)"""
+    from app.core.security import create_access_token
+    from app.models.user import User
+
+    email = f"opening_{uuid.uuid4().hex[:10]}@example.com"
+    db = api_env.db()
+    try:
+        user = User(email=email, hashed_password="x", therapist_id="01", has_finished_onboarding=True)
+        db.add(user)
+        db.commit()
+        return user.id, {"Authorization": f"Bearer {create_access_token(email)}"}
+    finally:
+        db.close()
+
+
+def _create_pending_session(api_env, user_id: int, start_time=None):
+    from app.models.session import Session, SessionStatus
+
+    db = api_env.db()
+    try:
+        session = Session(user_id=user_id, status=SessionStatus.open, opening_pending=True,
+                          start_time=start_time or datetime.utcnow())
+        db.add(session)
+        db.flush()
+        session.agno_session_id = f"session_{session.id}_opening"
+        db.commit()
+        return session.id, session.agno_session_id
+    finally:
+        db.close()
+
+
+def _opening_pending_column(api_env, session_id: int) -> bool:
+    from app.models.session import Session
+
+    db = api_env.db()
+    try:
+        return db.get(Session, session_id).opening_pending
+    finally:
+        db.close()
+
+
+def _capture_events(monkeypatch) -> list:
+    """记录分发给本进程连接的会话事件（SQLite 下提交后直接分发）"""
+    from app.services.session_events import get_session_event_hub
+
+    events = []
+    monkeypatch.setattr(get_session_event_hub(), "dispatch", lambda session_id, event: events.append(event))
+    return events
+
+
+def test_start_session_generates_opening_in_background(client, api_env, monkeypatch):
+    """start 返回 opening_pending=True；后台任务（TestClient 在响应后同步执行）完成后标记被清除"""
+    print("=" * 60)
+    print("测试 1: 后台生成开场白")
+    print("=" * 60)
+
+    _, headers = _create_user(api_env)
+    events = _capture_events(monkeypatch)
+    calls = api_env.stub_agent.calls
+
+    response = client.post("/api/sessions/start", headers=headers)
+    assert response.status_code == 201, response.text
+    body = response.json()
+    assert body["opening_pending"] is True
+
+    assert api_env.stub_agent.calls == calls + 1, "开场白应调用一次 Therapist"
+    assert _opening_pending_column(api_env, body["session_id"]) is False
+    active = client.get("/api/sessions/active", headers=headers).json()
+    assert active["session_id"] == body["session_id"] and active["opening_pending"] is False
+    assert {"type": "opening_ready", "session_id": body["session_id"]} in events
+    print(f"✓ 会话 {body['session_id']} 的开场白已生成，opening_pending 已清除")
+
+
+def test_failed_opening_clears_pending(api_env, monkeypatch):
+    """生成开场白时抛异常：仍然清除 opening_pending 并发布 opening_ready，用户可以直接发消息"""
+    print("\n" + "=" * 60)
+    print("测试 2: 生成失败时清除标记")
+    print("=" * 60)
+
+    from app.services.session_orchestrator import SessionOrchestrator, generate_opening_message, run_session_turn
+
+    user_id, _ = _create_user(api_env)
+    session_id, agno_session_id = _create_pending_session(api_env, user_id)
+    events = _capture_events(monkeypatch)
+
+    def fail(self, **kwargs):
+        raise RuntimeError("model unavailable")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(SessionOrchestrator, "process_message", fail)
+        generate_opening_message(user_id=user_id, session_id=session_id, agno_session_id=agno_session_id)
+
+    assert _opening_pending_column(api_env, session_id) is False
+    assert events == [{"type": "opening_ready", "session_id": session_id}]
+    assert run_session_turn(user_id, session_id, "你好") == api_env.stub_agent.reply
+    print("✓ 失败后 opening_pending 已清除，可以继续对话")
+
+
+def test_pending_blocks_turns_until_stale(api_env):
+    """生成期间拒绝发消息；标记超过 SESSION_OPENING_TIMEOUT_SECONDS 视为过期，不再阻塞"""
+    print("\n" + "=" * 60)
+    print("测试 3: 生成期间和过期的标记")
+    print("=" * 60)
+
+    from app.models.session import Session
+    from app.services.session_orchestrator import is_opening_pending, run_session_turn
+
+    user_id, _ = _create_user(api_env)
+    session_id, _ = _create_pending_session(api_env, user_id)
+    try:
+        run_session_turn(user_id, session_id, "你好")
+    except ValueError as e:
+        assert "Opening" in str(e)
+    else:
+        raise AssertionError("开场白生成期间应拒绝发消息")
+
+    timeout = timedelta(seconds=settings.SESSION_OPENING_TIMEOUT_SECONDS)
+    assert is_opening_pending(Session(opening_pending=True, start_time=datetime.utcnow())) is True
+    assert is_opening_pending(Session(opening_pending=False, start_time=datetime.utcnow())) is False
+    assert is_opening_pending(
+        Session(opening_pending=True, start_time=datetime.utcnow() - timeout - timedelta(seconds=1))
+    ) is False
+
+    stale_user_id, _ = _create_user(api_env)
+    stale_id, _ = _create_pending_session(
+        api_env, stale_user_id, start_time=datetime.utcnow() - timeout - timedelta(seconds=1)
+    )
+    assert run_session_turn(stale_user_id, stale_id, "你好") == api_env.stub_agent.reply
+    print("✓ 生成期间被拒绝，过期标记不再阻塞")
+
+
+def test_opening_run_registered_before_response(api_env, monkeypatch):
+    """start_session 返回时开场白已登记为进行中的轮次，drain 会等到后台任务结束"""
+    print("\n" + "=" * 60)
+    print("测试 4: 返回前登记开场白")
+    print("=" * 60)
+
+    from fastapi import BackgroundTasks
+
+    from app.api.routes import sessions
+    from app.models.user import User
+    from app.services import session_orchestrator
+    from app.services.lifecycle import LifecycleManager
+
+    manager = LifecycleManager()
+    monkeypatch.setattr(sessions, "get_lifecycle_manager", lambda: manager)
+    monkeypatch.setattr(session_orchestrator, "get_lifecycle_manager", lambda: manager)
+
+    user_id, _ = _create_user(api_env)
+    background_tasks = BackgroundTasks()
+    db = api_env.db()
+    try:
+        response = sessions.start_session(background_tasks, current_user=db.get(User, user_id), db=db)
+    finally:
+        db.close()
+
+    # 响应已返回、后台任务还没开始：开场白已在登记中，draining 时 wait_idle 不会提前返回
+    assert manager.stats()["in_flight_kinds"] == ["opening"]
+    manager.begin_drain("test")
+    assert manager.wait_idle(0.05) is False
+
+    asyncio.run(background_tasks())
+    assert manager.wait_idle(1) is True and manager.in_flight() == 0
+    assert _opening_pending_column(api_env, response.session_id) is False
+    print(f"✓ 会话 {response.session_id} 的开场白在返回前登记，drain 等到开场白生成后才空闲")
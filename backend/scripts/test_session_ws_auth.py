@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+测试会话 WebSocket 的认证
+
+验证：JWT 在连接后的第一条消息中发送（不是 ?token=），缺少 / 格式错误 / 无效的 auth 消息和
+超时都以 1008 关闭连接；查询参数中的 token 不被接受，访问日志中的 ?token= 被隐去
+"""
+
+import logging
+import os
+import sys
+from pathlib import Path
+
+# 添加项目根目录到 path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fastapi import FastAPI, status
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app.core.config import settings
+
+# 导入路由会创建全局 engine：未配置数据库（默认 Postgres URL）时换成不需要驱动的 SQLite
+if "app.services.database" not in sys.modules and "DATABASE_URL" not in os.environ:
+    settings.DATABASE_URL = "sqlite://"
+
+from app.api.routes import session_ws
+from app.core.log_redaction import install_token_redaction
+from app.core.security import create_access_token
+
+
+def _client() -> TestClient:
+    app = FastAPI()
+    app.include_router(session_ws.router, prefix="/api")
+    return TestClient(app)
+
+
+def _close_code(client: TestClient, url: str, frame=None) -> int:
+    with client.websocket_connect(url) as ws:
+        if frame is not None:
+            ws.send_json(frame)
+        try:
+            ws.receive_json()
+        except WebSocketDisconnect as e:
+            return e.code
+    raise AssertionError("连接应该被关闭")
+
+
+def test_rejects_without_auth_frame():
+    """第一条消息不是有效的 auth 消息时以 1008 关闭"""
+    print("=" * 60)
+    print("测试 1: 第一条消息认证")
+    print("=" * 60)
+
+    client = _client()
+    policy = status.WS_1008_POLICY_VIOLATION
+    assert _close_code(client, "/api/sessions/1/ws", {"type": "message", "message": "hi"}) == policy
+    assert _close_code(client, "/api/sessions/1/ws", {"type": "auth"}) == policy
+    assert _close_code(client, "/api/sessions/1/ws", {"type": "auth", "token": "not-a-jwt"}) == policy
+
+    # 查询参数中的有效 token 不再被接受
+    token = create_access_token("someone@example.com")
+    assert _close_code(client, f"/api/sessions/1/ws?token={token}", {"type": "ping"}) == policy
+    print("✓ 非 auth 消息、缺少 token、无效 token、?token= 都被拒绝")
+
+
+def test_auth_timeout():
+    """连接后一直不发 auth 消息：超时关闭"""
+    print("\n" + "=" * 60)
+    print("测试 2: 认证超时")
+    print("=" * 60)
+
+    original = settings.WS_AUTH_TIMEOUT_SECONDS
+    settings.WS_AUTH_TIMEOUT_SECONDS = 0.2
+    try:
+        assert _close_code(_client(), "/api/sessions/1/ws") == status.WS_1008_POLICY_VIOLATION
+    finally:
+        settings.WS_AUTH_TIMEOUT_SECONDS = original
+    print("✓ 超时后以 1008 关闭")
+
+
+def test_access_log_redacts_token():
+    """uvicorn 访问日志 / WebSocket 连接日志中的 ?token= 被隐去"""
+    print("\n" + "=" * 60)
+    print("测试 3: 访问日志隐去 token")
+    print("=" * 60)
+
+    install_token_redaction()
+
+    records = []
+
+    class Capture(logging.Handler):
+        def emit(self, record):
+            records.append(record.getMessage())
+
+    access = logging.getLogger("uvicorn.access")
+    handler, level = Capture(), access.level
+    access.addHandler(handler)
+    access.setLevel(logging.INFO)
+    try:
+        access.info('%s - "%s %s HTTP/%s" %d', "127.0.0.1:1", "GET", "/api/sessions/1/ws?token=eyJabc.def&x=1",
+                    "1.1", 101)
+    finally:
+        access.removeHandler(handler)
+        access.setLevel(level)
+    assert records == ['127.0.0.1:1 - "GET /api/sessions/1/ws?token=<redacted>&x=1 HTTP/1.1" 101'], records
+    print(f"✓ {records[0]}")
+
+
+def main():
+    test_rejects_without_auth_frame()
+    test_auth_timeout()
+    test_access_log_redacts_token()
+    print("\n✓ 全部测试通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+测试启动耗时预算
+
+在新的子进程中导入 app.main，验证：
+agno / openai / httpx / numpy / PIL / passlib 没有在启动时导入（由用到的函数懒加载）、
+导入耗时不超过预算（STARTUP_IMPORT_BUDGET_MS，默认 1200ms，取 3 次中最快的一次）
+
+详细的导入耗时报告：python -m benchmarks --group startup --importtime
+"""
+
+import os
+import sys
+from pathlib import Path
+
+# 添加项目根目录到 path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.startup import HEAVY_MODULES, import_app, import_profile
+
+# 子进程没有配置数据库时用 SQLite（只导入，不连接），避免依赖 Postgres 驱动
+SUBPROCESS_ENV = {"DATABASE_URL": os.environ.get("DATABASE_URL", "sqlite://")}
+
+BUDGET_MS = float(os.getenv("STARTUP_IMPORT_BUDGET_MS", 1200))
+ATTEMPTS = 3
+
+
+def test_heavy_modules_not_imported():
+    """导入 app.main 不应加载重模块"""
+    print("=" * 60)
+    print("测试 1: 启动时不导入重模块")
+    print("=" * 60)
+
+    loaded = import_app(SUBPROCESS_ENV)["heavy_modules"]
+    assert not loaded, (
+        f"导入 app.main 时加载了 {loaded}，应改为在用到的函数内导入；"
+        f"用 python -m benchmarks --group startup --importtime 查看是谁导入的"
+    )
+    print(f"✓ 未加载 {HEAVY_MODULES}")
+
+
+def test_import_time_budget():
+    """导入 app.main 的耗时不超过预算"""
+    print("\n" + "=" * 60)
+    print("测试 2: 启动耗时预算")
+    print("=" * 60)
+
+    timings = [import_app(SUBPROCESS_ENV)["import_ms"] for _ in range(ATTEMPTS)]
+    best = min(timings)
+    print(f"import app.main: {', '.join(f'{t:.0f}ms' for t in timings)}（预算 {BUDGET_MS:.0f}ms）")
+    if best > BUDGET_MS:
+        top = import_profile(top=10, env=SUBPROCESS_ENV)["top"]
+        details = "\n".join(f"  {r['module']}: {r['cumulative_ms']:.1f}ms" for r in top)
+        raise AssertionError(f"导入耗时 {best:.0f}ms 超过预算 {BUDGET_MS:.0f}ms，累计耗时最多的模块：\n{details}")
+    print(f"✓ {best:.0f}ms <= {BUDGET_MS:.0f}ms")
+
+
+def main():
+    test_heavy_modules_not_imported()
+    test_import_time_budget()
+    print("\n✓ 全部测试通过")
+
+
+if __name__ == "__main__":
+    main()
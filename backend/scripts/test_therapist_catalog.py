@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+测试治疗师目录缓存
+
+用 conftest.py 的 client / auth_headers（临时 SQLite + StubAgent）验证：
+- 列表 / 详情返回强 ETag，If-None-Match 匹配（含 W/ 前缀、*）时返回 304，命中缓存时不查询治疗师表
+- PATCH 治疗师后目录失效：ETag 变化，旧 ETag 返回 200 和新内容
+- 加载期间发生的失效不会被加载结果覆盖
+- 失效后只有一个线程重新加载，其他线程返回上一份快照；首次加载时其他线程等待同一次加载
+
+运行：python -m pytest scripts/test_therapist_catalog.py
+"""
+
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# 添加项目根目录到 path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+def test_etag_not_modified(client, auth_headers, assert_max_queries):
+    """同一 ETag 返回 304、无响应体；缓存命中时只有鉴权一条语句"""
+    print("=" * 60)
+    print("测试 1: ETag / 304")
+    print("=" * 60)
+
+    response = client.get("/api/therapists", headers=auth_headers)
+    assert response.status_code == 200 and response.json()
+    etag = response.headers["etag"]
+    assert etag.startswith('"') and response.headers["cache-control"].startswith("private")
+
+    with assert_max_queries(1):
+        not_modified = client.get("/api/therapists", headers={**auth_headers, "If-None-Match": etag})
+    assert not_modified.status_code == 304 and not_modified.content == b""
+    assert not_modified.headers["etag"] == etag
+
+    for header in (f"W/{etag}", f'"other", {etag}', "*"):
+        response = client.get("/api/therapists", headers={**auth_headers, "If-None-Match": header})
+        assert response.status_code == 304, header
+    assert client.get("/api/therapists", headers={**auth_headers, "If-None-Match": '"other"'}).status_code == 200
+
+    detail = client.get("/api/therapists/01", headers=auth_headers)
+    assert detail.status_code == 200 and detail.json()["id"] == "01"
+    detail_etag = detail.headers["etag"]
+    assert detail_etag != etag
+    assert client.get(
+        "/api/therapists/01", headers={**auth_headers, "If-None-Match": detail_etag}
+    ).status_code == 304
+    assert client.get("/api/therapists/missing", headers=auth_headers).status_code == 404
+    print(f"✓ 列表 ETag {etag}，匹配时返回 304")
+
+
+def test_update_invalidates_catalog(client, auth_headers):
+    """PATCH 后 ETag 变化，旧 ETag 不再匹配；目录（Therapist prompt 的来源）读取到新内容"""
+    print("\n" + "=" * 60)
+    print("测试 2: 修改后失效")
+    print("=" * 60)
+
+    from app.services.therapist_catalog import get_therapist_catalog
+
+    list_etag = client.get("/api/therapists", headers=auth_headers).headers["etag"]
+    detail = client.get("/api/therapists/01", headers=auth_headers)
+    original, detail_etag = detail.json(), detail.headers["etag"]
+
+    try:
+        response = client.patch("/api/therapists/01", json={"info": "更新后的简介"}, headers=auth_headers)
+        assert response.status_code == 200 and response.json()["info"] == "更新后的简介"
+        assert get_therapist_catalog().get("01").info == "更新后的简介"
+
+        refreshed = client.get("/api/therapists", headers={**auth_headers, "If-None-Match": list_etag})
+        assert refreshed.status_code == 200 and refreshed.headers["etag"] != list_etag
+        assert next(t for t in refreshed.json() if t["id"] == "01")["info"] == "更新后的简介"
+
+        refreshed = client.get("/api/therapists/01", headers={**auth_headers, "If-None-Match": detail_etag})
+        assert refreshed.status_code == 200 and refreshed.json()["info"] == "更新后的简介"
+    finally:
+        client.patch("/api/therapists/01", json={"info": original["info"]}, headers=auth_headers)
+
+    # 列表不含时间戳：恢复原内容后 ETag 也恢复（内容的 sha256）
+    assert client.get("/api/therapists", headers=auth_headers).headers["etag"] == list_etag
+    print("✓ 修改后返回新内容和新 ETag，恢复后列表 ETag 一致")
+
+
+def test_invalidation_during_load_is_not_overwritten(api_env):
+    """加载期间失效：这次加载的结果只返回给调用方，不保存为快照，下一次访问重新加载"""
+    print("\n" + "=" * 60)
+    print("测试 3: 加载期间失效")
+    print("=" * 60)
+
+    from sqlalchemy import event
+
+    from app.services.therapist_catalog import TherapistCatalog
+
+    catalog = TherapistCatalog()
+    db = api_env.db()
+    try:
+        # 在加载的查询执行时模拟另一个请求修改了治疗师
+        event.listen(db, "do_orm_execute", lambda state: catalog.invalidate("01"), once=True)
+        snapshot = catalog.load(db)
+    finally:
+        db.close()
+
+    assert "01" in snapshot.therapists
+    assert catalog.stats()["loaded"] is False, "加载期间失效后不应保存快照"
+    catalog.snapshot()
+    assert catalog.stats()["loaded"] is True and catalog.loads == 2
+    print("✓ 过期的加载结果没有被保存，下一次访问重新加载")
+
+
+def _gated_loads(catalog):
+    """让 catalog.load 在 gate 打开前阻塞，返回 gate"""
+    gate = threading.Event()
+    load = catalog.load
+
+    def gated_load(db=None):
+        gate.wait(5)
+        return load(db)
+
+    catalog.load = gated_load
+    return gate
+
+
+def _wait_until_loading(catalog):
+    deadline = time.monotonic() + 5
+    while not catalog._reload_lock.locked():
+        assert time.monotonic() < deadline, "加载没有开始"
+        time.sleep(0.01)
+
+
+def test_single_flight_reload(api_env):
+    """失效后并发访问只触发一次加载，加载期间其他线程立即拿到上一份快照"""
+    print("\n" + "=" * 60)
+    print("测试 4: 失效后的单次重新加载")
+    print("=" * 60)
+
+    from app.services.therapist_catalog import TherapistCatalog
+
+    catalog = TherapistCatalog()
+    previous = catalog.snapshot()
+    catalog.invalidate("01")
+    gate = _gated_loads(catalog)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        loader = executor.submit(catalog.snapshot)
+        _wait_until_loading(catalog)
+        waiters = [executor.submit(catalog.snapshot) for _ in range(7)]
+        served = [future.result(timeout=5) for future in waiters]
+        assert all(snapshot is previous for snapshot in served), "加载期间应返回上一份快照"
+        gate.set()
+        reloaded = loader.result(timeout=5)
+
+    assert reloaded is not previous and catalog.snapshot() is reloaded
+    assert catalog.loads == 2 and catalog.stats()["loaded"] is True
+    print("✓ 8 个并发访问只加载 1 次，7 个等待者拿到上一份快照")
+
+
+def test_first_load_waits_for_single_load(api_env):
+    """还没有快照时并发访问等待同一次加载，不会各自加载"""
+    print("\n" + "=" * 60)
+    print("测试 5: 首次加载")
+    print("=" * 60)
+
+    from app.services.therapist_catalog import TherapistCatalog
+
+    catalog = TherapistCatalog()
+    gate = _gated_loads(catalog)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(catalog.snapshot)]
+        _wait_until_loading(catalog)
+        futures += [executor.submit(catalog.snapshot) for _ in range(3)]
+        gate.set()
+        snapshots = [future.result(timeout=5) for future in futures]
+
+    assert all(snapshot is snapshots[0] for snapshot in snapshots)
+    assert catalog.loads == 1
+    print("✓ 4 个并发的首次访问共用 1 次加载")
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+测试请求级 tracing
+
+验证：
+- 中间件为每个请求创建 Trace，同步路由（线程池）中的 span 挂在同一个 Trace 上，父子关系正确
+- SQL 语句数统计到当前 span，并汇总为 sql_count_total；Trace 以路由模板命名
+- Server-Timing 只返回给 admin；请求之外调用 trace_span 不做任何事
+- 与 query_counter 同时开启时共用一次计时：span 和 QueryStats 记录的耗时相同
+- jsonl / OTLP 导出的内容
+"""
+
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+# 添加项目根目录到 path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import httpx
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from app.core import tracing
+from app.core.tracing import SpanExporter, Trace, install_sql_hooks, mark_admin, trace_span, tracing_middleware
+
+
+def _app(engine) -> FastAPI:
+    app = FastAPI()
+    app.middleware("http")(tracing_middleware)
+
+    @app.get("/items/{item_id}")
+    def get_item(item_id: int, admin: bool = False):
+        if admin:
+            mark_admin()
+        with trace_span("item.load", item_id=item_id):
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+                conn.execute(text("SELECT 2"))
+            with trace_span("item.render"):
+                pass
+        return {"id": item_id}
+
+    return app
+
+
+def _with_exporter(exporter: SpanExporter, func):
+    """临时替换全局 span exporter"""
+    original = tracing._span_exporter
+    tracing._span_exporter = exporter
+    try:
+        return func()
+    finally:
+        tracing._span_exporter = original
+
+
+def test_spans_and_sql_counts():
+    """span 树、SQL 统计、路由模板命名；Server-Timing 只给 admin"""
+    print("=" * 60)
+    print("测试 1: span 与 SQL 统计")
+    print("=" * 60)
+
+    install_sql_hooks()
+    engine = create_engine("sqlite://")
+    client = TestClient(_app(engine))
+
+    with tempfile.TemporaryDirectory() as directory:
+        exporter = SpanExporter(exporter="jsonl", log_dir=directory)
+
+        def run():
+            plain = client.get("/items/7")
+            admin = client.get("/items/8", params={"admin": "true"})
+            exporter.flush()
+            return plain, admin
+
+        plain, admin = _with_exporter(exporter, run)
+        entries = [
+            json.loads(line)
+            for path in Path(directory).glob("spans_*.jsonl")
+            for line in path.read_text(encoding="utf-8").splitlines()
+        ]
+
+    assert plain.status_code == 200 and "server-timing" not in plain.headers
+    timing = admin.headers["server-timing"]
+    assert 'item.load;dur=' in timing and 'desc="sql=2"' in timing, timing
+
+    trace_id = next(entry["trace_id"] for entry in entries if entry["attributes"].get("item_id") == 7)
+    first = [entry for entry in entries if entry["trace_id"] == trace_id]
+    spans = {entry["name"]: entry for entry in first}
+    assert set(spans) == {"http.request", "item.load", "item.render"}, spans
+    root, load, render = spans["http.request"], spans["item.load"], spans["item.render"]
+    assert root["parent_id"] is None and load["parent_id"] == root["span_id"]
+    assert render["parent_id"] == load["span_id"]
+    assert load["sql_count"] == 2 and render["sql_count"] == 0
+    assert root["attributes"]["sql_count_total"] == 2
+    assert root["attributes"]["route"] == "/items/{item_id}"
+    assert root["attributes"]["status_code"] == 200
+    assert all(entry["trace_name"] == "GET /items/{item_id}" for entry in first)
+    print(f"✓ {len(entries)} 个 span 已导出，Server-Timing: {timing}")
+
+
+def test_trace_span_outside_request():
+    """没有请求 Trace 时 trace_span 返回 None，record_span / mark_admin 不做任何事"""
+    print("\n" + "=" * 60)
+    print("测试 2: 请求之外")
+    print("=" * 60)
+
+    assert tracing.get_current_trace() is None
+    with trace_span("background.job") as span:
+        assert span is None
+    tracing.record_span("ignored", 0, 1)
+    mark_admin()
+    print("✓ 请求之外的 span 被忽略")
+
+
+def test_shared_sql_timing_with_query_counter():
+    """tracing 与 query_counter 共用同一对 Engine 事件：每条语句只计时一次，两边耗时一致"""
+    print("\n" + "=" * 60)
+    print("测试 3: 与 query_counter 共用计时")
+    print("=" * 60)
+
+    from app.core.query_counter import count_queries
+
+    install_sql_hooks()
+    engine = create_engine("sqlite://")
+    trace = Trace("job")
+    token = tracing._current_trace.set(trace)
+    try:
+        with count_queries() as stats:
+            with trace_span("job.sql") as span:
+                with engine.connect() as conn:
+                    for i in range(3):
+                        conn.execute(text(f"SELECT {i}"))
+                    assert not conn.info.get("query_counter_start")
+    finally:
+        tracing._current_trace.reset(token)
+
+    assert span.sql_count == stats.count == 3 and trace.sql_count == 3
+    assert span.sql_time_ns == stats.total_time_ns > 0
+    print(f"✓ 3 条语句，span 与 QueryStats 耗时均为 {stats.total_time_ms:.3f}ms")
+
+
+def test_otlp_payload():
+    """OTLP/HTTP JSON：根 span 为 SERVER，子 span 带 parentSpanId，SQL 统计作为属性"""
+    print("\n" + "=" * 60)
+    print("测试 4: OTLP 导出")
+    print("=" * 60)
+
+    requests = []
+
+    def collector(request: httpx.Request) -> httpx.Response:
+        requests.append(json.loads(request.content))
+        return httpx.Response(200)
+
+    exporter = SpanExporter(exporter="otlp", otlp_endpoint="http://collector/v1/traces", service_name="test")
+    exporter._http_client = httpx.Client(transport=httpx.MockTransport(collector))
+
+    trace = Trace("GET /items/{item_id}")
+    token = tracing._current_trace.set(trace)
+    try:
+        with trace_span("http.request"):
+            with trace_span("item.load", cached=True) as span:
+                span.sql_count = 3
+    finally:
+        tracing._current_trace.reset(token)
+    exporter.export(trace)
+    exporter.flush()
+
+    assert len(requests) == 1
+    resource = requests[0]["resourceSpans"][0]
+    assert resource["resource"]["attributes"] == [{"key": "service.name", "value": {"stringValue": "test"}}]
+    spans = {span["name"]: span for span in resource["scopeSpans"][0]["spans"]}
+    root, load = spans["http.request"], spans["item.load"]
+    assert root["kind"] == 2 and "parentSpanId" not in root
+    assert load["kind"] == 1 and load["parentSpanId"] == root["spanId"]
+    assert load["traceId"] == root["traceId"] == trace.trace_id
+    attributes = {attr["key"]: attr["value"] for attr in load["attributes"]}
+    assert attributes["cached"] == {"boolValue": True}
+    assert attributes["db.statement_count"] == {"intValue": "3"}
+    assert int(load["endTimeUnixNano"]) >= int(load["startTimeUnixNano"])
+    print("✓ OTLP 载荷的 span 层级和属性正确")
+
+
+def main():
+    test_spans_and_sql_counts()
+    test_trace_span_outside_request()
+    test_shared_sql_timing_with_query_counter()
+    test_otlp_payload()
+    print("\n✓ 全部测试通过")
+
+
+if __name__ == "__main__":
+    main()
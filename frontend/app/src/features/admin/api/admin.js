@@ -21,6 +21,58 @@ export const updateFilePrompt = async (key, content) => {
   return response.data
 }
 
+/**
+ * 获取文件型 prompt 的发布历史（新的在前）
+ * 返回: { key, active_version, versions: [{ version, content, content_hash, created_by_user_id, created_at }] }
+ */
+export const getFilePromptVersions = async (key, limit = 50) => {
+  const response = await apiClient.get(`/api/admin/prompts/files/${key}/versions`, { params: { limit } })
+  return response.data
+}
+
+/**
+ * 回滚文件型 prompt 到某个历史版本（0 表示 YAML 默认值）
+ */
+export const rollbackFilePrompt = async (key, version) => {
+  const response = await apiClient.post(`/api/admin/prompts/files/${key}/rollback`, { version })
+  return response.data
+}
+
+// ============ Prompt A/B 实验 ============
+
+/**
+ * 获取全部 prompt 实验（新的在前）
+ */
+export const getPromptExperiments = async () => {
+  const response = await apiClient.get('/api/admin/prompt-experiments')
+  return response.data
+}
+
+/**
+ * 创建 prompt 实验
+ * @param {Object} experiment - { name, key, variants: [{ id, weight, content }] }，content 为 null 表示对照组
+ */
+export const createPromptExperiment = async (experiment) => {
+  const response = await apiClient.post('/api/admin/prompt-experiments', experiment)
+  return response.data
+}
+
+/**
+ * 结束 prompt 实验
+ */
+export const stopPromptExperiment = async (experimentId) => {
+  const response = await apiClient.post(`/api/admin/prompt-experiments/${experimentId}/stop`)
+  return response.data
+}
+
+/**
+ * 获取实验报告（每个变体的 token / 缓存命中率 / 延迟）
+ */
+export const getPromptExperimentReport = async (experimentId) => {
+  const response = await apiClient.get(`/api/admin/prompt-experiments/${experimentId}/report`)
+  return response.data
+}
+
 // ============ 治疗师 Prompt 管理 ============
 
 /**
@@ -90,14 +142,53 @@ export const updateSessionConfig = async (config) => {
   return response.data
 }
 
+// ============ 运行参数（热更新）============
+
+/**
+ * 获取所有可热更新的运行参数
+ * 返回: { version, settings: [{ key, value, default, is_overridden, type, min, max, description }] }
+ */
+export const getRuntimeSettings = async () => {
+  const response = await apiClient.get('/api/admin/runtime-settings')
+  return response.data
+}
+
+/**
+ * 批量修改运行参数，立即对所有后端进程生效
+ * @param {Object} values - 参数名 -> 新值（null 表示恢复默认）
+ */
+export const updateRuntimeSettings = async (values) => {
+  const response = await apiClient.put('/api/admin/runtime-settings', { values })
+  return response.data
+}
+
+/**
+ * 获取运行参数修改记录（新的在前）
+ * @param {Object} params - { limit, key }
+ */
+export const getRuntimeSettingsAudit = async (params = {}) => {
+  const response = await apiClient.get('/api/admin/runtime-settings/audit', { params })
+  return response.data
+}
+
 // ============ 邀请码管理 ============
 
 /**
- * 获取所有邀请码列表
- * 返回: { codes: [ { id, code, is_universal, is_used, used_by_email, used_at, created_at } ] }
+ * 分页获取邀请码列表（按创建时间倒序）
+ * @param {Object} params - { limit, cursor, status: 'used' | 'unused' | 'universal', code_prefix, created_from, created_to }
+ * 返回: { codes: [ { id, code, is_universal, is_used, used_by_email, used_at, created_at } ], next_cursor, has_more }
+ */
+export const getInvitationCodes = async (params = {}) => {
+  const response = await apiClient.get('/api/admin/invitation-codes', { params })
+  return response.data
+}
+
+/**
+ * 统计邀请码数量（参数同列表的过滤条件）
+ * 返回: { count, estimated }，estimated 为 true 时是大表的估算值
  */
-export const getInvitationCodes = async () => {
-  const response = await apiClient.get('/api/admin/invitation-codes')
+export const countInvitationCodes = async (params = {}) => {
+  const response = await apiClient.get('/api/admin/invitation-codes/count', { params })
   return response.data
 }
 
@@ -0,0 +1,63 @@
+import { useAuthStore } from '@/features/auth/store/auth'
+
+// 客户端 ping 间隔（服务端超过 WS_IDLE_TIMEOUT_SECONDS 没收到任何帧会断开）
+const HEARTBEAT_INTERVAL_MS = 20000
+
+function socketUrl(sessionId) {
+  const url = new URL(`/api/sessions/${sessionId}/ws`, import.meta.env.VITE_API_URL || 'http://127.0.0.1:8000')
+  url.protocol = url.protocol === 'https:' ? 'wss:' : 'ws:'
+  return url.toString()
+}
+
+/**
+ * 打开会话 WebSocket
+ * @param {number|string} sessionId
+ * @param {Object} handlers - 按服务端消息类型回调：ready / token / reply / session_state /
+ *   opening_ready / review / error，以及连接关闭时的 close(event)
+ */
+export function openSessionSocket(sessionId, handlers = {}) {
+  const authStore = useAuthStore()
+  // token 不放在 URL 里（会被写进访问日志），连接后作为第一条消息发送
+  const ws = new WebSocket(socketUrl(sessionId))
+  let heartbeat = null
+
+  function send(payload) {
+    if (ws.readyState !== WebSocket.OPEN) return false
+    ws.send(JSON.stringify(payload))
+    return true
+  }
+
+  ws.onopen = () => {
+    send({ type: 'auth', token: authStore.token })
+    heartbeat = setInterval(() => send({ type: 'ping' }), HEARTBEAT_INTERVAL_MS)
+  }
+
+  ws.onmessage = (event) => {
+    const data = JSON.parse(event.data)
+    if (data.type === 'ping') {
+      send({ type: 'pong' })
+      return
+    }
+    handlers[data.type]?.(data)
+  }
+
+  ws.onclose = (event) => {
+    clearInterval(heartbeat)
+    handlers.close?.(event)
+  }
+
+  return {
+    get isOpen() {
+      return ws.readyState === WebSocket.OPEN
+    },
+    sendMessage(message, activeDurationSeconds) {
+      return send({ type: 'message', message, active_duration_seconds: activeDurationSeconds })
+    },
+    end() {
+      return send({ type: 'end' })
+    },
+    close() {
+      ws.close(1000)
+    }
+  }
+}
@@ -2,6 +2,9 @@ import axios from 'axios'
 import { useAuthStore } from '@/features/auth/store/auth'
 import router from '@/router'
 
+// 503 重试前最多等待的秒数
+const MAX_RETRY_AFTER_SECONDS = 10
+
 const instance = axios.create({
   baseURL: import.meta.env.VITE_API_URL || 'http://127.0.0.1:8000',
   timeout: 30000,
@@ -27,12 +30,20 @@ instance.interceptors.response.use(
   (response) => {
     return response
   },
-  (error) => {
+  async (error) => {
     if (error.response && error.response.status === 401) {
       const authStore = useAuthStore()
       authStore.logout()
       router.push('/auth/login')
     }
+    // 后端滚动重启中（503 + Retry-After）：等待后重试一次，请求会落到其他 worker
+    const retryAfter = error.response?.status === 503 && error.response.headers['retry-after']
+    if (retryAfter && error.config && !error.config._retriedAfterRestart) {
+      error.config._retriedAfterRestart = true
+      const delayMs = Math.min(Number(retryAfter) || 1, MAX_RETRY_AFTER_SECONDS) * 1000
+      await new Promise(resolve => setTimeout(resolve, delayMs))
+      return instance(error.config)
+    }
     return Promise.reject(error)
   }
 )
@@ -18,12 +18,13 @@ export const getLatestEmoScore = async () => {
 }
 
 /**
- * 获取情绪评估历史列表
+ * 分页获取情绪评估历史列表（按时间倒序）
  * @param {string} source - 可选，筛选评估来源 (onboarding/session)
- * @returns {Promise} 返回评估历史列表
+ * @param {Object} options - 可选，{ limit, cursor, from, to, fields: 'stress_score,anxiety_score', include_total }
+ * @returns {Promise} 返回 { items, next_cursor, has_more, total? }
  */
-export const getEmoScoreList = async (source = null) => {
-  const params = source ? { source } : {}
+export const getEmoScoreList = async (source = null, options = {}) => {
+  const params = source ? { source, ...options } : { ...options }
   const response = await axios.get('/api/emo-score/list', { params })
   return response.data
 }